@@ -7,6 +7,12 @@ from mutagen import File
 from mutagen.easyid3 import EasyID3
 import time
 from codes import env_loader
+from codes import path_cache
+from codes import count_cache
+from codes import suggest_index
+from codes import scan_manifest
+from codes import media_walker
+from codes import collection_stats
 
 class AudioProcessor:
     def __init__(self):
@@ -119,8 +125,14 @@ class AudioProcessor:
         """获取当前进度"""
         return self.progress
 
-    def process_audio_data(self, root_path, is_vip=False, progress_callback=None):
-        """处理音频文件数据 - 支持复杂目录结构"""
+    def process_audio_data(self, root_path, is_vip=False, progress_callback=None, incremental=False,
+                           cancel_event=None):
+        """
+        处理音频文件数据 - 支持复杂目录结构
+
+        incremental=True 时指纹（大小/修改时间/inode）未变的文件不再读取标签，
+        并删除已从磁盘消失的音频记录。cancel_event 置位后整个事务回滚并抛出 ScanCancelled
+        """
         connection = None
         cursor = None
         try:
@@ -140,82 +152,47 @@ class AudioProcessor:
                 self.logger.error(f"数据库连接或磁盘信息获取失败: {e}")
                 return {'status': 'error', 'message': f'数据库连接失败: {str(e)}'}
 
-            total_files = 0
             processed_files = 0
             start_time = time.time()
 
             # 🎯 支持的音频扩展名
             AUDIO_EXTENSIONS = {'.mp3', '.wav', '.flac', '.m4a', '.ogg', '.aac', '.wma'}
 
-            # 🎯 首先计算总文件数（递归扫描所有音频文件）
-            for file_path in root_path.rglob('*'):
-                if file_path.is_file() and file_path.suffix.lower() in AUDIO_EXTENSIONS:
-                    total_files += 1
-
-            if total_files == 0:
-                return {'status': 'error', 'message': '未找到音频文件'}
-
             # 🎯 扫描音频文件夹 - 支持复杂目录结构
             def scan_audio_folders(scan_path):
                 """
-                扫描音频文件夹，支持多种目录结构：
+                扫描音频文件夹（单次遍历），支持多种目录结构：
                 1. 根目录直接有音频文件
                 2. 根目录有子文件夹，子文件夹内有音频文件
                 3. 多级嵌套目录，每个包含音频的文件夹作为一个专辑
                 
-                返回: {collection_name: [audio_files]}
+                返回: {collection_name: [(audio_file, stat)]}
                 """
-                collections = {}
-                
-                # 递归遍历所有目录
-                for current_dir in scan_path.rglob('*'):
-                    if not current_dir.is_dir() or current_dir.name.startswith('.'):
-                        continue
-                        
-                    # 查找当前目录下的音频文件（不递归，只看直接子文件）
-                    audio_files = []
-                    for file_path in current_dir.iterdir():
-                        if file_path.is_file() and file_path.suffix.lower() in AUDIO_EXTENSIONS:
-                            audio_files.append(file_path)
-                    
-                    # 如果当前目录有音频，就创建一个集合
-                    if audio_files:
-                        collection_name = current_dir.name
-                        
-                        # 处理重名情况：如果已存在同名集合，添加路径信息区分
-                        if collection_name in collections:
-                            # 使用相对路径作为唯一标识
-                            try:
-                                rel_path = current_dir.relative_to(scan_path)
-                                collection_name = str(rel_path).replace('\\', '_').replace('/', '_')
-                            except ValueError:
-                                collection_name = f"{current_dir.name}_{len(collections)}"
-                        
-                        collections[collection_name] = audio_files
-                        self.logger.info(f"📂 发现音频集合: {collection_name} ({len(audio_files)} 个音频)")
-                
-                # 🎯 特殊处理：如果根目录直接有音频文件
-                root_audios = []
-                for file_path in scan_path.iterdir():
-                    if file_path.is_file() and file_path.suffix.lower() in AUDIO_EXTENSIONS:
-                        root_audios.append(file_path)
-                
-                if root_audios:
-                    collection_name = scan_path.name
-                    # 如果已有同名集合，添加后缀区分
-                    if collection_name in collections:
-                        collection_name = f"{scan_path.name}_root"
-                    
-                    collections[collection_name] = root_audios
-                    self.logger.info(f"📂 发现根目录音频集合: {collection_name} ({len(root_audios)} 个音频)")
-                
+                collections = media_walker.group_by_directory(scan_path, AUDIO_EXTENSIONS, root_suffix="_root",
+                                                             cancel_event=cancel_event)
+                for name, files in collections.items():
+                    self.logger.info(f"📂 发现音频集合: {name} ({len(files)} 个音频)")
                 return collections
 
             # 🎯 扫描所有音频集合
             audio_collections = scan_audio_folders(root_path)
             
-            if not audio_collections:
-                return {'status': 'error', 'message': '未找到有效的音频集合'}
+            # 🎯 总文件数直接由遍历结果得出，不再单独遍历一次计数
+            total_files = sum(len(files) for files in audio_collections.values())
+            if total_files == 0:
+                return {'status': 'error', 'message': '未找到音频文件'}
+
+            # 🎯 读取本次扫描目录下已入库音频的指纹（专辑的 storage_root 相对于扫描目录的父目录）
+            root_name = root_path.name
+            manifest = scan_manifest.ScanManifest('audio_item', 'audio_id', 'audio_collection').load(
+                cursor,
+                "c.disk_id = %s AND (c.storage_root = %s OR LEFT(c.storage_root, CHAR_LENGTH(%s)) = %s)",
+                (disk_id, root_name, root_name + '/', root_name + '/')
+            )
+            # 有专辑回滚时，其音频的存在状态未知，本次不删除任何记录
+            removal_safe = True
+            # 本次涉及的专辑，提交前重算统计列
+            touched_collections = set(manifest.collection_ids)
 
             # 🎯 处理每个音频集合
             for collection_name, audio_files in audio_collections.items():
@@ -223,7 +200,7 @@ class AudioProcessor:
                     cursor.execute("SAVEPOINT sp_collection")
                     
                     # 获取第一个音频文件的相对路径来确定存储根路径
-                    first_audio = audio_files[0]
+                    first_audio, _ = audio_files[0]
                     collection_dir = first_audio.parent
                     storage_root = str(collection_dir.relative_to(mount_path))
                     storage_root = storage_root.replace('\\', '/')  # 统一使用正斜杠
@@ -241,6 +218,7 @@ class AudioProcessor:
                             (disk_id, collection_name, storage_root, group_id, cover_path)
                         VALUES (%s, %s, %s, %s, %s)
                         ON DUPLICATE KEY UPDATE
+                            collection_id = LAST_INSERT_ID(collection_id),
                             disk_id = VALUES(disk_id),
                             storage_root = VALUES(storage_root),
                             group_id = VALUES(group_id),
@@ -251,11 +229,12 @@ class AudioProcessor:
 
                     # 处理音频文件
                     file_count = 0
-                    for file_path in audio_files:
+                    for file_path, file_stat in audio_files:
+                        media_walker.check_cancelled(cancel_event)
                         try:
                             relative_path = str(file_path.relative_to(mount_path))
                             relative_path = relative_path.replace('\\', '/')  # 统一使用正斜杠
-                            file_size = file_path.stat().st_size
+                            file_size, file_mtime, file_inode = scan_manifest.fingerprint(file_stat)
                             
                             # 🎯 更新进度（同时更新内部进度和外部回调）
                             processed_files += 1
@@ -266,16 +245,23 @@ class AudioProcessor:
                             if progress_callback:
                                 progress_callback(percentage, str(file_path.name))
                             
+                            # 🎯 增量模式下指纹未变的文件不再读取标签
+                            status = manifest.check(collection_id, relative_path, file_stat)
+                            if incremental and status == scan_manifest.UNCHANGED:
+                                continue
+                            
                             # 提取音频元数据
                             metadata = self.extract_audio_metadata(file_path)
                             if metadata:
                                 cursor.execute("""
                                     INSERT INTO audio_item 
                                         (collection_id, relative_path, file_size, duration, 
-                                         title, artist, album, genre, year)
-                                    VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s)
+                                         title, artist, album, genre, year, file_mtime, file_inode, path_hash)
+                                    VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
                                     ON DUPLICATE KEY UPDATE
                                         file_size = VALUES(file_size),
+                                        file_mtime = VALUES(file_mtime),
+                                        file_inode = VALUES(file_inode),
                                         duration = VALUES(duration),
                                         title = VALUES(title),
                                         artist = VALUES(artist),
@@ -286,7 +272,8 @@ class AudioProcessor:
                                     collection_id, relative_path, file_size,
                                     metadata['duration'], metadata['title'],
                                     metadata['artist'], metadata['album'],
-                                    metadata['genre'], metadata['year']
+                                    metadata['genre'], metadata['year'],
+                                    file_mtime, file_inode, scan_manifest.path_hash(relative_path)
                                 ))
 
                                 if cursor.rowcount > 0:
@@ -296,14 +283,28 @@ class AudioProcessor:
                             self.logger.error(f"音频文件处理失败：{file_path} | 错误：{str(e)}")
                             continue
 
+                    touched_collections.add(collection_id)
                     self.logger.info(f"插入 {file_count} 个音频文件到集合: {collection_name}")
 
+                except media_walker.ScanCancelled:
+                    raise
                 except Exception as e:
                     self.logger.error(f"专辑处理失败：{collection_name} | 错误：{str(e)}")
                     if cursor:
                         cursor.execute("ROLLBACK TO SAVEPOINT sp_collection")
+                    removal_safe = False
                     continue
 
+            # 🎯 增量模式：删除已消失的音频
+            if incremental:
+                if removal_safe:
+                    manifest.remove_vanished(cursor)
+                else:
+                    self.logger.warning("存在回滚的专辑，跳过删除已消失的音频记录")
+
+            # 🎯 重算专辑统计列（条目数/总大小/总时长/第一首）
+            collection_stats.refresh(cursor, 'audio', touched_collections)
+
             if connection:
                 connection.commit()
             end_time = time.time()
@@ -311,9 +312,16 @@ class AudioProcessor:
             return {
                 'status': 'success',
                 'message': f'共处理{processed_files}个音频文件，创建{len(audio_collections)}个专辑',
-                'processing_time': f'{end_time - start_time:.2f}秒'
+                'processing_time': f'{end_time - start_time:.2f}秒',
+                'incremental': incremental,
+                **manifest.counts
             }
 
+        except media_walker.ScanCancelled:
+            self.logger.warning("音频扫描已取消，本次改动已回滚")
+            if connection:
+                connection.rollback()
+            raise
         except Exception as e:
             self.logger.error(f"音频处理失败: {str(e)}")
             if connection:
@@ -324,4 +332,8 @@ class AudioProcessor:
             if cursor:
                 cursor.close()
             if connection:
-                connection.close() 
\ No newline at end of file
+                connection.close()
+            # 音频记录已变化，丢弃缓存的路径解析结果
+            path_cache.invalidate('audio')
+            count_cache.invalidate('audio')
+            suggest_index.refresh('audio')
\ No newline at end of file
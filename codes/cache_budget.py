@@ -0,0 +1,141 @@
+"""
+磁盘缓存目录的容量预算（缩放图、故事板）
+
+这些缓存文件按 (原文件路径, 大小, 修改时间, 参数) 的 SHA1 命名，原文件被替换/删除或配置调整后，
+旧文件不会再被引用，目录只增不减。这里用文件 mtime 近似最近访问时间做 LRU：
+    - 命中时调用 touch()，mtime 早于 _TOUCH_INTERVAL 秒才写回，不会每次请求都写磁盘
+    - 写入新文件后调用 added(size)，累计大小超过预算时在后台线程扫描目录，
+      按 mtime 从旧到新删除，直到降到预算的 90%；_EVICT_GRACE 秒内访问过的文件不删
+累计大小在第一次写入时扫描目录得到，之后只按新增文件累加，每次清理后按实际大小校准。
+"""
+import os
+import threading
+import time
+
+
+# 命中时写回 mtime 的最小间隔（秒）
+_TOUCH_INTERVAL = 3600
+# 最近访问过的文件不淘汰（秒）
+_EVICT_GRACE = 600
+# 两次清理的最小间隔（秒），所有文件都在保护期内时避免每次写入都扫描目录
+_SWEEP_INTERVAL = 60
+# 清理后保留的比例
+_LOW_WATERMARK = 0.9
+# 生成中断留下的临时文件（以 . 开头）超过该秒数才允许删除
+_STALE_TEMP = 3600
+
+
+def touch(path, mtime):
+    """记录一次命中：文件 mtime 距今超过 _TOUCH_INTERVAL 秒时更新为当前时间"""
+    if time.time() - mtime >= _TOUCH_INTERVAL:
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+
+
+def _walk(root):
+    """递归列出目录下的文件 [(mtime, 大小, 路径)]"""
+    files = []
+    stack = [str(root)]
+    while stack:
+        try:
+            with os.scandir(stack.pop()) as entries:
+                for entry in entries:
+                    try:
+                        if entry.is_dir(follow_symlinks=False):
+                            stack.append(entry.path)
+                        elif entry.is_file(follow_symlinks=False):
+                            st = entry.stat()
+                            files.append((st.st_mtime, st.st_size, entry.path))
+                    except OSError:
+                        continue
+        except OSError:
+            continue
+    return files
+
+
+class DiskBudget:
+    """
+    单个缓存目录的容量预算
+
+    Args:
+        label: 日志中的名称
+        root: 返回缓存目录的函数
+        budget_mb: 预算（MB），0 表示不限制
+    """
+
+    def __init__(self, label, root, budget_mb):
+        self.label = label
+        self.budget = max(0, budget_mb) * 1024 * 1024
+        self._root = root
+        self._lock = threading.Lock()
+        self._used = None          # 估算的目录总大小，None 表示还没扫描过
+        self._sweeping = False
+        self._last_sweep = 0.0
+        self._stats = {'sweeps': 0, 'evicted': 0, 'evicted_bytes': 0}
+
+    def added(self, size):
+        """写入新文件后调用，超出预算时在后台清理"""
+        if not self.budget:
+            return
+        with self._lock:
+            if self._used is not None:
+                self._used += size
+                if self._used <= self.budget:
+                    return
+            if self._sweeping or time.monotonic() - self._last_sweep < _SWEEP_INTERVAL:
+                return
+            self._sweeping = True
+        threading.Thread(target=self._sweep_in_background, name=f'{self.label}-sweep', daemon=True).start()
+
+    def _sweep_in_background(self):
+        try:
+            self.sweep()
+        except Exception as e:
+            print(f"清理{self.label}缓存失败: {str(e)}")
+        finally:
+            with self._lock:
+                self._sweeping = False
+                self._last_sweep = time.monotonic()
+
+    def sweep(self):
+        """扫描目录，超出预算时按 mtime 从旧到新删除；返回 (删除文件数, 释放字节数)"""
+        files = _walk(self._root())
+        total = sum(size for _, size, _ in files)
+        removed = freed = 0
+        if self.budget and total > self.budget:
+            target = self.budget * _LOW_WATERMARK
+            now = time.time()
+            files.sort()
+            for mtime, size, path in files:
+                if total <= target:
+                    break
+                grace = _STALE_TEMP if os.path.basename(path).startswith('.') else _EVICT_GRACE
+                if now - mtime < grace:
+                    continue
+                try:
+                    os.remove(path)
+                except OSError:
+                    continue
+                total -= size
+                removed += 1
+                freed += size
+        with self._lock:
+            self._used = total
+            self._stats['sweeps'] += 1
+            self._stats['evicted'] += removed
+            self._stats['evicted_bytes'] += freed
+        if removed:
+            print(f"🧹 {self.label}缓存超出预算，已淘汰 {removed} 个文件（{freed / 1024 / 1024:.1f} MB）")
+        return removed, freed
+
+    def stats(self):
+        with self._lock:
+            return {
+                'budget_mb': self.budget // 1024 // 1024,
+                'used_mb': round(self._used / 1024 / 1024, 1) if self._used is not None else None,
+                'sweeps': self._stats['sweeps'],
+                'evicted': self._stats['evicted'],
+                'evicted_mb': round(self._stats['evicted_bytes'] / 1024 / 1024, 1)
+            }
@@ -0,0 +1,100 @@
+"""
+集合表上的冗余统计列
+
+video_collection / image_collection / audio_collection 上保存：
+    - item_count:     条目数
+    - total_bytes:    文件总字节数
+    - total_duration: 总时长（秒，图片没有该列）
+    - first_item_id:  主键最小的条目（列表封面/第一首）
+列表页直接读这些列，不再对所有条目 LEFT JOIN ... GROUP BY。
+
+扫描器在写入/删除条目后只重算本次涉及的集合（按 idx_collection 做范围聚合），
+统计列出现偏差时可执行重建：
+    python -m codes.collection_stats            # 重建全部媒体类型
+    python -m codes.collection_stats video      # 只重建视频集合
+也可以调用管理接口 POST /api/collection-stats/reconcile。
+"""
+import sys
+
+
+# 媒体类型 -> (集合表, 条目表, 条目主键, 时长表达式)
+SPECS = {
+    'video': ('video_collection', 'video_item', 'video_id', 'i.duration_ms / 1000'),
+    'image': ('image_collection', 'image_item', 'image_id', None),
+    'audio': ('audio_collection', 'audio_item', 'audio_id', 'i.duration'),
+}
+
+
+def refresh(cursor, media_type, collection_ids=None, batch_size=500):
+    """
+    重算集合统计列（调用方负责提交事务）
+
+    Args:
+        cursor: 数据库游标（pymysql 或 mysql.connector）
+        media_type: video / image / audio
+        collection_ids: 需要重算的集合ID，None 表示全部集合
+        batch_size: 每条 UPDATE 覆盖的集合数
+
+    Returns:
+        int: 重算的集合数（全部重算时为受影响行数）
+    """
+    collection_table, item_table, id_column, duration_sql = SPECS[media_type]
+    duration_select = f", COALESCE(SUM({duration_sql}), 0) AS dur" if duration_sql else ""
+    duration_set = ", c.total_duration = COALESCE(s.dur, 0)" if duration_sql else ""
+
+    def update(scope_ids):
+        if scope_ids is None:
+            item_where, collection_where, params = "", "", []
+        else:
+            placeholders = ','.join(['%s'] * len(scope_ids))
+            item_where = f"WHERE i.collection_id IN ({placeholders})"
+            collection_where = f"WHERE c.collection_id IN ({placeholders})"
+            params = list(scope_ids) * 2
+        cursor.execute(f"""
+            UPDATE {collection_table} c
+            LEFT JOIN (
+                SELECT i.collection_id, COUNT(*) AS cnt, COALESCE(SUM(i.file_size), 0) AS bytes,
+                       MIN(i.{id_column}) AS first_id{duration_select}
+                FROM {item_table} i
+                {item_where}
+                GROUP BY i.collection_id
+            ) s ON s.collection_id = c.collection_id
+            SET c.item_count = COALESCE(s.cnt, 0),
+                c.total_bytes = COALESCE(s.bytes, 0),
+                c.first_item_id = s.first_id{duration_set}
+            {collection_where}
+        """, params)
+        return cursor.rowcount
+
+    if collection_ids is None:
+        return update(None)
+
+    ids = sorted({cid for cid in collection_ids if cid})
+    for start in range(0, len(ids), batch_size):
+        update(ids[start:start + batch_size])
+    return len(ids)
+
+
+def reconcile(media_types=None):
+    """重建统计列（全部集合，视频同时重建分面预聚合计数），返回 {媒体类型: 行数}"""
+    from codes import connect_mysql
+    from codes import video_facets
+    db = connect_mysql.Connect_mysql()
+    result = {}
+    for media_type in media_types or SPECS.keys():
+        with db.connect() as conn:
+            with conn.cursor() as cursor:
+                result[media_type] = refresh(cursor, media_type)
+                if media_type == 'video':
+                    video_facets.refresh(cursor)
+            conn.commit()
+        print(f"✅ 已重建{media_type}集合统计列: {result[media_type]} 行")
+    return result
+
+
+if __name__ == '__main__':
+    targets = [arg for arg in sys.argv[1:] if arg in SPECS]
+    if sys.argv[1:] and not targets:
+        print(f"用法: python -m codes.collection_stats [{'|'.join(SPECS)}] ...")
+        sys.exit(1)
+    reconcile(targets or None)
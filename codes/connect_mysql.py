@@ -2,6 +2,14 @@ import os
 from pathlib import Path
 import pymysql
 from codes import env_loader
+from codes import db_pool
+from codes import path_cache
+from codes import count_cache
+from codes import suggest_index
+from codes import scan_manifest
+from codes import media_walker
+from codes import collection_stats
+from codes import derivative_store
 import json
 from flask import current_app
 
@@ -14,15 +22,30 @@ class Connect_mysql:
         self.password = env_loader.mysql_password
         self.database = env_loader.mysql_database
         self.charset = env_loader.mysql_charset
-
-    # 数据库连接
+        # 所有 Connect_mysql 实例共享同一个连接池，避免每次查询都重新 TCP 握手 + 认证
+        self.pool = db_pool.get_pool(
+            dict(host=self.host, port=self.port, user=self.user,
+                 passwd=self.password, db=self.database, charset=self.charset),
+            min_size=env_loader.mysql_pool_min_size,
+            max_size=env_loader.mysql_pool_max_size,
+            max_lifetime=env_loader.mysql_pool_max_lifetime,
+            idle_timeout=env_loader.mysql_pool_idle_timeout,
+            borrow_timeout=env_loader.mysql_pool_borrow_timeout,
+            validate_after=env_loader.mysql_pool_validate_after
+        )
+
+    # 数据库连接（从连接池借出，close()/with 结束时归还）
     def connect(self):
         try:
-            return pymysql.connect(host=self.host, port=self.port, user=self.user,
-                                   passwd=self.password, db=self.database, charset=self.charset)
+            return self.pool.connection()
         except Exception as e:
+            print(f"数据库连接失败: {str(e)}")
             return json.dumps({'error': "数据库连接失败"}, ensure_ascii=False)
 
+    # 连接池统计信息
+    def pool_stats(self):
+        return self.pool.stats()
+
     # 查询多条记录
     def fetch_all_records(self, SQL):
         try:
@@ -52,7 +75,7 @@ class Connect_mysql:
                     db.commit()  # 手动提交事务
                 return cursor.rowcount  # 返回受影响的行数
         except Exception as e:
-            db.rollback()  # 出现异常时回滚事务
+            # 连接归还连接池时会自动回滚未提交的事务
             return json.dumps({'error': "数据库更新失败"}, ensure_ascii=False)
 
     # 新增：清空表的方法
@@ -65,8 +88,7 @@ class Connect_mysql:
                     db.commit()
                 return True
         except Exception as e:
-            if isinstance(db, pymysql.connections.Connection):
-                db.rollback()
+            # 连接归还连接池时会自动回滚未提交的事务
             return json.dumps({'error': f"清空表 {table_name} 失败: {str(e)}"}, ensure_ascii=False)
 
     # 在 Connect_mysql 类中添加以下方法
@@ -157,9 +179,10 @@ class Connect_mysql:
 
                                         cursor.execute("""
                                             INSERT IGNORE INTO image_item 
-                                                (collection_id, relative_path, file_size)
-                                            VALUES (%s, %s, %s)
-                                            """, (collection_id, relative_path, file_size))
+                                                (collection_id, relative_path, file_size, path_hash)
+                                            VALUES (%s, %s, %s, %s)
+                                            """, (collection_id, relative_path, file_size,
+                                                  scan_manifest.path_hash(relative_path)))
 
                                         if cursor.rowcount == 1:
                                             file_count += 1
@@ -194,8 +217,14 @@ class Connect_mysql:
         except Exception as e:
             return {'status': 'error', 'message': f'系统错误: {str(e)}'}
 
-    def process_image_data_with_progress(self, root_path, is_vip, progress_callback=None):
-        """带进度更新的图片数据处理"""
+    def process_image_data_with_progress(self, root_path, is_vip, progress_callback=None, incremental=False,
+                                         cancel_event=None):
+        """
+        带进度更新的图片数据处理
+
+        指纹（大小/修改时间/inode）未变的图片不会重复写库；incremental=True 时还会删除
+        已从磁盘消失的图片记录。cancel_event 置位后整个事务回滚并抛出 ScanCancelled
+        """
         print(f"开始处理数据结构（带进度），传入的参数：{root_path}  {is_vip}")
         
         # 🎯 定义支持的图片格式（全面覆盖）
@@ -229,54 +258,16 @@ class Connect_mysql:
         def scan_image_folders(scan_path):
             """
             简单直接的扫描方式：
-            - 遍历所有文件夹（包括多级嵌套）
+            - 单次遍历所有文件夹（包括多级嵌套）
             - 如果文件夹内有图片文件，就将该文件夹作为一个图集
             - 文件夹名 = 图集名，文件夹内的图片 = 图集内容
             
-            返回: {collection_name: [image_files]}
+            返回: {collection_name: [(image_file, stat)]}
             """
-            collections = {}
-            
-            # 递归遍历所有目录
-            for current_dir in scan_path.rglob('*'):
-                if not current_dir.is_dir():
-                    continue
-                    
-                # 查找当前目录下的图片文件（不递归，只看直接子文件）
-                image_files = []
-                for file_path in current_dir.iterdir():
-                    if file_path.is_file() and file_path.suffix.lower() in SUPPORTED_IMAGE_FORMATS:
-                        image_files.append(file_path)
-                
-                # 如果当前目录有图片，就创建一个图集
-                if image_files:
-                    collection_name = current_dir.name
-                    
-                    # 处理重名情况：如果已存在同名图集，添加路径信息区分
-                    if collection_name in collections:
-                        # 使用相对路径作为唯一标识
-                        try:
-                            rel_path = current_dir.relative_to(scan_path)
-                            collection_name = str(rel_path).replace('\\', '_').replace('/', '_')
-                        except ValueError:
-                            collection_name = f"{current_dir.name}_{len(collections)}"
-                    
-                    collections[collection_name] = image_files
-                    print(f"📂 发现图集: {collection_name} ({len(image_files)} 张图片)")
-            
-            # 特殊处理：如果根目录直接有图片
-            root_images = []
-            for file_path in scan_path.iterdir():
-                if file_path.is_file() and file_path.suffix.lower() in SUPPORTED_IMAGE_FORMATS:
-                    root_images.append(file_path)
-            
-            if root_images:
-                collection_name = scan_path.name
-                # 如果已有同名图集，添加后缀区分
-                if collection_name in collections:
-                    collection_name = f"{scan_path.name}_根目录"
-                collections[collection_name] = root_images
-                print(f"📂 发现根目录图集: {collection_name} ({len(root_images)} 张图片)")
+            collections = media_walker.group_by_directory(scan_path, SUPPORTED_IMAGE_FORMATS, root_suffix="_根目录",
+                                                         cancel_event=cancel_event)
+            for name, files in collections.items():
+                print(f"📂 发现图集: {name} ({len(files)} 张图片)")
             
             print(f"🔍 总共发现 {len(collections)} 个图集")
             
@@ -285,7 +276,7 @@ class Connect_mysql:
                 print("📋 扫描结果详情:")
                 for name, files in collections.items():
                     print(f"  📂 图集: {name}")
-                    for i, file_path in enumerate(files[:3]):  # 只显示前3个文件
+                    for file_path, _ in files[:3]:  # 只显示前3个文件
                         print(f"    📄 {file_path.name}")
                     if len(files) > 3:
                         print(f"    ... 还有 {len(files) - 3} 个文件")
@@ -367,9 +358,21 @@ class Connect_mysql:
                     if not disk_id:
                         raise ValueError("无法获取磁盘ID")
 
+                    # 读取本次扫描根目录下已入库图片的指纹
+                    manifest = scan_manifest.ScanManifest('image_item', 'image_id', 'image_collection').load(
+                        cursor, "c.disk_id = %s AND c.storage_root = %s", (disk_id, storage_root))
+                    # 有集合回滚时，其图片的存在状态未知，本次不删除任何记录
+                    removal_safe = True
+                    # 本次涉及的集合，提交前重算统计列
+                    touched_collections = set(manifest.collection_ids)
+
                     # ================== 🎯 处理图片集合 ==================
-                    total_files = 0
-                    processed_files = 0
+                    total_files = 0      # 实际插入的图片数
+                    processed_files = 0  # 已扫描的图片数（用于进度）
+                    batch_size = max(1, env_loader.image_scan_batch_size)
+                    # 新增/变化的图片（提交后按需在后台预生成预览图）
+                    prewarm_images = []
+                    prewarm_covers = []
                     
                     collection_names = list(image_collections.keys())
                     
@@ -402,79 +405,145 @@ class Connect_mysql:
                             collection_id = cursor.lastrowid
                             print(f"📋 集合ID：{collection_id}")
 
-                            # ================== 🎯 处理图片文件（仅处理图片格式） ==================
+                            # ================== 🎯 处理图片文件（仅处理图片格式），按批次写入 ==================
                             file_count = 0
-                            for file_path in image_files:
+                            batch = []          # 新图片
+                            changed_batch = []  # 指纹有变化的已有图片
+                            written_files = []  # 本集合写入的图片文件
+
+                            def flush_batch():
+                                """把当前批次一次性写入，返回实际插入的行数（INSERT IGNORE 跳过的重复行不计）"""
+                                inserted = 0
+                                if batch:
+                                    cursor.executemany("""
+                                        INSERT IGNORE INTO image_item 
+                                            (collection_id, relative_path, file_size, file_mtime, file_inode, path_hash)
+                                        VALUES (%s, %s, %s, %s, %s, %s)
+                                        """, batch)
+                                    inserted = cursor.rowcount
+                                    batch.clear()
+                                if changed_batch:
+                                    cursor.executemany("""
+                                        INSERT INTO image_item 
+                                            (collection_id, relative_path, file_size, file_mtime, file_inode, path_hash)
+                                        VALUES (%s, %s, %s, %s, %s, %s)
+                                        ON DUPLICATE KEY UPDATE
+                                            file_size = VALUES(file_size),
+                                            file_mtime = VALUES(file_mtime),
+                                            file_inode = VALUES(file_inode)
+                                        """, changed_batch)
+                                    changed_batch.clear()
+                                return inserted
+
+                            for file_path, file_stat in image_files:
+                                media_walker.check_cancelled(cancel_event)
                                 try:
-                                    # 再次确认是图片格式（双重保险）
-                                    if file_path.suffix.lower() not in SUPPORTED_IMAGE_FORMATS:
-                                        continue
-                                    
                                     relative_path = file_path.relative_to(path).as_posix()
-                                    file_size = file_path.stat().st_size
-
-                                    cursor.execute("""
-                                        INSERT IGNORE INTO image_item 
-                                            (collection_id, relative_path, file_size)
-                                        VALUES (%s, %s, %s)
-                                        """, (collection_id, relative_path, file_size))
-
-                                    if cursor.rowcount == 1:
-                                        file_count += 1
-                                        total_files += 1
-                                        processed_files += 1
-                                        
-                                        # 🎯 更新文件级别的进度（平滑过渡，减少跳跃感）
-                                        if processed_files % 50 == 0 or processed_files <= 100 or processed_files == total_files_count:  
-                                            # 前100个文件每个都更新，后续每50个文件更新一次，最后一个文件也更新
-                                            file_progress = 8 + (processed_files / total_files_count) * 87  # 8%-95%
-                                            print(f"🔄 进度更新: {int(file_progress)}% - {file_path.name} ({processed_files}/{total_files_count})")
-                                            update_progress(
-                                                int(file_progress), 
-                                                f'处理图片: {file_path.name} ({processed_files}/{total_files_count})', 
-                                                processed_files, 
-                                                total_files_count
-                                            )
-                                        
+                                    status = manifest.check(collection_id, relative_path, file_stat)
+                                    if status == scan_manifest.UNCHANGED:
+                                        continue
+                                    row = (collection_id, relative_path, *scan_manifest.fingerprint(file_stat),
+                                           scan_manifest.path_hash(relative_path))
+                                    if status == scan_manifest.NEW:
+                                        batch.append(row)
+                                    else:
+                                        changed_batch.append(row)
+                                    written_files.append(file_path)
                                 except Exception as e:
                                     print(f"❌ 图片处理失败：{file_path} | 错误：{str(e)}")
                                     continue
+                                finally:
+                                    processed_files += 1
+
+                                if len(batch) + len(changed_batch) >= batch_size:
+                                    file_count += flush_batch()
+                                    # 🎯 每写入一批更新一次进度（8%-95%）
+                                    file_progress = 8 + (processed_files / total_files_count) * 87
+                                    update_progress(
+                                        int(file_progress), 
+                                        f'处理图片: {file_path.name} ({processed_files}/{total_files_count})', 
+                                        processed_files, 
+                                        total_files_count
+                                    )
+
+                            file_count += flush_batch()
+                            cursor.execute("RELEASE SAVEPOINT sp_collection")
+                            # 集合整体成功后才计入总数，回滚到保存点的集合不计
+                            total_files += file_count
+                            touched_collections.add(collection_id)
+                            if written_files:
+                                prewarm_images.extend(written_files)
+                                prewarm_covers.append(written_files[0])
+                            update_progress(
+                                int(8 + (processed_files / total_files_count) * 87),
+                                f'完成图片集合: {collection_name} ({processed_files}/{total_files_count})',
+                                processed_files,
+                                total_files_count
+                            )
 
                             print(f"✅ 成功插入 {file_count} 张图片")
 
+                        except media_walker.ScanCancelled:
+                            raise
                         except Exception as e:
-                            print(f"❌ 图片集合处理失败：{collection_name} | 回滚操作")
+                            print(f"❌ 图片集合处理失败：{collection_name} | 错误：{str(e)} | 回滚操作")
                             cursor.execute("ROLLBACK TO SAVEPOINT sp_collection")
+                            removal_safe = False
                             continue
 
+                    # ================== 增量模式：删除已消失的图片 ==================
+                    if incremental:
+                        if removal_safe:
+                            update_progress(95, '清理已删除的图片记录...', processed_files, total_files_count)
+                            manifest.remove_vanished(cursor)
+                        else:
+                            print("⚠️ 存在回滚的图片集合，跳过删除已消失的图片记录")
+
+                    # ================== 重算集合统计列 ==================
+                    collection_stats.refresh(cursor, 'image', touched_collections)
+
                     # ================== 完成处理 ==================
                     update_progress(96, '提交数据库事务...', processed_files, total_files_count)
                     db.commit()
+                    if env_loader.image_preview_prewarm:
+                        derivative_store.prewarm_image_previews(prewarm_images, prewarm_covers)
                     
                     update_progress(100, '扫描完成', processed_files, total_files_count)
                     
                     res={
                         'status': 'success',
                         'message': f'共处理{total_files}个文件',
-                        'storage_root': f"{mount_path.as_posix()}/{storage_root}"
+                        'storage_root': f"{mount_path.as_posix()}/{storage_root}",
+                        'incremental': incremental,
+                        **manifest.counts
                     }
                     print(res)
                     return res
 
+                except media_walker.ScanCancelled:
+                    db.rollback()
+                    update_progress(0, '扫描已取消，本次改动已回滚', 0, 0)
+                    raise
                 except Exception as e:
                     db.rollback()
                     update_progress(0, f'数据库操作失败: {str(e)}', 0, 0)
                     return {'status': 'error', 'message': f'数据库操作失败: {str(e)}'}
                 finally:
                     cursor.close()
+                    # 图片记录已变化，丢弃缓存的路径解析结果和列表总数
+                    path_cache.invalidate('image')
+                    count_cache.invalidate('image')
+                    suggest_index.refresh('image')
 
+        except media_walker.ScanCancelled:
+            raise
         except Exception as e:
             update_progress(0, f'系统错误: {str(e)}', 0, 0)
             return {'status': 'error', 'message': f'系统错误: {str(e)}'}
 
 
 if __name__ == '__main__':
-    db = Connect_mysql.connect()
+    db = Connect_mysql().connect()
 
 
 
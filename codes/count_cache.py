@@ -0,0 +1,141 @@
+"""
+列表总数缓存
+
+分页接口每次都要 SELECT COUNT(*)（多表 JOIN），经常比取一页数据还慢。这里按
+(媒体类型, 用户组, 范围, 分类/关键词) 缓存总数，扫描和清空数据时按媒体类型失效。
+
+count_mode=approximate 时，不带筛选条件的列表直接读取 media_counter 表中维护的
+按分组计数（每次扫描/清空后由集合表的 item_count 统计列汇总），不再扫描明细表；这类总数可能与
+实时数据略有出入，接口会返回 count_exact=false。精确模式不读取计数器，也不维护它。
+"""
+import threading
+from codes import env_loader
+from codes.path_cache import LRUTTLCache
+
+
+MODE_EXACT = 'exact'
+MODE_APPROXIMATE = 'approximate'
+
+# 各媒体类型的集合表，用于重算计数器
+_TABLES = {
+    'video': 'video_collection',
+    'image': 'image_collection',
+    'audio': 'audio_collection',
+}
+
+count_cache = LRUTTLCache(
+    max_entries=env_loader.count_cache_max_entries,
+    ttl=env_loader.count_cache_ttl
+)
+
+# 每种媒体类型的失效代数：计算期间发生了失效，算出的旧值不写入缓存
+_generation = {}
+_generation_lock = threading.Lock()
+_db = None
+
+
+def _get_db():
+    # connect_mysql 会导入本模块，这里延迟创建连接对象避免循环导入
+    global _db
+    if _db is None:
+        from codes import connect_mysql
+        _db = connect_mysql.Connect_mysql()
+    return _db
+
+
+def get_count(media_type, user_group, scope, term, compute, counter_field=None):
+    """
+    读取列表总数
+
+    Args:
+        media_type: video / image / audio
+        user_group: 用户组
+        scope: all（不带筛选）/ category / search
+        term: 分类名或搜索关键词
+        compute: 无参函数，执行精确的 COUNT(*) 并返回结果
+        counter_field: 近似模式下可用的计数器字段（item_count / collection_count），None 表示不适用
+
+    Returns:
+        tuple: (总数, 是否精确)
+    """
+    if env_loader.count_mode == MODE_APPROXIMATE and counter_field and scope == 'all':
+        value = read_counter(media_type, user_group, counter_field)
+        if value is not None:
+            return value, False
+
+    key = (media_type, user_group, scope, term)
+    value = count_cache.get(key)
+    if value is not None:
+        return value, True
+
+    with _generation_lock:
+        generation = _generation.get(media_type, 0)
+    value = compute()
+    with _generation_lock:
+        if _generation.get(media_type, 0) == generation:
+            count_cache.set(key, value)
+    return value, True
+
+
+def read_counter(media_type, user_group, counter_field):
+    """从 media_counter 读取用户可见分组的计数之和，没有计数记录时返回 None"""
+    try:
+        with _get_db().connect() as conn:
+            with conn.cursor() as cursor:
+                cursor.execute(f"""
+                    SELECT COUNT(*), COALESCE(SUM({counter_field}), 0)
+                    FROM media_counter
+                    WHERE media_type = %s AND group_id <= %s
+                """, (media_type, user_group))
+                rows, total = cursor.fetchone()
+        return int(total) if rows else None
+    except Exception as e:
+        print(f"读取媒体计数器失败: {str(e)}")
+        return None
+
+
+def refresh_counters(media_type):
+    """
+    按分组重算某媒体类型的集合数/条目数，写入 media_counter
+
+    条目数取集合表上扫描时维护的 item_count（collection_stats），只读集合表，不扫描明细表；
+    调用方需先刷新集合统计列
+    """
+    collection_table = _TABLES[media_type]
+    try:
+        with _get_db().connect() as conn:
+            with conn.cursor() as cursor:
+                cursor.execute("DELETE FROM media_counter WHERE media_type = %s", (media_type,))
+                cursor.execute(f"""
+                    INSERT INTO media_counter (media_type, group_id, collection_count, item_count)
+                    SELECT %s, c.group_id, COUNT(*), COALESCE(SUM(c.item_count), 0)
+                    FROM {collection_table} c
+                    GROUP BY c.group_id
+                """, (media_type,))
+            conn.commit()
+    except Exception as e:
+        print(f"更新媒体计数器失败: {media_type} | {str(e)}")
+
+
+def refresh_all():
+    """启动时调用：近似模式下按集合统计列重算所有计数器（精确模式期间不维护，切换模式后可能已过期）"""
+    if env_loader.count_mode == MODE_APPROXIMATE:
+        for media_type in _TABLES:
+            refresh_counters(media_type)
+
+
+def invalidate(*media_types):
+    """扫描/清空数据后调用：丢弃这些媒体类型的缓存总数；近似模式下同时重算计数器"""
+    with _generation_lock:
+        for media_type in media_types:
+            _generation[media_type] = _generation.get(media_type, 0) + 1
+    removed = count_cache.invalidate(lambda k: k[0] in media_types)
+    if env_loader.count_mode == MODE_APPROXIMATE:
+        for media_type in media_types:
+            refresh_counters(media_type)
+    print(f"🧹 列表总数缓存已失效: {', '.join(media_types)}（清除 {removed} 条）")
+    return removed
+
+
+def stats():
+    return {**count_cache.stats(), 'mode': env_loader.count_mode}
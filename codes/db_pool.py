@@ -0,0 +1,335 @@
+import threading
+import time
+from collections import deque
+import pymysql
+from pymysql.constants import COMMAND
+
+
+# MySQL 5.7.3+ 的 COM_RESET_CONNECTION，旧版 PyMySQL 常量表中可能没有
+_COM_RESET_CONNECTION = getattr(COMMAND, 'COM_RESET_CONNECTION', 0x1f)
+
+
+class PoolExhaustedError(Exception):
+    """在等待超时内没有借到连接"""
+
+
+class PooledConnection:
+    """
+    连接池借出的连接代理
+
+    - 所有属性/方法透传给底层 pymysql 连接（cursor/commit/rollback/begin 等）
+    - close() 和 with 语句结束时不会真正断开，而是归还给连接池
+    """
+
+    def __init__(self, pool, raw_conn, created_at):
+        self._pool = pool
+        self._raw = raw_conn
+        self._created_at = created_at
+        self._returned = False
+
+    def __getattr__(self, name):
+        if self._returned:
+            # 归还后底层连接可能已被其他线程借走，禁止继续使用
+            raise pymysql.err.InterfaceError(0, "连接已归还连接池")
+        return getattr(self._raw, name)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def close(self):
+        """归还连接（重复调用无副作用）"""
+        if self._returned:
+            return
+        self._returned = True
+        self._pool._release(self._raw, self._created_at)
+
+    def __del__(self):
+        # 兜底：调用方忘记 close 时也能把连接归还，避免池子被慢慢耗尽
+        try:
+            self.close()
+        except Exception:
+            pass
+
+
+class ConnectionPool:
+    """
+    线程安全、有界的 MySQL 连接池
+
+    Args:
+        connect_kwargs: 传给 pymysql.connect 的参数
+        min_size: 池中保持的最少连接数（首次借用时预热）
+        max_size: 同时存在的最大连接数（借出 + 空闲）
+        max_lifetime: 连接最长存活秒数，超过后归还时直接关闭重建
+        idle_timeout: 空闲超过该秒数且池内连接多于 min_size 时回收
+        borrow_timeout: 池满时等待空闲连接的最长秒数
+        validate_after: 空闲超过该秒数的连接在借出前先 ping 一次做健康检查（0 = 每次都检查）
+    """
+
+    def __init__(self, connect_kwargs, min_size=1, max_size=10, max_lifetime=1800,
+                 idle_timeout=300, borrow_timeout=10, validate_after=5):
+        self.connect_kwargs = dict(connect_kwargs)
+        self.min_size = max(0, int(min_size))
+        self.max_size = max(1, int(max_size), self.min_size)
+        self.max_lifetime = max_lifetime
+        self.idle_timeout = idle_timeout
+        self.borrow_timeout = borrow_timeout
+        self.validate_after = validate_after
+
+        self._cond = threading.Condition(threading.Lock())
+        # 空闲连接：(raw_conn, created_at, last_used_at)，右进右出（LIFO），让冷连接沉到左边被回收
+        self._idle = deque()
+        self._total = 0          # 当前存在的连接数（借出 + 空闲 + 正在创建）
+        self._warmed = False
+        self._stats = {
+            'borrowed': 0,        # 当前借出中的连接数
+            'waiting': 0,         # 当前等待连接的线程数
+            'created': 0,         # 累计创建的连接数
+            'recycled': 0,        # 累计回收（超龄/空闲/健康检查失败/出错）的连接数
+            'borrow_total': 0,    # 累计借用次数
+            'wait_timeouts': 0,   # 累计等待超时次数
+        }
+
+    # ================== 借用 / 归还 ==================
+    def connection(self):
+        """借出一个连接，返回 PooledConnection（支持 with 语句）"""
+        if not self._warmed:
+            self._warm_up()
+
+        deadline = time.monotonic() + self.borrow_timeout
+        with self._cond:
+            self._evict_idle_locked()
+            while True:
+                if self._idle:
+                    raw, created_at, last_used = self._idle.pop()
+                    self._mark_borrowed_locked()
+                    break
+                if self._total < self.max_size:
+                    # 先占位再在锁外建连接，避免握手期间阻塞其他线程
+                    self._total += 1
+                    raw = None
+                    self._mark_borrowed_locked()
+                    break
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    self._stats['wait_timeouts'] += 1
+                    raise PoolExhaustedError(
+                        f"等待数据库连接超时（{self.borrow_timeout}秒，连接池上限 {self.max_size}）")
+                self._stats['waiting'] += 1
+                try:
+                    self._cond.wait(remaining)
+                finally:
+                    self._stats['waiting'] -= 1
+
+        if raw is None:
+            return self._new_pooled()
+
+        # 健康检查：超龄或长时间空闲的连接先检查再借出，不合格的在原名额上重建
+        now = time.monotonic()
+        if self.max_lifetime and now - created_at >= self.max_lifetime:
+            return self._recycle_in_place(raw)
+        if now - last_used >= self.validate_after:
+            try:
+                raw.ping(reconnect=False)
+            except Exception:
+                return self._recycle_in_place(raw)
+        return PooledConnection(self, raw, created_at)
+
+    def _release(self, raw, created_at):
+        """归还连接：重置事务状态后放回空闲队列，超龄/异常的直接关闭"""
+        now = time.monotonic()
+        healthy = bool(getattr(raw, 'open', False))
+        if healthy:
+            try:
+                # 丢弃未提交的事务，也结束 SELECT 打开的快照，避免下一个借用者读到旧数据
+                raw.rollback()
+                self._reset_session(raw)
+            except Exception:
+                healthy = False
+
+        expired = self.max_lifetime and now - created_at >= self.max_lifetime
+        if not healthy or expired:
+            self._discard(raw, borrowed=True)
+            return
+
+        with self._cond:
+            self._stats['borrowed'] -= 1
+            self._idle.append((raw, created_at, now))
+            self._evict_idle_locked()
+            self._cond.notify()
+
+    # ================== 内部工具 ==================
+    @staticmethod
+    def _reset_session(raw):
+        """
+        清空会话状态（SET 过的会话变量、用户变量、LAST_INSERT_ID、临时表），避免带给下一个借用者
+
+        COM_RESET_CONNECTION 会把字符集和 autocommit 也恢复为服务端默认值，之后按连接参数重新设置；
+        服务端不支持时退回为只恢复本项目会修改的会话变量
+        """
+        try:
+            # PyMySQL 没有公开的重置接口，与 ping() 一样直接发送命令
+            raw._execute_command(_COM_RESET_CONNECTION, b'')
+            raw._read_ok_packet()
+        except pymysql.err.MySQLError as e:
+            if not getattr(raw, 'open', False):
+                raise
+            print(f"⚠️ 服务端不支持重置连接，只恢复会话变量: {str(e)}")
+            with raw.cursor() as cursor:
+                cursor.execute("SET FOREIGN_KEY_CHECKS = 1")
+            return
+
+        with raw.cursor() as cursor:
+            names = f"SET NAMES {raw.charset}"
+            if getattr(raw, 'collation', None):
+                names += f" COLLATE {raw.collation}"
+            cursor.execute(names)
+            if getattr(raw, 'init_command', None):
+                cursor.execute(raw.init_command)
+        if getattr(raw, 'autocommit_mode', None) is not None:
+            raw.autocommit(raw.autocommit_mode)
+
+    def _create_raw(self):
+        return pymysql.connect(**self.connect_kwargs)
+
+    def _new_pooled(self):
+        """为已占位的名额创建一个新连接"""
+        try:
+            raw = self._create_raw()
+        except Exception:
+            with self._cond:
+                self._total -= 1
+                self._stats['borrowed'] -= 1
+                self._cond.notify()
+            raise
+        with self._cond:
+            self._stats['created'] += 1
+        return PooledConnection(self, raw, time.monotonic())
+
+    def _recycle_in_place(self, raw):
+        """关闭不合格的连接，并在同一个名额上重新建一个（名额不释放，避免超出 max_size）"""
+        try:
+            raw.close()
+        except Exception:
+            pass
+        with self._cond:
+            self._stats['recycled'] += 1
+        return self._new_pooled()
+
+    def _mark_borrowed_locked(self):
+        self._stats['borrowed'] += 1
+        self._stats['borrow_total'] += 1
+
+    def _discard(self, raw, borrowed=False):
+        try:
+            raw.close()
+        except Exception:
+            pass
+        with self._cond:
+            self._total -= 1
+            self._stats['recycled'] += 1
+            if borrowed:
+                self._stats['borrowed'] -= 1
+            self._cond.notify()
+
+    def _evict_idle_locked(self):
+        """回收空闲过久或超龄的连接（调用方需持有锁），保留 min_size 个"""
+        if not self._idle:
+            return
+        now = time.monotonic()
+        keep = deque()
+        evicted = []
+        # 最久未用的在左边
+        while self._idle:
+            raw, created_at, last_used = self._idle.popleft()
+            too_old = self.max_lifetime and now - created_at >= self.max_lifetime
+            too_idle = (self.idle_timeout and now - last_used >= self.idle_timeout
+                        and self._total - len(evicted) > self.min_size)
+            if too_old or too_idle:
+                evicted.append(raw)
+            else:
+                keep.append((raw, created_at, last_used))
+        self._idle = keep
+        for raw in evicted:
+            try:
+                raw.close()
+            except Exception:
+                pass
+            self._total -= 1
+            self._stats['recycled'] += 1
+
+    def _warm_up(self):
+        """首次借用时预建 min_size 个连接，失败不影响正常借用"""
+        with self._cond:
+            if self._warmed:
+                return
+            self._warmed = True
+            need = max(0, self.min_size - self._total)
+            self._total += need
+        created = []
+        try:
+            for _ in range(need):
+                created.append(self._create_raw())
+        except Exception as e:
+            print(f"连接池预热失败: {str(e)}")
+        now = time.monotonic()
+        with self._cond:
+            self._total -= need - len(created)
+            self._stats['created'] += len(created)
+            for raw in created:
+                self._idle.append((raw, now, now))
+            self._cond.notify_all()
+
+    # ================== 统计 / 关闭 ==================
+    def stats(self):
+        """返回连接池统计信息，用于容量规划"""
+        with self._cond:
+            return {
+                **self._stats,
+                'idle': len(self._idle),
+                'total': self._total,
+                'min_size': self.min_size,
+                'max_size': self.max_size,
+            }
+
+    def close_all(self):
+        """关闭所有空闲连接（借出中的连接归还时会按正常流程处理）"""
+        with self._cond:
+            idle = list(self._idle)
+            self._idle.clear()
+            self._total -= len(idle)
+            self._stats['recycled'] += len(idle)
+            self._cond.notify_all()
+        for raw, _, _ in idle:
+            try:
+                raw.close()
+            except Exception:
+                pass
+
+
+# 同一份连接参数在进程内共享一个连接池（各模块都会各自 new Connect_mysql()）
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def get_pool(connect_kwargs, **pool_options):
+    """获取（或创建）与连接参数对应的全局连接池"""
+    key = tuple(sorted(connect_kwargs.items()))
+    with _pools_lock:
+        pool = _pools.get(key)
+        if pool is None:
+            pool = ConnectionPool(connect_kwargs, **pool_options)
+            _pools[key] = pool
+        return pool
+
+
+def all_pool_stats():
+    """所有连接池的统计信息"""
+    with _pools_lock:
+        pools = list(_pools.values())
+    return [
+        {'host': p.connect_kwargs.get('host'), 'database': p.connect_kwargs.get('db'), **p.stats()}
+        for p in pools
+    ]
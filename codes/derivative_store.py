@@ -0,0 +1,281 @@
+"""
+缩放图（衍生图）缓存
+
+视频列表每页 30 张卡片，原来每张都下载 ffmpeg 截出的全分辨率 JPEG；图集封面和浏览页也直接加载
+原图（可能是几 MB 的照片或浏览器无法显示的 TIFF/HEIC）。这里按需把原图等比缩小（不放大），
+输出 WebP（浏览器 Accept 支持时）或 JPEG，写入缓存目录：
+
+    derivative_cache_dir/ab/cd/<sha1>.webp
+
+文件名是 (原图绝对路径, 大小, 修改时间, 尺寸, 缩放方式, 格式) 的 SHA1，原图被重新生成或替换后自然换成新键，
+旧文件不会再被引用，由 derivative_cache_budget_mb 按最近访问时间淘汰（见 cache_budget）。
+缩放由 ffmpeg 完成，同时运行的 ffmpeg 数量受 derivative_workers 限制，名额占满时请求最多等待
+derivative_wait_timeout 秒，超时返回 None 由调用方直接发送原图；同一个衍生图并发请求时只生成一次。
+
+尺寸来源：
+    - 视频缩略图：derivative_widths 中的固定宽度（?w=），只限制宽度，与 srcset 中的 {width}w 描述一致
+    - 图片预览：image_preview_sizes 中的命名尺寸（?size=grid/cover/lightbox），宽高都不超过该尺寸
+扫描后可调用 prewarm() 在后台预先生成。
+"""
+import hashlib
+import os
+import subprocess
+import threading
+from collections import deque
+from pathlib import Path
+from urllib.parse import quote
+from codes import env_loader
+from codes.cache_budget import DiskBudget, touch
+
+
+# 格式 -> (Content-Type, 扩展名, ffmpeg 编码参数)
+FORMATS = {
+    'avif': ('image/avif', '.avif', ['-c:v', 'libaom-av1', '-still-picture', '1', '-crf', '32', '-cpu-used', '6']),
+    'webp': ('image/webp', '.webp', ['-c:v', 'libwebp', '-quality', '75', '-compression_level', '4']),
+    'jpeg': ('image/jpeg', '.jpg', ['-c:v', 'mjpeg', '-q:v', '4', '-pix_fmt', 'yuvj420p']),
+}
+FALLBACK_FORMAT = 'jpeg'
+
+_PROJECT_ROOT = Path(__file__).resolve().parent.parent
+
+
+def cache_dir():
+    path = Path(env_loader.derivative_cache_dir)
+    return path if path.is_absolute() else _PROJECT_ROOT / path
+
+
+def widths():
+    """配置的输出宽度（升序）"""
+    return sorted({int(w) for w in env_loader.derivative_widths.split(',') if w.strip().isdigit()})
+
+
+def enabled_formats():
+    """按优先级排列的可用格式，JPEG 总是作为兜底"""
+    formats = [f.strip() for f in env_loader.derivative_formats.split(',') if f.strip() in FORMATS]
+    if FALLBACK_FORMAT not in formats:
+        formats.append(FALLBACK_FORMAT)
+    return formats
+
+
+def presets():
+    """图片预览的命名尺寸 {名称: 最大边长}"""
+    result = {}
+    for item in env_loader.image_preview_sizes.split(','):
+        name, _, size = item.partition(':')
+        if name.strip() and size.strip().isdigit():
+            result[name.strip()] = int(size)
+    return result
+
+
+def preset_width(name):
+    """命名尺寸对应的最大边长，未知名称返回 None"""
+    return presets().get(name)
+
+
+def negotiate_format(accept):
+    """按请求的 Accept 头选择输出格式"""
+    accept = (accept or '').lower()
+    for fmt in enabled_formats():
+        if fmt == FALLBACK_FORMAT or FORMATS[fmt][0] in accept:
+            return fmt
+    return FALLBACK_FORMAT
+
+
+def pick_width(requested):
+    """不小于请求宽度的最小配置宽度；请求超过最大宽度时返回 None（直接用原图）"""
+    try:
+        requested = int(requested)
+    except (TypeError, ValueError):
+        return None
+    for width in widths():
+        if width >= requested:
+            return width
+    return None
+
+
+def srcset(url):
+    """生成 <img srcset> 可直接使用的字符串，如 "/thumbnails/a.jpg?w=160 160w, ..." """
+    quoted = quote(url, safe='/')
+    return ', '.join(f"{quoted}?w={width} {width}w" for width in widths())
+
+
+def cache_path(source, width, fmt, box=False):
+    stat = source.stat()
+    key = f"{source}|{stat.st_size}|{stat.st_mtime_ns}|{width}|{'box' if box else 'w'}|{fmt}"
+    digest = hashlib.sha1(key.encode('utf-8')).hexdigest()
+    return cache_dir() / digest[:2] / digest[2:4] / f"{digest}{FORMATS[fmt][1]}"
+
+
+class DerivativeStore:
+
+    def __init__(self, workers, budget_mb):
+        self._slots = threading.BoundedSemaphore(max(1, workers))
+        self.budget = DiskBudget('缩放图', cache_dir, budget_mb)
+        self._lock = threading.Lock()
+        self._building = {}       # {缓存路径: threading.Event}
+        self._stats = {'hits': 0, 'generated': 0, 'failed': 0, 'busy': 0}
+        self._prewarm = deque()   # [(原图路径, 最大边长, 格式)]，都是图片预览（宽高限制）
+        self._prewarm_worker = None
+
+    def get(self, source_path, width, fmt, box=False, blocking=False):
+        """
+        取得衍生图，没有时生成
+
+        Args:
+            source_path: 原图路径
+            width: widths() 中的宽度，或 box=True 时 presets() 中的最大边长
+            fmt: FORMATS 中的格式
+            box: False 只限制宽度（缩略图 srcset），True 宽高都限制在 width 以内（图片预览）
+            blocking: True 时一直等待生成名额（后台预生成），否则最多等待 derivative_wait_timeout 秒
+
+        Returns:
+            Path: 衍生图路径；生成失败或等待超时返回 None（调用方回退为原图）
+        """
+        source = Path(source_path).resolve()
+        target = cache_path(source, width, fmt, box)
+        try:
+            st = target.stat()
+        except OSError:
+            pass
+        else:
+            touch(target, st.st_mtime)
+            with self._lock:
+                self._stats['hits'] += 1
+            return target
+
+        with self._lock:
+            event = self._building.get(target)
+            owner = event is None
+            if owner:
+                event = self._building[target] = threading.Event()
+        if not owner:
+            # 其他请求正在生成同一个衍生图，等它完成
+            event.wait(timeout=None if blocking else env_loader.derivative_wait_timeout)
+            return target if target.exists() else None
+
+        try:
+            if not self._slots.acquire(timeout=None if blocking else env_loader.derivative_wait_timeout):
+                with self._lock:
+                    self._stats['busy'] += 1
+                return None
+            try:
+                ok = self._render(source, target, width, fmt, box)
+            finally:
+                self._slots.release()
+            with self._lock:
+                self._stats['generated' if ok else 'failed'] += 1
+            if ok:
+                self.budget.added(target.stat().st_size)
+            return target if ok else None
+        finally:
+            with self._lock:
+                self._building.pop(target, None)
+            event.set()
+
+    @staticmethod
+    def _render(source, target, width, fmt, box):
+        target.parent.mkdir(parents=True, exist_ok=True)
+        # 先写临时文件再改名，避免并发读取到写了一半的文件
+        temp = target.with_name(f".{target.stem}.{os.getpid()}.{threading.get_ident()}{target.suffix}")
+        ffmpeg_cmd = [
+            env_loader.ffmpeg_path,
+            "-v", "error",
+            "-i", str(source),
+            "-frames:v", "1",
+            # 等比缩小、不放大小图：图片预览限制在 width x width 以内，缩略图只限制宽度
+            "-vf", (f"scale='min({width},iw)':'min({width},ih)':force_original_aspect_ratio=decrease" if box
+                    else f"scale='min({width},iw)':-2"),
+            *FORMATS[fmt][2],
+            "-y",
+            str(temp)
+        ]
+        try:
+            result = subprocess.run(
+                ffmpeg_cmd,
+                check=False,
+                stderr=subprocess.PIPE,
+                stdout=subprocess.PIPE,
+                creationflags=subprocess.CREATE_NO_WINDOW if os.name == 'nt' else 0,
+                encoding='utf-8',
+                errors='ignore',
+                timeout=60
+            )
+            if result.returncode != 0 or not temp.exists():
+                print(f"生成缩放图失败: {source} -> {width}w {fmt} | {result.stderr.strip()[-300:]}")
+                return False
+            os.replace(temp, target)
+            return True
+        except Exception as e:
+            print(f"生成缩放图异常: {source} -> {width}w {fmt} | {str(e)}")
+            return False
+        finally:
+            if temp.exists():
+                try:
+                    temp.unlink()
+                except OSError:
+                    pass
+
+    def prewarm(self, jobs):
+        """后台依次生成图片预览 [(原图路径, 最大边长, 格式)]（单线程，只占用一个生成名额），已生成的直接跳过"""
+        with self._lock:
+            self._prewarm.extend(jobs)
+            if self._prewarm_worker is not None and self._prewarm_worker.is_alive():
+                return
+            self._prewarm_worker = threading.Thread(target=self._prewarm_pending, name='derivative-prewarm',
+                                                    daemon=True)
+            self._prewarm_worker.start()
+
+    def _prewarm_pending(self):
+        while True:
+            with self._lock:
+                if not self._prewarm:
+                    self._prewarm_worker = None
+                    return
+                source_path, width, fmt = self._prewarm.popleft()
+            try:
+                if Path(source_path).exists():
+                    self.get(source_path, width, fmt, box=True, blocking=True)
+            except Exception as e:
+                print(f"预生成缩放图失败: {source_path} | {str(e)}")
+
+    def stats(self):
+        with self._lock:
+            return {
+                'cache_dir': str(cache_dir()),
+                'widths': widths(),
+                'presets': presets(),
+                'formats': enabled_formats(),
+                'building': len(self._building),
+                'prewarm_pending': len(self._prewarm),
+                'cache': self.budget.stats(),
+                **self._stats
+            }
+
+
+store = DerivativeStore(env_loader.derivative_workers, env_loader.derivative_cache_budget_mb)
+
+
+def get(source_path, width, fmt, box=False):
+    return store.get(source_path, width, fmt, box)
+
+
+def prewarm(jobs):
+    store.prewarm(jobs)
+
+
+def prewarm_image_previews(image_paths, cover_paths=()):
+    """图片扫描后预生成：所有图片的 grid 尺寸、各图集首图的 cover 尺寸（使用首选格式）"""
+    fmt = enabled_formats()[0]
+    grid, cover = preset_width('grid'), preset_width('cover')
+    jobs = []
+    if cover:
+        jobs.extend((path, cover, fmt) for path in cover_paths)
+    if grid:
+        jobs.extend((path, grid, fmt) for path in image_paths)
+    if jobs:
+        print(f"🖼️ 后台预生成图片预览: {len(jobs)} 个")
+        store.prewarm(jobs)
+
+
+def stats():
+    return store.stats()
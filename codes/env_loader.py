@@ -22,7 +22,79 @@ def load_env():
         'mysql_password': os.getenv('mysql_password', '123456'),
         'mysql_database': os.getenv('mysql_database', 'fishmo'),
         'mysql_charset': os.getenv('mysql_charset', 'utf8'),
+        'mysql_pool_min_size': int(os.getenv('mysql_pool_min_size', '2')),
+        'mysql_pool_max_size': int(os.getenv('mysql_pool_max_size', '20')),
+        'mysql_pool_max_lifetime': int(os.getenv('mysql_pool_max_lifetime', '1800')),
+        'mysql_pool_idle_timeout': int(os.getenv('mysql_pool_idle_timeout', '300')),
+        'mysql_pool_borrow_timeout': float(os.getenv('mysql_pool_borrow_timeout', '10')),
+        'mysql_pool_validate_after': float(os.getenv('mysql_pool_validate_after', '5')),
+        'path_cache_max_entries': int(os.getenv('path_cache_max_entries', '20000')),
+        'path_cache_ttl': int(os.getenv('path_cache_ttl', '600')),
+        'count_mode': os.getenv('count_mode', 'exact').lower(),
+        'count_cache_max_entries': int(os.getenv('count_cache_max_entries', '2000')),
+        'count_cache_ttl': int(os.getenv('count_cache_ttl', '300')),
+        'search_mode': os.getenv('search_mode', 'fulltext').lower(),
+        'search_ngram_token_size': int(os.getenv('search_ngram_token_size', '2')),
+        'search_max_terms': int(os.getenv('search_max_terms', '8')),
+        'suggest_max_entries': int(os.getenv('suggest_max_entries', '200000')),
+        'scan_skip_hidden': os.getenv('scan_skip_hidden', 'true').lower() == 'true',
+        'scan_symlinks': os.getenv('scan_symlinks', 'files').lower(),
+        'scan_max_depth': int(os.getenv('scan_max_depth', '0')),
+        'image_scan_batch_size': int(os.getenv('image_scan_batch_size', '1000')),
+        'video_probe_executor': os.getenv('video_probe_executor', 'process').lower(),
+        'video_probe_workers': int(os.getenv('video_probe_workers', '0')),
+        'video_probe_timeout': float(os.getenv('video_probe_timeout', '60')),
+        'video_probe_queue_size': int(os.getenv('video_probe_queue_size', '0')),
+        'video_scan_batch_size': int(os.getenv('video_scan_batch_size', '200')),
+        'job_max_workers': int(os.getenv('job_max_workers', '4')),
+        'job_limit_video': int(os.getenv('job_limit_video', '1')),
+        'job_limit_image': int(os.getenv('job_limit_image', '1')),
+        'job_limit_audio': int(os.getenv('job_limit_audio', '1')),
+        'job_history_size': int(os.getenv('job_history_size', '200')),
+        'progress_heartbeat': float(os.getenv('progress_heartbeat', '15')),
+        'progress_min_interval': float(os.getenv('progress_min_interval', '0.25')),
+        'progress_max_idle': float(os.getenv('progress_max_idle', '300')),
+        'file_offload_mode': os.getenv('file_offload_mode', 'direct').lower(),
+        'file_offload_internal_prefix': os.getenv('file_offload_internal_prefix', '/_protected'),
         'ffmpeg_path': os.getenv('ffmpeg_path', ''),
+        'thumbnail_workers': int(os.getenv('thumbnail_workers', '2')),
+        'thumbnail_queue_size': int(os.getenv('thumbnail_queue_size', '100000')),
+        'thumbnail_pregenerate': os.getenv('thumbnail_pregenerate', 'true').lower() == 'true',
+        'thumbnail_retry_after': int(os.getenv('thumbnail_retry_after', '3')),
+        'thumbnail_failure_backoff': int(os.getenv('thumbnail_failure_backoff', '600')),
+        'thumbnail_failure_backoff_max': int(os.getenv('thumbnail_failure_backoff_max', '604800')),
+        'derivative_cache_dir': os.getenv('derivative_cache_dir', 'cache/derivatives'),
+        'derivative_widths': os.getenv('derivative_widths', '160,320,640'),
+        'derivative_formats': os.getenv('derivative_formats', 'webp,jpeg').lower(),
+        'derivative_workers': int(os.getenv('derivative_workers', '2')),
+        'derivative_wait_timeout': int(os.getenv('derivative_wait_timeout', '10')),
+        'derivative_cache_budget_mb': int(os.getenv('derivative_cache_budget_mb', '2048')),
+        'derivative_max_age': int(os.getenv('derivative_max_age', '86400')),
+        'image_preview_sizes': os.getenv('image_preview_sizes', 'grid:400,cover:640,lightbox:1920'),
+        'image_preview_prewarm': os.getenv('image_preview_prewarm', 'false').lower() == 'true',
+        'storyboard_enabled': os.getenv('storyboard_enabled', 'true').lower() == 'true',
+        'storyboard_cache_dir': os.getenv('storyboard_cache_dir', 'cache/storyboards'),
+        'storyboard_frames': int(os.getenv('storyboard_frames', '60')),
+        'storyboard_columns': int(os.getenv('storyboard_columns', '10')),
+        'storyboard_tile_width': int(os.getenv('storyboard_tile_width', '160')),
+        'storyboard_workers': int(os.getenv('storyboard_workers', '1')),
+        'storyboard_timeout': int(os.getenv('storyboard_timeout', '600')),
+        'storyboard_pregenerate': os.getenv('storyboard_pregenerate', 'false').lower() == 'true',
+        'storyboard_max_age': int(os.getenv('storyboard_max_age', '604800')),
+        'storyboard_cache_budget_mb': int(os.getenv('storyboard_cache_budget_mb', '1024')),
+        'hls_enabled': os.getenv('hls_enabled', 'false').lower() == 'true',
+        'hls_extensions': os.getenv('hls_extensions', 'mkv,avi,rmvb,rm,flv,wmv,ts,mpg,mpeg,vob').lower(),
+        'hls_min_size_mb': int(os.getenv('hls_min_size_mb', '4096')),
+        'hls_copy_codecs': os.getenv('hls_copy_codecs', 'avc,h264'),
+        'hls_segment_seconds': int(os.getenv('hls_segment_seconds', '6')),
+        'hls_cache_dir': os.getenv('hls_cache_dir', 'cache/hls'),
+        'hls_cache_budget_mb': int(os.getenv('hls_cache_budget_mb', '51200')),
+        'hls_remux_workers': int(os.getenv('hls_remux_workers', '1')),
+        'hls_transcode_workers': int(os.getenv('hls_transcode_workers', '2')),
+        'hls_transcode_preset': os.getenv('hls_transcode_preset', 'veryfast'),
+        'hls_transcode_max_height': int(os.getenv('hls_transcode_max_height', '1080')),
+        'hls_segment_timeout': int(os.getenv('hls_segment_timeout', '60')),
+        'hls_max_age': int(os.getenv('hls_max_age', '86400')),
         'video_everyPageShowVideoNum': int(os.getenv('video_everyPageShowVideoNum', '30')),
         'image_everyPageShowImageNum': int(os.getenv('image_everyPageShowImageNum', '21')),
         'showImage_everyPageShowImageNum': int(os.getenv('showImage_everyPageShowImageNum', '30')),
@@ -41,7 +113,79 @@ mysql_user = env_config['mysql_user']
 mysql_password = env_config['mysql_password']
 mysql_database = env_config['mysql_database']
 mysql_charset = env_config['mysql_charset']
+mysql_pool_min_size = env_config['mysql_pool_min_size']
+mysql_pool_max_size = env_config['mysql_pool_max_size']
+mysql_pool_max_lifetime = env_config['mysql_pool_max_lifetime']
+mysql_pool_idle_timeout = env_config['mysql_pool_idle_timeout']
+mysql_pool_borrow_timeout = env_config['mysql_pool_borrow_timeout']
+mysql_pool_validate_after = env_config['mysql_pool_validate_after']
+path_cache_max_entries = env_config['path_cache_max_entries']
+path_cache_ttl = env_config['path_cache_ttl']
+count_mode = env_config['count_mode']
+count_cache_max_entries = env_config['count_cache_max_entries']
+count_cache_ttl = env_config['count_cache_ttl']
+search_mode = env_config['search_mode']
+search_ngram_token_size = env_config['search_ngram_token_size']
+search_max_terms = env_config['search_max_terms']
+suggest_max_entries = env_config['suggest_max_entries']
+scan_skip_hidden = env_config['scan_skip_hidden']
+scan_symlinks = env_config['scan_symlinks']
+scan_max_depth = env_config['scan_max_depth']
+image_scan_batch_size = env_config['image_scan_batch_size']
+video_probe_executor = env_config['video_probe_executor']
+video_probe_workers = env_config['video_probe_workers']
+video_probe_timeout = env_config['video_probe_timeout']
+video_probe_queue_size = env_config['video_probe_queue_size']
+video_scan_batch_size = env_config['video_scan_batch_size']
+job_max_workers = env_config['job_max_workers']
+job_limit_video = env_config['job_limit_video']
+job_limit_image = env_config['job_limit_image']
+job_limit_audio = env_config['job_limit_audio']
+job_history_size = env_config['job_history_size']
+progress_heartbeat = env_config['progress_heartbeat']
+progress_min_interval = env_config['progress_min_interval']
+progress_max_idle = env_config['progress_max_idle']
+file_offload_mode = env_config['file_offload_mode']
+file_offload_internal_prefix = env_config['file_offload_internal_prefix']
 ffmpeg_path = env_config['ffmpeg_path']
+thumbnail_workers = env_config['thumbnail_workers']
+thumbnail_queue_size = env_config['thumbnail_queue_size']
+thumbnail_pregenerate = env_config['thumbnail_pregenerate']
+thumbnail_retry_after = env_config['thumbnail_retry_after']
+thumbnail_failure_backoff = env_config['thumbnail_failure_backoff']
+thumbnail_failure_backoff_max = env_config['thumbnail_failure_backoff_max']
+derivative_cache_dir = env_config['derivative_cache_dir']
+derivative_widths = env_config['derivative_widths']
+derivative_formats = env_config['derivative_formats']
+derivative_workers = env_config['derivative_workers']
+derivative_wait_timeout = env_config['derivative_wait_timeout']
+derivative_cache_budget_mb = env_config['derivative_cache_budget_mb']
+derivative_max_age = env_config['derivative_max_age']
+image_preview_sizes = env_config['image_preview_sizes']
+image_preview_prewarm = env_config['image_preview_prewarm']
+storyboard_enabled = env_config['storyboard_enabled']
+storyboard_cache_dir = env_config['storyboard_cache_dir']
+storyboard_frames = env_config['storyboard_frames']
+storyboard_columns = env_config['storyboard_columns']
+storyboard_tile_width = env_config['storyboard_tile_width']
+storyboard_workers = env_config['storyboard_workers']
+storyboard_timeout = env_config['storyboard_timeout']
+storyboard_pregenerate = env_config['storyboard_pregenerate']
+storyboard_max_age = env_config['storyboard_max_age']
+storyboard_cache_budget_mb = env_config['storyboard_cache_budget_mb']
+hls_enabled = env_config['hls_enabled']
+hls_extensions = env_config['hls_extensions']
+hls_min_size_mb = env_config['hls_min_size_mb']
+hls_copy_codecs = env_config['hls_copy_codecs']
+hls_segment_seconds = env_config['hls_segment_seconds']
+hls_cache_dir = env_config['hls_cache_dir']
+hls_cache_budget_mb = env_config['hls_cache_budget_mb']
+hls_remux_workers = env_config['hls_remux_workers']
+hls_transcode_workers = env_config['hls_transcode_workers']
+hls_transcode_preset = env_config['hls_transcode_preset']
+hls_transcode_max_height = env_config['hls_transcode_max_height']
+hls_segment_timeout = env_config['hls_segment_timeout']
+hls_max_age = env_config['hls_max_age']
 video_everyPageShowVideoNum = env_config['video_everyPageShowVideoNum']
 image_everyPageShowImageNum = env_config['image_everyPageShowImageNum']
 showImage_everyPageShowImageNum = env_config['showImage_everyPageShowImageNum']
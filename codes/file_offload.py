@@ -0,0 +1,145 @@
+"""
+媒体文件字节交给前端代理发送
+
+direct 模式下由 Flask 的 send_from_directory 直接读文件发送（默认，也是无法映射时的回退方式）。
+大视频的范围请求会长时间占住 WSGI 工作线程，因此可以改为：路由只做权限判断和路径解析，
+然后返回一个空响应加内部跳转头，由代理自己读文件、处理 Range/缓存：
+    - nginx:  X-Accel-Redirect: <内部前缀>/<disk_id>/<相对挂载点的路径>
+              每个 storage_disk 对应一个 internal location（alias 到 mount_path）
+    - apache: X-Sendfile: <绝对路径>（lighttpd 同样使用该头），需用 XSendFilePath 放行各挂载点
+
+nginx 的 location 配置可通过 /api/file-offload/config 按当前 storage_disk 生成。
+"""
+import mimetypes
+import os
+import threading
+import time
+from urllib.parse import quote
+from flask import Response, send_from_directory
+from codes import env_loader
+from codes import connect_mysql
+
+
+MODE_DIRECT = 'direct'
+MODE_NGINX = 'nginx'
+MODE_APACHE = 'apache'
+
+# 挂载点列表的刷新间隔；遇到无法映射的路径时最多每 _MISS_REFRESH 秒重新读取一次
+_REFRESH_INTERVAL = 300
+_MISS_REFRESH = 5
+
+_lock = threading.Lock()
+_mounts = []          # [(规范化后的挂载路径, disk_id, 原始挂载路径)]，按路径长度降序
+_loaded_at = 0.0
+_db = connect_mysql.Connect_mysql()
+
+
+def _normalize(path):
+    return os.path.normcase(os.path.abspath(str(path)))
+
+
+def _load_mounts():
+    """读取 storage_disk 中的全部挂载点"""
+    global _mounts, _loaded_at
+    try:
+        with _db.connect() as conn:
+            with conn.cursor() as cursor:
+                cursor.execute("SELECT disk_id, mount_path FROM storage_disk")
+                rows = cursor.fetchall()
+        mounts = [(_normalize(mount_path), disk_id, mount_path) for disk_id, mount_path in rows if mount_path]
+        mounts.sort(key=lambda item: len(item[0]), reverse=True)
+        with _lock:
+            _mounts = mounts
+            _loaded_at = time.monotonic()
+    except Exception as e:
+        print(f"读取存储挂载点失败: {str(e)}")
+        with _lock:
+            _loaded_at = time.monotonic()
+
+
+def _match_mount(abs_path):
+    """找到包含该文件的最长挂载点，返回 (disk_id, 相对路径)，找不到返回 None"""
+    norm = _normalize(abs_path)
+    with _lock:
+        mounts = list(_mounts)
+    for mount_norm, disk_id, _ in mounts:
+        prefix = mount_norm.rstrip(os.sep) + os.sep
+        if norm.startswith(prefix):
+            return disk_id, norm[len(prefix):].replace(os.sep, '/')
+    return None
+
+
+def resolve_internal_uri(abs_path):
+    """把磁盘上的绝对路径映射为 nginx 内部 location 的 URI，无法映射时返回 None"""
+    with _lock:
+        age = time.monotonic() - _loaded_at if _loaded_at else None
+    if age is None or age > _REFRESH_INTERVAL:
+        _load_mounts()
+        age = 0
+    match = _match_mount(abs_path)
+    if match is None and age > _MISS_REFRESH:
+        # 可能是扫描后新登记的磁盘
+        _load_mounts()
+        match = _match_mount(abs_path)
+    if match is None:
+        return None
+    disk_id, relative_path = match
+    prefix = env_loader.file_offload_internal_prefix.rstrip('/')
+    return f"{prefix}/{disk_id}/{quote(relative_path)}"
+
+
+def send_media_file(abs_path, conditional=True, as_attachment=False):
+    """
+    发送媒体文件：按 file_offload_mode 返回内部跳转头，或回退为 Flask 直接发送
+
+    Args:
+        abs_path: 文件绝对路径（调用方已完成权限判断和存在性检查）
+        conditional: direct 模式下是否支持条件/范围请求
+        as_attachment: 是否以附件形式下载
+    """
+    abs_path = str(abs_path)
+    directory, name = os.path.split(abs_path)
+    mode = env_loader.file_offload_mode
+
+    if mode in (MODE_NGINX, MODE_APACHE):
+        if mode == MODE_NGINX:
+            internal_uri = resolve_internal_uri(abs_path)
+            headers = {'X-Accel-Redirect': internal_uri} if internal_uri else None
+        else:
+            headers = {'X-Sendfile': abs_path}
+
+        if headers:
+            mimetype = mimetypes.guess_type(name)[0] or 'application/octet-stream'
+            if as_attachment:
+                headers['Content-Disposition'] = f"attachment; filename*=UTF-8''{quote(name)}"
+            return Response(b'', mimetype=mimetype, headers=headers)
+        print(f"⚠️ 文件不在任何已登记的挂载点下，回退为直接发送: {abs_path}")
+
+    return send_from_directory(directory, name, conditional=conditional, as_attachment=as_attachment)
+
+
+def nginx_config():
+    """按当前 storage_disk 生成 nginx 的 internal location 配置片段"""
+    _load_mounts()
+    prefix = env_loader.file_offload_internal_prefix.rstrip('/')
+    with _lock:
+        mounts = sorted(_mounts, key=lambda item: item[1])
+    blocks = []
+    for _, disk_id, mount_path in mounts:
+        alias = str(mount_path).replace('\\', '/').rstrip('/') + '/'
+        blocks.append(
+            f"location {prefix}/{disk_id}/ {{\n"
+            f"    internal;\n"
+            f"    alias {alias};\n"
+            f"}}"
+        )
+    return '\n'.join(blocks)
+
+
+def stats():
+    with _lock:
+        return {
+            'mode': env_loader.file_offload_mode,
+            'internal_prefix': env_loader.file_offload_internal_prefix,
+            'mounts': [{'disk_id': disk_id, 'mount_path': mount_path} for _, disk_id, mount_path in _mounts]
+        }
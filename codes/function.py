@@ -2,6 +2,7 @@ import os
 import subprocess
 from codes import query_database
 from codes import env_loader
+from codes import video_duration as duration_util
 from pathlib import Path
 
 from pymediainfo import MediaInfo
@@ -10,16 +11,58 @@ from flask import abort, session, render_template
 from codes.video_queries_new import insert_video_collection, insert_video_item, get_or_create_disk
 
 
-def get_optimal_screenshot_time(video_path):
+def screenshot_time_for_duration(duration_ms):
+    """
+    按视频时长计算最佳截图时间点
+
+    Args:
+        duration_ms: 视频时长（毫秒）
+
+    Returns:
+        str: 格式化的时间点字符串 (HH:MM:SS)
+    """
+    duration_seconds = duration_ms / 1000
+    print(f"📊 视频时长: {duration_seconds:.2f}秒")
+
+    # 计算最佳截图时间点的策略
+    if duration_seconds < 10:
+        # 极短视频：使用前3秒或一半时间
+        optimal_seconds = min(3, duration_seconds / 2)
+    elif duration_seconds < 60:
+        # 短视频（<1分钟）：使用一半时间
+        optimal_seconds = duration_seconds / 2
+    elif duration_seconds < 300:
+        # 中等视频（1-5分钟）：使用一半时间，但不超过2分钟
+        optimal_seconds = min(duration_seconds / 2, 120)
+    else:
+        # 长视频（>5分钟）：使用1/3时间，在30秒到3分钟之间
+        optimal_seconds = max(30, min(duration_seconds / 3, 180))
+
+    # 转换为 HH:MM:SS 格式
+    hours = int(optimal_seconds // 3600)
+    minutes = int((optimal_seconds % 3600) // 60)
+    seconds = int(optimal_seconds % 60)
+
+    time_str = f"{hours:02d}:{minutes:02d}:{seconds:02d}"
+    print(f"🎯 计算出最佳截图时间点: {time_str} (第{optimal_seconds:.1f}秒)")
+    return time_str
+
+
+def get_optimal_screenshot_time(video_path, duration_ms=None):
     """
     智能计算视频的最佳截图时间点
     
     Args:
         video_path: 视频文件路径
+        duration_ms: 已知的视频时长（毫秒，来自 video_item.duration_ms），
+                     提供时直接计算，不再用 MediaInfo 解析文件
         
     Returns:
         str: 格式化的时间点字符串 (HH:MM:SS) 或 None
     """
+    if duration_ms:
+        return screenshot_time_for_duration(duration_ms)
+
     try:
         print(f"🔍 分析视频时长: {video_path}")
         
@@ -28,35 +71,7 @@ def get_optimal_screenshot_time(video_path):
         
         for track in media_info.tracks:
             if track.track_type == "Video" and track.duration:
-                # 获取时长（毫秒）
-                duration_ms = track.duration
-                duration_seconds = duration_ms / 1000
-                
-                print(f"📊 视频时长: {duration_seconds:.2f}秒")
-                
-                # 计算最佳截图时间点的策略
-                if duration_seconds < 10:
-                    # 极短视频：使用前3秒或一半时间
-                    optimal_seconds = min(3, duration_seconds / 2)
-                elif duration_seconds < 60:
-                    # 短视频（<1分钟）：使用一半时间
-                    optimal_seconds = duration_seconds / 2
-                elif duration_seconds < 300:
-                    # 中等视频（1-5分钟）：使用一半时间，但不超过2分钟
-                    optimal_seconds = min(duration_seconds / 2, 120)
-                else:
-                    # 长视频（>5分钟）：使用1/3时间，在30秒到3分钟之间
-                    optimal_seconds = max(30, min(duration_seconds / 3, 180))
-                
-                # 转换为 HH:MM:SS 格式
-                hours = int(optimal_seconds // 3600)
-                minutes = int((optimal_seconds % 3600) // 60)
-                seconds = int(optimal_seconds % 60)
-                
-                time_str = f"{hours:02d}:{minutes:02d}:{seconds:02d}"
-                print(f"🎯 计算出最佳截图时间点: {time_str} (第{optimal_seconds:.1f}秒)")
-                
-                return time_str
+                return screenshot_time_for_duration(float(track.duration))
         
         print("⚠️ 无法获取视频时长，将使用备选方案")
         return None
@@ -66,13 +81,15 @@ def get_optimal_screenshot_time(video_path):
         return None
 
 
-def generate_thumbnail(video_path, thumbnail_path):
+def generate_thumbnail(video_path, thumbnail_path, duration_ms=None, errors=None):
     """
     从视频生成缩略图（优化版：智能选择时间点）
     
     Args:
         video_path: 视频文件的完整路径
         thumbnail_path: 保存缩略图的完整路径
+        duration_ms: 已知的视频时长（毫秒），为空时才解析文件获取时长
+        errors: 可选的列表，失败原因会追加到其中（供失败记录使用）
         
     Returns:
         bool: 是否成功生成缩略图
@@ -87,6 +104,8 @@ def generate_thumbnail(video_path, thumbnail_path):
         # 确保视频文件存在
         if not video_path_obj.exists():
             print(f"视频文件不存在: {video_path_obj}")
+            if errors is not None:
+                errors.append(f"视频文件不存在: {video_path_obj}")
             return False
             
         # 确保缩略图目录存在
@@ -100,7 +119,7 @@ def generate_thumbnail(video_path, thumbnail_path):
         print(f"处理后的路径 - 视频: {video_path_str}, 缩略图: {thumbnail_path_str}")
         
         # 🎯 智能获取视频时长并计算最佳截图时间点
-        optimal_time_point = get_optimal_screenshot_time(video_path_str)
+        optimal_time_point = get_optimal_screenshot_time(video_path_str, duration_ms)
         
         # 构建时间点列表：最佳时间点优先，然后是备选方案
         time_points = []
@@ -156,6 +175,9 @@ def generate_thumbnail(video_path, thumbnail_path):
                 if result.returncode != 0:
                     print(f"FFmpeg命令返回错误码: {result.returncode}")
                     print(f"错误输出: {result.stderr}")
+                    if errors is not None:
+                        stderr_lines = (result.stderr or '').strip().splitlines()
+                        errors.append(f"{time_point} ffmpeg返回{result.returncode}: {stderr_lines[-1] if stderr_lines else ''}")
                     continue
                 
                 # 检查输出文件是否存在
@@ -164,6 +186,8 @@ def generate_thumbnail(video_path, thumbnail_path):
                     return True
                 else:
                     print(f"命令成功但未生成文件，尝试下一个时间点")
+                    if errors is not None:
+                        errors.append(f"{time_point} ffmpeg未生成文件")
                     continue
                     
             except subprocess.CalledProcessError as e:
@@ -185,6 +209,8 @@ def generate_thumbnail(video_path, thumbnail_path):
                 
             except Exception as e:
                 print(f"未知错误: {str(e)}")
+                if errors is not None:
+                    errors.append(f"{time_point} {str(e)}")
                 continue
                 
         print("所有时间点尝试均失败，无法生成缩略图")
@@ -192,6 +218,8 @@ def generate_thumbnail(video_path, thumbnail_path):
         
     except Exception as e:
         print(f"生成缩略图过程中发生异常: {str(e)}")
+        if errors is not None:
+            errors.append(str(e))
         return False
 
 def get_video_structure(app):
@@ -241,6 +269,15 @@ def get_video_structure(app):
     
     return video_structure
 
+def get_session_user_group():
+    """获取当前会话的用户权限组（1=普通用户，2=VIP用户），未登录或格式异常时按普通用户处理"""
+    user_group = session.get('user_group', 1)
+    if isinstance(user_group, str):
+        user_group = int(user_group) if user_group.isdigit() else 1
+    elif user_group is None:
+        user_group = 1
+    return user_group
+
 def admin_required(f):
     @wraps(f)
     def decorated_function(*args, **kwargs):
@@ -323,16 +360,7 @@ def get_quality_label(width, height):
 
 def format_duration(milliseconds):
     """获取视频时长"""
-    total_seconds = int(milliseconds // 1000)
-    hours = total_seconds // 3600
-    minutes = (total_seconds % 3600) // 60
-    seconds = total_seconds % 60
-    if hours > 0:
-        return f"{hours}时{minutes}分{seconds}秒"
-    elif minutes > 0:
-        return f"{minutes}分{seconds}秒"
-    else:
-        return f"{seconds}秒"
+    return duration_util.format_duration(milliseconds)
 
 #扫描视频写入数据库
 def scan_and_process_videos(app, parent_dir, video_base, is_vip=False, progress_callback=None):
@@ -470,6 +498,7 @@ def scan_and_process_videos(app, parent_dir, video_base, is_vip=False, progress_
                                 relative_path=relative_path,
                                 video_name=video_name,
                                 video_duration=video_duration,
+                                duration_ms=duration_util.parse_duration(video_duration),
                                 video_quality=video_quality
                             )
                 
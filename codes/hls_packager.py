@@ -0,0 +1,460 @@
+"""
+大视频 HLS 分片播放
+
+/media/video/<id> 原样发送文件：浏览器放不了的 .mkv/.avi/.rmvb 直接失败，几十 GB 的文件拖动进度条时
+浏览器会发起很大的范围请求。HLS 模式把视频切成 hls_segment_seconds 秒的分片，播放器只请求需要的分片：
+
+    - 复制模式（视频编码在 hls_copy_codecs 中，如 H.264）：后台一次 ffmpeg 把视频流原样复制、音频转 AAC，
+      封装成 fMP4 分片（init.mp4 + seg_00000.m4s ...），播放列表是边生成边追加的 EVENT 列表，
+      前几个分片写好即可开始播放；速度取决于磁盘读取，不需要转码
+    - 转码模式（其他编码）：按时长直接生成完整的 VOD 播放列表（固定长度的 TS 分片），
+      某个分片第一次被请求时才用 ffmpeg 从对应时间点转码这一段（H.264 + AAC），拖动进度条只转码需要的分片
+
+分片缓存在 hls_cache_dir/<sha1>/ 下，目录名是 (视频绝对路径, 大小, 修改时间, 模式, 分片长度) 的 SHA1；
+总大小超过 hls_cache_budget_mb 时按最近访问时间淘汰整个目录（正在生成或最近几分钟内访问过的不淘汰）。
+"""
+import hashlib
+import json
+import os
+import re
+import shutil
+import subprocess
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+from codes import env_loader
+
+
+MODE_COPY = 'copy'
+MODE_TRANSCODE = 'transcode'
+
+PLAYLIST_NAME = 'index.m3u8'
+META_NAME = 'meta.json'
+_COPY_SEGMENT = re.compile(r'^(init\.mp4|seg_\d{5}\.m4s)$')
+_TRANSCODE_SEGMENT = re.compile(r'^seg_(\d{5})\.ts$')
+
+# 最近访问过的目录不淘汰（秒），避免正在播放的视频分片被删
+_EVICT_GRACE = 600
+# 访问时间写回目录 mtime 的最小间隔（秒），重启后按 mtime 恢复 LRU 顺序
+_TOUCH_INTERVAL = 60
+
+_PROJECT_ROOT = Path(__file__).resolve().parent.parent
+
+
+class SegmentBusy(Exception):
+    """转码名额在 hls_segment_timeout 秒内一直被占满，调用方返回 503 让播放器稍后重试"""
+
+
+def cache_dir():
+    path = Path(env_loader.hls_cache_dir)
+    return path if path.is_absolute() else _PROJECT_ROOT / path
+
+
+def _split_setting(value):
+    return [item.strip().lower() for item in value.split(',') if item.strip()]
+
+
+def wants_hls(video_name, file_size):
+    """是否为该视频提供 HLS 地址：浏览器一般无法直接播放的容器，或超过 hls_min_size_mb 的大文件"""
+    if not env_loader.hls_enabled:
+        return False
+    extension = Path(video_name or '').suffix.lstrip('.').lower()
+    if extension in _split_setting(env_loader.hls_extensions):
+        return True
+    min_size = env_loader.hls_min_size_mb * 1024 * 1024
+    return bool(min_size and file_size and file_size >= min_size)
+
+
+def choose_mode(video_codec):
+    """视频编码（MediaInfo 的 codec，如 AVC、V_MPEG4/ISO/AVC、HEVC）可以直接复制时用复制模式"""
+    codec = (video_codec or '').lower()
+    if codec and any(name in codec for name in _split_setting(env_loader.hls_copy_codecs)):
+        return MODE_COPY
+    return MODE_TRANSCODE
+
+
+def supported(duration_ms, video_codec):
+    """转码模式需要按时长预先切分，时长未知的视频只能在编码可复制时使用 HLS"""
+    return bool(duration_ms) or choose_mode(video_codec) == MODE_COPY
+
+
+def segment_count(duration_ms):
+    return max(1, -(-duration_ms // (env_loader.hls_segment_seconds * 1000)))
+
+
+def build_vod_playlist(duration_ms):
+    """转码模式的播放列表：按时长切成固定长度的分片，最后一片取余下的时长"""
+    seconds = env_loader.hls_segment_seconds
+    count = segment_count(duration_ms)
+    lines = [
+        '#EXTM3U',
+        '#EXT-X-VERSION:3',
+        f'#EXT-X-TARGETDURATION:{seconds}',
+        '#EXT-X-MEDIA-SEQUENCE:0',
+        '#EXT-X-PLAYLIST-TYPE:VOD'
+    ]
+    for index in range(count):
+        length = min(seconds, duration_ms / 1000 - index * seconds)
+        lines.append(f'#EXTINF:{length:.3f},')
+        lines.append(f'seg_{index:05d}.ts')
+    lines.append('#EXT-X-ENDLIST')
+    return '\n'.join(lines) + '\n'
+
+
+def _run_ffmpeg(ffmpeg_cmd, timeout=None):
+    return subprocess.run(
+        ffmpeg_cmd,
+        check=False,
+        stderr=subprocess.PIPE,
+        stdout=subprocess.PIPE,
+        creationflags=subprocess.CREATE_NO_WINDOW if os.name == 'nt' else 0,
+        encoding='utf-8',
+        errors='ignore',
+        timeout=timeout
+    )
+
+
+def _dir_size(path):
+    total = 0
+    try:
+        with os.scandir(path) as entries:
+            for entry in entries:
+                if entry.is_file():
+                    total += entry.stat().st_size
+    except OSError:
+        pass
+    return total
+
+
+class HlsPackager:
+
+    def __init__(self, remux_workers, transcode_workers):
+        self._remux_slots = threading.BoundedSemaphore(max(1, remux_workers))
+        self._transcode_slots = threading.BoundedSemaphore(max(1, transcode_workers))
+        self._lock = threading.Lock()
+        self._remuxing = set()        # 正在复制封装的目录名
+        self._remux_failures = {}     # {目录名: 失败时间}，thumbnail_failure_backoff 秒内不再重试
+        self._building = {}           # {分片路径: threading.Event}
+        self._lru = None              # OrderedDict {目录名: [大小, 最近访问时间, 写回mtime的时间]}
+        self._stats = {'remuxed': 0, 'remux_failed': 0, 'segments': 0, 'segment_failed': 0, 'evicted': 0}
+
+    # ---------- 缓存目录与 LRU ----------
+
+    def _load_lru(self):
+        # 第一次使用时扫描缓存目录，按目录 mtime 恢复访问顺序（调用方已持有锁）
+        if self._lru is not None:
+            return
+        entries = []
+        root = cache_dir()
+        if root.exists():
+            for child in root.iterdir():
+                if child.is_dir():
+                    mtime = child.stat().st_mtime
+                    entries.append((mtime, child.name, _dir_size(child)))
+        entries.sort()
+        self._lru = OrderedDict((name, [size, mtime, mtime]) for mtime, name, size in entries)
+
+    def _touch(self, name, size_delta=0, size=None):
+        """记录一次访问（移到 LRU 末尾），可同时更新目录大小"""
+        now = time.time()
+        with self._lock:
+            self._load_lru()
+            entry = self._lru.pop(name, None) or [0, now, 0]
+            entry[1] = now
+            if size is not None:
+                entry[0] = size
+            entry[0] += size_delta
+            self._lru[name] = entry
+            persist = now - entry[2] >= _TOUCH_INTERVAL
+            if persist:
+                entry[2] = now
+        if persist:
+            try:
+                os.utime(cache_dir() / name)
+            except OSError:
+                pass
+
+    def _enforce_budget(self):
+        """总大小超过预算时从最久未访问的目录开始删除"""
+        budget = env_loader.hls_cache_budget_mb * 1024 * 1024
+        now = time.time()
+        victims = []
+        with self._lock:
+            self._load_lru()
+            total = sum(entry[0] for entry in self._lru.values())
+            for name, (size, last_access, _) in list(self._lru.items()):
+                if total <= budget:
+                    break
+                if name in self._remuxing or now - last_access < _EVICT_GRACE:
+                    continue
+                del self._lru[name]
+                total -= size
+                victims.append(name)
+            self._stats['evicted'] += len(victims)
+        for name in victims:
+            shutil.rmtree(cache_dir() / name, ignore_errors=True)
+        if victims:
+            print(f"🧹 HLS 分片缓存超出预算，已淘汰 {len(victims)} 个视频的分片")
+
+    # ---------- 播放列表 ----------
+
+    def _package_dir(self, video_path, mode):
+        source = Path(video_path).resolve()
+        stat = source.stat()
+        key = f"{source}|{stat.st_size}|{stat.st_mtime_ns}|{mode}|{env_loader.hls_segment_seconds}"
+        return cache_dir() / hashlib.sha1(key.encode('utf-8')).hexdigest()
+
+    @staticmethod
+    def _read_meta(package_dir):
+        try:
+            return json.loads((package_dir / META_NAME).read_text(encoding='utf-8'))
+        except (OSError, ValueError):
+            return None
+
+    @staticmethod
+    def _write_meta(package_dir, meta):
+        (package_dir / META_NAME).write_text(json.dumps(meta), encoding='utf-8')
+
+    def playlist(self, video_path, duration_ms, video_codec):
+        """
+        取得播放列表
+
+        Returns:
+            tuple: (播放列表路径, 是否已完整)；复制模式刚开始封装、列表还没写出时返回 (None, False)
+        """
+        mode = choose_mode(video_codec)
+        package_dir = self._package_dir(video_path, mode)
+        playlist_path = package_dir / PLAYLIST_NAME
+        meta = self._read_meta(package_dir)
+
+        if mode == MODE_TRANSCODE:
+            if meta is None:
+                package_dir.mkdir(parents=True, exist_ok=True)
+                self._write_meta(package_dir, {'mode': mode, 'video_path': str(video_path),
+                                               'duration_ms': duration_ms, 'complete': True})
+                playlist_path.write_text(build_vod_playlist(duration_ms), encoding='utf-8')
+            self._touch(package_dir.name)
+            return playlist_path, True
+
+        with self._lock:
+            running = package_dir.name in self._remuxing
+        if meta is None or (not meta.get('complete') and not running):
+            if self._recently_failed(package_dir.name):
+                return None, False
+            # 没有封装过，或上次封装被中断（进程重启）：重新开始
+            self._start_remux(video_path, package_dir, video_codec)
+        self._touch(package_dir.name, size=_dir_size(package_dir))
+        complete = bool(meta and meta.get('complete'))
+        return (playlist_path if playlist_path.exists() else None), complete
+
+    def _start_remux(self, video_path, package_dir, video_codec):
+        with self._lock:
+            if package_dir.name in self._remuxing:
+                return
+            self._remuxing.add(package_dir.name)
+        shutil.rmtree(package_dir, ignore_errors=True)
+        package_dir.mkdir(parents=True, exist_ok=True)
+        self._write_meta(package_dir, {'mode': MODE_COPY, 'video_path': str(video_path), 'complete': False})
+        thread = threading.Thread(target=self._remux, args=(video_path, package_dir, video_codec),
+                                  name='hls-remux', daemon=True)
+        thread.start()
+
+    def _remux(self, video_path, package_dir, video_codec):
+        ffmpeg_cmd = [
+            env_loader.ffmpeg_path,
+            "-v", "error",
+            "-i", str(video_path),
+            "-map", "0:v:0", "-map", "0:a:0?",
+            "-c:v", "copy",
+            *(["-tag:v", "hvc1"] if 'hevc' in (video_codec or '').lower() else []),
+            "-c:a", "aac", "-b:a", "160k", "-ac", "2",
+            "-f", "hls",
+            "-hls_time", str(env_loader.hls_segment_seconds),
+            "-hls_playlist_type", "event",
+            "-hls_segment_type", "fmp4",
+            "-hls_fmp4_init_filename", "init.mp4",
+            "-hls_segment_filename", str(package_dir / "seg_%05d.m4s"),
+            "-hls_flags", "independent_segments+temp_file",
+            "-y",
+            str(package_dir / PLAYLIST_NAME)
+        ]
+        ok = False
+        try:
+            with self._remux_slots:
+                print(f"📦 HLS 复制封装: {video_path}")
+                result = _run_ffmpeg(ffmpeg_cmd)
+            ok = result.returncode == 0 and (package_dir / PLAYLIST_NAME).exists()
+            if ok:
+                self._write_meta(package_dir, {'mode': MODE_COPY, 'video_path': str(video_path), 'complete': True})
+            else:
+                print(f"HLS 复制封装失败: {video_path} | {result.stderr.strip()[-300:]}")
+        except Exception as e:
+            print(f"HLS 复制封装异常: {video_path} | {str(e)}")
+        finally:
+            if not ok:
+                shutil.rmtree(package_dir, ignore_errors=True)
+            with self._lock:
+                self._remuxing.discard(package_dir.name)
+                self._stats['remuxed' if ok else 'remux_failed'] += 1
+                if not ok:
+                    self._remux_failures[package_dir.name] = time.monotonic()
+                    if self._lru is not None:
+                        self._lru.pop(package_dir.name, None)
+            if ok:
+                self._touch(package_dir.name, size=_dir_size(package_dir))
+            self._enforce_budget()
+
+    def _recently_failed(self, name):
+        with self._lock:
+            failed_at = self._remux_failures.get(name)
+            if failed_at is None:
+                return False
+            if time.monotonic() - failed_at < env_loader.thumbnail_failure_backoff:
+                return True
+            del self._remux_failures[name]
+            return False
+
+    def remux_failed(self, video_path, video_codec):
+        """复制封装失败且仍在退避期内时返回 True（调用方回退为直接播放原文件）"""
+        return self._recently_failed(self._package_dir(video_path, choose_mode(video_codec)).name)
+
+    # ---------- 分片 ----------
+
+    def segment(self, video_path, video_codec, name):
+        """
+        取得分片文件路径
+
+        复制模式只返回已经封装好的分片；转码模式在分片缺失时当场转码这一段
+
+        Returns:
+            Path: 分片路径；分片名非法、尚未生成或转码失败返回 None
+
+        Raises:
+            SegmentBusy: 等不到转码名额（或等待其他请求转码同一分片超时），不会无限占用请求线程
+        """
+        mode = choose_mode(video_codec)
+        package_dir = self._package_dir(video_path, mode)
+        meta = self._read_meta(package_dir)
+        if meta is None:
+            return None
+        target = package_dir / name
+
+        if meta['mode'] == MODE_COPY:
+            if not _COPY_SEGMENT.match(name) or not target.exists():
+                return None
+            self._touch(package_dir.name)
+            return target
+
+        match = _TRANSCODE_SEGMENT.match(name)
+        if not match or int(match.group(1)) >= segment_count(meta['duration_ms']):
+            return None
+        if target.exists():
+            self._touch(package_dir.name)
+            return target
+
+        with self._lock:
+            event = self._building.get(target)
+            owner = event is None
+            if owner:
+                event = self._building[target] = threading.Event()
+        if not owner:
+            # 同一个分片正在转码（播放器重试或多个标签页），等它完成
+            if not event.wait(timeout=env_loader.hls_segment_timeout):
+                raise SegmentBusy(name)
+            return target if target.exists() else None
+
+        ok = False
+        try:
+            if not self._transcode_slots.acquire(timeout=env_loader.hls_segment_timeout):
+                raise SegmentBusy(name)
+            try:
+                ok = self._transcode(video_path, target, int(match.group(1)), meta['duration_ms'])
+            finally:
+                self._transcode_slots.release()
+            with self._lock:
+                self._stats['segments' if ok else 'segment_failed'] += 1
+        finally:
+            with self._lock:
+                self._building.pop(target, None)
+            event.set()
+        if not ok:
+            return None
+        self._touch(package_dir.name, size_delta=target.stat().st_size)
+        self._enforce_budget()
+        return target
+
+    @staticmethod
+    def _transcode(video_path, target, index, duration_ms):
+        seconds = env_loader.hls_segment_seconds
+        start = index * seconds
+        length = min(seconds, duration_ms / 1000 - start)
+        temp = target.with_name(f".{target.stem}.{threading.get_ident()}{target.suffix}")
+        max_height = env_loader.hls_transcode_max_height
+        ffmpeg_cmd = [
+            env_loader.ffmpeg_path,
+            "-v", "error",
+            "-ss", f"{start:.3f}",           # 输入端定位：只读取这一段附近的数据
+            "-i", str(video_path),
+            "-t", f"{length:.3f}",
+            "-map", "0:v:0", "-map", "0:a:0?",
+            "-vf", f"scale=-2:'min({max_height},ih)'",
+            "-c:v", "libx264", "-preset", env_loader.hls_transcode_preset, "-crf", "23",
+            "-pix_fmt", "yuv420p",
+            "-force_key_frames", "expr:eq(n,0)",
+            "-c:a", "aac", "-b:a", "128k", "-ac", "2",
+            "-output_ts_offset", f"{start:.3f}",  # 分片时间戳与播放列表中的位置一致
+            "-muxdelay", "0",
+            "-f", "mpegts",
+            "-y",
+            str(temp)
+        ]
+        try:
+            result = _run_ffmpeg(ffmpeg_cmd, timeout=env_loader.hls_segment_timeout)
+            if result.returncode != 0 or not temp.exists():
+                print(f"HLS 分片转码失败: {video_path} #{index} | {result.stderr.strip()[-300:]}")
+                return False
+            os.replace(temp, target)
+            return True
+        except Exception as e:
+            print(f"HLS 分片转码异常: {video_path} #{index} | {str(e)}")
+            return False
+        finally:
+            if temp.exists():
+                try:
+                    temp.unlink()
+                except OSError:
+                    pass
+
+    def stats(self):
+        with self._lock:
+            self._load_lru()
+            return {
+                'cache_dir': str(cache_dir()),
+                'budget_mb': env_loader.hls_cache_budget_mb,
+                'used_mb': round(sum(entry[0] for entry in self._lru.values()) / 1024 / 1024, 1),
+                'packages': len(self._lru),
+                'remuxing': len(self._remuxing),
+                'transcoding': len(self._building),
+                **self._stats
+            }
+
+
+packager = HlsPackager(env_loader.hls_remux_workers, env_loader.hls_transcode_workers)
+
+
+def playlist(video_path, duration_ms, video_codec):
+    """调用前先用 supported() 判断"""
+    return packager.playlist(video_path, duration_ms, video_codec)
+
+
+def remux_failed(video_path, video_codec):
+    return packager.remux_failed(video_path, video_codec)
+
+
+def segment(video_path, video_codec, name):
+    return packager.segment(video_path, video_codec, name)
+
+
+def stats():
+    return packager.stats()
@@ -0,0 +1,359 @@
+import json
+import os
+import socket
+import threading
+import traceback
+import uuid
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from codes import env_loader
+from codes import connect_mysql
+from codes.progress_hub import hub
+from codes.media_walker import ScanCancelled
+
+
+# 任务状态
+QUEUED = 'queued'
+RUNNING = 'running'
+SUCCEEDED = 'succeeded'
+FAILED = 'failed'
+CANCELLED = 'cancelled'
+INTERRUPTED = 'interrupted'  # 服务重启时仍在排队/运行的任务
+
+FINISHED_STATES = (SUCCEEDED, FAILED, CANCELLED, INTERRUPTED)
+
+# 任务落库时记录提交它的进程（主机名:进程号）；任务只在提交它的进程内存中运行，
+# 启动时只把本机此前的进程留下的未结束任务标记为中断，不影响共用数据库的其他主机
+_HOST = socket.gethostname()
+_OWNER = f'{_HOST}:{os.getpid()}'
+_PROCESS_START = datetime.now()
+
+
+class ScanJob:
+    """一个后台扫描任务（内存中的运行态，关键状态变化会落库到 scan_job 表）"""
+
+    def __init__(self, media_type, target, params, progress_callback=None):
+        self.job_id = uuid.uuid4().hex
+        self.media_type = media_type
+        self.target = target
+        self.params = params
+        self.progress_callback = progress_callback
+        self.cancel_event = threading.Event()
+        self.status = QUEUED
+        self.progress = 0
+        self.message = '排队中'
+        self.result = None
+        self.error = None
+        self.create_time = datetime.now()
+        self.start_time = None
+        self.finish_time = None
+
+    def report(self, percentage, message='', *args):
+        """进度回调：记录到任务上并发布到进度中心，再转给原有的进度回调（保持各扫描器的回调签名不变）"""
+        self.progress = max(0, min(100, int(percentage)))
+        self.message = message
+        fields = {'current': args[0], 'total': args[1]} if len(args) >= 2 else {}
+        # 任务的结束状态由 publish_state 发布，这里的 100% 只是扫描器自己的进度
+        hub.update(self.job_id, min(self.progress, 99), current_file=message, status=self.status, **fields)
+        if self.progress_callback:
+            self.progress_callback(percentage, message, *args)
+
+    def publish_state(self):
+        """把任务状态变化（开始/结束/取消）发布到进度中心"""
+        done = self.status in FINISHED_STATES
+        hub.update(self.job_id, 100 if self.status == SUCCEEDED else self.progress, done=done,
+                   current_file=self.message, status=self.status, error=self.error)
+
+    def to_dict(self, with_result=False):
+        data = {
+            'job_id': self.job_id,
+            'media_type': self.media_type,
+            'status': self.status,
+            'progress': self.progress,
+            'message': self.message,
+            'params': self.params,
+            'error': self.error,
+            'create_time': _fmt_time(self.create_time),
+            'start_time': _fmt_time(self.start_time),
+            'finish_time': _fmt_time(self.finish_time),
+            'cancel_requested': self.cancel_event.is_set()
+        }
+        if with_result:
+            data['result'] = self.result
+        return data
+
+
+def _fmt_time(value):
+    return value.strftime('%Y-%m-%d %H:%M:%S') if value else None
+
+
+class JobRunner:
+    """
+    有界的后台任务执行器
+
+    - 全局最多 max_workers 个任务同时运行
+    - 每种媒体类型有单独的并发上限，超出的任务在该类型的队列里排队
+    - 取消：排队中的任务直接取消；运行中的任务置位 cancel_event，由扫描器在文件之间协作退出
+    """
+
+    def __init__(self, max_workers, type_limits, history_size=200):
+        self.max_workers = max(1, int(max_workers))
+        self.type_limits = dict(type_limits)
+        self.history_size = history_size
+        self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix='scan-job')
+        self._lock = threading.Lock()
+        self._jobs = OrderedDict()   # job_id -> ScanJob（含最近完成的任务）
+        self._pending = {}           # media_type -> deque[ScanJob]
+        self._running = {}           # media_type -> 运行中数量
+        self.db = connect_mysql.Connect_mysql()
+
+    # ================== 提交 / 调度 ==================
+    def submit(self, media_type, target, params=None, progress_callback=None):
+        """
+        提交任务，立即返回 ScanJob
+
+        Args:
+            media_type: video / image / audio
+            target: 任务函数 target(progress_callback, cancel_event) -> dict 结果
+            params: 任务参数（仅用于展示和落库）
+            progress_callback: 原有的进度回调，任务进度会同时转发给它
+        """
+        job = ScanJob(media_type, target, params or {}, progress_callback)
+        job.publish_state()
+        self._persist_insert(job)
+        with self._lock:
+            self._jobs[job.job_id] = job
+            limit = self.type_limits.get(media_type, 1)
+            if self._running.get(media_type, 0) < limit:
+                self._start_locked(job)
+            else:
+                self._pending.setdefault(media_type, deque()).append(job)
+                job.message = f'排队中（同类任务并发上限 {limit}）'
+        print(f"📥 已提交{media_type}扫描任务: {job.job_id} ({job.status})")
+        return job
+
+    def _start_locked(self, job):
+        self._running[job.media_type] = self._running.get(job.media_type, 0) + 1
+        self._executor.submit(self._run, job)
+
+    def _run(self, job):
+        job.status = RUNNING
+        job.start_time = datetime.now()
+        job.message = '运行中'
+        job.publish_state()
+        self._persist_update(job)
+        try:
+            if job.cancel_event.is_set():
+                raise ScanCancelled('任务在启动前已被取消')
+            result = job.target(job.report, job.cancel_event)
+            job.result = result
+            if job.cancel_event.is_set():
+                job.status = CANCELLED
+                job.message = '已取消'
+            elif isinstance(result, dict) and result.get('status') == 'error':
+                job.status = FAILED
+                job.error = result.get('message')
+                job.message = '失败'
+            else:
+                job.status = SUCCEEDED
+                job.progress = 100
+                job.message = '完成'
+        except ScanCancelled as e:
+            job.status = CANCELLED
+            job.message = '已取消'
+            job.error = str(e)
+        except Exception as e:
+            job.status = CANCELLED if job.cancel_event.is_set() else FAILED
+            job.message = '已取消' if job.status == CANCELLED else '失败'
+            job.error = str(e)
+            traceback.print_exc()
+        finally:
+            job.finish_time = datetime.now()
+            job.publish_state()
+            self._persist_update(job)
+            print(f"🏁 {job.media_type}扫描任务结束: {job.job_id} -> {job.status}")
+            with self._lock:
+                self._running[job.media_type] -= 1
+                pending = self._pending.get(job.media_type)
+                if pending:
+                    self._start_locked(pending.popleft())
+                self._trim_history_locked()
+
+    def _trim_history_locked(self):
+        finished = [jid for jid, j in self._jobs.items() if j.status in FINISHED_STATES]
+        for jid in finished[:max(0, len(finished) - self.history_size)]:
+            del self._jobs[jid]
+            hub.discard(jid)
+
+    # ================== 查询 / 取消 ==================
+    def get(self, job_id, with_result=False):
+        """任务详情：内存中没有（例如重启前的任务）时从数据库读取"""
+        with self._lock:
+            job = self._jobs.get(job_id)
+        if job:
+            return job.to_dict(with_result)
+        return self._load_from_db(job_id, with_result)
+
+    def list(self, media_type=None, limit=50):
+        """最近的任务列表（内存中的任务 + 数据库中的历史任务）"""
+        with self._lock:
+            jobs = [j.to_dict() for j in self._jobs.values()
+                    if media_type is None or j.media_type == media_type]
+        known = {j['job_id'] for j in jobs}
+        for row in self._list_from_db(media_type, limit):
+            if row['job_id'] not in known:
+                jobs.append(row)
+        jobs.sort(key=lambda j: j['create_time'] or '', reverse=True)
+        return jobs[:limit]
+
+    def latest(self, media_type):
+        """某类型最近提交的任务（内存中）"""
+        with self._lock:
+            for job in reversed(self._jobs.values()):
+                if job.media_type == media_type:
+                    return job
+        return None
+
+    def cancel(self, job_id):
+        """取消任务，返回 (是否成功, 说明)"""
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if not job:
+                return False, '任务不存在或已不在内存中'
+            if job.status in FINISHED_STATES:
+                return False, f'任务已结束（{job.status}）'
+            job.cancel_event.set()
+            pending = self._pending.get(job.media_type)
+            if job.status == QUEUED and pending and job in pending:
+                pending.remove(job)
+                job.status = CANCELLED
+                job.message = '已取消'
+                job.finish_time = datetime.now()
+                queued_cancelled = True
+            else:
+                job.message = '正在取消...'
+                queued_cancelled = False
+        if queued_cancelled:
+            job.publish_state()
+            self._persist_update(job)
+        return True, '已取消' if queued_cancelled else '已请求取消，当前文件处理完后停止'
+
+    # ================== 持久化 ==================
+    def recover_interrupted(self):
+        """
+        启动时调用：本机上次进程退出时仍在排队/运行的任务标记为 interrupted
+
+        只处理本进程启动前提交、且由本机进程提交的任务（owner 为空的是加 owner 列之前的旧记录），
+        本进程已提交的任务和其他主机的任务不受影响
+        """
+        try:
+            with self.db.connect() as conn:
+                with conn.cursor() as cursor:
+                    cursor.execute("""
+                        UPDATE scan_job
+                        SET status = %s, message = '服务重启，任务被中断', finish_time = NOW(3)
+                        WHERE status IN (%s, %s) AND create_time < %s
+                          AND (owner IS NULL OR SUBSTRING_INDEX(owner, ':', 1) = %s)
+                    """, (INTERRUPTED, QUEUED, RUNNING, _PROCESS_START, _HOST))
+                    count = cursor.rowcount
+                conn.commit()
+            if count:
+                print(f"⚠️ 发现 {count} 个被中断的扫描任务，已标记为 interrupted")
+            return count
+        except Exception as e:
+            print(f"恢复扫描任务状态失败: {str(e)}")
+            return 0
+
+    def _persist_insert(self, job):
+        try:
+            with self.db.connect() as conn:
+                with conn.cursor() as cursor:
+                    cursor.execute("""
+                        INSERT INTO scan_job (job_id, media_type, status, owner, params, message, create_time)
+                        VALUES (%s, %s, %s, %s, %s, %s, %s)
+                    """, (job.job_id, job.media_type, job.status, _OWNER,
+                          json.dumps(job.params, ensure_ascii=False), job.message, job.create_time))
+                conn.commit()
+        except Exception as e:
+            print(f"保存扫描任务失败: {str(e)}")
+
+    def _persist_update(self, job):
+        try:
+            with self.db.connect() as conn:
+                with conn.cursor() as cursor:
+                    cursor.execute("""
+                        UPDATE scan_job
+                        SET status = %s, progress = %s, message = %s, result = %s, error = %s,
+                            start_time = %s, finish_time = %s
+                        WHERE job_id = %s
+                    """, (job.status, job.progress, job.message,
+                          json.dumps(job.result, ensure_ascii=False, default=str) if job.result is not None else None,
+                          job.error, job.start_time, job.finish_time, job.job_id))
+                conn.commit()
+        except Exception as e:
+            print(f"更新扫描任务状态失败: {str(e)}")
+
+    def _row_to_dict(self, row, with_result=False):
+        job_id, media_type, status, params, progress, message, result, error, create_time, start_time, finish_time = row
+        data = {
+            'job_id': job_id,
+            'media_type': media_type,
+            'status': status,
+            'progress': progress or 0,
+            'message': message,
+            'params': json.loads(params) if params else {},
+            'error': error,
+            'create_time': _fmt_time(create_time),
+            'start_time': _fmt_time(start_time),
+            'finish_time': _fmt_time(finish_time),
+            'cancel_requested': False
+        }
+        if with_result:
+            data['result'] = json.loads(result) if result else None
+        return data
+
+    _COLUMNS = ("job_id, media_type, status, params, progress, message, result, error, "
+                "create_time, start_time, finish_time")
+
+    def _load_from_db(self, job_id, with_result=False):
+        try:
+            with self.db.connect() as conn:
+                with conn.cursor() as cursor:
+                    cursor.execute(f"SELECT {self._COLUMNS} FROM scan_job WHERE job_id = %s", (job_id,))
+                    row = cursor.fetchone()
+            return self._row_to_dict(row, with_result) if row else None
+        except Exception as e:
+            print(f"读取扫描任务失败: {str(e)}")
+            return None
+
+    def _list_from_db(self, media_type, limit):
+        try:
+            with self.db.connect() as conn:
+                with conn.cursor() as cursor:
+                    if media_type:
+                        cursor.execute(f"""
+                            SELECT {self._COLUMNS} FROM scan_job
+                            WHERE media_type = %s ORDER BY create_time DESC LIMIT %s
+                        """, (media_type, limit))
+                    else:
+                        cursor.execute(f"""
+                            SELECT {self._COLUMNS} FROM scan_job
+                            ORDER BY create_time DESC LIMIT %s
+                        """, (limit,))
+                    return [self._row_to_dict(row) for row in cursor.fetchall()]
+        except Exception as e:
+            print(f"读取扫描任务列表失败: {str(e)}")
+            return []
+
+
+# 进程内唯一的任务执行器
+runner = JobRunner(
+    max_workers=env_loader.job_max_workers,
+    type_limits={
+        'video': env_loader.job_limit_video,
+        'image': env_loader.job_limit_image,
+        'audio': env_loader.job_limit_audio,
+    },
+    history_size=env_loader.job_history_size
+)
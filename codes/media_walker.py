@@ -0,0 +1,145 @@
+import os
+from pathlib import Path
+from codes import env_loader
+
+
+# 符号链接策略
+SYMLINK_SKIP = 'skip'      # 忽略所有符号链接
+SYMLINK_FILES = 'files'    # 收录指向文件的符号链接，但不进入链接目录（默认，避免目录环）
+SYMLINK_FOLLOW = 'follow'  # 同时进入链接目录（按 设备号+inode 去重防止死循环）
+
+
+class ScanCancelled(Exception):
+    """扫描任务被取消（由后台任务的 cancel_event 触发）"""
+
+
+def check_cancelled(cancel_event):
+    """扫描器在目录/文件之间调用，任务被取消时抛出 ScanCancelled"""
+    if cancel_event is not None and cancel_event.is_set():
+        raise ScanCancelled('扫描已取消')
+
+
+def walk_media(root, extensions=None, skip_hidden=None, symlinks=None, max_depth=None, cancel_event=None):
+    """
+    单次遍历目录树，按目录产出匹配的文件
+
+    只用 os.scandir 的 DirEntry 缓存类型判断文件/目录，只对匹配扩展名的文件做一次 stat。
+
+    Args:
+        root: 扫描根目录
+        extensions: 小写扩展名集合（如 {'.mp4'}），None 表示不过滤
+        skip_hidden: 是否跳过以 . 开头的目录（整棵子树都不进入），默认取 scan_skip_hidden 配置
+        symlinks: 符号链接策略 skip / files / follow，默认取 scan_symlinks 配置
+        max_depth: 最大深度（根目录为 0），None 取 scan_max_depth 配置，0 表示不限制
+        cancel_event: threading.Event，置位后在下一个目录处抛出 ScanCancelled
+
+    Yields:
+        (Path 目录, [(Path 文件, os.stat_result), ...])，只产出含匹配文件的目录，父目录先于子目录
+    """
+    if skip_hidden is None:
+        skip_hidden = env_loader.scan_skip_hidden
+    if symlinks is None:
+        symlinks = env_loader.scan_symlinks
+    if max_depth is None:
+        max_depth = env_loader.scan_max_depth
+
+    root = str(root)
+    visited = set()
+    if symlinks == SYMLINK_FOLLOW:
+        try:
+            st = os.stat(root)
+            visited.add((st.st_dev, st.st_ino))
+        except OSError:
+            pass
+
+    stack = [(root, 0)]
+    while stack:
+        current, depth = stack.pop()
+        check_cancelled(cancel_event)
+        files = []
+        subdirs = []
+        try:
+            with os.scandir(current) as it:
+                for entry in it:
+                    try:
+                        is_link = entry.is_symlink()
+                        if is_link and symlinks == SYMLINK_SKIP:
+                            continue
+
+                        if entry.is_dir(follow_symlinks=is_link and symlinks == SYMLINK_FOLLOW):
+                            if skip_hidden and entry.name.startswith('.'):
+                                continue
+                            if max_depth and depth + 1 > max_depth:
+                                continue
+                            subdirs.append((entry, is_link))
+                        elif entry.is_file():
+                            if extensions is not None and os.path.splitext(entry.name)[1].lower() not in extensions:
+                                continue
+                            files.append((Path(entry.path), entry.stat()))
+                    except OSError as e:
+                        print(f"⚠️ 读取文件信息失败，已跳过: {entry.path} | {str(e)}")
+        except OSError as e:
+            print(f"⚠️ 无法读取目录，已跳过: {current} | {str(e)}")
+            continue
+
+        if files:
+            files.sort(key=lambda item: item[0].name)
+            yield Path(current), files
+
+        if symlinks == SYMLINK_FOLLOW:
+            # 跟随链接时记录每个目录的 设备号+inode，真实目录优先登记，链接指回已遍历的目录时跳过
+            unique = []
+            for entry, is_link in sorted(subdirs, key=lambda item: item[1]):
+                try:
+                    st = entry.stat()
+                except OSError:
+                    continue
+                key = (st.st_dev, st.st_ino)
+                if key not in visited:
+                    visited.add(key)
+                    unique.append(entry.path)
+            subdir_paths = unique
+        else:
+            subdir_paths = [entry.path for entry, _ in subdirs]
+
+        # 逆序压栈，保证按名称顺序深度优先遍历
+        for path in sorted(subdir_paths, reverse=True):
+            stack.append((path, depth + 1))
+
+
+def group_by_directory(root, extensions, root_suffix, **walk_options):
+    """
+    每个含媒体文件的目录作为一个集合（目录名 = 集合名），各扫描器共用
+
+    - 子目录重名时，后出现的用相对路径（/ 替换为 _）作为集合名
+    - 根目录自身的文件最后归为一个集合，与子目录重名时追加 root_suffix
+
+    Returns:
+        dict: {collection_name: [(Path 文件, os.stat_result), ...]}
+    """
+    root = Path(root)
+    collections = {}
+    root_files = None
+
+    for directory, files in walk_media(root, extensions, **walk_options):
+        if directory == root:
+            root_files = files
+            continue
+
+        collection_name = directory.name
+        if collection_name in collections:
+            # 使用相对路径作为唯一标识
+            try:
+                rel_path = directory.relative_to(root)
+                collection_name = str(rel_path).replace('\\', '_').replace('/', '_')
+            except ValueError:
+                collection_name = f"{directory.name}_{len(collections)}"
+        collections[collection_name] = files
+
+    if root_files:
+        collection_name = root.name
+        if collection_name in collections:
+            collection_name = f"{root.name}{root_suffix}"
+        collections[collection_name] = root_files
+
+    return collections
@@ -0,0 +1,130 @@
+"""
+游标（keyset）分页
+
+列表都按主键降序排列。OFFSET 分页翻到很深的页时，MySQL 需要先扫描并丢弃前面所有行，
+越往后越慢；游标分页记住上一页最后（或第一）条记录的主键，下一页直接用
+`主键 < 游标值` 在主键索引上定位，任何深度都是一次索引范围扫描。
+
+游标对前端是不透明字符串（base64 编码的 [主键值, 方向]），方向：
+    - next: 取比游标更旧的一页（主键更小）
+    - prev: 取比游标更新的一页（主键更大），查询时升序取再翻转
+原有的 page/per_page 参数继续可用（不带游标时仍按 OFFSET 分页），返回结果里同样带游标，
+前端可以从任意一页切换到游标翻页。
+"""
+import base64
+import json
+
+
+NEXT = 'next'
+PREV = 'prev'
+
+
+class InvalidCursor(ValueError):
+    """游标格式不正确"""
+
+
+def encode_cursor(key, direction=NEXT):
+    raw = json.dumps([key, direction], separators=(',', ':')).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+
+def decode_cursor(cursor):
+    """解析游标，返回 (主键值, 方向)；格式不正确时抛出 InvalidCursor"""
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        key, direction = json.loads(base64.urlsafe_b64decode(padded.encode('ascii')))
+    except Exception:
+        raise InvalidCursor('无效的分页游标')
+    if direction not in (NEXT, PREV) or not isinstance(key, int) or isinstance(key, bool):
+        raise InvalidCursor('无效的分页游标')
+    return key, direction
+
+
+def is_valid_cursor(cursor):
+    try:
+        decode_cursor(cursor)
+        return True
+    except InvalidCursor:
+        return False
+
+
+def empty_page_info():
+    return {'next_cursor': None, 'prev_cursor': None, 'has_more': False}
+
+
+class KeysetPage:
+    """
+    单列（主键，降序）游标分页的 SQL 片段和结果处理
+
+    用法：
+        keyset = KeysetPage('vi.video_id', per_page, cursor, page)
+        cond_sql, cond_params = keyset.condition()        # 拼进 WHERE
+        tail_sql, tail_params = keyset.order_and_limit()  # 拼在 SQL 末尾
+        rows = keyset.finish(cursor.fetchall())           # 去掉多取的一行、恢复降序
+        keyset.page_info                                  # next_cursor / prev_cursor / has_more
+
+    Args:
+        column: 排序/游标列（带表别名），必须是唯一且有索引的列
+        per_page: 每页数量
+        cursor: 前端传回的游标字符串，None 表示按 page 做 OFFSET 分页
+        page: 页码（仅在没有游标时使用）
+    """
+
+    def __init__(self, column, per_page, cursor=None, page=1):
+        self.column = column
+        self.per_page = max(1, int(per_page))
+        self.page = max(1, int(page or 1))
+        if cursor:
+            self.key, self.direction = decode_cursor(cursor)
+        else:
+            self.key, self.direction = None, NEXT
+        self.page_info = empty_page_info()
+
+    @property
+    def uses_cursor(self):
+        return self.key is not None
+
+    def condition(self):
+        """游标条件，返回 (SQL, 参数)；没有游标时是恒真条件"""
+        if not self.uses_cursor:
+            return "1 = 1", []
+        operator = '<' if self.direction == NEXT else '>'
+        return f"{self.column} {operator} %s", [self.key]
+
+    def order_and_limit(self):
+        """ORDER BY + LIMIT（多取一行判断是否还有下一页），没有游标时带 OFFSET"""
+        if self.uses_cursor:
+            order = 'DESC' if self.direction == NEXT else 'ASC'
+            return f" ORDER BY {self.column} {order} LIMIT %s", [self.per_page + 1]
+        offset = (self.page - 1) * self.per_page
+        return f" ORDER BY {self.column} DESC LIMIT %s OFFSET %s", [self.per_page + 1, offset]
+
+    def finish(self, rows, key_index=0):
+        """
+        处理查询结果：去掉多取的一行，prev 方向翻转回降序，并计算前后页游标
+
+        Args:
+            rows: 查询结果
+            key_index: 游标列在每行中的下标
+        """
+        rows = list(rows)
+        has_extra = len(rows) > self.per_page
+        rows = rows[:self.per_page]
+        if self.direction == PREV:
+            rows.reverse()
+
+        if rows:
+            first_key = rows[0][key_index]
+            last_key = rows[-1][key_index]
+            if self.direction == PREV:
+                has_newer, has_older = has_extra, True
+            else:
+                has_newer, has_older = self.uses_cursor or self.page > 1, has_extra
+            self.page_info = {
+                'next_cursor': encode_cursor(last_key, NEXT) if has_older else None,
+                'prev_cursor': encode_cursor(first_key, PREV) if has_newer else None,
+                'has_more': has_older
+            }
+        else:
+            self.page_info = empty_page_info()
+        return rows
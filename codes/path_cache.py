@@ -0,0 +1,141 @@
+import os
+import threading
+import time
+from collections import OrderedDict, namedtuple
+from codes import env_loader
+
+
+# 缓存的文件解析结果：绝对路径、所属分组（用于权限判断，None 表示不做分组限制）、修改时间、文件大小，
+# 以及随解析一起查出的元信息（如视频时长/编码，dict 或 None），与路径一同失效
+CachedFile = namedtuple('CachedFile', ['abs_path', 'group_id', 'mtime', 'size', 'meta'], defaults=(None,))
+
+
+class LRUTTLCache:
+    """
+    线程安全的 LRU + TTL 缓存
+
+    - 条目数达到 max_entries 时淘汰最久未使用的条目，内存占用有上限
+    - 条目写入超过 ttl 秒后视为过期，下次读取时丢弃
+    - 统计命中/未命中/淘汰次数
+    """
+
+    def __init__(self, max_entries=10000, ttl=300):
+        self.max_entries = max(1, int(max_entries))
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        # key -> (value, expires_at)，按最近使用顺序排列（最新的在末尾）
+        self._data = OrderedDict()
+        self._stats = {'hits': 0, 'misses': 0, 'evictions': 0, 'expirations': 0, 'invalidations': 0}
+
+    def get(self, key):
+        """读取缓存，未命中或已过期返回 None"""
+        now = time.monotonic()
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                self._stats['misses'] += 1
+                return None
+            value, expires_at = entry
+            if self.ttl and now >= expires_at:
+                del self._data[key]
+                self._stats['expirations'] += 1
+                self._stats['misses'] += 1
+                return None
+            self._data.move_to_end(key)
+            self._stats['hits'] += 1
+            return value
+
+    def set(self, key, value):
+        expires_at = time.monotonic() + self.ttl if self.ttl else None
+        with self._lock:
+            if key in self._data:
+                self._data.move_to_end(key)
+            self._data[key] = (value, expires_at)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+                self._stats['evictions'] += 1
+
+    def delete(self, key):
+        with self._lock:
+            if self._data.pop(key, None) is not None:
+                self._stats['invalidations'] += 1
+
+    def invalidate(self, predicate=None):
+        """清除满足条件的条目（predicate 接收 key），不传则清空全部；返回清除的条目数"""
+        with self._lock:
+            if predicate is None:
+                removed = len(self._data)
+                self._data.clear()
+            else:
+                keys = [k for k in self._data if predicate(k)]
+                for k in keys:
+                    del self._data[k]
+                removed = len(keys)
+            self._stats['invalidations'] += removed
+            return removed
+
+    def stats(self):
+        with self._lock:
+            lookups = self._stats['hits'] + self._stats['misses']
+            return {
+                **self._stats,
+                'size': len(self._data),
+                'max_entries': self.max_entries,
+                'ttl': self.ttl,
+                'hit_rate': round(self._stats['hits'] / lookups, 4) if lookups else 0.0,
+            }
+
+
+# ================== 媒体文件路径缓存 ==================
+# key 为 (媒体类型, 标识)，例如 ('video', 12)、('image', 345)、('thumbnail', 'a/b.jpg')
+media_path_cache = LRUTTLCache(
+    max_entries=env_loader.path_cache_max_entries,
+    ttl=env_loader.path_cache_ttl
+)
+
+
+def get_file(media_type, key):
+    """
+    读取缓存的文件解析结果
+
+    命中后会用一次 os.stat 核对修改时间和大小，文件被替换/删除时丢弃条目并返回 None，
+    由调用方重新查库解析
+    """
+    cache_key = (media_type, key)
+    cached = media_path_cache.get(cache_key)
+    if cached is None:
+        return None
+    try:
+        st = os.stat(cached.abs_path)
+    except OSError:
+        media_path_cache.delete(cache_key)
+        return None
+    if st.st_mtime_ns != cached.mtime or st.st_size != cached.size:
+        media_path_cache.delete(cache_key)
+        return None
+    return cached
+
+
+def put_file(media_type, key, abs_path, group_id=None, meta=None):
+    """写入文件解析结果（文件不存在时不缓存），返回 CachedFile 或 None"""
+    try:
+        st = os.stat(abs_path)
+    except OSError:
+        return None
+    cached = CachedFile(str(abs_path), group_id, st.st_mtime_ns, st.st_size, meta)
+    media_path_cache.set((media_type, key), cached)
+    return cached
+
+
+def invalidate(*media_types):
+    """按媒体类型失效缓存（扫描、清空数据表后调用），不传参数则清空全部"""
+    if not media_types:
+        removed = media_path_cache.invalidate()
+    else:
+        removed = media_path_cache.invalidate(lambda k: k[0] in media_types)
+    print(f"🧹 路径缓存已失效: {', '.join(media_types) if media_types else '全部'}（清除 {removed} 条）")
+    return removed
+
+
+def stats():
+    return media_path_cache.stats()
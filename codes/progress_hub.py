@@ -0,0 +1,153 @@
+"""
+扫描进度的发布/订阅中心
+
+扫描线程通过 update() 发布进度，SSE 连接通过 stream() 订阅。每个频道（任务ID，或旧版接口用的
+媒体类型频道）有一个版本号和一个条件变量：
+    - 订阅者阻塞在条件变量上，只有状态变化时才被唤醒，不再每 200ms 轮询一次
+    - 两次推送之间至少间隔 min_interval 秒，期间的多次更新合并为一次（只推最新状态）
+    - 长时间没有变化时发送 SSE 注释行作为心跳，顺便发现已断开的连接
+任意多个页面可以同时观看同一个扫描，发布方只是更新状态并 notify_all。
+"""
+import json
+import threading
+import time
+from codes import env_loader
+
+
+class _Channel:
+    def __init__(self, lock):
+        self.cond = threading.Condition(lock)
+        self.state = {'percentage': 0, 'current_file': ''}
+        self.version = 0
+        self.done = False
+        self.subscribers = 0
+
+
+class ProgressHub:
+    """
+    Args:
+        heartbeat: 无更新时发送心跳的间隔秒数
+        min_interval: 同一订阅者两次推送的最小间隔秒数（合并高频更新）
+        max_idle: 旧版频道无任何进度变化超过该秒数后结束事件流
+    """
+
+    def __init__(self, heartbeat=15, min_interval=0.25, max_idle=300):
+        self.heartbeat = heartbeat
+        self.min_interval = min_interval
+        self.max_idle = max_idle
+        self._lock = threading.Lock()
+        self._channels = {}
+
+    def _channel_locked(self, key):
+        channel = self._channels.get(key)
+        if channel is None:
+            channel = self._channels[key] = _Channel(self._lock)
+        return channel
+
+    # ================== 发布 ==================
+    def update(self, key, percentage, done=False, **fields):
+        """
+        发布进度：percentage 为 0 视为重新开始，否则只接受不小于当前值的进度
+
+        Args:
+            key: 频道（任务ID 或 scan:video 等旧版频道）
+            percentage: 0-100
+            done: 是否结束（percentage 达到 100 时自动视为结束）
+            fields: 其它展示字段（current_file / current / total / status ...）
+
+        Returns:
+            bool: 是否被接受（进度回退的更新会被忽略）
+        """
+        percentage = max(0, min(100, percentage))
+        with self._lock:
+            channel = self._channel_locked(key)
+            if percentage != 0 and percentage < channel.state['percentage'] and not done:
+                return False
+            if percentage == 0:
+                channel.state = {'percentage': 0, 'current_file': ''}
+            channel.state['percentage'] = percentage
+            channel.state.update(fields)
+            channel.done = done or percentage >= 100
+            channel.version += 1
+            channel.cond.notify_all()
+        return True
+
+    def snapshot(self, key):
+        """频道当前状态，频道不存在时返回 None"""
+        with self._lock:
+            channel = self._channels.get(key)
+            return dict(channel.state) if channel else None
+
+    def discard(self, key):
+        """移除频道（任务从内存中淘汰时调用），正在订阅的连接随之结束"""
+        with self._lock:
+            channel = self._channels.pop(key, None)
+            if channel:
+                channel.done = True
+                channel.version += 1
+                channel.cond.notify_all()
+
+    def stats(self):
+        with self._lock:
+            return {key: {'version': c.version, 'done': c.done, 'subscribers': c.subscribers}
+                    for key, c in self._channels.items()}
+
+    # ================== 订阅 ==================
+    def stream(self, key, follow=False):
+        """
+        SSE 事件流生成器
+
+        Args:
+            key: 频道
+            follow: 旧版按媒体类型的频道使用：订阅时已结束的状态属于上一次扫描，不推送，
+                    等待下一次扫描；无进度变化超过 max_idle 秒后结束
+        """
+        with self._lock:
+            channel = self._channel_locked(key)
+            channel.subscribers += 1
+            last_version = channel.version if (follow and channel.done) else -1
+        last_sent = 0.0
+        last_change = time.monotonic()
+        try:
+            while True:
+                # 合并：距上次推送不足 min_interval 时先等一会儿，期间的更新只推最后一次
+                delay = last_sent + self.min_interval - time.monotonic()
+                if delay > 0:
+                    time.sleep(delay)
+
+                with self._lock:
+                    deadline = time.monotonic() + self.heartbeat
+                    while channel.version == last_version:
+                        remaining = deadline - time.monotonic()
+                        if remaining <= 0:
+                            break
+                        channel.cond.wait(remaining)
+                    changed = channel.version != last_version
+                    state = dict(channel.state)
+                    version = channel.version
+                    done = channel.done
+
+                if not changed:
+                    if follow and time.monotonic() - last_change > self.max_idle:
+                        print(f"⏰ 进度SSE长时间无更新，自动关闭: {key}")
+                        return
+                    yield ": heartbeat\n\n"
+                    continue
+
+                last_version = version
+                last_sent = last_change = time.monotonic()
+                yield f"id: {version}\ndata: {json.dumps(state, ensure_ascii=False)}\n\n"
+                if done:
+                    print(f"🏁 进度SSE结束: {key}")
+                    return
+        finally:
+            with self._lock:
+                channel.subscribers -= 1
+
+
+# 进程内唯一的进度中心
+hub = ProgressHub(
+    heartbeat=env_loader.progress_heartbeat,
+    min_interval=env_loader.progress_min_interval,
+    max_idle=env_loader.progress_max_idle
+)
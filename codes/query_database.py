@@ -1,4 +1,11 @@
 from codes import connect_mysql
+from codes import path_cache
+from codes import pagination
+from codes import count_cache
+from codes import suggest_index
+from codes import video_facets
+from codes import search_index
+from codes import scan_manifest
 import os
 from flask import jsonify
 import re
@@ -116,7 +123,8 @@ def get_videos_paginated(page=1, per_page=20, category='', user_group=1):
     """
     try:
         # 使用新表结构
-        return get_videos_paginated_new(page, per_page, category, user_group)
+        total_count, videos, _ = get_videos_paginated_new(page, per_page, category, user_group)
+        return total_count, videos
                 
     except Exception as e:
         print(f"获取分页视频列表失败: {str(e)}")
@@ -223,9 +231,15 @@ def clear_table():
                 cursor.execute("SET FOREIGN_KEY_CHECKS = 0")
                 cursor.execute("TRUNCATE TABLE video_item")
                 cursor.execute("TRUNCATE TABLE video_collection") 
+                # video_id 会从头分配，旧的失败记录不能留给新视频
+                cursor.execute("TRUNCATE TABLE thumbnail_failure")
                 cursor.execute("SET FOREIGN_KEY_CHECKS = 1")
                 
                 conn.commit()
+                path_cache.invalidate('video', 'thumbnail')
+                count_cache.invalidate('video')
+                video_facets.refresh_all()
+                suggest_index.refresh('video')
                 
                 return jsonify({"message": "视频表已清空", "status": "success"})
                 
@@ -268,19 +282,23 @@ def clear_audio_tables():
                 cursor.execute("DELETE FROM audio_collection")
                 
                 conn.commit()
+                path_cache.invalidate('audio')
+                count_cache.invalidate('audio')
+                suggest_index.refresh('audio')
                 
     except Exception as e:
         logging.error(f"清空音频表失败: {e}")
         raise
 
 # 获取图片集列表（分页）
-def get_image_collections_paginated(page=1, per_page=20, user_group=1):
+def get_image_collections_paginated(page=1, per_page=20, user_group=1, page_cursor=None):
     """
     分页获取图片集列表
-    :param page: 页码
+    :param page: 页码（传了游标时忽略）
     :param per_page: 每页数量
     :param user_group: 用户组ID
-    :return: (总数, 图片集列表)
+    :param page_cursor: 上一次返回的 next_cursor/prev_cursor（可选，按主键定位）
+    :return: (总数, 图片集列表, 游标信息)
     """
     try:
         # 如果user_group不是整数，转换为整数
@@ -308,12 +326,18 @@ def get_image_collections_paginated(page=1, per_page=20, user_group=1):
         
         with db.connect() as conn:
             with conn.cursor() as cursor:
-                # 获取总数
-                cursor.execute(count_sql, params)
-                total_count = cursor.fetchone()[0]
+                # 获取总数（走总数缓存，扫描/清空后失效）
+                def count_collections():
+                    cursor.execute(count_sql, params)
+                    return cursor.fetchone()[0]
+                total_count, count_exact = count_cache.get_count(
+                    'image', user_group, 'all', '', count_collections, 'collection_count')
                 
-                # 计算偏移量
-                offset = (page - 1) * per_page
+                # 游标/页码分页（有游标时按主键定位，否则按页码偏移）
+                keyset = pagination.KeysetPage('c.collection_id', per_page, page_cursor, page)
+                cond_sql, cond_params = keyset.condition()
+                tail_sql, tail_params = keyset.order_and_limit()
+                page_where = f"{where_clause} AND {cond_sql}" if where_clause else f"WHERE {cond_sql}"
                 
                 # 优化查询，避免使用子查询，使用LEFT JOIN和GROUP BY来获取第一张图片信息
                 # 注意：为了提高性能，需要确保image_collection和image_item表上有适当的索引
@@ -323,29 +347,26 @@ def get_image_collections_paginated(page=1, per_page=20, user_group=1):
                         c.collection_name,
                         c.group_id,
                         c.cover_id,
-                        COUNT(i.image_id) AS image_count,
+                        c.item_count AS image_count,
                         d.mount_path,
                         c.storage_root,
-                        MIN(i.image_id) AS first_image_id,
-                        MIN(i.relative_path) AS first_image_path
+                        c.first_item_id AS first_image_id,
+                        fi.relative_path AS first_image_path,
+                        c.total_bytes
                     FROM 
                         image_collection c
                     LEFT JOIN 
                         storage_disk d ON c.disk_id = d.disk_id
                     LEFT JOIN 
-                        image_item i ON c.collection_id = i.collection_id
-                    {where_clause}
-                    GROUP BY 
-                        c.collection_id, c.collection_name, c.group_id, c.cover_id, d.mount_path, c.storage_root
-                    ORDER BY 
-                        c.collection_id DESC
-                    LIMIT %s OFFSET %s
+                        image_item fi ON fi.image_id = c.first_item_id
+                    {page_where}
+                    {tail_sql}
                 """
                 
                 # 获取分页数据
-                query_params = params + [per_page, offset]
+                query_params = params + cond_params + tail_params
                 cursor.execute(query_sql, query_params)
-                rows = cursor.fetchall()
+                rows = keyset.finish(cursor.fetchall())
                 
                 cover_ids = []
                 collections = []
@@ -353,7 +374,7 @@ def get_image_collections_paginated(page=1, per_page=20, user_group=1):
                 
                 # 处理查询结果
                 for row in rows:
-                    collection_id, collection_name, group_id, cover_id, image_count, mount_path, storage_root, first_image_id, first_image_path = row
+                    collection_id, collection_name, group_id, cover_id, image_count, mount_path, storage_root, first_image_id, first_image_path, total_bytes = row
                     
                     # 收集需要查询的封面图ID
                     if cover_id:
@@ -370,7 +391,8 @@ def get_image_collections_paginated(page=1, per_page=20, user_group=1):
                         'storage_root': storage_root,
                         'cover_path': None,
                         'first_image_id': first_image_id,
-                        'first_image_path': first_image_path
+                        'first_image_path': first_image_path,
+                        'total_bytes': total_bytes
                     }
                     
                     collections.append(collection_data)
@@ -392,42 +414,37 @@ def get_image_collections_paginated(page=1, per_page=20, user_group=1):
                         # 找到对应的集合
                         for collection in collections:
                             if collection['cover_id'] == image_id:
-                                # 构建封面图路径
-                                cover_path = f"/images/{collection['mount_path']}{collection['storage_root']}{relative_path}"
-                                # 确保路径格式正确
-                                cover_path = cover_path.replace('//', '/').replace('\\', '/')
-                                collection['cover_path'] = cover_path
+                                # 构建封面图地址（按图片ID访问）
+                                collection['cover_path'] = f"/media/image/{image_id}?size=cover"
                                 break
                 
                 # 处理没有封面图的情况
                 for collection in collections:
                     # 如果没有指定封面图或封面图不存在，使用第一张图片
-                    if not collection['cover_path'] and collection['first_image_path']:
-                        cover_path = f"/images/{collection['mount_path']}{collection['storage_root']}{collection['first_image_path']}"
-                        # 确保路径格式正确
-                        cover_path = cover_path.replace('//', '/').replace('\\', '/')
-                        collection['cover_path'] = cover_path
+                    if not collection['cover_path'] and collection['first_image_id']:
+                        collection['cover_path'] = f"/media/image/{collection['first_image_id']}?size=cover"
                 
                 # 记录查询执行时间
                 end_time = time.time()
                 print(f"图集列表查询用时: {end_time - start_time:.2f}秒，返回{len(collections)}条记录")
                 
-                return total_count, collections
+                return total_count, collections, {**keyset.page_info, 'count_exact': count_exact}
     
     except Exception as e:
         print(f"获取图片集列表分页出错: {e}")
         print(traceback.format_exc())
-        return 0, []
+        return 0, [], pagination.empty_page_info()
 
 # 搜索图片集
-def search_image_collections(keyword, page=1, per_page=20, user_group=1):
+def search_image_collections(keyword, page=1, per_page=20, user_group=1, page_cursor=None):
     """
     搜索图片集
     :param keyword: 搜索关键词
-    :param page: 页码
+    :param page: 页码（传了游标时忽略）
     :param per_page: 每页数量
     :param user_group: 用户组ID
-    :return: (总数, 图片集列表)
+    :param page_cursor: 上一次返回的 next_cursor/prev_cursor（可选）
+    :return: (总数, 图片集列表, 游标信息)
     """
     try:
         # 如果user_group不是整数，转换为整数
@@ -438,8 +455,9 @@ def search_image_collections(keyword, page=1, per_page=20, user_group=1):
         start_time = time.time()
         
         # 构建查询条件 - 普通用户(1)只能看普通图片集(1)，高级用户可以看所有图片集
-        where_clause = "WHERE c.collection_name LIKE %s"
-        params = [f"%{keyword}%"]
+        search = search_index.clause('image', keyword)
+        where_clause = f"WHERE {search.where}"
+        params = list(search.where_params)
         
         if user_group == 1:
             # 普通用户只能看到普通图片集(group_id = 1)
@@ -455,12 +473,18 @@ def search_image_collections(keyword, page=1, per_page=20, user_group=1):
         
         with db.connect() as conn:
             with conn.cursor() as cursor:
-                # 获取总数
-                cursor.execute(count_sql, params)
-                total_count = cursor.fetchone()[0]
+                # 获取总数（走总数缓存，扫描/清空后失效）
+                def count_collections():
+                    cursor.execute(count_sql, params)
+                    return cursor.fetchone()[0]
+                total_count, count_exact = count_cache.get_count(
+                    'image', user_group, 'search', keyword, count_collections)
                 
-                # 计算偏移量
-                offset = (page - 1) * per_page
+                # 游标/页码分页（有游标时按主键定位，否则按页码偏移）
+                keyset = pagination.KeysetPage('c.collection_id', per_page, page_cursor, page)
+                cond_sql, cond_params = keyset.condition()
+                tail_sql, tail_params = keyset.order_and_limit()
+                page_where = f"{where_clause} AND {cond_sql}" if where_clause else f"WHERE {cond_sql}"
                 
                 # 优化查询，避免使用子查询
                 query_sql = f"""
@@ -469,29 +493,26 @@ def search_image_collections(keyword, page=1, per_page=20, user_group=1):
                         c.collection_name,
                         c.group_id,
                         c.cover_id,
-                        COUNT(i.image_id) AS image_count,
+                        c.item_count AS image_count,
                         d.mount_path,
                         c.storage_root,
-                        MIN(i.image_id) AS first_image_id,
-                        MIN(i.relative_path) AS first_image_path
+                        c.first_item_id AS first_image_id,
+                        fi.relative_path AS first_image_path,
+                        c.total_bytes
                     FROM 
                         image_collection c
                     LEFT JOIN 
                         storage_disk d ON c.disk_id = d.disk_id
                     LEFT JOIN 
-                        image_item i ON c.collection_id = i.collection_id
-                    {where_clause}
-                    GROUP BY 
-                        c.collection_id, c.collection_name, c.group_id, c.cover_id, d.mount_path, c.storage_root
-                    ORDER BY 
-                        c.collection_id DESC
-                    LIMIT %s OFFSET %s
+                        image_item fi ON fi.image_id = c.first_item_id
+                    {page_where}
+                    {tail_sql}
                 """
                 
                 # 获取分页数据
-                query_params = params + [per_page, offset]
+                query_params = params + cond_params + tail_params
                 cursor.execute(query_sql, query_params)
-                rows = cursor.fetchall()
+                rows = keyset.finish(cursor.fetchall())
                 
                 cover_ids = []
                 collections = []
@@ -499,7 +520,7 @@ def search_image_collections(keyword, page=1, per_page=20, user_group=1):
                 
                 # 处理查询结果
                 for row in rows:
-                    collection_id, collection_name, group_id, cover_id, image_count, mount_path, storage_root, first_image_id, first_image_path = row
+                    collection_id, collection_name, group_id, cover_id, image_count, mount_path, storage_root, first_image_id, first_image_path, total_bytes = row
                     
                     # 收集需要查询的封面图ID
                     if cover_id:
@@ -516,7 +537,8 @@ def search_image_collections(keyword, page=1, per_page=20, user_group=1):
                         'storage_root': storage_root,
                         'cover_path': None,
                         'first_image_id': first_image_id,
-                        'first_image_path': first_image_path
+                        'first_image_path': first_image_path,
+                        'total_bytes': total_bytes
                     }
                     
                     collections.append(collection_data)
@@ -538,32 +560,26 @@ def search_image_collections(keyword, page=1, per_page=20, user_group=1):
                         # 找到对应的集合
                         for collection in collections:
                             if collection['cover_id'] == image_id:
-                                # 构建封面图路径
-                                cover_path = f"/images/{collection['mount_path']}{collection['storage_root']}{relative_path}"
-                                # 确保路径格式正确
-                                cover_path = cover_path.replace('//', '/').replace('\\', '/')
-                                collection['cover_path'] = cover_path
+                                # 构建封面图地址（按图片ID访问）
+                                collection['cover_path'] = f"/media/image/{image_id}?size=cover"
                                 break
                 
                 # 处理没有封面图的情况
                 for collection in collections:
                     # 如果没有指定封面图或封面图不存在，使用第一张图片
-                    if not collection['cover_path'] and collection['first_image_path']:
-                        cover_path = f"/images/{collection['mount_path']}{collection['storage_root']}{collection['first_image_path']}"
-                        # 确保路径格式正确
-                        cover_path = cover_path.replace('//', '/').replace('\\', '/')
-                        collection['cover_path'] = cover_path
+                    if not collection['cover_path'] and collection['first_image_id']:
+                        collection['cover_path'] = f"/media/image/{collection['first_image_id']}?size=cover"
                 
                 # 记录查询执行时间
                 end_time = time.time()
                 print(f"图集搜索查询用时: {end_time - start_time:.2f}秒，返回{len(collections)}条记录")
                 
-                return total_count, collections
+                return total_count, collections, {**keyset.page_info, 'count_exact': count_exact}
     
     except Exception as e:
         print(f"搜索图片集出错: {e}")
         print(traceback.format_exc())
-        return 0, []
+        return 0, [], pagination.empty_page_info()
 
 # 获取图片集详情
 def get_image_collection_by_id(collection_id, user_group=1):
@@ -653,17 +669,12 @@ def get_image_collection_by_id(collection_id, user_group=1):
                         cover_result = cursor.fetchone()
                         
                         if cover_result:
-                            # 如果封面图存在，构建封面图路径
-                            cover_relative_path = cover_result[0]
-                            cover_path = f"/images/{mount_path}{storage_root}{cover_relative_path}"
-                            # 确保路径格式正确
-                            cover_path = cover_path.replace('//', '/').replace('\\', '/')
+                            # 如果封面图存在，按图片ID构建封面图地址
+                            cover_path = f"/media/image/{cover_id}?size=cover"
                     
                     # 如果没有指定封面图或封面图不存在，使用第一张图片
-                    if not cover_path and first_image_path:
-                        cover_path = f"/images/{mount_path}{storage_root}{first_image_path}"
-                        # 确保路径格式正确
-                        cover_path = cover_path.replace('//', '/').replace('\\', '/')
+                    if not cover_path and first_image_id:
+                        cover_path = f"/media/image/{first_image_id}?size=cover"
                     
                     collection_data = {
                         'collection_id': collection_id,
@@ -738,7 +749,10 @@ def get_images_by_collection_id(collection_id, user_id=None):
                         'image_id': row[0],
                         'relative_path': row[1],
                         'file_size': row[2],
-                        'full_path': full_path
+                        'full_path': full_path,
+                        'url': f"/media/image/{row[0]}",  # 按ID访问，服务端一次主键查询（原图）
+                        'preview_url': f"/media/image/{row[0]}?size=grid",  # 缩略预览
+                        'lightbox_url': f"/media/image/{row[0]}?size=lightbox"  # 浏览大图
                     }
                     print(f"图片ID:{row[0]} 路径:{full_path}")
                     images.append(image_data)
@@ -749,13 +763,14 @@ def get_images_by_collection_id(collection_id, user_id=None):
         logging.error(f"获取图片集图片列表出错: {e}")
         return {"error": f"获取图像时出错: {str(e)}"}
 
-def get_audio_collections_paginated(page=1, per_page=20, user_group=1):
+def get_audio_collections_paginated(page=1, per_page=20, user_group=1, page_cursor=None):
     """
     分页获取音频集列表
-    :param page: 页码
+    :param page: 页码（传了游标时忽略）
     :param per_page: 每页数量
     :param user_group: 用户组ID
-    :return: (总数, 音频集列表)
+    :param page_cursor: 上一次返回的 next_cursor/prev_cursor（可选，按主键定位）
+    :return: (总数, 音频集列表, 游标信息)
     """
     try:
         # 如果user_group不是整数，转换为整数
@@ -777,12 +792,18 @@ def get_audio_collections_paginated(page=1, per_page=20, user_group=1):
         
         with db.connect() as conn:
             with conn.cursor() as cursor:
-                # 获取总数
-                cursor.execute(count_sql, params)
-                total_count = cursor.fetchone()[0]
+                # 获取总数（走总数缓存，扫描/清空后失效）
+                def count_collections():
+                    cursor.execute(count_sql, params)
+                    return cursor.fetchone()[0]
+                total_count, count_exact = count_cache.get_count(
+                    'audio', user_group, 'all', '', count_collections, 'collection_count')
                 
-                # 计算偏移量
-                offset = (page - 1) * per_page
+                # 游标/页码分页（有游标时按主键定位，否则按页码偏移）
+                keyset = pagination.KeysetPage('c.collection_id', per_page, page_cursor, page)
+                cond_sql, cond_params = keyset.condition()
+                tail_sql, tail_params = keyset.order_and_limit()
+                page_where = f"{where_clause} AND {cond_sql}" if where_clause else f"WHERE {cond_sql}"
                 
                 # 查询音频集
                 query_sql = f"""
@@ -792,34 +813,32 @@ def get_audio_collections_paginated(page=1, per_page=20, user_group=1):
                         c.group_id,
                         c.cover_path,
                         c.artist,
-                        COUNT(a.audio_id) AS audio_count,
+                        c.item_count AS audio_count,
                         d.mount_path,
                         c.storage_root,
-                        MIN(a.relative_path) AS first_track_path,
-                        MIN(a.title) AS first_track_title
+                        a.relative_path AS first_track_path,
+                        a.title AS first_track_title,
+                        c.first_item_id AS first_track_id,
+                        c.total_bytes,
+                        c.total_duration
                     FROM 
                         audio_collection c
                     LEFT JOIN 
                         storage_disk d ON c.disk_id = d.disk_id
                     LEFT JOIN 
-                        audio_item a ON c.collection_id = a.collection_id
-                    {where_clause}
-                    GROUP BY 
-                        c.collection_id, c.collection_name, c.group_id, c.cover_path,
-                        c.artist, d.mount_path, c.storage_root
-                    ORDER BY 
-                        c.collection_id DESC
-                    LIMIT %s OFFSET %s
+                        audio_item a ON a.audio_id = c.first_item_id
+                    {page_where}
+                    {tail_sql}
                 """
                 
                 # 获取分页数据
-                query_params = params + [per_page, offset]
+                query_params = params + cond_params + tail_params
                 cursor.execute(query_sql, query_params)
-                rows = cursor.fetchall()
+                rows = keyset.finish(cursor.fetchall())
                 
                 collections = []
                 for row in rows:
-                    collection_id, collection_name, group_id, cover_path, artist, audio_count, mount_path, storage_root, first_track_path, first_track_title = row
+                    collection_id, collection_name, group_id, cover_path, artist, audio_count, mount_path, storage_root, first_track_path, first_track_title, first_track_id, total_bytes, total_duration = row
                     
                     # 处理封面图路径
                     if cover_path:
@@ -833,7 +852,8 @@ def get_audio_collections_paginated(page=1, per_page=20, user_group=1):
                     if first_track_path:
                         first_track = {
                             'relative_path': first_track_path.replace('\\', '/'),
-                            'title': first_track_title or '未知标题'
+                            'title': first_track_title or '未知标题',
+                            'url': f"/media/audio/{first_track_id}"
                         }
                     
                     collection_data = {
@@ -843,24 +863,27 @@ def get_audio_collections_paginated(page=1, per_page=20, user_group=1):
                         'cover_path': cover_path,
                         'artist': artist,
                         'audio_count': audio_count,
+                        'total_bytes': total_bytes,
+                        'total_duration': total_duration,
                         'first_track': first_track
                     }
                     collections.append(collection_data)
                 
-                return total_count, collections
+                return total_count, collections, {**keyset.page_info, 'count_exact': count_exact}
     
     except Exception as e:
         logging.error(f"获取音频集列表分页出错: {e}")
-        return 0, []
+        return 0, [], pagination.empty_page_info()
 
-def search_audio_collections(keyword, page=1, per_page=20, user_group=1):
+def search_audio_collections(keyword, page=1, per_page=20, user_group=1, page_cursor=None):
     """
     搜索音频集
     :param keyword: 搜索关键词
-    :param page: 页码
+    :param page: 页码（传了游标时忽略）
     :param per_page: 每页数量
     :param user_group: 用户组ID
-    :return: (总数, 音频集列表)
+    :param page_cursor: 上一次返回的 next_cursor/prev_cursor（可选）
+    :return: (总数, 音频集列表, 游标信息)
     """
     try:
         # 如果user_group不是整数，转换为整数
@@ -868,8 +891,10 @@ def search_audio_collections(keyword, page=1, per_page=20, user_group=1):
             user_group = int(user_group) if user_group.isdigit() else 1
         
         # 构建查询条件
-        where_clause = "WHERE (c.collection_name LIKE %s OR c.artist LIKE %s)"
-        params = [f"%{keyword}%", f"%{keyword}%"]
+        # 专辑名/艺术家，或其中音频的标题/艺术家/专辑/流派命中（全文索引）
+        search = search_index.audio_collection_clause(keyword)
+        where_clause = f"WHERE {search.where}"
+        params = list(search.where_params)
         
         if user_group == 1:
             # 普通用户只能看到普通音频集(group_id = 1)
@@ -882,12 +907,18 @@ def search_audio_collections(keyword, page=1, per_page=20, user_group=1):
         
         with db.connect() as conn:
             with conn.cursor() as cursor:
-                # 获取总数
-                cursor.execute(count_sql, params)
-                total_count = cursor.fetchone()[0]
+                # 获取总数（走总数缓存，扫描/清空后失效）
+                def count_collections():
+                    cursor.execute(count_sql, params)
+                    return cursor.fetchone()[0]
+                total_count, count_exact = count_cache.get_count(
+                    'audio', user_group, 'search', keyword, count_collections)
                 
-                # 计算偏移量
-                offset = (page - 1) * per_page
+                # 游标/页码分页（有游标时按主键定位，否则按页码偏移）
+                keyset = pagination.KeysetPage('c.collection_id', per_page, page_cursor, page)
+                cond_sql, cond_params = keyset.condition()
+                tail_sql, tail_params = keyset.order_and_limit()
+                page_where = f"{where_clause} AND {cond_sql}" if where_clause else f"WHERE {cond_sql}"
                 
                 # 查询音频集
                 query_sql = f"""
@@ -897,34 +928,32 @@ def search_audio_collections(keyword, page=1, per_page=20, user_group=1):
                         c.group_id,
                         c.cover_path,
                         c.artist,
-                        COUNT(a.audio_id) AS audio_count,
+                        c.item_count AS audio_count,
                         d.mount_path,
                         c.storage_root,
-                        MIN(a.relative_path) AS first_track_path,
-                        MIN(a.title) AS first_track_title
+                        a.relative_path AS first_track_path,
+                        a.title AS first_track_title,
+                        c.first_item_id AS first_track_id,
+                        c.total_bytes,
+                        c.total_duration
                     FROM 
                         audio_collection c
                     LEFT JOIN 
                         storage_disk d ON c.disk_id = d.disk_id
                     LEFT JOIN 
-                        audio_item a ON c.collection_id = a.collection_id
-                    {where_clause}
-                    GROUP BY 
-                        c.collection_id, c.collection_name, c.group_id, c.cover_path,
-                        c.artist, d.mount_path, c.storage_root
-                    ORDER BY 
-                        c.collection_id DESC
-                    LIMIT %s OFFSET %s
+                        audio_item a ON a.audio_id = c.first_item_id
+                    {page_where}
+                    {tail_sql}
                 """
                 
                 # 获取分页数据
-                query_params = params + [per_page, offset]
+                query_params = params + cond_params + tail_params
                 cursor.execute(query_sql, query_params)
-                rows = cursor.fetchall()
+                rows = keyset.finish(cursor.fetchall())
                 
                 collections = []
                 for row in rows:
-                    collection_id, collection_name, group_id, cover_path, artist, audio_count, mount_path, storage_root, first_track_path, first_track_title = row
+                    collection_id, collection_name, group_id, cover_path, artist, audio_count, mount_path, storage_root, first_track_path, first_track_title, first_track_id, total_bytes, total_duration = row
                     
                     # 处理封面图路径
                     if cover_path:
@@ -938,7 +967,8 @@ def search_audio_collections(keyword, page=1, per_page=20, user_group=1):
                     if first_track_path:
                         first_track = {
                             'relative_path': first_track_path.replace('\\', '/'),
-                            'title': first_track_title or '未知标题'
+                            'title': first_track_title or '未知标题',
+                            'url': f"/media/audio/{first_track_id}"
                         }
                     
                     collection_data = {
@@ -948,15 +978,17 @@ def search_audio_collections(keyword, page=1, per_page=20, user_group=1):
                         'cover_path': cover_path,
                         'artist': artist,
                         'audio_count': audio_count,
+                        'total_bytes': total_bytes,
+                        'total_duration': total_duration,
                         'first_track': first_track
                     }
                     collections.append(collection_data)
                 
-                return total_count, collections
+                return total_count, collections, {**keyset.page_info, 'count_exact': count_exact}
     
     except Exception as e:
         logging.error(f"搜索音频集出错: {e}")
-        return 0, []
+        return 0, [], pagination.empty_page_info()
 
 def get_audio_collection_by_id(collection_id, user_group=1):
     """
@@ -1059,6 +1091,7 @@ def get_audio_collection_by_id(collection_id, user_group=1):
                         
                         audio_data = {
                             'audio_id': audio_id,
+                            'url': f"/media/audio/{audio_id}",  # 按ID访问，服务端一次主键查询
                             'relative_path': relative_path,  # 只保留相对路径
                             'file_size': file_size,
                             'duration': duration,
@@ -1126,11 +1159,20 @@ def check_audio_access(file_path, user_group=1):
         
         with db.connect() as conn:
             with conn.cursor() as cursor:
-                result = None
                 used_pattern = None
                 
+                # 先按相对路径精确查找（path_hash 索引），找不到再依次尝试模糊匹配
+                cursor.execute("""
+                    SELECT c.group_id, a.relative_path
+                    FROM audio_item a
+                    JOIN audio_collection c ON a.collection_id = c.collection_id
+                    WHERE a.path_hash IN (%s, %s)
+                    LIMIT 1
+                """, (scan_manifest.path_hash(file_path), scan_manifest.path_hash(f"Audios/{file_path}")))
+                result = cursor.fetchone()
+                
                 # 依次尝试不同的搜索模式
-                for pattern in search_patterns:
+                for pattern in ([] if result else search_patterns):
                     cursor.execute(query_sql, (pattern,))
                     result = cursor.fetchone()
                     if result:
@@ -1169,6 +1211,171 @@ def check_audio_access(file_path, user_group=1):
 
 
 
+def get_image_file_by_id(image_id, user_group=1):
+    """
+    按图片ID解析图片文件路径（主键查询，同时完成权限判断）
+    :param image_id: 图片ID
+    :param user_group: 用户组ID
+    :return: {'mount_path', 'storage_root', 'relative_path', 'group_id', 'allowed'}，不存在返回None
+    """
+    try:
+        query_sql = """
+            SELECT 
+                d.mount_path, 
+                c.storage_root, 
+                i.relative_path,
+                c.group_id,
+                c.group_id <= %s AS allowed
+            FROM 
+                image_item i
+            JOIN 
+                image_collection c ON i.collection_id = c.collection_id
+            JOIN 
+                storage_disk d ON c.disk_id = d.disk_id
+            WHERE 
+                i.image_id = %s
+        """
+        row = db.fetch_one_record(query_sql, (user_group, image_id))
+        if not row or isinstance(row, dict):
+            return None
+        
+        return {
+            'mount_path': row[0],
+            'storage_root': row[1],
+            'relative_path': row[2],
+            'group_id': row[3],
+            'allowed': bool(row[4])
+        }
+    
+    except Exception as e:
+        print(f"按ID查询图片文件失败: {str(e)}")
+        return None
+
+def get_audio_file_by_id(audio_id, user_group=1):
+    """
+    按音频ID解析音频文件路径（主键查询，同时完成权限判断）
+    :param audio_id: 音频ID
+    :param user_group: 用户组ID
+    :return: {'mount_path', 'relative_path', 'group_id', 'allowed'}，不存在返回None
+    """
+    try:
+        query_sql = """
+            SELECT 
+                d.mount_path, 
+                a.relative_path,
+                c.group_id,
+                c.group_id <= %s AS allowed
+            FROM 
+                audio_item a
+            JOIN 
+                audio_collection c ON a.collection_id = c.collection_id
+            JOIN 
+                storage_disk d ON c.disk_id = d.disk_id
+            WHERE 
+                a.audio_id = %s
+        """
+        row = db.fetch_one_record(query_sql, (user_group, audio_id))
+        if not row or isinstance(row, dict):
+            return None
+        
+        return {
+            'mount_path': row[0],
+            'relative_path': row[1],  # 音频的相对路径是相对于磁盘挂载点的
+            'group_id': row[2],
+            'allowed': bool(row[3])
+        }
+    
+    except Exception as e:
+        print(f"按ID查询音频文件失败: {str(e)}")
+        return None
+
+def resolve_legacy_image_id(file_path):
+    """
+    将旧版 /images/<挂载路径+存储根+相对路径> 地址解析为图片ID（仅用于兼容旧链接的重定向）
+    :param file_path: 旧地址中的图片路径
+    :return: 图片ID，找不到返回None
+    """
+    try:
+        file_path = file_path.strip().replace('\\', '/').lstrip('/')
+        
+        with db.connect() as conn:
+            with conn.cursor() as cursor:
+                # 1. 先用集合的 挂载路径+存储根 做前缀匹配（集合表很小），拆出相对路径
+                cursor.execute("""
+                    SELECT c.collection_id, d.mount_path, c.storage_root
+                    FROM image_collection c
+                    JOIN storage_disk d ON c.disk_id = d.disk_id
+                """)
+                candidates = {}
+                for collection_id, mount_path, storage_root in cursor.fetchall():
+                    prefix = f"{mount_path}{storage_root}".replace('\\', '/').replace('//', '/').lstrip('/')
+                    if prefix and file_path.startswith(prefix):
+                        candidates.setdefault(file_path[len(prefix):], []).append(collection_id)
+                
+                # 2. 再按 (path_hash, collection_id) 唯一索引精确查找
+                for relative_path, collection_ids in candidates.items():
+                    placeholders = ','.join(['%s'] * len(collection_ids))
+                    cursor.execute(f"""
+                        SELECT image_id
+                        FROM image_item
+                        WHERE path_hash = %s AND collection_id IN ({placeholders})
+                        LIMIT 1
+                    """, [scan_manifest.path_hash(relative_path)] + collection_ids)
+                    result = cursor.fetchone()
+                    if result:
+                        return result[0]
+                
+                # 3. 兜底：旧版的模糊匹配，只为兼容极旧的链接
+                cursor.execute("""
+                    SELECT image_id
+                    FROM image_item
+                    WHERE relative_path LIKE %s
+                    LIMIT 1
+                """, (f"%{file_path.split('/')[-1]}%",))
+                result = cursor.fetchone()
+                return result[0] if result else None
+    
+    except Exception as e:
+        print(f"解析旧版图片地址失败: {str(e)}")
+        return None
+
+def resolve_legacy_audio_id(file_path):
+    """
+    将旧版 /audios/<相对路径> 地址解析为音频ID（仅用于兼容旧链接的重定向）
+    :param file_path: 旧地址中的音频路径
+    :return: 音频ID，找不到返回None
+    """
+    try:
+        file_path = file_path.replace('\\', '/').replace('//', '/')
+        
+        with db.connect() as conn:
+            with conn.cursor() as cursor:
+                # 1. 精确匹配（path_hash 索引，兼容列表接口去掉了 "Audios/" 前缀的情况）
+                cursor.execute("""
+                    SELECT audio_id
+                    FROM audio_item
+                    WHERE path_hash IN (%s, %s)
+                    LIMIT 1
+                """, (scan_manifest.path_hash(file_path), scan_manifest.path_hash(f"Audios/{file_path}")))
+                result = cursor.fetchone()
+                
+                if not result:
+                    # 2. 兜底：旧版的模糊匹配，只为兼容极旧的链接
+                    cursor.execute("""
+                        SELECT audio_id
+                        FROM audio_item
+                        WHERE relative_path LIKE %s
+                        LIMIT 1
+                    """, (f"%{file_path}%",))
+                    result = cursor.fetchone()
+                
+                return result[0] if result else None
+    
+    except Exception as e:
+        print(f"解析旧版音频地址失败: {str(e)}")
+        return None
+
+
 def get_audio_config():
     """获取音频配置（已废弃，保留兼容性）"""
     try:
@@ -0,0 +1,137 @@
+"""
+增量扫描用的文件指纹清单
+
+数据库中每个媒体条目记录 (file_size, file_mtime, file_inode) 作为指纹。扫描时先把扫描范围内
+已有条目的指纹一次性读入内存，遍历磁盘时逐个比对：
+    - new:       数据库中没有的文件，需要探测并插入
+    - changed:   大小/修改时间/inode 有变化，需要重新探测并更新
+    - unchanged: 指纹一致，直接跳过（不探测、不写库）
+遍历结束后仍未出现的条目即为已从磁盘消失的文件。
+
+视频/图片扫描用 pymysql 游标，音频扫描用 mysql.connector 游标，两者参数风格一致，这里都能用。
+
+path_hash 为规范化相对路径的 SHA1（20 字节），各条目表上有 (path_hash, collection_id) 唯一索引，
+按路径精确查找时不受路径长度影响，总是一次索引定位。
+SQL 中的等价写法为 UNHEX(SHA1(REPLACE(relative_path, '\\', '/')))（见 database_upgrade.sql 的回填语句）。
+"""
+import hashlib
+
+
+NEW = 'new'
+CHANGED = 'changed'
+UNCHANGED = 'unchanged'
+
+
+def fingerprint(st):
+    """从 os.stat 结果提取指纹：(大小, 纳秒修改时间, inode)；inode 为 0 的文件系统视为未知"""
+    return st.st_size, st.st_mtime_ns, (st.st_ino or None)
+
+
+def normalize_path(relative_path):
+    """统一相对路径写法（正斜杠），保证扫描结果和数据库中的值可以直接比较"""
+    return relative_path.replace('\\', '/')
+
+
+def path_hash(relative_path):
+    """相对路径的哈希（规范化后 UTF-8 编码的 SHA1，20 字节），写入/查找条目时使用"""
+    return hashlib.sha1(normalize_path(relative_path).encode('utf-8')).digest()
+
+
+class ScanManifest:
+    """
+    扫描范围内已入库文件的指纹快照
+
+    Args:
+        item_table: 条目表名（video_item / image_item / audio_item）
+        id_column: 条目主键列名
+        collection_table: 集合表名
+    """
+
+    def __init__(self, item_table, id_column, collection_table):
+        self.item_table = item_table
+        self.id_column = id_column
+        self.collection_table = collection_table
+        # (collection_id, relative_path) -> (item_id, size, mtime_ns, inode)
+        self._entries = {}
+        self._seen = set()
+        self.collection_ids = set()
+        self.counts = {'added': 0, 'changed': 0, 'removed': 0, 'unchanged': 0}
+
+    def load(self, cursor, scope_sql, scope_params):
+        """
+        读取扫描范围内的全部条目指纹
+
+        Args:
+            cursor: 数据库游标
+            scope_sql: 限定集合范围的 WHERE 条件（作用于别名 c，即集合表）
+            scope_params: scope_sql 的参数
+        """
+        cursor.execute(f"""
+            SELECT c.collection_id, i.{self.id_column}, i.relative_path,
+                   i.file_size, i.file_mtime, i.file_inode
+            FROM {self.collection_table} c
+            LEFT JOIN {self.item_table} i ON i.collection_id = c.collection_id
+            WHERE {scope_sql}
+        """, scope_params)
+        for collection_id, item_id, relative_path, size, mtime, inode in cursor.fetchall():
+            self.collection_ids.add(collection_id)
+            if item_id is None:
+                continue
+            self._entries[(collection_id, normalize_path(relative_path))] = (item_id, size, mtime, inode)
+        print(f"📋 已加载指纹清单: {self.item_table} {len(self._entries)} 条，集合 {len(self.collection_ids)} 个")
+        return self
+
+    def check(self, collection_id, relative_path, st):
+        """比对单个文件的指纹，返回 NEW / CHANGED / UNCHANGED，并记录该文件仍然存在"""
+        key = (collection_id, normalize_path(relative_path))
+        self._seen.add(key)
+        entry = self._entries.get(key)
+        if entry is None:
+            self.counts['added'] += 1
+            return NEW
+
+        _, size, mtime, inode = entry
+        cur_size, cur_mtime, cur_inode = fingerprint(st)
+        same = (size == cur_size and mtime == cur_mtime
+                and (inode is None or cur_inode is None or inode == cur_inode))
+        if same:
+            self.counts['unchanged'] += 1
+            return UNCHANGED
+        self.counts['changed'] += 1
+        return CHANGED
+
+    def item_id(self, collection_id, relative_path):
+        entry = self._entries.get((collection_id, normalize_path(relative_path)))
+        return entry[0] if entry else None
+
+    def vanished_ids(self):
+        """遍历后没有出现过的条目ID（文件已被删除/移走）"""
+        return [entry[0] for key, entry in self._entries.items() if key not in self._seen]
+
+    def remove_vanished(self, cursor, batch_size=1000):
+        """
+        删除已消失文件对应的条目，再删除扫描范围内因此变空的集合
+
+        Returns:
+            int: 删除的条目数
+        """
+        ids = self.vanished_ids()
+        for start in range(0, len(ids), batch_size):
+            chunk = ids[start:start + batch_size]
+            placeholders = ','.join(['%s'] * len(chunk))
+            cursor.execute(
+                f"DELETE FROM {self.item_table} WHERE {self.id_column} IN ({placeholders})", chunk)
+
+        if self.collection_ids:
+            collection_ids = list(self.collection_ids)
+            placeholders = ','.join(['%s'] * len(collection_ids))
+            cursor.execute(f"""
+                DELETE c FROM {self.collection_table} c
+                LEFT JOIN {self.item_table} i ON i.collection_id = c.collection_id
+                WHERE c.collection_id IN ({placeholders}) AND i.collection_id IS NULL
+            """, collection_ids)
+
+        self.counts['removed'] = len(ids)
+        if ids:
+            print(f"🗑️ 删除已消失的文件记录: {self.item_table} {len(ids)} 条")
+        return len(ids)
@@ -0,0 +1,295 @@
+"""
+全文检索（ngram 分词，适配中文标题）
+
+名称搜索原来都是 LIKE '%关键词%'，无法使用索引，也无法按相关度排序。这里改为 MySQL
+InnoDB 的 FULLTEXT 索引（WITH PARSER ngram），索引定义见 database_upgrade.sql：
+    - video_item.video_name
+    - image_collection.collection_name
+    - audio_collection.collection_name, artist
+    - audio_item.title, artist, album, genre
+InnoDB 在事务提交时同步更新全文索引，扫描器写入/删除条目后无需额外处理。
+
+关键词按空白拆分为多个词，所有词都必须命中（AND）。每个词在 BOOLEAN MODE 下按短语匹配，
+ngram 解析器会把它切成 ngram_token_size 长度的片段；短于该长度的词（比如单个汉字）
+无法通过全文索引查到，这类词退回 LIKE 条件。
+
+search_mode=like 时全部使用 LIKE（数据库未建全文索引或不支持 ngram 时使用）。
+"""
+import re
+from pathlib import Path
+from codes import env_loader
+from codes import video_duration as duration_util
+
+
+MODE_FULLTEXT = 'fulltext'
+MODE_LIKE = 'like'
+
+# 检索目标 -> 参与匹配的列（顺序必须与 FULLTEXT 索引定义一致）
+TARGETS = {
+    'video': ('vi.video_name',),
+    'image': ('c.collection_name',),
+    'audio_collection': ('c.collection_name', 'c.artist'),
+    'audio_item': ('a.title', 'a.artist', 'a.album', 'a.genre'),
+}
+
+# BOOLEAN MODE 中有特殊含义的字符
+_OPERATOR_CHARS = re.compile(r'[+\-<>()~*"@]')
+
+
+class SearchClause:
+    """
+    一次检索的 SQL 片段
+
+    Attributes:
+        where: 匹配条件（不含 WHERE）
+        where_params: 条件参数
+        score: 相关度表达式（只有短词/LIKE 模式时为常量 0）
+        score_params: 相关度表达式参数
+    """
+
+    def __init__(self, where, where_params, score='0', score_params=None):
+        self.where = where
+        self.where_params = list(where_params)
+        self.score = score
+        self.score_params = list(score_params or [])
+
+    @property
+    def ranked(self):
+        return self.score != '0'
+
+
+def parse_terms(keyword):
+    """拆分关键词：去掉全文检索运算符，按空白拆分、去重，最多保留 search_max_terms 个"""
+    cleaned = _OPERATOR_CHARS.sub(' ', keyword or '')
+    terms = []
+    for term in cleaned.split():
+        if term.lower() not in (t.lower() for t in terms):
+            terms.append(term)
+    return terms[:env_loader.search_max_terms]
+
+
+def _escape_like(term):
+    return term.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+
+
+def _like_condition(columns, term):
+    """单个词的 LIKE 条件：任一列包含即可"""
+    pattern = f"%{_escape_like(term)}%"
+    sql = ' OR '.join(f"{column} LIKE %s" for column in columns)
+    return f"({sql})", [pattern] * len(columns)
+
+
+def clause(target, keyword):
+    """
+    生成检索条件和相关度表达式
+
+    Args:
+        target: TARGETS 中的检索目标
+        keyword: 用户输入的关键词
+
+    Returns:
+        SearchClause
+    """
+    columns = TARGETS[target]
+    terms = parse_terms(keyword)
+    if not terms:
+        return SearchClause("1 = 0", [])
+
+    if env_loader.search_mode == MODE_FULLTEXT:
+        indexed = [t for t in terms if len(t) >= env_loader.search_ngram_token_size]
+        short = [t for t in terms if len(t) < env_loader.search_ngram_token_size]
+    else:
+        indexed, short = [], terms
+
+    conditions, params = [], []
+    score, score_params = '0', []
+    if indexed:
+        match_sql = f"MATCH({', '.join(columns)}) AGAINST(%s IN BOOLEAN MODE)"
+        boolean_query = ' '.join(f'+"{term}"' for term in indexed)
+        conditions.append(match_sql)
+        params.append(boolean_query)
+        score, score_params = match_sql, [boolean_query]
+    for term in short:
+        sql, term_params = _like_condition(columns, term)
+        conditions.append(sql)
+        params.extend(term_params)
+
+    return SearchClause(' AND '.join(conditions), params, score, score_params)
+
+
+def audio_collection_clause(keyword):
+    """
+    音频集检索：专辑名/艺术家命中，或其中任一音频的标题/艺术家/专辑/流派命中
+
+    条件中使用别名 c（audio_collection），子查询使用别名 a（audio_item）
+    """
+    collection = clause('audio_collection', keyword)
+    item = clause('audio_item', keyword)
+    where = (f"({collection.where} OR c.collection_id IN "
+             f"(SELECT a.collection_id FROM audio_item a WHERE {item.where}))")
+    if not collection.ranked:
+        return SearchClause(where, collection.where_params + item.where_params)
+    score = (f"({collection.score} + COALESCE((SELECT MAX({item.score}) FROM audio_item a "
+             f"WHERE a.collection_id = c.collection_id AND {item.where}), 0))")
+    return SearchClause(
+        where,
+        collection.where_params + item.where_params,
+        score,
+        collection.score_params + item.score_params + item.where_params
+    )
+
+
+def _visible_groups(user_group):
+    # 与各列表接口保持一致：普通用户只能看到 group_id = 1，VIP 可以看到全部
+    return ("= 1", []) if user_group == 1 else ("<= %s", [user_group])
+
+
+def _search_videos(cursor, keyword, user_group, per_page, offset):
+    search = clause('video', keyword)
+    cursor.execute(f"""
+        SELECT COUNT(*)
+        FROM video_item vi
+        JOIN video_collection vc ON vi.collection_id = vc.collection_id
+        WHERE {search.where} AND vc.group_id <= %s
+    """, search.where_params + [user_group])
+    total = cursor.fetchone()[0]
+    if not total:
+        return 0, []
+
+    cursor.execute(f"""
+        SELECT vi.video_id, vi.video_name, vc.collection_name, vi.video_duration, vi.duration_ms,
+               vi.thumbnail_path, vi.relative_path, vc.group_id, {search.score} AS score
+        FROM video_item vi
+        JOIN video_collection vc ON vi.collection_id = vc.collection_id
+        WHERE {search.where} AND vc.group_id <= %s
+        ORDER BY score DESC, vi.video_id DESC
+        LIMIT %s OFFSET %s
+    """, search.score_params + search.where_params + [user_group, per_page, offset])
+
+    items = []
+    for video_id, video_name, category, duration, duration_ms, thumbnail_path, relative_path, group_id, score in cursor.fetchall():
+        if thumbnail_path:
+            thumbnail_url = f"/thumbnails/{thumbnail_path}"
+        else:
+            thumbnail_url = f"/thumbnails/{Path(relative_path).parent / (Path(video_name).stem + '.jpg')}"
+        items.append({
+            'id': video_id,
+            'video_name': video_name,
+            'category': category,
+            'video_duration': duration_util.display_duration(duration_ms, duration),
+            'duration_ms': duration_ms,
+            'is_vip': group_id > 1,
+            'thumbnail_url': thumbnail_url,
+            'video_play_url': f"/media/video/{video_id}",
+            'score': float(score or 0)
+        })
+    return total, items
+
+
+def _search_images(cursor, keyword, user_group, per_page, offset):
+    search = clause('image', keyword)
+    group_sql, group_params = _visible_groups(user_group)
+    cursor.execute(f"""
+        SELECT COUNT(*) FROM image_collection c
+        WHERE {search.where} AND c.group_id {group_sql}
+    """, search.where_params + group_params)
+    total = cursor.fetchone()[0]
+    if not total:
+        return 0, []
+
+    cursor.execute(f"""
+        SELECT c.collection_id, c.collection_name, c.item_count, c.cover_id, c.first_item_id, c.group_id,
+               {search.score} AS score
+        FROM image_collection c
+        WHERE {search.where} AND c.group_id {group_sql}
+        ORDER BY score DESC, c.collection_id DESC
+        LIMIT %s OFFSET %s
+    """, search.score_params + search.where_params + group_params + [per_page, offset])
+
+    items = []
+    for collection_id, collection_name, image_count, cover_id, first_item_id, group_id, score in cursor.fetchall():
+        cover_image_id = cover_id or first_item_id
+        items.append({
+            'collection_id': collection_id,
+            'collection_name': collection_name,
+            'image_count': image_count,
+            'is_vip': group_id > 1,
+            'cover_url': f"/media/image/{cover_image_id}?size=cover" if cover_image_id else None,
+            'score': float(score or 0)
+        })
+    return total, items
+
+
+def _search_audio(cursor, keyword, user_group, per_page, offset):
+    search = clause('audio_item', keyword)
+    group_sql, group_params = _visible_groups(user_group)
+    cursor.execute(f"""
+        SELECT COUNT(*)
+        FROM audio_item a
+        JOIN audio_collection c ON a.collection_id = c.collection_id
+        WHERE {search.where} AND c.group_id {group_sql}
+    """, search.where_params + group_params)
+    total = cursor.fetchone()[0]
+    if not total:
+        return 0, []
+
+    cursor.execute(f"""
+        SELECT a.audio_id, a.title, a.artist, a.album, a.genre, a.duration,
+               c.collection_id, c.collection_name, c.group_id, {search.score} AS score
+        FROM audio_item a
+        JOIN audio_collection c ON a.collection_id = c.collection_id
+        WHERE {search.where} AND c.group_id {group_sql}
+        ORDER BY score DESC, a.audio_id DESC
+        LIMIT %s OFFSET %s
+    """, search.score_params + search.where_params + group_params + [per_page, offset])
+
+    items = []
+    for audio_id, title, artist, album, genre, duration, collection_id, collection_name, group_id, score in cursor.fetchall():
+        items.append({
+            'audio_id': audio_id,
+            'title': title or '未知标题',
+            'artist': artist,
+            'album': album,
+            'genre': genre,
+            'duration': duration,
+            'collection_id': collection_id,
+            'collection_name': collection_name,
+            'is_vip': group_id > 1,
+            'url': f"/media/audio/{audio_id}",
+            'score': float(score or 0)
+        })
+    return total, items
+
+
+_SEARCHERS = {
+    'video': _search_videos,
+    'image': _search_images,
+    'audio': _search_audio,
+}
+MEDIA_TYPES = tuple(_SEARCHERS)
+
+
+def search(db, keyword, media_types=None, user_group=1, page=1, per_page=20):
+    """
+    跨媒体类型检索，每种类型各自按相关度排序分页
+
+    Args:
+        db: Connect_mysql 实例
+        keyword: 关键词（空白分隔的多个词需全部命中）
+        media_types: 检索的媒体类型，None 表示全部
+        user_group: 用户权限组
+        page: 页码
+        per_page: 每种类型每页数量
+
+    Returns:
+        dict: {媒体类型: {'total': 总数, 'items': 当前页结果}}
+    """
+    page = max(1, int(page))
+    offset = (page - 1) * per_page
+    results = {}
+    with db.connect() as conn:
+        with conn.cursor() as cursor:
+            for media_type in media_types or MEDIA_TYPES:
+                total, items = _SEARCHERS[media_type](cursor, keyword, user_group, per_page, offset)
+                results[media_type] = {'total': total, 'items': items}
+    return results
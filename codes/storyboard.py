@@ -0,0 +1,248 @@
+"""
+视频故事板（悬停预览雪碧图 + WebVTT 索引）
+
+每个视频生成一张雪碧图：沿时间轴均匀取 storyboard_frames 帧，缩放到 storyboard_tile_width 宽，
+按 storyboard_columns 列拼接；同时生成 WebVTT 索引，每条 cue 对应一段时间和雪碧图中的一个
+区域（#xywh=x,y,w,h），前端悬停/拖动时按位置显示对应画面，不需要再发起视频的范围请求。
+
+生成只运行一次 ffmpeg：fps 滤镜按固定间隔取帧，tile 滤镜拼接，解码时跳过非关键帧
+（-skip_frame nokey），不需要对每一帧单独 seek。生成在后台队列中进行（storyboard_workers 个线程），
+请求时缺失则入队并返回 202；生成失败的视频在 thumbnail_failure_backoff 秒内不再入队（只记在内存中，
+过期记录在入队和查看统计时清除）。
+
+文件按 (视频绝对路径, 大小, 修改时间, 布局参数) 的 SHA1 命名，视频文件变化或布局配置调整后自动换新文件：
+    storyboard_cache_dir/ab/<sha1>.jpg
+    storyboard_cache_dir/ab/<sha1>.vtt
+旧文件由 storyboard_cache_budget_mb 按最近访问时间淘汰（见 cache_budget）。
+"""
+import hashlib
+import math
+import os
+import subprocess
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+from codes import env_loader
+from codes.cache_budget import DiskBudget, touch
+
+
+SPRITE_NAME = 'storyboard.jpg'   # VTT 中引用雪碧图的相对地址（与 .vtt 接口同目录）
+_DEFAULT_ASPECT = 9 / 16
+_PROJECT_ROOT = Path(__file__).resolve().parent.parent
+
+
+def cache_dir():
+    path = Path(env_loader.storyboard_cache_dir)
+    return path if path.is_absolute() else _PROJECT_ROOT / path
+
+
+def files(video_path):
+    """返回 (雪碧图路径, VTT路径)；视频文件不存在时抛出 OSError"""
+    source = Path(video_path).resolve()
+    stat = source.stat()
+    key = (f"{source}|{stat.st_size}|{stat.st_mtime_ns}|{env_loader.storyboard_frames}|"
+           f"{env_loader.storyboard_columns}|{env_loader.storyboard_tile_width}")
+    digest = hashlib.sha1(key.encode('utf-8')).hexdigest()
+    base = cache_dir() / digest[:2] / digest
+    return base.with_suffix('.jpg'), base.with_suffix('.vtt')
+
+
+def layout(duration_ms, width=None, height=None):
+    """
+    计算雪碧图布局
+
+    Returns:
+        dict: frames/columns/rows/tile_width/tile_height/interval（秒）
+    """
+    duration_seconds = duration_ms / 1000
+    # 短视频每秒最多一帧
+    frames = max(1, min(env_loader.storyboard_frames, int(duration_seconds)))
+    columns = max(1, min(env_loader.storyboard_columns, frames))
+    tile_width = env_loader.storyboard_tile_width
+    aspect = (height / width) if width and height else _DEFAULT_ASPECT
+    tile_height = max(2, int(round(tile_width * aspect / 2)) * 2)
+    return {
+        'frames': frames,
+        'columns': columns,
+        'rows': math.ceil(frames / columns),
+        'tile_width': tile_width,
+        'tile_height': tile_height,
+        'interval': duration_seconds / frames
+    }
+
+
+def _timestamp(seconds):
+    hours = int(seconds // 3600)
+    minutes = int((seconds % 3600) // 60)
+    return f"{hours:02d}:{minutes:02d}:{seconds % 60:06.3f}"
+
+
+def build_vtt(plan, sprite_url=SPRITE_NAME):
+    """按布局生成 WebVTT 索引"""
+    lines = ['WEBVTT', '']
+    for index in range(plan['frames']):
+        x = (index % plan['columns']) * plan['tile_width']
+        y = (index // plan['columns']) * plan['tile_height']
+        start = index * plan['interval']
+        lines.append(f"{_timestamp(start)} --> {_timestamp(start + plan['interval'])}")
+        lines.append(f"{sprite_url}#xywh={x},{y},{plan['tile_width']},{plan['tile_height']}")
+        lines.append('')
+    return '\n'.join(lines)
+
+
+def generate(video_path, duration_ms, width=None, height=None):
+    """一次 ffmpeg 生成雪碧图并写入 VTT，成功返回 True"""
+    sprite_path, vtt_path = files(video_path)
+    plan = layout(duration_ms, width, height)
+    sprite_path.parent.mkdir(parents=True, exist_ok=True)
+    temp_sprite = sprite_path.with_name(f".{sprite_path.stem}.{threading.get_ident()}.jpg")
+    fps = plan['frames'] / (duration_ms / 1000)
+    ffmpeg_cmd = [
+        env_loader.ffmpeg_path,
+        "-v", "error",
+        "-skip_frame", "nokey",          # 只解码关键帧
+        "-i", str(video_path),
+        "-an", "-sn", "-dn",
+        "-vf", (f"fps={fps:.6f},scale={plan['tile_width']}:{plan['tile_height']},"
+                f"tile={plan['columns']}x{plan['rows']}"),
+        "-frames:v", "1",
+        "-q:v", "5",
+        "-y",
+        str(temp_sprite)
+    ]
+    print(f"🎞️ 生成故事板: {video_path}（{plan['frames']} 帧，{plan['columns']}x{plan['rows']}）")
+    try:
+        result = subprocess.run(
+            ffmpeg_cmd,
+            check=False,
+            stderr=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            creationflags=subprocess.CREATE_NO_WINDOW if os.name == 'nt' else 0,
+            encoding='utf-8',
+            errors='ignore',
+            timeout=env_loader.storyboard_timeout
+        )
+        if result.returncode != 0 or not temp_sprite.exists():
+            print(f"生成故事板失败: {video_path} | {result.stderr.strip()[-300:]}")
+            return False
+        # 先写 VTT 再放雪碧图：雪碧图存在即表示故事板完整
+        vtt_path.write_text(build_vtt(plan), encoding='utf-8')
+        os.replace(temp_sprite, sprite_path)
+        budget.added(sprite_path.stat().st_size + vtt_path.stat().st_size)
+        return True
+    except Exception as e:
+        print(f"生成故事板异常: {video_path} | {str(e)}")
+        return False
+    finally:
+        if temp_sprite.exists():
+            try:
+                temp_sprite.unlink()
+            except OSError:
+                pass
+
+
+def ready(video_path):
+    """故事板已生成时返回 (雪碧图路径, VTT路径)，否则返回 None"""
+    try:
+        sprite_path, vtt_path = files(video_path)
+    except OSError:
+        return None
+    try:
+        sprite_mtime = sprite_path.stat().st_mtime
+        vtt_mtime = vtt_path.stat().st_mtime
+    except OSError:
+        return None
+    # 两个文件一起刷新访问时间，淘汰时在 mtime 排序中相邻
+    touch(sprite_path, sprite_mtime)
+    touch(vtt_path, vtt_mtime)
+    return sprite_path, vtt_path
+
+
+class StoryboardQueue:
+    """按视频路径去重的先进先出队列，storyboard_workers 个后台线程处理"""
+
+    def __init__(self, workers, max_size):
+        self.workers = max(1, workers)
+        self.max_size = max_size
+        self._pending = OrderedDict()   # {视频路径: (时长毫秒, 宽, 高)}
+        self._running = set()
+        self._failed = OrderedDict()    # {视频路径: 失败时间}，按失败先后排列
+        self._cond = threading.Condition()
+        self._threads = []
+        self._stats = {'generated': 0, 'failed': 0, 'dropped': 0}
+
+    def enqueue(self, video_path, duration_ms, width=None, height=None):
+        """加入生成队列；时长未知的视频无法均匀取帧，直接跳过。返回是否已在队列中"""
+        if not duration_ms:
+            return False
+        key = str(video_path)
+        with self._cond:
+            if key in self._pending or key in self._running:
+                return True
+            self._prune_failed()
+            if key in self._failed:
+                return False
+            if len(self._pending) >= self.max_size:
+                self._stats['dropped'] += 1
+                return False
+            self._pending[key] = (duration_ms, width, height)
+            self._threads = [t for t in self._threads if t.is_alive()]
+            for i in range(len(self._threads), self.workers):
+                thread = threading.Thread(target=self._work, name=f'storyboard-{i}', daemon=True)
+                thread.start()
+                self._threads.append(thread)
+            self._cond.notify()
+            return True
+
+    def _prune_failed(self):
+        # 清除退避期已过的失败记录（调用方已持有锁）；记录按失败时间先后插入，遇到未过期的即可停止
+        cutoff = time.monotonic() - env_loader.thumbnail_failure_backoff
+        while self._failed:
+            key, failed_at = next(iter(self._failed.items()))
+            if failed_at > cutoff:
+                break
+            del self._failed[key]
+
+    def _work(self):
+        while True:
+            with self._cond:
+                while not self._pending:
+                    self._cond.wait()
+                video_path, (duration_ms, width, height) = self._pending.popitem(last=False)
+                self._running.add(video_path)
+            ok = False
+            try:
+                ok = ready(video_path) is not None or generate(video_path, duration_ms, width, height)
+            except Exception as e:
+                print(f"后台生成故事板异常: {video_path} | {str(e)}")
+            finally:
+                with self._cond:
+                    self._running.discard(video_path)
+                    self._stats['generated' if ok else 'failed'] += 1
+                    if not ok:
+                        self._failed.pop(video_path, None)
+                        self._failed[video_path] = time.monotonic()
+
+    def stats(self):
+        with self._cond:
+            self._prune_failed()
+            return {
+                'workers': self.workers,
+                'queued': len(self._pending),
+                'running': len(self._running),
+                'backing_off': len(self._failed),
+                **self._stats
+            }
+
+
+budget = DiskBudget('故事板', cache_dir, env_loader.storyboard_cache_budget_mb)
+queue = StoryboardQueue(env_loader.storyboard_workers, env_loader.thumbnail_queue_size)
+
+
+def enqueue(video_path, duration_ms, width=None, height=None):
+    return queue.enqueue(video_path, duration_ms, width, height)
+
+
+def stats():
+    return {'cache_dir': str(cache_dir()), 'cache': budget.stats(), **queue.stats()}
@@ -0,0 +1,239 @@
+"""
+搜索框输入联想（前缀索引）
+
+每次按键都去数据库 LIKE 查询代价太高，这里在进程内维护一份排好序的候选词数组，
+用 bisect 定位前缀区间，查询只涉及内存中的二分查找。
+
+候选词来源：
+    - video: 视频文件名（去掉扩展名）、视频分类名
+    - image: 图集名
+    - audio: 音频集名、艺术家、专辑名
+名称按空格/下划线/横线/括号等分隔后，每个分词起点也作为一个入口，输入名称中间的词也能联想到。
+
+索引按 (媒体类型, 权限组) 分区保存：查询时只读取 group_id <= 用户组 的分区，VIP 内容不会
+出现在普通用户的联想结果中；扫描/清空某媒体类型后只重建该类型的分区（后台线程）。
+候选词总数受 suggest_max_entries 限制，超出时按出现次数保留最常见的词。
+"""
+import os
+import re
+import threading
+import time
+import unicodedata
+from bisect import bisect_left
+from codes import env_loader
+
+
+MEDIA_TYPES = ('video', 'image', 'audio')
+
+# 各媒体类型的候选词查询：(类别, SQL)，SQL 返回 (名称, group_id, 出现次数)
+_SOURCES = {
+    'video': [
+        ('video', """
+            SELECT vi.video_name, vc.group_id, 1
+            FROM video_item vi
+            JOIN video_collection vc ON vi.collection_id = vc.collection_id
+        """),
+        ('category', "SELECT collection_name, group_id, GREATEST(item_count, 1) FROM video_collection"),
+    ],
+    'image': [
+        ('image_collection', "SELECT collection_name, group_id, GREATEST(item_count, 1) FROM image_collection"),
+    ],
+    'audio': [
+        ('audio_collection', "SELECT collection_name, group_id, GREATEST(item_count, 1) FROM audio_collection"),
+        ('artist', """
+            SELECT a.artist, c.group_id, COUNT(*)
+            FROM audio_item a JOIN audio_collection c ON a.collection_id = c.collection_id
+            WHERE a.artist IS NOT NULL AND a.artist != ''
+            GROUP BY 1, 2
+        """),
+        ('album', """
+            SELECT a.album, c.group_id, COUNT(*)
+            FROM audio_item a JOIN audio_collection c ON a.collection_id = c.collection_id
+            WHERE a.album IS NOT NULL AND a.album != ''
+            GROUP BY 1, 2
+        """),
+    ],
+}
+
+# 名称内部的分词边界
+_WORD_BOUNDARY = re.compile(r'[\s_\-.·、，,【】\[\]()（）《》]+')
+# 每次查询最多检查的前缀区间条目数（区间很大时只看前面这些，再按出现次数排序）
+_MAX_CANDIDATES = 500
+_MAX_KEY_LENGTH = 64
+_PREFIX_END = '\U0010ffff'
+
+
+def normalize(text):
+    """统一全半角和大小写，作为索引键"""
+    return unicodedata.normalize('NFKC', text or '').casefold().strip()
+
+
+class _Partition:
+    """一个 (媒体类型, 权限组) 分区：按键排序的平行数组"""
+
+    __slots__ = ('keys', 'entries')
+
+    def __init__(self, rows):
+        rows.sort(key=lambda row: row[0])
+        self.keys = [row[0] for row in rows]
+        self.entries = [row[1] for row in rows]   # (显示文本, 类别, 出现次数)
+
+    def lookup(self, prefix):
+        lo = bisect_left(self.keys, prefix)
+        hi = bisect_left(self.keys, prefix + _PREFIX_END, lo)
+        return self.entries[lo:min(hi, lo + _MAX_CANDIDATES)]
+
+
+class SuggestIndex:
+
+    def __init__(self, max_entries):
+        self.max_entries = max_entries
+        self._partitions = {}          # {媒体类型: {group_id: _Partition}}
+        self._sizes = {}
+        self._built_at = {}
+        self._lock = threading.Lock()
+        self._pending = set()
+        self._worker = None
+
+    def _entry_budget(self, media_type):
+        # 其余媒体类型已占用的条目数之外的配额
+        others = sum(size for mt, size in self._sizes.items() if mt != media_type)
+        return max(0, self.max_entries - others)
+
+    def rebuild(self, media_type, db):
+        """从数据库重建某媒体类型的分区"""
+        started = time.perf_counter()
+        weights = {}
+        with db.connect() as conn:
+            with conn.cursor() as cursor:
+                for kind, sql in _SOURCES[media_type]:
+                    cursor.execute(sql)
+                    for name, group_id, weight in cursor.fetchall():
+                        if not name:
+                            continue
+                        display = os.path.splitext(str(name))[0] if kind == 'video' else str(name)
+                        key = (display, kind, int(group_id or 1))
+                        weights[key] = weights.get(key, 0) + int(weight or 1)
+
+        # 超出配额时保留出现次数多的名称
+        with self._lock:
+            budget = self._entry_budget(media_type)
+        names = [(display, kind, group_id, weight) for (display, kind, group_id), weight in weights.items()]
+        names.sort(key=lambda item: -item[3])
+        rows_by_group = {}
+        count = 0
+        for display, kind, group_id, weight in names:
+            keys = self._keys_for(display)
+            if count + len(keys) > budget:
+                print(f"⚠️ 联想索引已达上限 {self.max_entries} 条，{media_type} 其余名称不再收录")
+                break
+            entry = (display, kind, weight)
+            rows = rows_by_group.setdefault(group_id, [])
+            rows.extend((key, entry) for key in keys)
+            count += len(keys)
+
+        partitions = {group_id: _Partition(rows) for group_id, rows in rows_by_group.items()}
+        with self._lock:
+            self._partitions[media_type] = partitions
+            self._sizes[media_type] = count
+            self._built_at[media_type] = time.time()
+        elapsed = (time.perf_counter() - started) * 1000
+        print(f"🔤 联想索引已重建: {media_type}，{count} 条，耗时 {elapsed:.0f}ms")
+
+    @staticmethod
+    def _keys_for(display):
+        """名称本身以及名称中每个分词起点的后缀"""
+        normalized = normalize(display)
+        keys = {normalized[:_MAX_KEY_LENGTH]}
+        for match in _WORD_BOUNDARY.finditer(normalized):
+            rest = normalized[match.end():]
+            if rest:
+                keys.add(rest[:_MAX_KEY_LENGTH])
+        keys.discard('')
+        return keys
+
+    def suggest(self, prefix, user_group=1, media_types=None, limit=10):
+        """
+        返回以 prefix 开头的候选词
+
+        Returns:
+            list: [{'text': 显示文本, 'type': 类别, 'media_type': 媒体类型}]，按出现次数降序
+        """
+        prefix = normalize(prefix)[:_MAX_KEY_LENGTH]
+        if not prefix:
+            return []
+        with self._lock:
+            partitions = {mt: dict(parts) for mt, parts in self._partitions.items()}
+
+        seen = {}
+        for media_type in media_types or MEDIA_TYPES:
+            for group_id, partition in partitions.get(media_type, {}).items():
+                if group_id > user_group:
+                    continue
+                for display, kind, weight in partition.lookup(prefix):
+                    key = (display, kind)
+                    if key not in seen or seen[key][2] < weight:
+                        seen[key] = (media_type, normalize(display).startswith(prefix), weight)
+
+        # 名称开头匹配优先，其次出现次数多、文本短的
+        ranked = sorted(seen.items(), key=lambda item: (not item[1][1], -item[1][2], len(item[0][0])))
+        return [
+            {'text': display, 'type': kind, 'media_type': media_type}
+            for (display, kind), (media_type, _, _) in ranked[:limit]
+        ]
+
+    def schedule_refresh(self, db, *media_types):
+        """后台重建指定媒体类型（合并重建请求，同一时间只有一个重建线程）"""
+        with self._lock:
+            self._pending.update(media_types)
+            if self._worker is not None and self._worker.is_alive():
+                return
+            self._worker = threading.Thread(target=self._refresh_pending, args=(db,), daemon=True)
+            self._worker.start()
+
+    def _refresh_pending(self, db):
+        while True:
+            with self._lock:
+                if not self._pending:
+                    self._worker = None
+                    return
+                media_type = self._pending.pop()
+            try:
+                self.rebuild(media_type, db)
+            except Exception as e:
+                print(f"重建联想索引失败: {media_type} | {str(e)}")
+
+    def stats(self):
+        with self._lock:
+            return {
+                'max_entries': self.max_entries,
+                'entries': dict(self._sizes),
+                'built_at': dict(self._built_at),
+                'pending': sorted(self._pending)
+            }
+
+
+index = SuggestIndex(env_loader.suggest_max_entries)
+_db = None
+
+
+def _get_db():
+    # connect_mysql 的扫描流程会导入本模块，这里延迟创建连接对象避免循环导入
+    global _db
+    if _db is None:
+        from codes import connect_mysql
+        _db = connect_mysql.Connect_mysql()
+    return _db
+
+
+def refresh(*media_types):
+    """扫描/清空数据后调用：后台重建这些媒体类型的联想索引"""
+    index.schedule_refresh(_get_db(), *(media_types or MEDIA_TYPES))
+
+
+def suggest(prefix, user_group=1, media_types=None, limit=10):
+    return index.suggest(prefix, user_group, media_types, limit)
+
+
+def stats():
+    return index.stats()
@@ -0,0 +1,142 @@
+"""
+缩略图生成失败记录
+
+损坏或不支持的视频每次生成缩略图都会把所有截图时间点的 ffmpeg 跑一遍，热门页面上的一个坏文件
+会不停地启动 ffmpeg。生成失败后在 thumbnail_failure 表中记录（按 video_id），退避期内
+/thumbnails 直接返回默认图，不再入队；退避时间按失败次数指数增长：
+    thumbnail_failure_backoff * 2^(失败次数-1)，上限 thumbnail_failure_backoff_max
+生成成功、手动重试或视频记录被删除（外键级联）时清除记录。
+"""
+from codes import env_loader
+
+
+_db = None
+
+
+def _get_db():
+    # 由缩略图队列的工作线程调用，延迟创建连接对象避免循环导入
+    global _db
+    if _db is None:
+        from codes import connect_mysql
+        _db = connect_mysql.Connect_mysql()
+    return _db
+
+
+def backoff_seconds(attempts):
+    """第 attempts 次失败后的退避秒数"""
+    base = max(1, env_loader.thumbnail_failure_backoff)
+    return min(env_loader.thumbnail_failure_backoff_max, base * 2 ** (max(1, attempts) - 1))
+
+
+def record_failure(video_id, error):
+    """记录一次生成失败，并按失败次数计算下次允许重试的时间"""
+    try:
+        with _get_db().connect() as conn:
+            with conn.cursor() as cursor:
+                cursor.execute("SELECT attempts FROM thumbnail_failure WHERE video_id = %s FOR UPDATE", (video_id,))
+                row = cursor.fetchone()
+                attempts = (row[0] if row else 0) + 1
+                delay = backoff_seconds(attempts)
+                cursor.execute("""
+                    INSERT INTO thumbnail_failure (video_id, attempts, last_error, last_failed_at, next_retry_at)
+                    VALUES (%s, %s, %s, NOW(), NOW() + INTERVAL %s SECOND)
+                    ON DUPLICATE KEY UPDATE
+                        attempts = VALUES(attempts),
+                        last_error = VALUES(last_error),
+                        last_failed_at = VALUES(last_failed_at),
+                        next_retry_at = VALUES(next_retry_at)
+                """, (video_id, attempts, (error or '')[:1000], delay))
+            conn.commit()
+        print(f"⚠️ 视频 {video_id} 缩略图生成失败（第{attempts}次），{delay} 秒内不再重试")
+    except Exception as e:
+        print(f"记录缩略图失败信息出错: {video_id} | {str(e)}")
+
+
+def clear(video_id):
+    """生成成功后清除失败记录"""
+    try:
+        with _get_db().connect() as conn:
+            with conn.cursor() as cursor:
+                cursor.execute("DELETE FROM thumbnail_failure WHERE video_id = %s", (video_id,))
+            conn.commit()
+    except Exception as e:
+        print(f"清除缩略图失败记录出错: {video_id} | {str(e)}")
+
+
+def list_failures(page=1, per_page=50):
+    """
+    分页列出失败记录（最近失败的在前）
+
+    Returns:
+        tuple: (总数, 记录列表)
+    """
+    page = max(1, int(page))
+    with _get_db().connect() as conn:
+        with conn.cursor() as cursor:
+            cursor.execute("SELECT COUNT(*) FROM thumbnail_failure")
+            total = cursor.fetchone()[0]
+            cursor.execute("""
+                SELECT tf.video_id, vi.video_name, vc.collection_name, tf.attempts, tf.last_error,
+                       tf.last_failed_at, tf.next_retry_at, tf.next_retry_at <= NOW()
+                FROM thumbnail_failure tf
+                JOIN video_item vi ON tf.video_id = vi.video_id
+                JOIN video_collection vc ON vi.collection_id = vc.collection_id
+                ORDER BY tf.last_failed_at DESC
+                LIMIT %s OFFSET %s
+            """, (per_page, (page - 1) * per_page))
+            items = [{
+                'video_id': video_id,
+                'video_name': video_name,
+                'category': category,
+                'attempts': attempts,
+                'last_error': last_error,
+                'last_failed_at': last_failed_at.strftime('%Y-%m-%d %H:%M:%S') if last_failed_at else None,
+                'next_retry_at': next_retry_at.strftime('%Y-%m-%d %H:%M:%S') if next_retry_at else None,
+                'retry_due': bool(retry_due)
+            } for video_id, video_name, category, attempts, last_error, last_failed_at, next_retry_at, retry_due
+                in cursor.fetchall()]
+    return total, items
+
+
+def retry(video_ids=None):
+    """
+    清除失败记录并立即重新加入缩略图队列
+
+    Args:
+        video_ids: 要重试的视频ID列表，None 表示全部
+
+    Returns:
+        int: 重新入队的数量
+    """
+    from codes import thumbnail_queue
+    where, params = "", []
+    if video_ids is not None:
+        if not video_ids:
+            return 0
+        where = f"WHERE tf.video_id IN ({', '.join(['%s'] * len(video_ids))})"
+        params = list(video_ids)
+
+    with _get_db().connect() as conn:
+        with conn.cursor() as cursor:
+            cursor.execute(f"""
+                SELECT tf.video_id, sd_thumb.mount_path, vc.thumbnail_root, vi.thumbnail_path,
+                       sd_video.mount_path, vc.storage_root, vi.relative_path, vi.video_name, vi.duration_ms
+                FROM thumbnail_failure tf
+                JOIN video_item vi ON tf.video_id = vi.video_id
+                JOIN video_collection vc ON vi.collection_id = vc.collection_id
+                JOIN storage_disk sd_video ON vc.disk_id = sd_video.disk_id
+                LEFT JOIN storage_disk sd_thumb ON vc.thumbnail_disk_id = sd_thumb.disk_id
+                {where}
+            """, params)
+            rows = cursor.fetchall()
+            cursor.execute(f"DELETE tf FROM thumbnail_failure tf {where}", params)
+        conn.commit()
+
+    queued = 0
+    for video_id, *paths, duration_ms in rows:
+        video_full_path, thumbnail_full_path = thumbnail_queue.thumbnail_paths(*paths)
+        if thumbnail_queue.enqueue(video_full_path, thumbnail_full_path, thumbnail_queue.PRIORITY_SCAN,
+                                   duration_ms, video_id):
+            queued += 1
+    print(f"🔁 已重新加入缩略图队列: {queued} 个")
+    return queued
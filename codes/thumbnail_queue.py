@@ -0,0 +1,163 @@
+"""
+缩略图后台生成队列
+
+缩略图原来在 /thumbnails 请求内同步生成：一次 MediaInfo 解析加最多 6 次 ffmpeg 截图，
+新分类第一次打开时几十个请求同时启动 ffmpeg，页面要等很久。现在改为：
+    - 请求发现缩略图缺失时只入队（高优先级），立即返回占位图并带 Retry-After，前端稍后重试
+    - 视频扫描结束后把缺失缩略图的视频入队（低优先级）预生成
+    - 固定数量（thumbnail_workers）的后台线程按优先级取任务调用 ffmpeg，并发的 ffmpeg 进程数不会超过它
+
+同一个缩略图路径只会排队一次；已排队的低优先级任务被页面请求到时提升为高优先级。
+带 video_id 的任务生成失败时写入 thumbnail_failure 表退避（见 thumbnail_failure 模块）。
+"""
+import heapq
+import itertools
+import threading
+from pathlib import Path
+from codes import env_loader
+
+
+# 数值越小越先处理
+PRIORITY_VISIBLE = 0     # 页面正在显示的缩略图
+PRIORITY_SCAN = 10       # 扫描后预生成
+
+QUEUED = 'queued'
+RUNNING = 'running'
+
+
+class ThumbnailQueue:
+
+    def __init__(self, workers, max_size):
+        self.workers = max(1, workers)
+        self.max_size = max_size
+        self._heap = []                 # (优先级, 序号, 缩略图路径)
+        self._queued = {}               # {缩略图路径: (优先级, 视频路径, 时长毫秒, 视频ID)}
+        self._running = set()
+        self._counter = itertools.count()
+        self._cond = threading.Condition()
+        self._threads = []
+        self._stats = {'generated': 0, 'failed': 0, 'dropped': 0}
+        self._last_error = None
+
+    def _ensure_workers(self):
+        # 第一次入队时才启动工作线程（调用方已持有锁）
+        self._threads = [t for t in self._threads if t.is_alive()]
+        for i in range(len(self._threads), self.workers):
+            thread = threading.Thread(target=self._work, name=f'thumbnail-{i}', daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def enqueue(self, video_path, thumbnail_path, priority=PRIORITY_SCAN, duration_ms=None, video_id=None):
+        """
+        缩略图加入生成队列
+
+        Args:
+            duration_ms: video_item 中已知的时长（毫秒），用来直接计算截图时间点，避免再解析一次文件
+            video_id: 视频ID，提供时生成失败会记录到 thumbnail_failure 表
+
+        Returns:
+            str: QUEUED/RUNNING 表示已在队列或正在生成；None 表示队列已满被丢弃
+        """
+        key = str(thumbnail_path)
+        with self._cond:
+            if key in self._running:
+                return RUNNING
+            queued = self._queued.get(key)
+            if queued is not None:
+                if priority < queued[0]:
+                    # 提升优先级：压入新条目，旧条目出队时按优先级不一致跳过
+                    self._queued[key] = (priority, queued[1], queued[2] or duration_ms, queued[3] or video_id)
+                    heapq.heappush(self._heap, (priority, next(self._counter), key))
+                    self._cond.notify()
+                return QUEUED
+            if priority >= PRIORITY_SCAN and len(self._queued) >= self.max_size:
+                self._stats['dropped'] += 1
+                return None
+            self._queued[key] = (priority, str(video_path), duration_ms, video_id)
+            heapq.heappush(self._heap, (priority, next(self._counter), key))
+            self._ensure_workers()
+            self._cond.notify()
+            return QUEUED
+
+    def _next_task(self):
+        with self._cond:
+            while True:
+                while self._heap:
+                    priority, _, key = heapq.heappop(self._heap)
+                    queued = self._queued.get(key)
+                    if queued is None or queued[0] != priority:
+                        continue   # 已提升过优先级的旧条目
+                    del self._queued[key]
+                    self._running.add(key)
+                    return (key,) + queued[1:]
+                self._cond.wait()
+
+    def _work(self):
+        # 延迟导入：function 模块依赖 flask 和数据库查询模块
+        from codes import function as fun
+        from codes import thumbnail_failure
+        while True:
+            thumbnail_path, video_path, duration_ms, video_id = self._next_task()
+            ok = False
+            errors = []
+            try:
+                if Path(thumbnail_path).exists():
+                    ok = True
+                else:
+                    ok = fun.generate_thumbnail(video_path, thumbnail_path, duration_ms, errors)
+            except Exception as e:
+                print(f"后台生成缩略图异常: {thumbnail_path} | {str(e)}")
+                errors.append(str(e))
+            finally:
+                with self._cond:
+                    self._running.discard(thumbnail_path)
+                    self._stats['generated' if ok else 'failed'] += 1
+                    if not ok:
+                        self._last_error = thumbnail_path
+            if video_id is not None:
+                if ok:
+                    thumbnail_failure.clear(video_id)
+                else:
+                    thumbnail_failure.record_failure(video_id, errors[-1] if errors else '生成失败')
+
+    def stats(self):
+        with self._cond:
+            by_priority = {}
+            for priority, *_ in self._queued.values():
+                by_priority[priority] = by_priority.get(priority, 0) + 1
+            return {
+                'workers': self.workers,
+                'alive_workers': sum(1 for t in self._threads if t.is_alive()),
+                'max_size': self.max_size,
+                'queued': len(self._queued),
+                'queued_visible': by_priority.get(PRIORITY_VISIBLE, 0),
+                'queued_scan': sum(n for p, n in by_priority.items() if p != PRIORITY_VISIBLE),
+                'running': len(self._running),
+                **self._stats,
+                'last_failed': self._last_error
+            }
+
+
+def thumbnail_paths(thumb_mount, thumbnail_root, thumbnail_path, video_mount, storage_root, relative_path, video_name):
+    """
+    按视频记录计算 (视频完整路径, 缩略图完整路径)
+
+    集合配置了缩略图目录且视频有 thumbnail_path 时缩略图在缩略图目录下，否则与视频同目录同名 .jpg
+    """
+    video_full_path = Path(video_mount) / storage_root / relative_path
+    if thumb_mount and thumbnail_root and thumbnail_path:
+        thumbnail_full_path = Path(thumb_mount) / thumbnail_root / thumbnail_path
+    else:
+        thumbnail_full_path = video_full_path.parent / f"{Path(video_name).stem}.jpg"
+    return video_full_path, thumbnail_full_path
+
+
+queue = ThumbnailQueue(env_loader.thumbnail_workers, env_loader.thumbnail_queue_size)
+
+
+def enqueue(video_path, thumbnail_path, priority=PRIORITY_SCAN, duration_ms=None, video_id=None):
+    return queue.enqueue(video_path, thumbnail_path, priority, duration_ms, video_id)
+
+
+def stats():
+    return queue.stats()
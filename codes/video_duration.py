@@ -0,0 +1,149 @@
+"""
+视频时长
+
+video_item.duration_ms 保存毫秒数（扫描时由 MediaInfo 写入），用于按时长筛选和排序；
+旧的 video_duration 字符串列（“1时2分3秒”）继续写入以兼容旧数据，接口返回的显示文本
+统一由 duration_ms 格式化生成。
+
+已有数据回填：
+    python -m codes.video_duration            # 从 video_duration 字符串换算
+    python -m codes.video_duration --probe    # 换算后仍为空的再用 MediaInfo 重新读取文件
+"""
+import os
+import re
+import sys
+
+
+_PART_PATTERN = re.compile(r'(\d+)\s*(时|分|秒)')
+_UNIT_SECONDS = {'时': 3600, '分': 60, '秒': 1}
+
+
+def format_duration(milliseconds):
+    """毫秒数格式化为显示文本，如 “1时2分3秒”"""
+    total_seconds = int(milliseconds // 1000)
+    hours = total_seconds // 3600
+    minutes = (total_seconds % 3600) // 60
+    seconds = total_seconds % 60
+    if hours > 0:
+        return f"{hours}时{minutes}分{seconds}秒"
+    elif minutes > 0:
+        return f"{minutes}分{seconds}秒"
+    else:
+        return f"{seconds}秒"
+
+
+def display_duration(duration_ms, legacy_text=None):
+    """接口返回的时长文本：优先用 duration_ms，没有时退回旧的字符串列"""
+    if duration_ms is not None:
+        return format_duration(duration_ms)
+    return legacy_text
+
+
+def parse_duration(text):
+    """把 “1时2分3秒” 形式的文本解析为毫秒数，无法解析返回 None"""
+    parts = _PART_PATTERN.findall(text or '')
+    if not parts:
+        return None
+    return sum(int(value) * _UNIT_SECONDS[unit] for value, unit in parts) * 1000
+
+
+def duration_string_seconds_sql(alias='vi'):
+    """在 SQL 中把 video_duration 字符串换算为秒（alias 为 video_item 的表别名）"""
+    column = f"{alias}.video_duration"
+    return f"""(
+    CASE WHEN {column} LIKE '%%时%%'
+         THEN CAST(SUBSTRING_INDEX({column}, '时', 1) AS UNSIGNED) * 3600 ELSE 0 END
+  + CASE WHEN {column} LIKE '%%分%%'
+         THEN CAST(SUBSTRING_INDEX(SUBSTRING_INDEX({column}, '分', 1), '时', -1) AS UNSIGNED) * 60 ELSE 0 END
+  + CASE WHEN {column} LIKE '%%秒%%'
+         THEN CAST(SUBSTRING_INDEX(SUBSTRING_INDEX({column}, '秒', 1), '分', -1) AS UNSIGNED) ELSE 0 END
+)"""
+
+
+def _probe_duration_ms(file_path):
+    from pymediainfo import MediaInfo
+    for track in MediaInfo.parse(file_path).tracks:
+        if track.track_type == "Video" and track.duration:
+            return int(float(track.duration))
+    return None
+
+
+def backfill(probe=False, batch_size=500):
+    """
+    回填 duration_ms 为空的视频
+
+    Args:
+        probe: 字符串无法换算的视频是否重新读取文件获取时长
+        batch_size: 重新读取时每批提交的行数
+
+    Returns:
+        dict: {'parsed': 由字符串换算的行数, 'probed': 重新读取成功数, 'probe_failed': 失败数}
+    """
+    from codes import connect_mysql
+    from codes import collection_stats
+    db = connect_mysql.Connect_mysql()
+    result = {'parsed': 0, 'probed': 0, 'probe_failed': 0}
+
+    with db.connect() as conn:
+        with conn.cursor() as cursor:
+            cursor.execute(f"""
+                UPDATE video_item vi
+                SET vi.duration_ms = {duration_string_seconds_sql('vi')} * 1000
+                WHERE vi.duration_ms IS NULL
+                  AND (vi.video_duration LIKE %s OR vi.video_duration LIKE %s OR vi.video_duration LIKE %s)
+            """, ('%时%', '%分%', '%秒%'))
+            result['parsed'] = cursor.rowcount
+        conn.commit()
+    print(f"✅ 已从时长文本换算 {result['parsed']} 个视频")
+
+    if probe:
+        with db.connect() as conn:
+            with conn.cursor() as cursor:
+                cursor.execute("""
+                    SELECT vi.video_id, sd.mount_path, vc.storage_root, vi.relative_path
+                    FROM video_item vi
+                    JOIN video_collection vc ON vi.collection_id = vc.collection_id
+                    JOIN storage_disk sd ON vc.disk_id = sd.disk_id
+                    WHERE vi.duration_ms IS NULL
+                """)
+                missing = cursor.fetchall()
+        print(f"🔍 需要重新读取时长的视频: {len(missing)} 个")
+
+        updates = []
+
+        def flush():
+            with db.connect() as conn:
+                with conn.cursor() as cursor:
+                    cursor.executemany("UPDATE video_item SET duration_ms = %s WHERE video_id = %s", updates)
+                conn.commit()
+            updates.clear()
+
+        for video_id, mount_path, storage_root, relative_path in missing:
+            file_path = os.path.join(mount_path, storage_root, relative_path)
+            try:
+                duration_ms = _probe_duration_ms(file_path)
+            except Exception as e:
+                print(f"读取视频时长失败: {file_path} | {str(e)}")
+                duration_ms = None
+            if duration_ms is None:
+                result['probe_failed'] += 1
+                continue
+            updates.append((duration_ms, video_id))
+            result['probed'] += 1
+            if len(updates) >= batch_size:
+                flush()
+        if updates:
+            flush()
+        print(f"✅ 重新读取时长: 成功 {result['probed']} 个，失败 {result['probe_failed']} 个")
+
+    # 集合总时长和分面计数都依赖 duration_ms
+    collection_stats.reconcile(['video'])
+    return result
+
+
+if __name__ == '__main__':
+    unknown = [arg for arg in sys.argv[1:] if arg != '--probe']
+    if unknown:
+        print("用法: python -m codes.video_duration [--probe]")
+        sys.exit(1)
+    backfill(probe='--probe' in sys.argv[1:])
@@ -0,0 +1,344 @@
+"""
+视频分面筛选（画质/编码/分辨率/时长/大小）
+
+筛选参数：
+    - 枚举：quality、codec（原始值）；resolution、duration、size（分档键，见 *_BUCKETS）
+      多个值用逗号分隔，同一分面内为 OR，不同分面之间为 AND；unknown 表示该属性缺失
+    - 范围：duration_min/duration_max（秒）、size_min/size_max（字节）、fps_min/fps_max
+    - 排序：sort=date|duration|size，order=desc|asc
+
+分面计数不再对每个分面各执行一次 COUNT：video_facet 表按
+(集合, 画质, 编码, 分辨率档, 时长档, 大小档) 预先聚合了视频数，扫描后按集合增量重算；
+侧边栏一次查询取回这些组合（规模只与组合数有关，和视频数无关），在内存中按
+“除本分面外的其余筛选条件” 汇总出每个分面的计数。带范围筛选时无法使用预聚合，
+改为对 video_item 做同样的一次分组查询。
+"""
+
+MB = 1024 * 1024
+GB = 1024 * MB
+UNKNOWN = 'unknown'
+
+# 分档：(键, 显示名, 下限(含), 上限(不含)，None 表示不限)
+RESOLUTION_BUCKETS = [
+    ('sd', '标清', None, 720),
+    ('hd', '720P', 720, 1080),
+    ('fhd', '1080P', 1080, 1440),
+    ('qhd', '2K', 1440, 2160),
+    ('uhd', '4K及以上', 2160, None),
+]
+# 时长分档单位为毫秒（与 duration_ms 列一致）
+DURATION_BUCKETS = [
+    ('short', '5分钟以内', None, 300 * 1000),
+    ('medium', '5-20分钟', 300 * 1000, 1200 * 1000),
+    ('long', '20-60分钟', 1200 * 1000, 3600 * 1000),
+    ('extra', '1小时以上', 3600 * 1000, None),
+]
+SIZE_BUCKETS = [
+    ('small', '100MB以内', None, 100 * MB),
+    ('medium', '100MB-1GB', 100 * MB, GB),
+    ('large', '1-4GB', GB, 4 * GB),
+    ('huge', '4GB以上', 4 * GB, None),
+]
+
+# 分辨率按短边分档，竖屏视频也能落到正确的档位
+RESOLUTION_SQL = "LEAST(vi.video_width, vi.video_height)"
+DURATION_SQL = "vi.duration_ms"
+SIZE_SQL = "vi.file_size"
+
+# 分面名 -> (video_facet 列, 明细值表达式, 缺失条件, 分档)
+FACETS = {
+    'quality': ('quality', "COALESCE(vi.video_quality, '')",
+                "(vi.video_quality IS NULL OR vi.video_quality = '')", None),
+    'codec': ('codec', "COALESCE(vi.video_codec, '')",
+              "(vi.video_codec IS NULL OR vi.video_codec = '')", None),
+    'resolution': ('resolution', RESOLUTION_SQL,
+                   "(vi.video_width IS NULL OR vi.video_height IS NULL)", RESOLUTION_BUCKETS),
+    'duration': ('duration_bucket', DURATION_SQL, "vi.duration_ms IS NULL", DURATION_BUCKETS),
+    'size': ('size_bucket', SIZE_SQL, "vi.file_size IS NULL", SIZE_BUCKETS),
+}
+FACET_NAMES = list(FACETS)
+
+# 枚举分面筛选时直接比较原始列，可以使用 idx_quality / idx_codec
+_ENUM_COLUMNS = {
+    'quality': "vi.video_quality",
+    'codec': "vi.video_codec",
+}
+
+# 范围筛选：名称 -> (列, 参数换算倍数)；duration_min/duration_max 以秒传入
+RANGES = {
+    'duration': (DURATION_SQL, 1000),
+    'size': (SIZE_SQL, 1),
+    'fps': ("vi.video_fps", 1),
+}
+
+SORTS = {
+    'date': "vi.video_id",
+    'duration': DURATION_SQL,
+    'size': "vi.file_size",
+}
+
+_db = None
+
+
+def _get_db():
+    # 扫描流程会导入本模块，这里延迟创建连接对象避免循环导入
+    global _db
+    if _db is None:
+        from codes import connect_mysql
+        _db = connect_mysql.Connect_mysql()
+    return _db
+
+
+def _range_sql(expr, low, high):
+    parts = []
+    if low is not None:
+        parts.append(f"{expr} >= {int(low)}")
+    if high is not None:
+        parts.append(f"{expr} < {int(high)}")
+    return ' AND '.join(parts) or '1 = 1'
+
+
+def _bucket_case(name):
+    """明细行所属分档的 CASE 表达式（枚举分面直接返回原值）"""
+    _, expr, missing_sql, buckets = FACETS[name]
+    if buckets is None:
+        return expr
+    whens = ' '.join(f"WHEN {_range_sql(expr, low, high)} THEN '{key}'" for key, _, low, high in buckets)
+    return f"(CASE WHEN {missing_sql} THEN '{UNKNOWN}' {whens} ELSE '{UNKNOWN}' END)"
+
+
+def _split(value):
+    return [v.strip() for v in (value or '').split(',') if v.strip()]
+
+
+def parse_filters(args):
+    """
+    解析筛选/排序参数（request.args）
+
+    Returns:
+        dict: {'selected': {分面: [值]}, 'ranges': {名称: (下限, 上限)}, 'sort': 列, 'order': 方向}
+
+    Raises:
+        ValueError: 分档键、数值或排序参数不合法
+    """
+    selected = {}
+    for name in FACET_NAMES:
+        values = _split(args.get(name))
+        buckets = FACETS[name][3]
+        if buckets is not None:
+            valid = {key for key, _, _, _ in buckets} | {UNKNOWN}
+            invalid = [v for v in values if v not in valid]
+            if invalid:
+                raise ValueError(f"无效的{name}筛选值: {', '.join(invalid)}")
+        if values:
+            selected[name] = values
+
+    ranges = {}
+    for name in RANGES:
+        low, high = args.get(f'{name}_min'), args.get(f'{name}_max')
+        if low in (None, '') and high in (None, ''):
+            continue
+        try:
+            ranges[name] = (float(low) if low not in (None, '') else None,
+                            float(high) if high not in (None, '') else None)
+        except ValueError:
+            raise ValueError(f"无效的{name}范围")
+
+    sort = args.get('sort', 'date')
+    order = args.get('order', 'desc').lower()
+    if sort not in SORTS:
+        raise ValueError(f"不支持的排序字段: {sort}")
+    if order not in ('asc', 'desc'):
+        raise ValueError(f"不支持的排序方向: {order}")
+    return {'selected': selected, 'ranges': ranges, 'sort': sort, 'order': order}
+
+
+def has_filters(filters):
+    return bool(filters['selected'] or filters['ranges'] or filters['sort'] != 'date' or filters['order'] != 'desc')
+
+
+def cache_term(filters, category=''):
+    """筛选条件的规范化字符串，用作总数缓存的键"""
+    selected = ';'.join(f"{k}={','.join(sorted(v))}" for k, v in sorted(filters['selected'].items()))
+    ranges = ';'.join(f"{k}={v[0]}~{v[1]}" for k, v in sorted(filters['ranges'].items()))
+    return f"{category}|{selected}|{ranges}"
+
+
+def _selection_sql(name, values):
+    """单个分面的筛选条件（同一分面内 OR）"""
+    _, expr, missing_sql, buckets = FACETS[name]
+    conditions, params = [], []
+    if buckets is None:
+        known = [v for v in values if v != UNKNOWN]
+        if known:
+            conditions.append(f"{_ENUM_COLUMNS[name]} IN ({','.join(['%s'] * len(known))})")
+            params.extend(known)
+    else:
+        bounds = {key: (low, high) for key, _, low, high in buckets}
+        for value in values:
+            if value != UNKNOWN:
+                low, high = bounds[value]
+                conditions.append(f"(NOT {missing_sql} AND {_range_sql(expr, low, high)})")
+    if UNKNOWN in values:
+        conditions.append(missing_sql)
+    return f"({' OR '.join(conditions)})", params
+
+
+def where_sql(filters):
+    """
+    视频明细的筛选条件（表别名 vi）
+
+    Returns:
+        tuple: (SQL 片段列表, 参数列表)，调用方用 AND 拼接
+    """
+    conditions, params = [], []
+    for name, values in filters['selected'].items():
+        sql, sql_params = _selection_sql(name, values)
+        conditions.append(sql)
+        params.extend(sql_params)
+    for name, (low, high) in filters['ranges'].items():
+        expr, scale = RANGES[name]
+        if low is not None:
+            conditions.append(f"{expr} >= %s")
+            params.append(low * scale)
+        if high is not None:
+            conditions.append(f"{expr} <= %s")
+            params.append(high * scale)
+    return conditions, params
+
+
+def order_sql(filters):
+    direction = 'ASC' if filters['order'] == 'asc' else 'DESC'
+    expr = SORTS[filters['sort']]
+    if filters['sort'] == 'date':
+        return f" ORDER BY {expr} {direction}"
+    return f" ORDER BY {expr} {direction}, vi.video_id {direction}"
+
+
+def refresh(cursor, collection_ids=None):
+    """
+    重算 video_facet 中指定集合的预聚合计数（调用方负责提交事务）
+
+    Args:
+        cursor: 数据库游标
+        collection_ids: 需要重算的集合ID，None 表示全部
+    """
+    if collection_ids is None:
+        scope_sql, params = "", []
+        cursor.execute("DELETE FROM video_facet")
+    else:
+        ids = sorted({cid for cid in collection_ids if cid})
+        if not ids:
+            return
+        placeholders = ','.join(['%s'] * len(ids))
+        scope_sql, params = f"WHERE vi.collection_id IN ({placeholders})", ids
+        cursor.execute(f"DELETE FROM video_facet WHERE collection_id IN ({placeholders})", ids)
+
+    dims = ', '.join(_bucket_case(name) for name in FACET_NAMES)
+    cursor.execute(f"""
+        INSERT INTO video_facet (collection_id, quality, codec, resolution, duration_bucket, size_bucket, item_count)
+        SELECT vi.collection_id, {dims}, COUNT(*)
+        FROM video_item vi
+        {scope_sql}
+        GROUP BY 1, 2, 3, 4, 5, 6
+    """, params)
+
+
+def refresh_all():
+    """重建全部集合的预聚合计数（清空视频表后调用）"""
+    try:
+        with _get_db().connect() as conn:
+            with conn.cursor() as cursor:
+                refresh(cursor)
+            conn.commit()
+    except Exception as e:
+        print(f"重建视频分面计数失败: {str(e)}")
+
+
+def _facet_rows(cursor, filters, user_group, category):
+    """
+    取回 (画质, 编码, 分辨率档, 时长档, 大小档, 视频数) 组合
+
+    没有范围筛选时读取预聚合表，否则对明细做一次分组查询
+    """
+    base_sql = "vc.group_id <= %s"
+    params = [user_group]
+    if category:
+        base_sql += " AND vc.collection_name = %s"
+        params.append(category)
+
+    if not filters['ranges']:
+        columns = ', '.join(f"f.{FACETS[name][0]}" for name in FACET_NAMES)
+        cursor.execute(f"""
+            SELECT {columns}, SUM(f.item_count)
+            FROM video_facet f
+            JOIN video_collection vc ON f.collection_id = vc.collection_id
+            WHERE {base_sql}
+            GROUP BY 1, 2, 3, 4, 5
+        """, params)
+        return cursor.fetchall()
+
+    range_conditions, range_params = where_sql({'selected': {}, 'ranges': filters['ranges']})
+    dims = ', '.join(_bucket_case(name) for name in FACET_NAMES)
+    cursor.execute(f"""
+        SELECT {dims}, COUNT(*)
+        FROM video_item vi
+        JOIN video_collection vc ON vi.collection_id = vc.collection_id
+        WHERE {base_sql} AND {' AND '.join(range_conditions)}
+        GROUP BY 1, 2, 3, 4, 5
+    """, params + range_params)
+    return cursor.fetchall()
+
+
+def _labels(name):
+    buckets = FACETS[name][3]
+    labels = {UNKNOWN: '未知'}
+    if buckets is not None:
+        labels.update({key: label for key, label, _, _ in buckets})
+    return labels
+
+
+def get_facets(filters, user_group=1, category=''):
+    """
+    计算各分面的取值计数（每个分面的计数应用其余分面的筛选条件）
+
+    Returns:
+        dict: {'total': 满足全部筛选条件的视频数,
+               'facets': {分面: [{'value', 'label', 'count', 'selected'}]}}
+    """
+    with _get_db().connect() as conn:
+        with conn.cursor() as cursor:
+            rows = _facet_rows(cursor, filters, user_group, category)
+
+    selected = {name: set(values) for name, values in filters['selected'].items()}
+    counts = {name: {} for name in FACET_NAMES}
+    total = 0
+    for row in rows:
+        values = {name: (row[i] or UNKNOWN) for i, name in enumerate(FACET_NAMES)}
+        count = int(row[-1] or 0)
+        misses = [name for name in selected if values[name] not in selected[name]]
+        if not misses:
+            total += count
+        for name in FACET_NAMES:
+            if not misses or misses == [name]:
+                counts[name][values[name]] = counts[name].get(values[name], 0) + count
+
+    facets = {}
+    for name in FACET_NAMES:
+        labels = _labels(name)
+        buckets = FACETS[name][3]
+        if buckets is not None:
+            order = [key for key, _, _, _ in buckets] + [UNKNOWN]
+            items = [(key, counts[name][key]) for key in order if key in counts[name]]
+        else:
+            items = sorted(counts[name].items(), key=lambda item: (item[0] == UNKNOWN, -item[1]))
+        facets[name] = [
+            {
+                'value': value,
+                'label': labels.get(value, value),
+                'count': count,
+                'selected': value in selected.get(name, ())
+            }
+            for value, count in items
+        ]
+    return {'total': total, 'facets': facets}
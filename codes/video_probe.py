@@ -0,0 +1,183 @@
+"""
+视频元信息探测池
+
+MediaInfo 解析损坏文件时可能长时间卡在原生库里，线程无法被中断。子进程模式下每个探测工作者对应一个
+常驻子进程（python -m codes.video_probe），通过标准输入/输出逐行交换 JSON：
+    请求: {"path": "..."}
+    响应: {"ok": true, "track": {...}} / {"ok": false, "error": "..."}
+超过 timeout 秒没有响应时立即 kill 该子进程，下一个任务到来时再启动新的，卡住的文件不会长期占用名额。
+子进程只导入 pymediainfo 和本模块，不会重新导入 main.py。
+
+线程模式直接在线程中解析，没有进程开销，但超时的解析无法中止，只是不再等待它的结果。
+"""
+import json
+import os
+import queue
+import subprocess
+import sys
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+
+_PROJECT_ROOT = Path(__file__).resolve().parent.parent
+
+
+class ProbeTimeout(Exception):
+    """单个文件的解析超时（子进程已被终止）"""
+
+
+def video_track(media_info):
+    """取第一条视频轨的原始字段，没有视频轨返回 None"""
+    for track in media_info.tracks:
+        if track.track_type == "Video":
+            return {
+                'duration': track.duration,
+                'width': track.width,
+                'height': track.height,
+                'bit_rate': track.bit_rate,
+                'frame_rate': track.frame_rate,
+                'codec': track.codec
+            }
+    return None
+
+
+def parse(file_path):
+    """在当前线程中解析"""
+    from pymediainfo import MediaInfo
+    return video_track(MediaInfo.parse(file_path))
+
+
+class _ProbeProcess:
+    """一个常驻探测子进程，同一时间只处理一个文件（由 ProbePool 保证）"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._proc = None
+        self._replies = None
+        self.closed = False
+
+    def _ensure_started(self):
+        with self._lock:
+            if self.closed:
+                raise RuntimeError('探测池已关闭')
+            if self._proc is not None and self._proc.poll() is None:
+                return self._proc, self._replies
+            self._proc = subprocess.Popen(
+                [sys.executable, '-m', 'codes.video_probe'],
+                stdin=subprocess.PIPE,
+                stdout=subprocess.PIPE,
+                cwd=str(_PROJECT_ROOT),
+                creationflags=subprocess.CREATE_NO_WINDOW if os.name == 'nt' else 0
+            )
+            self._replies = queue.Queue()
+            threading.Thread(target=self._read_replies, args=(self._proc, self._replies),
+                             name='video-probe-reader', daemon=True).start()
+            return self._proc, self._replies
+
+    @staticmethod
+    def _read_replies(proc, replies):
+        for line in proc.stdout:
+            replies.put(line)
+        replies.put(None)   # 子进程已退出
+
+    def probe(self, file_path, timeout):
+        proc, replies = self._ensure_started()
+        try:
+            proc.stdin.write(json.dumps({'path': file_path}).encode('ascii') + b'\n')
+            proc.stdin.flush()
+        except OSError:
+            self.kill()
+            raise RuntimeError('探测子进程已退出')
+        try:
+            line = replies.get(timeout=timeout)
+        except queue.Empty:
+            self.kill()
+            raise ProbeTimeout(f'解析超过 {timeout} 秒，已终止探测子进程')
+        if line is None:
+            self.kill()
+            raise RuntimeError('探测子进程意外退出')
+        reply = json.loads(line)
+        if not reply['ok']:
+            raise RuntimeError(reply['error'])
+        return reply['track']
+
+    def kill(self):
+        with self._lock:
+            proc, self._proc = self._proc, None
+        if proc is not None and proc.poll() is None:
+            proc.kill()
+            proc.wait()
+
+    def close(self):
+        with self._lock:
+            self.closed = True
+        self.kill()
+
+
+class ProbePool:
+    """子进程模式：workers 个常驻子进程，超时立即终止"""
+
+    # 工作者自行超时，调用方不需要另设等待超时
+    wait_timeout = None
+
+    def __init__(self, workers, timeout):
+        self.timeout = timeout
+        self._processes = [_ProbeProcess() for _ in range(workers)]
+        self._idle = queue.SimpleQueue()
+        for process in self._processes:
+            self._idle.put(process)
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='video-probe')
+
+    def submit(self, file_path):
+        return self._executor.submit(self._probe, file_path)
+
+    def _probe(self, file_path):
+        process = self._idle.get()
+        try:
+            return process.probe(file_path, self.timeout)
+        finally:
+            self._idle.put(process)
+
+    def shutdown(self):
+        """取消排队的任务并终止所有子进程（正在进行的解析随之失败返回）"""
+        self._executor.shutdown(wait=False, cancel_futures=True)
+        for process in self._processes:
+            process.close()
+
+
+class ThreadProbePool:
+    """线程模式：超时的解析无法中止，调用方按 wait_timeout 放弃等待"""
+
+    def __init__(self, workers, timeout):
+        self.wait_timeout = timeout
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='video-probe')
+
+    def submit(self, file_path):
+        return self._executor.submit(parse, file_path)
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+
+def create_pool(mode, workers, timeout):
+    """mode: process=常驻子进程（默认），thread=线程"""
+    if mode == 'thread':
+        return ThreadProbePool(workers, timeout)
+    return ProbePool(workers, timeout)
+
+
+def _serve():
+    """子进程入口：逐行读取请求并返回解析结果，标准输入关闭（父进程退出）时结束"""
+    from pymediainfo import MediaInfo
+    for line in sys.stdin.buffer:
+        try:
+            reply = {'ok': True, 'track': video_track(MediaInfo.parse(json.loads(line)['path']))}
+        except Exception as e:
+            reply = {'ok': False, 'error': str(e)}
+        sys.stdout.buffer.write(json.dumps(reply).encode('ascii') + b'\n')
+        sys.stdout.buffer.flush()
+
+
+if __name__ == '__main__':
+    _serve()
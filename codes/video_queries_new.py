@@ -1,5 +1,14 @@
 from codes.connect_mysql import Connect_mysql
 from pathlib import Path
+from codes import pagination
+from codes import count_cache
+from codes import search_index
+from codes import scan_manifest
+from codes import video_facets
+from codes import video_duration as duration_util
+from codes import derivative_store
+from codes import env_loader
+from codes import hls_packager
 
 db = Connect_mysql()
 
@@ -54,6 +63,7 @@ def insert_video_collection(disk_id, collection_name, storage_root, group_id=1,
                      thumbnail_disk_id, thumbnail_root)
                     VALUES (%s, %s, %s, %s, %s, %s, %s)
                     ON DUPLICATE KEY UPDATE
+                    collection_id = LAST_INSERT_ID(collection_id),
                     group_id = VALUES(group_id),
                     description = VALUES(description),
                     thumbnail_disk_id = VALUES(thumbnail_disk_id),
@@ -62,19 +72,8 @@ def insert_video_collection(disk_id, collection_name, storage_root, group_id=1,
                 """, (disk_id, collection_name, storage_root, group_id, description, 
                       thumbnail_disk_id, thumbnail_root))
                 
-                # 获取插入或更新的集合ID
-                cursor.execute("SELECT LAST_INSERT_ID()")
-                result = cursor.fetchone()
-                collection_id = result[0]
-                
-                # 如果LAST_INSERT_ID()返回0，说明是更新操作，需要查询实际ID
-                if collection_id == 0:
-                    cursor.execute("""
-                        SELECT collection_id FROM video_collection 
-                        WHERE disk_id = %s AND collection_name = %s
-                    """, (disk_id, collection_name))
-                    result = cursor.fetchone()
-                    collection_id = result[0] if result else None
+                # 插入和更新两种情况下 lastrowid 都是该集合的ID（更新时由 LAST_INSERT_ID(collection_id) 设置）
+                collection_id = cursor.lastrowid
                 
                 conn.commit()
                 return collection_id
@@ -86,7 +85,8 @@ def insert_video_collection(disk_id, collection_name, storage_root, group_id=1,
 def insert_video_item(collection_id, relative_path, video_name, file_size=None, 
                      video_duration=None, video_quality=None, video_width=None, 
                      video_height=None, video_bitrate=None, video_fps=None, 
-                     video_codec=None, thumbnail_path=None):
+                     video_codec=None, thumbnail_path=None, file_mtime=None, file_inode=None,
+                     duration_ms=None):
     """
     插入新的视频条目
     
@@ -94,6 +94,9 @@ def insert_video_item(collection_id, relative_path, video_name, file_size=None,
         collection_id: 所属集合ID
         relative_path: 相对路径（含文件名）
         video_name: 视频文件名
+        file_mtime: 文件修改时间（纳秒，增量扫描指纹）
+        file_inode: 文件inode（增量扫描指纹）
+        duration_ms: 视频时长（毫秒）
         其他参数: 视频元信息
     
     Returns:
@@ -105,13 +108,15 @@ def insert_video_item(collection_id, relative_path, video_name, file_size=None,
                 cursor.execute("""
                     INSERT INTO video_item 
                     (collection_id, relative_path, video_name, file_size, 
-                     video_duration, video_quality, video_width, video_height, 
-                     video_bitrate, video_fps, video_codec, thumbnail_path)
-                    VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
+                     video_duration, duration_ms, video_quality, video_width, video_height, 
+                     video_bitrate, video_fps, video_codec, thumbnail_path,
+                     file_mtime, file_inode, path_hash)
+                    VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
                     ON DUPLICATE KEY UPDATE
                     video_name = VALUES(video_name),
                     file_size = VALUES(file_size),
                     video_duration = VALUES(video_duration),
+                    duration_ms = VALUES(duration_ms),
                     video_quality = VALUES(video_quality),
                     video_width = VALUES(video_width),
                     video_height = VALUES(video_height),
@@ -119,10 +124,13 @@ def insert_video_item(collection_id, relative_path, video_name, file_size=None,
                     video_fps = VALUES(video_fps),
                     video_codec = VALUES(video_codec),
                     thumbnail_path = VALUES(thumbnail_path),
+                    file_mtime = VALUES(file_mtime),
+                    file_inode = VALUES(file_inode),
                     update_time = CURRENT_TIMESTAMP(3)
                 """, (collection_id, relative_path, video_name, file_size, 
-                      video_duration, video_quality, video_width, video_height, 
-                      video_bitrate, video_fps, video_codec, thumbnail_path))
+                      video_duration, duration_ms, video_quality, video_width, video_height, 
+                      video_bitrate, video_fps, video_codec, thumbnail_path,
+                      file_mtime, file_inode, scan_manifest.path_hash(relative_path)))
                 conn.commit()
                 return True
                 
@@ -130,18 +138,112 @@ def insert_video_item(collection_id, relative_path, video_name, file_size=None,
         print(f'插入视频条目异常：{str(e)}')
         return False
 
-def get_videos_paginated_new(page=1, per_page=20, category='', user_group=1):
+def insert_video_items_batch(rows):
+    """
+    批量插入/更新视频条目（一次往返写入一批，已存在的按唯一键更新元信息）
+    
+    Args:
+        rows: 元组列表，字段顺序为 (collection_id, relative_path, video_name, file_size,
+              video_duration, duration_ms, video_quality, video_width, video_height, video_bitrate,
+              video_fps, video_codec, thumbnail_path, file_mtime, file_inode)，
+              path_hash 由 relative_path 计算后追加
+    
+    Returns:
+        bool: 写入是否成功
+    """
+    if not rows:
+        return True
+    try:
+        with db.connect() as conn:
+            with conn.cursor() as cursor:
+                cursor.executemany("""
+                    INSERT INTO video_item 
+                    (collection_id, relative_path, video_name, file_size, 
+                     video_duration, duration_ms, video_quality, video_width, video_height, 
+                     video_bitrate, video_fps, video_codec, thumbnail_path,
+                     file_mtime, file_inode, path_hash)
+                    VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
+                    ON DUPLICATE KEY UPDATE
+                    video_name = VALUES(video_name),
+                    file_size = VALUES(file_size),
+                    video_duration = VALUES(video_duration),
+                    duration_ms = VALUES(duration_ms),
+                    video_quality = VALUES(video_quality),
+                    video_width = VALUES(video_width),
+                    video_height = VALUES(video_height),
+                    video_bitrate = VALUES(video_bitrate),
+                    video_fps = VALUES(video_fps),
+                    video_codec = VALUES(video_codec),
+                    thumbnail_path = VALUES(thumbnail_path),
+                    file_mtime = VALUES(file_mtime),
+                    file_inode = VALUES(file_inode),
+                    update_time = CURRENT_TIMESTAMP(3)
+                """, [tuple(row) + (scan_manifest.path_hash(row[1]),) for row in rows])
+                conn.commit()
+                return True
+                
+    except Exception as e:
+        print(f'批量插入视频条目异常：{str(e)}')
+        return False
+
+def _video_row_to_dict(row):
+    """
+    把视频列表查询的一行转换为接口返回的字典
+    
+    行字段顺序: video_id, category, full_path, relative_path, video_name, video_duration,
+    video_quality, group_id, file_size, video_width, video_height, thumbnail_path, duration_ms
+    """
+    # 构建缩略图路径 - 修复版
+    if row[11]:  # thumbnail_path 存在
+        thumbnail_url = f"/thumbnails/{row[11]}"
+    else:
+        # 生成默认缩略图路径 - 修复路径构建逻辑
+        video_relative_path = row[3]  # 例如: "分类1/video1.mp4"
+        video_name = row[4]           # 例如: "video1.mp4"
+        video_name_no_ext = Path(video_name).stem  # 例如: "video1"
+        
+        # 构建缩略图相对路径：目录保持不变，只替换文件名
+        video_path_obj = Path(video_relative_path)
+        thumbnail_relative_path = video_path_obj.parent / f"{video_name_no_ext}.jpg"
+        thumbnail_url = f"/thumbnails/{thumbnail_relative_path}"
+    
+    return {
+        'id': row[0],
+        'category': row[1],
+        'video_path': str(Path(row[3][7:] if row[3].startswith('Videos/') and '/' in row[3][7:] else row[3]).parent) if (row[3][7:] if row[3].startswith('Videos/') and '/' in row[3][7:] else row[3]) != Path(row[3][7:] if row[3].startswith('Videos/') and '/' in row[3][7:] else row[3]).name else "",  # 智能修复路径前缀
+        'video_name': row[4],
+        'video_duration': duration_util.display_duration(row[12], row[5]),
+        'duration_ms': row[12],
+        'video_quality': row[6],
+        'group_id': row[7],
+        'is_vip': row[7] > 1,
+        'file_size': row[8],
+        'video_width': row[9],
+        'video_height': row[10],
+        'thumbnail_url': thumbnail_url,
+        'thumbnail_srcset': derivative_store.srcset(thumbnail_url),  # 各宽度的缩放图，可直接用于 <img srcset>
+        'video_play_url': f"/media/video/{row[0]}",  # 按ID访问，服务端一次主键查询
+        # 悬停预览的 WebVTT 索引（cue 指向雪碧图区域），时长未知的视频无法均匀取帧
+        'storyboard_url': f"/media/video/{row[0]}/storyboard.vtt" if env_loader.storyboard_enabled and row[12] else None,
+        # 大视频/浏览器无法直接播放的容器提供 HLS 播放列表，播放器只请求需要的分片
+        'hls_url': f"/media/video/{row[0]}/hls/index.m3u8" if hls_packager.wants_hls(row[4], row[8]) else None,
+        'full_path': row[3][7:] if row[3].startswith('Videos/') and '/' in row[3][7:] else row[3],  # 智能修复：只在嵌套情况下去掉Videos前缀
+        'relative_path': row[3]  # 相对路径
+    }
+
+def get_videos_paginated_new(page=1, per_page=20, category='', user_group=1, page_cursor=None):
     """
     获取分页的视频列表（新表结构版本）
     
     Args:
-        page: 当前页码（从1开始）
+        page: 当前页码（从1开始，传了游标时忽略）
         per_page: 每页显示数量
         category: 分类名称（可选）
         user_group: 用户权限组（1=普通用户，2=VIP用户）
+        page_cursor: 上一次返回的 next_cursor/prev_cursor（可选，按主键索引定位，深翻页不变慢）
     
     Returns:
-        tuple: (总数量, 视频列表)
+        tuple: (总数量, 视频列表, 游标信息 {next_cursor, prev_cursor, has_more})
     """
     try:
         with db.connect() as conn:
@@ -168,7 +270,8 @@ def get_videos_paginated_new(page=1, per_page=20, category='', user_group=1):
                         vi.file_size,
                         vi.video_width,
                         vi.video_height,
-                        vi.thumbnail_path
+                        vi.thumbnail_path,
+                        vi.duration_ms
                 """ + base_query
                 
                 # 参数列表，第一个参数是user_group
@@ -180,56 +283,116 @@ def get_videos_paginated_new(page=1, per_page=20, category='', user_group=1):
                     data_query += " AND vc.collection_name = %s"
                     params.append(category)
                 
-                # 获取总数
-                cursor.execute(count_query, params)
-                total_count = cursor.fetchone()[0]
+                # 获取总数（走总数缓存，扫描/清空后失效）
+                def count_videos():
+                    cursor.execute(count_query, params)
+                    return cursor.fetchone()[0]
+                total_count, count_exact = count_cache.get_count(
+                    'video', user_group, 'category' if category else 'all', category, count_videos, 'item_count')
                 
-                # 添加分页
-                data_query += " ORDER BY vi.video_id DESC LIMIT %s OFFSET %s"
-                offset = (page - 1) * per_page
-                params.extend([per_page, offset])
+                # 添加分页（有游标时按主键定位，否则按页码偏移）
+                keyset = pagination.KeysetPage('vi.video_id', per_page, page_cursor, page)
+                cond_sql, cond_params = keyset.condition()
+                tail_sql, tail_params = keyset.order_and_limit()
+                data_query += f" AND {cond_sql}" + tail_sql
+                params.extend(cond_params + tail_params)
                 
                 # 获取数据
                 cursor.execute(data_query, params)
                 videos = []
-                for row in cursor.fetchall():
-                    # 构建缩略图路径 - 修复版
-                    if row[11]:  # thumbnail_path 存在
-                        thumbnail_url = f"/thumbnails/{row[11]}"
-                    else:
-                        # 生成默认缩略图路径 - 修复路径构建逻辑
-                        video_relative_path = row[3]  # 例如: "分类1/video1.mp4"
-                        video_name = row[4]           # 例如: "video1.mp4"
-                        video_name_no_ext = Path(video_name).stem  # 例如: "video1"
-                        
-                        # 构建缩略图相对路径：目录保持不变，只替换文件名
-                        video_path_obj = Path(video_relative_path)
-                        thumbnail_relative_path = video_path_obj.parent / f"{video_name_no_ext}.jpg"
-                        thumbnail_url = f"/thumbnails/{thumbnail_relative_path}"
-                    
-                    videos.append({
-                        'id': row[0],
-                        'category': row[1],
-                        'video_path': str(Path(row[3][7:] if row[3].startswith('Videos/') and '/' in row[3][7:] else row[3]).parent) if (row[3][7:] if row[3].startswith('Videos/') and '/' in row[3][7:] else row[3]) != Path(row[3][7:] if row[3].startswith('Videos/') and '/' in row[3][7:] else row[3]).name else "",  # 智能修复路径前缀
-                        'video_name': row[4],
-                        'video_duration': row[5],
-                        'video_quality': row[6],
-                        'group_id': row[7],
-                        'is_vip': row[7] > 1,
-                        'file_size': row[8],
-                        'video_width': row[9],
-                        'video_height': row[10],
-                        'thumbnail_url': thumbnail_url,
-                        'full_path': row[3][7:] if row[3].startswith('Videos/') and '/' in row[3][7:] else row[3],  # 智能修复：只在嵌套情况下去掉Videos前缀
-                        'relative_path': row[3]  # 相对路径
-                    })
+                for row in keyset.finish(cursor.fetchall()):
+                    videos.append(_video_row_to_dict(row))
                 
-                return total_count, videos
+                return total_count, videos, {**keyset.page_info, 'count_exact': count_exact}
                 
     except Exception as e:
         print(f"获取视频列表失败: {str(e)}")
         raise
 
+def get_videos_faceted_new(filters, page=1, per_page=20, category='', user_group=1, page_cursor=None):
+    """
+    按分面筛选/排序获取视频列表
+    
+    Args:
+        filters: video_facets.parse_filters 的结果
+        page: 当前页码（按时间倒序时可改用游标）
+        per_page: 每页显示数量
+        category: 分类名称（可选）
+        user_group: 用户权限组（1=普通用户，2=VIP用户）
+        page_cursor: 游标（仅 sort=date、order=desc 时可用，其余排序按页码偏移分页）
+    
+    Returns:
+        tuple: (总数量, 视频列表, 游标信息)
+    """
+    try:
+        with db.connect() as conn:
+            with conn.cursor() as cursor:
+                conditions, params = video_facets.where_sql(filters)
+                conditions.insert(0, "vc.group_id <= %s")
+                params.insert(0, user_group)
+                if category:
+                    conditions.insert(1, "vc.collection_name = %s")
+                    params.insert(1, category)
+                where = ' AND '.join(conditions)
+                
+                # 获取总数（走总数缓存，扫描/清空后失效）
+                def count_videos():
+                    cursor.execute(f"""
+                        SELECT COUNT(*)
+                        FROM video_item vi
+                        JOIN video_collection vc ON vi.collection_id = vc.collection_id
+                        WHERE {where}
+                    """, params)
+                    return cursor.fetchone()[0]
+                total_count, count_exact = count_cache.get_count(
+                    'video', user_group, 'facet', video_facets.cache_term(filters, category), count_videos)
+                
+                data_query = f"""
+                    SELECT 
+                        vi.video_id,
+                        vc.collection_name as category,
+                        CONCAT(sd.mount_path, vc.storage_root, '/', vi.relative_path) as full_path,
+                        vi.relative_path,
+                        vi.video_name,
+                        vi.video_duration,
+                        vi.video_quality,
+                        vc.group_id,
+                        vi.file_size,
+                        vi.video_width,
+                        vi.video_height,
+                        vi.thumbnail_path,
+                        vi.duration_ms
+                    FROM video_item vi
+                    JOIN video_collection vc ON vi.collection_id = vc.collection_id
+                    JOIN storage_disk sd ON vc.disk_id = sd.disk_id
+                    WHERE {where}
+                """
+                
+                videos = []
+                if filters['sort'] == 'date' and filters['order'] == 'desc':
+                    # 默认顺序与普通列表一致，可以继续使用主键游标
+                    keyset = pagination.KeysetPage('vi.video_id', per_page, page_cursor, page)
+                    cond_sql, cond_params = keyset.condition()
+                    tail_sql, tail_params = keyset.order_and_limit()
+                    cursor.execute(data_query + f" AND {cond_sql}" + tail_sql, params + cond_params + tail_params)
+                    for row in keyset.finish(cursor.fetchall()):
+                        videos.append(_video_row_to_dict(row))
+                    page_info = keyset.page_info
+                else:
+                    offset = (max(1, int(page)) - 1) * per_page
+                    cursor.execute(data_query + video_facets.order_sql(filters) + " LIMIT %s OFFSET %s",
+                                   params + [per_page + 1, offset])
+                    rows = cursor.fetchall()
+                    for row in rows[:per_page]:
+                        videos.append(_video_row_to_dict(row))
+                    page_info = {**pagination.empty_page_info(), 'has_more': len(rows) > per_page}
+                
+                return total_count, videos, {**page_info, 'count_exact': count_exact}
+                
+    except Exception as e:
+        print(f"筛选视频列表失败: {str(e)}")
+        raise
+
 def get_video_categories_new():
     """
     获取所有视频分类（新表结构版本）
@@ -243,12 +406,12 @@ def get_video_categories_new():
                 cursor.execute("""
                     SELECT 
                         vc.collection_name,
-                        COUNT(vi.video_id) as video_count,
+                        vc.item_count as video_count,
                         vc.group_id,
-                        vc.description
+                        vc.description,
+                        vc.total_bytes,
+                        vc.total_duration
                     FROM video_collection vc
-                    LEFT JOIN video_item vi ON vc.collection_id = vi.collection_id
-                    GROUP BY vc.collection_id, vc.collection_name, vc.group_id, vc.description
                     ORDER BY vc.collection_name
                 """)
                 
@@ -260,7 +423,9 @@ def get_video_categories_new():
                         'video_count': row[1],  # 保留兼容性
                         'group_id': row[2],
                         'is_vip': row[2] > 1,
-                        'description': row[3]
+                        'description': row[3],
+                        'total_bytes': row[4],
+                        'total_duration': row[5]
                     })
                 
                 return categories
@@ -269,41 +434,45 @@ def get_video_categories_new():
         print(f"获取视频分类失败: {str(e)}")
         raise
 
-def search_videos_by_name_new(keyword, page=1, per_page=20, user_group=1):
+def search_videos_by_name_new(keyword, page=1, per_page=20, user_group=1, page_cursor=None):
     """
     按名称搜索视频（新表结构版本）
     
     Args:
         keyword: 搜索关键词
-        page: 页码，默认为1
+        page: 页码，默认为1（传了游标时忽略）
         per_page: 每页数量，默认为20
         user_group: 用户权限组（1=普通用户，2=VIP用户）
+        page_cursor: 上一次返回的 next_cursor/prev_cursor（可选）
     
     Returns:
-        tuple: (符合条件的视频总数, 当前页的视频列表)
+        tuple: (符合条件的视频总数, 当前页的视频列表, 游标信息)
     """
     try:
         with db.connect() as conn:
             with conn.cursor() as cursor:
-                # 构建模糊查询 - 先获取符合条件的总数，添加权限过滤
-                count_query = """
+                # 全文检索条件（ngram 索引）- 先获取符合条件的总数，添加权限过滤
+                search = search_index.clause('video', keyword)
+                count_query = f"""
                     SELECT COUNT(*) 
                     FROM video_item vi
                     JOIN video_collection vc ON vi.collection_id = vc.collection_id
-                    WHERE vi.video_name LIKE %s AND vc.group_id <= %s
+                    WHERE {search.where} AND vc.group_id <= %s
                 """
-                search_pattern = f'%{keyword}%'
                 
-                # 执行计数查询
-                cursor.execute(count_query, (search_pattern, user_group))
-                total_count = cursor.fetchone()[0]
+                # 执行计数查询（走总数缓存）
+                def count_matches():
+                    cursor.execute(count_query, search.where_params + [user_group])
+                    return cursor.fetchone()[0]
+                total_count, count_exact = count_cache.get_count(
+                    'video', user_group, 'search', keyword, count_matches)
                 
                 # 如果没有结果，直接返回
                 if total_count == 0:
-                    return 0, []
+                    return 0, [], {**pagination.empty_page_info(), 'count_exact': count_exact}
                 
                 # 构建分页查询，添加权限过滤
-                search_query = """
+                search_query = f"""
                     SELECT 
                         vi.video_id,
                         vc.collection_name as category,
@@ -316,55 +485,28 @@ def search_videos_by_name_new(keyword, page=1, per_page=20, user_group=1):
                         vi.file_size,
                         vi.video_width,
                         vi.video_height,
-                        vi.thumbnail_path
+                        vi.thumbnail_path,
+                        vi.duration_ms
                     FROM video_item vi
                     JOIN video_collection vc ON vi.collection_id = vc.collection_id
                     JOIN storage_disk sd ON vc.disk_id = sd.disk_id
-                    WHERE vi.video_name LIKE %s AND vc.group_id <= %s
-                    ORDER BY vi.video_id DESC
-                    LIMIT %s OFFSET %s
+                    WHERE {search.where} AND vc.group_id <= %s
                 """
                 
-                # 计算偏移量
-                offset = (page - 1) * per_page
+                # 游标/页码分页
+                keyset = pagination.KeysetPage('vi.video_id', per_page, page_cursor, page)
+                cond_sql, cond_params = keyset.condition()
+                tail_sql, tail_params = keyset.order_and_limit()
+                search_query += f" AND {cond_sql}" + tail_sql
                 
                 # 执行分页查询
-                cursor.execute(search_query, (search_pattern, user_group, per_page, offset))
+                cursor.execute(search_query, search.where_params + [user_group] + cond_params + tail_params)
                 
                 videos = []
-                for row in cursor.fetchall():
-                    # 构建缩略图路径 - 修复版
-                    if row[11]:  # thumbnail_path 存在
-                        thumbnail_url = f"/thumbnails/{row[11]}"
-                    else:
-                        # 生成默认缩略图路径 - 修复路径构建逻辑
-                        video_relative_path = row[3]  # 例如: "分类1/video1.mp4"
-                        video_name = row[4]           # 例如: "video1.mp4"
-                        video_name_no_ext = Path(video_name).stem  # 例如: "video1"
-                        
-                        # 构建缩略图相对路径：目录保持不变，只替换文件名
-                        video_path_obj = Path(video_relative_path)
-                        thumbnail_relative_path = video_path_obj.parent / f"{video_name_no_ext}.jpg"
-                        thumbnail_url = f"/thumbnails/{thumbnail_relative_path}"
-                    
-                    videos.append({
-                        'id': row[0],
-                        'category': row[1],
-                        'video_path': str(Path(row[3][7:] if row[3].startswith('Videos/') and '/' in row[3][7:] else row[3]).parent) if (row[3][7:] if row[3].startswith('Videos/') and '/' in row[3][7:] else row[3]) != Path(row[3][7:] if row[3].startswith('Videos/') and '/' in row[3][7:] else row[3]).name else "",  # 智能修复路径前缀
-                        'video_name': row[4],
-                        'video_duration': row[5],
-                        'video_quality': row[6],
-                        'group_id': row[7],
-                        'is_vip': row[7] > 1,
-                        'file_size': row[8],
-                        'video_width': row[9],
-                        'video_height': row[10],
-                        'thumbnail_url': thumbnail_url,
-                        'full_path': row[3][7:] if row[3].startswith('Videos/') and '/' in row[3][7:] else row[3],  # 智能修复：只在嵌套情况下去掉Videos前缀
-                        'relative_path': row[3]  # 相对路径
-                    })
+                for row in keyset.finish(cursor.fetchall()):
+                    videos.append(_video_row_to_dict(row))
                 
-                return total_count, videos
+                return total_count, videos, {**keyset.page_info, 'count_exact': count_exact}
                 
     except Exception as e:
         print(f"搜索视频失败: {str(e)}")
@@ -386,12 +528,12 @@ def check_video_access_new(video_path, user_group=1):
             with conn.cursor() as cursor:
                 # 尝试多种匹配方式
                 queries = [
-                    # 1. 精确匹配相对路径
+                    # 1. 精确匹配相对路径（path_hash 索引）
                     """
                         SELECT vc.group_id 
                         FROM video_item vi
                         JOIN video_collection vc ON vi.collection_id = vc.collection_id
-                        WHERE vi.relative_path = %s
+                        WHERE vi.path_hash = %s
                         LIMIT 1
                     """,
                     # 2. 匹配文件名
@@ -413,7 +555,7 @@ def check_video_access_new(video_path, user_group=1):
                 ]
                 
                 # 尝试第一种查询
-                cursor.execute(queries[0], (video_path,))
+                cursor.execute(queries[0], (scan_manifest.path_hash(video_path),))
                 result = cursor.fetchone()
                 
                 if not result:
@@ -442,6 +584,111 @@ def check_video_access_new(video_path, user_group=1):
 
 
 
+def get_video_file_by_id(video_id, user_group=1):
+    """
+    按视频ID解析视频文件路径（主键查询，同时完成权限判断）
+    
+    Args:
+        video_id: 视频ID
+        user_group: 用户权限组（1=普通用户，2=VIP用户）
+    
+    Returns:
+        dict: {'mount_path', 'storage_root', 'relative_path', 'group_id', 'allowed',
+               'duration_ms', 'video_width', 'video_height', 'video_codec'}，不存在返回None
+    """
+    try:
+        with db.connect() as conn:
+            with conn.cursor() as cursor:
+                cursor.execute("""
+                    SELECT 
+                        sd.mount_path,
+                        vc.storage_root,
+                        vi.relative_path,
+                        vc.group_id,
+                        vc.group_id <= %s AS allowed,
+                        vi.duration_ms,
+                        vi.video_width,
+                        vi.video_height,
+                        vi.video_codec
+                    FROM video_item vi
+                    JOIN video_collection vc ON vi.collection_id = vc.collection_id
+                    JOIN storage_disk sd ON vc.disk_id = sd.disk_id
+                    WHERE vi.video_id = %s
+                """, (user_group, video_id))
+                row = cursor.fetchone()
+                
+                if not row:
+                    return None
+                
+                return {
+                    'mount_path': row[0],
+                    'storage_root': row[1],
+                    'relative_path': row[2],
+                    'group_id': row[3],
+                    'allowed': bool(row[4]),
+                    'duration_ms': row[5],
+                    'video_width': row[6],
+                    'video_height': row[7],
+                    'video_codec': row[8]
+                }
+    
+    except Exception as e:
+        print(f"按ID查询视频文件失败: {str(e)}")
+        return None
+
+def resolve_legacy_video_id(video_path):
+    """
+    将旧版 /videos/<路径> 地址解析为视频ID（仅用于兼容旧链接的重定向）
+    
+    Args:
+        video_path: 旧地址中的视频路径（可能是相对路径或文件名）
+    
+    Returns:
+        int: 视频ID，找不到返回None
+    """
+    try:
+        video_path = video_path.replace('\\', '/').lstrip('/')
+        filename = Path(video_path).name
+        
+        with db.connect() as conn:
+            with conn.cursor() as cursor:
+                # 1. 相对路径完全一致（走 path_hash 索引）
+                cursor.execute("""
+                    SELECT video_id
+                    FROM video_item
+                    WHERE path_hash = %s
+                    ORDER BY video_id DESC
+                    LIMIT 1
+                """, (scan_manifest.path_hash(video_path),))
+                result = cursor.fetchone()
+                
+                if not result:
+                    # 2. 精确匹配文件名（走 idx_video_name 索引）
+                    cursor.execute("""
+                        SELECT video_id
+                        FROM video_item
+                        WHERE video_name = %s
+                        ORDER BY video_id DESC
+                        LIMIT 1
+                    """, (filename,))
+                    result = cursor.fetchone()
+                
+                if not result:
+                    # 3. 兜底：旧版的模糊匹配，只为兼容极旧的链接
+                    cursor.execute("""
+                        SELECT video_id
+                        FROM video_item
+                        WHERE relative_path LIKE %s
+                        LIMIT 1
+                    """, (f"%{filename}%",))
+                    result = cursor.fetchone()
+                
+                return result[0] if result else None
+    
+    except Exception as e:
+        print(f"解析旧版视频地址失败: {str(e)}")
+        return None
+
 def clear_video_tables_new():
     """
     清空新的视频表
@@ -460,6 +707,9 @@ def clear_video_tables_new():
                 
                 # 清空视频集合表
                 cursor.execute("TRUNCATE TABLE video_collection")
+
+                # 清空缩略图失败记录（video_id 会从头分配）
+                cursor.execute("TRUNCATE TABLE thumbnail_failure")
                 
                 # 重新启用外键检查
                 cursor.execute("SET FOREIGN_KEY_CHECKS = 1")
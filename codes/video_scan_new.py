@@ -1,13 +1,70 @@
 import os
+from collections import deque
+from concurrent.futures import TimeoutError as FutureTimeout
 from pathlib import Path
-from pymediainfo import MediaInfo
 from codes.video_queries_new import (
-    insert_video_collection, insert_video_item, get_or_create_disk, smart_fix_video_path
+    insert_video_collection, insert_video_item, insert_video_items_batch, get_or_create_disk, smart_fix_video_path
 )
 from codes import function as fun
 from codes.query_database import db, get_video_config
+from codes import env_loader
+from codes import path_cache
+from codes import count_cache
+from codes import suggest_index
+from codes import scan_manifest
+from codes import media_walker
+from codes import collection_stats
+from codes import video_facets
+from codes import video_duration as duration_util
+from codes import thumbnail_queue
+from codes import storyboard
+from codes import video_probe
 
-def scan_and_process_videos_new(app, parent_dir, is_vip=False, progress_callback=None, thumbnail_dir=None):
+
+def video_meta(track):
+    """
+    把探测得到的视频轨原始字段（video_probe.video_track）整理成入库的元信息
+
+    Returns:
+        dict: 时长/画质/宽高/码率/帧率/编码，取不到的字段为 None
+    """
+    meta = {
+        'video_duration': None,
+        'duration_ms': None,
+        'video_quality': None,
+        'video_width': None,
+        'video_height': None,
+        'video_bitrate': None,
+        'video_fps': None,
+        'video_codec': None
+    }
+    if not track:
+        return meta
+    if track['duration']:
+        meta['duration_ms'] = int(float(track['duration']))
+        meta['video_duration'] = fun.format_duration(meta['duration_ms'])
+    if track['width'] and track['height']:
+        meta['video_width'] = track['width']
+        meta['video_height'] = track['height']
+        meta['video_quality'] = fun.get_quality_label(track['width'], track['height'])
+    if track['bit_rate']:
+        meta['video_bitrate'] = track['bit_rate']
+    if track['frame_rate']:
+        meta['video_fps'] = float(track['frame_rate'])
+    if track['codec']:
+        meta['video_codec'] = track['codec']
+    return meta
+
+
+def _create_probe_pool():
+    """按配置创建元信息探测池，返回 (探测池, 工作者数量)"""
+    workers = env_loader.video_probe_workers or os.cpu_count() or 1
+    pool = video_probe.create_pool(env_loader.video_probe_executor, workers, env_loader.video_probe_timeout)
+    return pool, workers
+
+
+def scan_and_process_videos_new(app, parent_dir, is_vip=False, progress_callback=None, thumbnail_dir=None,
+                                incremental=False, cancel_event=None):
     """
     扫描并处理视频文件 - 新版本支持跨根目录和缩略图自动映射
     
@@ -17,6 +74,10 @@ def scan_and_process_videos_new(app, parent_dir, is_vip=False, progress_callback
         is_vip: 是否为VIP视频（默认False）
         progress_callback: 进度更新回调函数
         thumbnail_dir: 缩略图目录(Path对象或字符串，可选)
+        incremental: 增量扫描：指纹（大小/修改时间/inode）未变的文件不再解析元信息，
+                     并删除已从磁盘消失的视频记录
+        cancel_event: 后台任务的取消信号，置位后在下一个文件处抛出 ScanCancelled
+                      （已写入的批次保留，不做增量删除）
     
     Returns:
         dict: 扫描结果统计
@@ -25,8 +86,21 @@ def scan_and_process_videos_new(app, parent_dir, is_vip=False, progress_callback
         'categories_added': 0,
         'videos_added': 0,
         'failed_count': 0,
-        'disk_paths': []  # 记录涉及的磁盘路径
+        'probe_failed': 0,  # 元信息解析失败/超时（仍会入库，下次增量扫描重试）
+        'disk_paths': [],  # 记录涉及的磁盘路径
+        'incremental': incremental,
+        'added': 0,
+        'changed': 0,
+        'removed': 0,
+        'unchanged': 0
     }
+    probe_pool = None
+    # 本次扫描涉及的集合（扫描范围内已有的 + 新建的），结束时重算它们的统计列
+    touched_collections = set()
+    # 已入库视频的 (视频路径, 缩略图路径, 时长毫秒)，扫描结束后交给后台缩略图队列预生成
+    thumbnail_jobs = []
+    # 已入库视频的 (视频路径, 时长毫秒, 宽, 高)，storyboard_pregenerate 开启时交给故事板队列预生成
+    storyboard_jobs = []
     
     try:
         # 确保目录存在且为Path对象
@@ -103,6 +177,31 @@ def scan_and_process_videos_new(app, parent_dir, is_vip=False, progress_callback
         storage_root = relative_to_mount.as_posix() + "/"
         print(f"计算存储根路径：{storage_root}")
 
+        # 读取扫描范围内（该磁盘上 storage_root 以扫描目录开头的集合）已入库视频的指纹
+        manifest = scan_manifest.ScanManifest('video_item', 'video_id', 'video_collection')
+        with db.connect() as conn:
+            with conn.cursor() as cursor:
+                manifest.load(
+                    cursor,
+                    "c.disk_id = %s AND LEFT(c.storage_root, CHAR_LENGTH(%s)) = %s",
+                    (disk_id, storage_root, storage_root)
+                )
+        touched_collections.update(manifest.collection_ids)
+        # 有集合处理失败时，其视频的存在状态未知，本次不删除任何记录
+        removal_safe = True
+
+        def finish():
+            """汇总增量统计；增量模式下删除已消失的视频记录"""
+            if incremental:
+                if removal_safe:
+                    with db.connect() as conn:
+                        with conn.cursor() as cursor:
+                            manifest.remove_vanished(cursor)
+                        conn.commit()
+                else:
+                    print("⚠️ 存在处理失败的视频集合，跳过删除已消失的视频记录")
+            result.update(manifest.counts)
+
         # 4. 支持的视频扩展名
         VIDEO_EXTENSIONS = {'.mp4', '.avi', '.mkv', '.mov', '.flv', '.wmv', '.rm', '.rmvb', '.3gp', '.webm'}
         
@@ -113,54 +212,16 @@ def scan_and_process_videos_new(app, parent_dir, is_vip=False, progress_callback
         def scan_video_folders(scan_path):
             """
             简单直接的扫描方式：
-            - 遍历所有文件夹（包括多级嵌套）
+            - 单次遍历所有文件夹（包括多级嵌套）
             - 如果文件夹内有视频文件，就将该文件夹作为一个视频集合
             - 文件夹名 = 集合名，文件夹内的视频 = 集合内容
             
-            返回: {collection_name: [video_files]}
+            返回: {collection_name: [(video_file, stat)]}
             """
-            collections = {}
-            
-            # 递归遍历所有目录
-            for current_dir in scan_path.rglob('*'):
-                if not current_dir.is_dir() or current_dir.name.startswith('.'):
-                    continue
-                    
-                # 查找当前目录下的视频文件（不递归，只看直接子文件）
-                video_files = []
-                for file_path in current_dir.iterdir():
-                    if file_path.is_file() and file_path.suffix.lower() in VIDEO_EXTENSIONS:
-                        video_files.append(file_path)
-                
-                # 如果当前目录有视频，就创建一个集合
-                if video_files:
-                    collection_name = current_dir.name
-                    
-                    # 处理重名情况：如果已存在同名集合，添加路径信息区分
-                    if collection_name in collections:
-                        # 使用相对路径作为唯一标识
-                        try:
-                            rel_path = current_dir.relative_to(scan_path)
-                            collection_name = str(rel_path).replace('\\', '_').replace('/', '_')
-                        except ValueError:
-                            collection_name = f"{current_dir.name}_{len(collections)}"
-                    
-                    collections[collection_name] = video_files
-                    print(f"📂 发现视频集合: {collection_name} ({len(video_files)} 个视频)")
-            
-            # 特殊处理：如果根目录直接有视频
-            root_videos = []
-            for file_path in scan_path.iterdir():
-                if file_path.is_file() and file_path.suffix.lower() in VIDEO_EXTENSIONS:
-                    root_videos.append(file_path)
-            
-            if root_videos:
-                collection_name = scan_path.name
-                # 如果已有同名集合，添加后缀区分
-                if collection_name in collections:
-                    collection_name = f"{scan_path.name}_根目录"
-                collections[collection_name] = root_videos
-                print(f"📂 发现根目录视频集合: {collection_name} ({len(root_videos)} 个视频)")
+            collections = media_walker.group_by_directory(scan_path, VIDEO_EXTENSIONS, root_suffix="_根目录",
+                                                         cancel_event=cancel_event)
+            for name, files in collections.items():
+                print(f"📂 发现视频集合: {name} ({len(files)} 个视频)")
             
             print(f"🔍 总共发现 {len(collections)} 个视频集合")
             
@@ -169,7 +230,7 @@ def scan_and_process_videos_new(app, parent_dir, is_vip=False, progress_callback
                 print("📋 扫描结果详情:")
                 for name, files in collections.items():
                     print(f"  📂 视频集合: {name}")
-                    for i, file_path in enumerate(files[:3]):  # 只显示前3个文件
+                    for file_path, _ in files[:3]:  # 只显示前3个文件
                         print(f"    🎬 {file_path.name}")
                     if len(files) > 3:
                         print(f"    ... 还有 {len(files) - 3} 个文件")
@@ -182,6 +243,7 @@ def scan_and_process_videos_new(app, parent_dir, is_vip=False, progress_callback
         
         if not video_collections:
             print("未发现任何视频文件")
+            finish()
             return result
         
         # 计算总文件数
@@ -195,6 +257,73 @@ def scan_and_process_videos_new(app, parent_dir, is_vip=False, progress_callback
         # 🎯 5. 处理每个视频集合 - 修复路径计算问题
         processed_collections = {}  # 缓存已创建的集合
         processed_files = 0
+
+        # 🎯 元信息解析流水线：探测池并行解析，主线程作为唯一的写库方按批次写入
+        probe_pool, workers = _create_probe_pool()
+        max_in_flight = env_loader.video_probe_queue_size or workers * 4
+        probe_timeout = env_loader.video_probe_timeout
+        batch_size = max(1, env_loader.video_scan_batch_size)
+        in_flight = deque()  # (future, task)，按提交顺序排列，长度即有界队列的占用
+        pending_rows = []
+        pending_thumbnails = []
+        pending_storyboards = []
+        print(f"🧵 视频元信息解析: {env_loader.video_probe_executor} x {workers}，"
+              f"在途上限 {max_in_flight}，单文件超时 {probe_timeout} 秒")
+
+        def file_done(file_name):
+            nonlocal processed_files
+            processed_files += 1
+            if progress_callback:
+                percentage = int((processed_files / total_files) * 100)
+                progress_callback(percentage, file_name)
+
+        def flush_rows():
+            if not pending_rows:
+                return
+            if insert_video_items_batch(pending_rows):
+                result['videos_added'] += len(pending_rows)
+                thumbnail_jobs.extend(pending_thumbnails)
+                storyboard_jobs.extend(pending_storyboards)
+                print(f"✅ 批量写入 {len(pending_rows)} 个视频")
+            else:
+                result['failed_count'] += len(pending_rows)
+                print(f"❌ 批量写入视频失败，共 {len(pending_rows)} 个")
+            pending_rows.clear()
+            pending_thumbnails.clear()
+            pending_storyboards.clear()
+
+        def collect_oldest():
+            """收取最早提交的解析任务，生成待写入的行，攒满一批就写库"""
+            future, task = in_flight.popleft()
+            meta = None
+            try:
+                meta = video_meta(future.result(timeout=probe_pool.wait_timeout))
+            except (FutureTimeout, video_probe.ProbeTimeout):
+                future.cancel()
+                result['probe_failed'] += 1
+                print(f"⏱️ 解析视频元信息超时（{probe_timeout}秒），本次不写入元信息: {task['file_path']}")
+            except Exception as e:
+                result['probe_failed'] += 1
+                print(f"获取视频元信息失败: {task['file_path']} | {str(e)}")
+
+            file_done(task['file_path'].name)
+            # 解析失败/超时的视频不记录修改时间，下次增量扫描会视为有变化并重新解析
+            file_mtime = task['file_mtime'] if meta else None
+            meta = meta or {}
+            pending_rows.append((
+                task['collection_id'], task['relative_path'], task['file_path'].name, task['file_size'],
+                meta.get('video_duration'), meta.get('duration_ms'), meta.get('video_quality'),
+                meta.get('video_width'), meta.get('video_height'),
+                meta.get('video_bitrate'), meta.get('video_fps'), meta.get('video_codec'),
+                task['thumbnail_path'], file_mtime, task['file_inode']
+            ))
+            if env_loader.thumbnail_pregenerate:
+                pending_thumbnails.append((task['file_path'], task['thumbnail_file'], meta.get('duration_ms')))
+            if env_loader.storyboard_enabled and env_loader.storyboard_pregenerate and meta.get('duration_ms'):
+                pending_storyboards.append((task['file_path'], meta['duration_ms'],
+                                            meta.get('video_width'), meta.get('video_height')))
+            if len(pending_rows) >= batch_size:
+                flush_rows()
         
         collection_names = list(video_collections.keys())
         
@@ -206,7 +335,7 @@ def scan_and_process_videos_new(app, parent_dir, is_vip=False, progress_callback
             # 🎯 计算该集合的正确存储根路径
             if video_files:
                 # 使用第一个视频文件所在的目录来计算存储根路径
-                first_video = video_files[0]
+                first_video, _ = video_files[0]
                 video_dir = first_video.parent
                 
                 try:
@@ -242,25 +371,21 @@ def scan_and_process_videos_new(app, parent_dir, is_vip=False, progress_callback
                 if not collection_id:
                     print(f"❌ 无法创建视频集合: {collection_name}")
                     result['failed_count'] += len(video_files)
+                    removal_safe = False
                     continue
                     
                 processed_collections[collection_key] = collection_id
+                touched_collections.add(collection_id)
                 valid_categories.add(collection_name)
                 print(f"✅ 创建视频集合: {collection_name} (ID: {collection_id})")
                 result['categories_added'] += 1
             else:
                 collection_id = processed_collections[collection_key]
             
-            # 🎯 处理该集合中的每个视频文件
-            for file_path in video_files:
+            # 🎯 处理该集合中的每个视频文件：主线程比对指纹后把需要解析的文件交给探测池
+            for file_path, file_stat in video_files:
+                media_walker.check_cancelled(cancel_event)
                 try:
-                    processed_files += 1
-                    
-                    # 更新进度
-                    if progress_callback:
-                        percentage = int((processed_files / total_files) * 100)
-                        progress_callback(percentage, file_path.name)
-                    
                     # 🎯 计算正确的相对路径 - 相对于集合目录的路径
                     try:
                         # 相对于集合目录的路径
@@ -270,45 +395,13 @@ def scan_and_process_videos_new(app, parent_dir, is_vip=False, progress_callback
                     except ValueError:
                         # 如果无法计算相对路径，使用文件名
                         clean_relative_path = file_path.name
-                    print(f"🎬 处理视频: {collection_name}/{file_path.name} -> {clean_relative_path}")
 
-                    # 🎯 7. 获取视频元信息
-                    full_video_path = file_path  # 使用正确的文件路径
-                    file_size = full_video_path.stat().st_size if full_video_path.exists() else None
-                    
-                    video_duration = None
-                    video_quality = None
-                    video_width = None
-                    video_height = None
-                    video_bitrate = None
-                    video_fps = None
-                    video_codec = None
-                    
-                    # 🎯 获取视频元信息
-                    try:
-                        print(f"分析视频元信息: {full_video_path}")
-                        media_info = MediaInfo.parse(str(full_video_path))
-                        
-                        for track in media_info.tracks:
-                            if track.track_type == "Video":
-                                if track.duration:
-                                    video_duration = fun.format_duration(track.duration)
-                                if track.width and track.height:
-                                    video_width = track.width
-                                    video_height = track.height
-                                    video_quality = fun.get_quality_label(track.width, track.height)
-                                if track.bit_rate:
-                                    video_bitrate = track.bit_rate
-                                if track.frame_rate:
-                                    video_fps = float(track.frame_rate)
-                                if track.codec:
-                                    video_codec = track.codec
-                                break
-                                
-                        print(f"视频信息: {video_quality}, {video_duration}, {video_width}x{video_height}")
-                        
-                    except Exception as e:
-                        print(f"获取视频元信息失败: {str(e)}")
+                    # 🎯 比对文件指纹（stat 由遍历时取得），增量模式下未变化的文件直接跳过
+                    status = manifest.check(collection_id, clean_relative_path, file_stat)
+                    if incremental and status == scan_manifest.UNCHANGED:
+                        file_done(file_path.name)
+                        continue
+                    print(f"🎬 处理视频({status}): {collection_name}/{file_path.name} -> {clean_relative_path}")
 
                     # 🎯 8. 计算缩略图路径（如果提供了缩略图目录）
                     thumbnail_path = None
@@ -317,52 +410,106 @@ def scan_and_process_videos_new(app, parent_dir, is_vip=False, progress_callback
                         video_stem = file_path.stem
                         # 使用集合名作为顶级目录，确保不同集合的缩略图分开存储
                         thumbnail_path = str(Path(collection_name) / Path(clean_relative_path).parent / f"{video_stem}.jpg").replace("\\", "/")
-                        print(f"计算缩略图路径: {thumbnail_path}")
 
                         # 确保缩略图目录存在
                         if thumbnail_dir:
                             full_thumbnail_dir = Path(thumbnail_dir) / Path(clean_relative_path).parent
                             try:
                                 os.makedirs(full_thumbnail_dir, exist_ok=True)
-                                print(f"确保缩略图目录存在: {full_thumbnail_dir}")
                             except Exception as e:
                                 print(f"创建缩略图目录失败: {str(e)}")
 
-                    # 🎯 9. 插入视频条目
-                    success = insert_video_item(
-                        collection_id=collection_id,
-                        relative_path=clean_relative_path,
-                        video_name=file_path.name,
-                        file_size=file_size,
-                        video_duration=video_duration,
-                        video_quality=video_quality,
-                        video_width=video_width,
-                        video_height=video_height,
-                        video_bitrate=video_bitrate,
-                        video_fps=video_fps,
-                        video_codec=video_codec,
-                        thumbnail_path=thumbnail_path
-                    )
-                    
-                    if success:
-                        result['videos_added'] += 1
-                        print(f"✅ 成功插入视频: {collection_name}/{file_path.name}")
+                    # 缩略图完整路径与 /thumbnails 接口的解析规则一致：配置了缩略图目录时在其下，否则与视频同目录
+                    if thumbnail_path:
+                        thumbnail_file = Path(thumbnail_mount_path) / thumbnail_storage_root / thumbnail_path
                     else:
-                        result['failed_count'] += 1
-                        print(f"❌ 插入视频失败: {collection_name}/{file_path.name}")
+                        thumbnail_file = file_path.parent / f"{file_path.stem}.jpg"
+
+                    # 🎯 7. 提交元信息解析任务；在途任务达到上限时先收取最早的结果（背压）
+                    file_size, file_mtime, file_inode = scan_manifest.fingerprint(file_stat)
+                    task = {
+                        'collection_id': collection_id,
+                        'collection_name': collection_name,
+                        'relative_path': clean_relative_path,
+                        'file_path': file_path,
+                        'file_size': file_size,
+                        'file_mtime': file_mtime,
+                        'file_inode': file_inode,
+                        'thumbnail_path': thumbnail_path,
+                        'thumbnail_file': thumbnail_file
+                    }
+                    while len(in_flight) >= max_in_flight:
+                        collect_oldest()
+                    in_flight.append((probe_pool.submit(str(file_path)), task))
 
                 except Exception as e:
                     print(f"❌ 处理视频失败：{file_path} | 错误：{str(e)}")
                     result['failed_count'] += 1
+                    file_done(file_path.name)
                     continue
 
+        # 收取剩余的解析结果并写入最后一批
+        while in_flight:
+            collect_oldest()
+        flush_rows()
+
         # 最终统计结果已在集合创建时更新
+        finish()
         print(f"扫描完成，结果：{result}")
         return result
 
     except Exception as e:
         print(f"扫描视频时发生错误: {str(e)}")
         raise
+    finally:
+        if probe_pool is not None:
+            # 排队中的任务直接取消，仍在解析的子进程随之终止
+            probe_pool.shutdown()
+        if touched_collections:
+            _refresh_collection_stats(touched_collections)
+        # 扫描可能新增/覆盖了视频和缩略图记录，已缓存的路径解析结果不再可信
+        path_cache.invalidate('video', 'thumbnail')
+        count_cache.invalidate('video')
+        suggest_index.refresh('video')
+        _enqueue_thumbnails(thumbnail_jobs)
+        _enqueue_storyboards(storyboard_jobs)
+
+def _enqueue_thumbnails(thumbnail_jobs):
+    """缺失缩略图的视频按低优先级加入后台生成队列（页面请求到的缩略图会被提到队首）"""
+    queued = 0
+    try:
+        for video_path, thumbnail_file, duration_ms in thumbnail_jobs:
+            if thumbnail_file.exists():
+                continue
+            if thumbnail_queue.enqueue(video_path, thumbnail_file, thumbnail_queue.PRIORITY_SCAN, duration_ms):
+                queued += 1
+    except Exception as e:
+        print(f"缩略图加入生成队列失败: {str(e)}")
+    if queued:
+        print(f"🖼️ {queued} 个视频的缩略图已加入后台生成队列")
+
+def _enqueue_storyboards(storyboard_jobs):
+    """新入库的视频加入故事板生成队列（已生成的由工作线程跳过）"""
+    queued = 0
+    try:
+        for video_path, duration_ms, width, height in storyboard_jobs:
+            if storyboard.enqueue(video_path, duration_ms, width, height):
+                queued += 1
+    except Exception as e:
+        print(f"故事板加入生成队列失败: {str(e)}")
+    if queued:
+        print(f"🎞️ {queued} 个视频的故事板已加入后台生成队列")
+
+def _refresh_collection_stats(collection_ids):
+    """重算视频集合的统计列（条目数/总大小/总时长/首个视频）和分面预聚合计数"""
+    try:
+        with db.connect() as conn:
+            with conn.cursor() as cursor:
+                collection_stats.refresh(cursor, 'video', collection_ids)
+                video_facets.refresh(cursor, collection_ids)
+            conn.commit()
+    except Exception as e:
+        print(f"更新视频集合统计失败: {str(e)}")
 
 def migrate_from_old_videos():
     """
@@ -461,6 +608,7 @@ def migrate_from_old_videos():
                             relative_path=relative_path.replace("\\", "/"),
                             video_name=video_name,
                             video_duration=video_duration,
+                            duration_ms=duration_util.parse_duration(video_duration),
                             video_quality=video_quality
                         )
                         
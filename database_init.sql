@@ -46,12 +46,17 @@ CREATE TABLE `audio_collection`  (
   `group_id` tinyint NOT NULL COMMENT '访问权限组',
   `cover_path` varchar(512) CHARACTER SET utf8mb4 COLLATE utf8mb4_unicode_ci NULL DEFAULT NULL COMMENT '专辑封面路径',
   `artist` varchar(255) CHARACTER SET utf8mb4 COLLATE utf8mb4_unicode_ci NULL DEFAULT NULL COMMENT '艺术家名称',
+  `item_count` int NOT NULL DEFAULT 0 COMMENT '音频数（扫描时维护）',
+  `total_bytes` bigint UNSIGNED NOT NULL DEFAULT 0 COMMENT '文件总字节数（扫描时维护）',
+  `total_duration` bigint UNSIGNED NOT NULL DEFAULT 0 COMMENT '总时长（秒，扫描时维护）',
+  `first_item_id` int NULL DEFAULT NULL COMMENT '第一首音频ID（扫描时维护）',
   `create_time` datetime(3) NULL DEFAULT CURRENT_TIMESTAMP(3),
   `update_time` datetime(3) NULL DEFAULT CURRENT_TIMESTAMP(3) ON UPDATE CURRENT_TIMESTAMP(3),
   PRIMARY KEY (`collection_id`) USING BTREE,
   UNIQUE INDEX `uniq_collection`(`collection_name`) USING BTREE,
   INDEX `idx_group_root`(`group_id`, `storage_root`(100)) USING BTREE,
   INDEX `disk_id`(`disk_id`) USING BTREE,
+  FULLTEXT INDEX `ft_collection`(`collection_name`, `artist`) WITH PARSER `ngram`,
   CONSTRAINT `audio_collection_ibfk_1` FOREIGN KEY (`group_id`) REFERENCES `access_group` (`group_id`) ON DELETE RESTRICT ON UPDATE RESTRICT,
   CONSTRAINT `audio_collection_ibfk_2` FOREIGN KEY (`disk_id`) REFERENCES `storage_disk` (`disk_id`) ON DELETE RESTRICT ON UPDATE RESTRICT
 ) ENGINE = InnoDB AUTO_INCREMENT = 40 CHARACTER SET = utf8mb4 COLLATE = utf8mb4_unicode_ci ROW_FORMAT = DYNAMIC;
@@ -68,6 +73,7 @@ CREATE TABLE `audio_item`  (
   `audio_id` int NOT NULL AUTO_INCREMENT COMMENT '音频自增ID',
   `collection_id` int NOT NULL COMMENT '所属专辑ID',
   `relative_path` varchar(768) CHARACTER SET utf8mb4 COLLATE utf8mb4_unicode_ci NOT NULL COMMENT '相对路径（含文件名）',
+  `path_hash` binary(20) NOT NULL COMMENT '相对路径的SHA1(正斜杠规范化后)，按路径精确查找用',
   `file_size` int UNSIGNED NULL DEFAULT NULL COMMENT '音频文件大小',
   `duration` int UNSIGNED NULL DEFAULT NULL COMMENT '音频时长(秒)',
   `title` varchar(255) CHARACTER SET utf8mb4 COLLATE utf8mb4_unicode_ci NULL DEFAULT NULL COMMENT '音频标题',
@@ -75,10 +81,13 @@ CREATE TABLE `audio_item`  (
   `album` varchar(255) CHARACTER SET utf8mb4 COLLATE utf8mb4_unicode_ci NULL DEFAULT NULL COMMENT '专辑名',
   `genre` varchar(50) CHARACTER SET utf8mb4 COLLATE utf8mb4_unicode_ci NULL DEFAULT NULL COMMENT '音乐类型',
   `year` varchar(4) CHARACTER SET utf8mb4 COLLATE utf8mb4_unicode_ci NULL DEFAULT NULL COMMENT '发行年份',
+  `file_mtime` bigint NULL DEFAULT NULL COMMENT '文件修改时间(纳秒，增量扫描指纹)',
+  `file_inode` bigint UNSIGNED NULL DEFAULT NULL COMMENT '文件inode(增量扫描指纹)',
   `create_time` datetime(3) NULL DEFAULT CURRENT_TIMESTAMP(3) COMMENT '音频插入时间',
   PRIMARY KEY (`audio_id`) USING BTREE,
-  UNIQUE INDEX `uniq_file`(`collection_id`, `relative_path`(200)) USING BTREE,
+  UNIQUE INDEX `uniq_path_hash`(`path_hash`, `collection_id`) USING BTREE,
   INDEX `idx_collection`(`collection_id`) USING BTREE,
+  FULLTEXT INDEX `ft_meta`(`title`, `artist`, `album`, `genre`) WITH PARSER `ngram`,
   CONSTRAINT `audio_item_ibfk_1` FOREIGN KEY (`collection_id`) REFERENCES `audio_collection` (`collection_id`) ON DELETE CASCADE ON UPDATE RESTRICT
 ) ENGINE = InnoDB AUTO_INCREMENT = 1509 CHARACTER SET = utf8mb4 COLLATE = utf8mb4_unicode_ci ROW_FORMAT = DYNAMIC;
 
@@ -97,12 +106,16 @@ CREATE TABLE `image_collection`  (
   `storage_root` varchar(512) CHARACTER SET utf8mb4 COLLATE utf8mb4_unicode_ci NOT NULL COMMENT '物理存储根路径',
   `group_id` tinyint NOT NULL COMMENT '访问权限组',
   `cover_id` int NULL DEFAULT NULL COMMENT '封面图片ID (image_item的某张图片的ID，让该图片作为封面图展示)',
+  `item_count` int NOT NULL DEFAULT 0 COMMENT '图片数（扫描时维护）',
+  `total_bytes` bigint UNSIGNED NOT NULL DEFAULT 0 COMMENT '文件总字节数（扫描时维护）',
+  `first_item_id` bigint UNSIGNED NULL DEFAULT NULL COMMENT '第一张图片ID（扫描时维护）',
   `create_time` datetime(3) NULL DEFAULT CURRENT_TIMESTAMP(3),
   `update_time` datetime(3) NULL DEFAULT CURRENT_TIMESTAMP(3) ON UPDATE CURRENT_TIMESTAMP(3),
   PRIMARY KEY (`collection_id`) USING BTREE,
   UNIQUE INDEX `uniq_collection`(`collection_name`) USING BTREE,
   INDEX `idx_group_root`(`group_id`, `storage_root`(100)) USING BTREE,
   INDEX `disk_id`(`disk_id`) USING BTREE,
+  FULLTEXT INDEX `ft_collection_name`(`collection_name`) WITH PARSER `ngram`,
   CONSTRAINT `image_collection_ibfk_1` FOREIGN KEY (`group_id`) REFERENCES `access_group` (`group_id`) ON DELETE RESTRICT ON UPDATE RESTRICT,
   CONSTRAINT `image_collection_ibfk_2` FOREIGN KEY (`disk_id`) REFERENCES `storage_disk` (`disk_id`) ON DELETE RESTRICT ON UPDATE RESTRICT
 ) ENGINE = InnoDB AUTO_INCREMENT = 109 CHARACTER SET = utf8mb4 COLLATE = utf8mb4_unicode_ci ROW_FORMAT = DYNAMIC;
@@ -119,10 +132,13 @@ CREATE TABLE `image_item`  (
   `image_id` bigint UNSIGNED NOT NULL AUTO_INCREMENT COMMENT '图片自增ID',
   `collection_id` int NOT NULL COMMENT '所属套图ID',
   `relative_path` varchar(768) CHARACTER SET utf8mb4 COLLATE utf8mb4_unicode_ci NOT NULL COMMENT '相对路径（含文件名）',
+  `path_hash` binary(20) NOT NULL COMMENT '相对路径的SHA1(正斜杠规范化后)，按路径精确查找用',
   `file_size` int UNSIGNED NULL DEFAULT NULL COMMENT '图片字节数',
+  `file_mtime` bigint NULL DEFAULT NULL COMMENT '文件修改时间(纳秒，增量扫描指纹)',
+  `file_inode` bigint UNSIGNED NULL DEFAULT NULL COMMENT '文件inode(增量扫描指纹)',
   `create_time` datetime(3) NULL DEFAULT CURRENT_TIMESTAMP(3) COMMENT '图片插入时间',
   PRIMARY KEY (`image_id`) USING BTREE,
-  UNIQUE INDEX `uniq_file`(`collection_id`, `relative_path`(200)) USING BTREE,
+  UNIQUE INDEX `uniq_path_hash`(`path_hash`, `collection_id`) USING BTREE,
   INDEX `idx_collection`(`collection_id`) USING BTREE,
   CONSTRAINT `image_item_ibfk_1` FOREIGN KEY (`collection_id`) REFERENCES `image_collection` (`collection_id`) ON DELETE CASCADE ON UPDATE RESTRICT
 ) ENGINE = InnoDB AUTO_INCREMENT = 38419 CHARACTER SET = utf8mb4 COLLATE = utf8mb4_unicode_ci ROW_FORMAT = DYNAMIC;
@@ -131,6 +147,41 @@ CREATE TABLE `image_item`  (
 -- Records of image_item
 -- ----------------------------
 
+-- ----------------------------
+-- Table structure for media_counter
+-- ----------------------------
+DROP TABLE IF EXISTS `media_counter`;
+CREATE TABLE `media_counter`  (
+  `media_type` varchar(16) CHARACTER SET utf8mb4 COLLATE utf8mb4_unicode_ci NOT NULL COMMENT '媒体类型 video/image/audio',
+  `group_id` int NOT NULL COMMENT '权限分组',
+  `collection_count` int NOT NULL DEFAULT 0 COMMENT '集合数',
+  `item_count` int NOT NULL DEFAULT 0 COMMENT '条目数',
+  `update_time` datetime(3) NULL DEFAULT CURRENT_TIMESTAMP(3) ON UPDATE CURRENT_TIMESTAMP(3),
+  PRIMARY KEY (`media_type`, `group_id`) USING BTREE
+) ENGINE = InnoDB CHARACTER SET = utf8mb4 COLLATE = utf8mb4_unicode_ci ROW_FORMAT = DYNAMIC;
+
+-- ----------------------------
+-- Table structure for scan_job
+-- ----------------------------
+DROP TABLE IF EXISTS `scan_job`;
+CREATE TABLE `scan_job`  (
+  `job_id` varchar(32) CHARACTER SET utf8mb4 COLLATE utf8mb4_unicode_ci NOT NULL COMMENT '任务ID',
+  `media_type` varchar(16) CHARACTER SET utf8mb4 COLLATE utf8mb4_unicode_ci NOT NULL COMMENT '媒体类型 video/image/audio',
+  `status` varchar(16) CHARACTER SET utf8mb4 COLLATE utf8mb4_unicode_ci NOT NULL COMMENT 'queued/running/succeeded/failed/cancelled/interrupted',
+  `owner` varchar(128) CHARACTER SET utf8mb4 COLLATE utf8mb4_unicode_ci NULL DEFAULT NULL COMMENT '提交任务的进程(主机名:进程号)，启动时只恢复本机的任务',
+  `params` text CHARACTER SET utf8mb4 COLLATE utf8mb4_unicode_ci NULL COMMENT '任务参数(JSON)',
+  `progress` int NOT NULL DEFAULT 0 COMMENT '进度百分比',
+  `message` varchar(255) CHARACTER SET utf8mb4 COLLATE utf8mb4_unicode_ci NULL DEFAULT NULL COMMENT '当前状态说明',
+  `result` longtext CHARACTER SET utf8mb4 COLLATE utf8mb4_unicode_ci NULL COMMENT '扫描结果(JSON)',
+  `error` text CHARACTER SET utf8mb4 COLLATE utf8mb4_unicode_ci NULL COMMENT '失败原因',
+  `create_time` datetime(3) NOT NULL COMMENT '提交时间',
+  `start_time` datetime(3) NULL DEFAULT NULL COMMENT '开始时间',
+  `finish_time` datetime(3) NULL DEFAULT NULL COMMENT '结束时间',
+  PRIMARY KEY (`job_id`) USING BTREE,
+  INDEX `idx_type_time`(`media_type`, `create_time`) USING BTREE,
+  INDEX `idx_status`(`status`) USING BTREE
+) ENGINE = InnoDB CHARACTER SET = utf8mb4 COLLATE = utf8mb4_unicode_ci ROW_FORMAT = DYNAMIC;
+
 -- ----------------------------
 -- Table structure for storage_disk
 -- ----------------------------
@@ -148,6 +199,25 @@ CREATE TABLE `storage_disk`  (
 -- Records of storage_disk
 -- ----------------------------
 
+-- ----------------------------
+-- Table structure for thumbnail_failure
+-- ----------------------------
+DROP TABLE IF EXISTS `thumbnail_failure`;
+CREATE TABLE `thumbnail_failure`  (
+  `video_id` int NOT NULL COMMENT '视频ID',
+  `attempts` int NOT NULL DEFAULT 1 COMMENT '连续失败次数',
+  `last_error` varchar(1000) CHARACTER SET utf8mb4 COLLATE utf8mb4_unicode_ci NULL DEFAULT NULL COMMENT '最后一次失败原因',
+  `last_failed_at` datetime NOT NULL COMMENT '最后一次失败时间',
+  `next_retry_at` datetime NOT NULL COMMENT '退避结束时间，此前不再尝试生成',
+  PRIMARY KEY (`video_id`) USING BTREE,
+  INDEX `idx_last_failed`(`last_failed_at`) USING BTREE,
+  CONSTRAINT `thumbnail_failure_ibfk_1` FOREIGN KEY (`video_id`) REFERENCES `video_item` (`video_id`) ON DELETE CASCADE ON UPDATE RESTRICT
+) ENGINE = InnoDB CHARACTER SET = utf8mb4 COLLATE = utf8mb4_unicode_ci ROW_FORMAT = DYNAMIC;
+
+-- ----------------------------
+-- Records of thumbnail_failure
+-- ----------------------------
+
 -- ----------------------------
 -- Table structure for users
 -- ----------------------------
@@ -184,6 +254,10 @@ CREATE TABLE `video_collection`  (
   `group_id` tinyint NOT NULL DEFAULT 1 COMMENT '访问权限组 (1=普通, 2=VIP)',
   `cover_video_id` int NULL DEFAULT NULL COMMENT '封面视频ID (video_item的某个视频ID)',
   `description` text CHARACTER SET utf8mb4 COLLATE utf8mb4_unicode_ci NULL COMMENT '分类描述',
+  `item_count` int NOT NULL DEFAULT 0 COMMENT '视频数（扫描时维护）',
+  `total_bytes` bigint UNSIGNED NOT NULL DEFAULT 0 COMMENT '文件总字节数（扫描时维护）',
+  `total_duration` bigint UNSIGNED NOT NULL DEFAULT 0 COMMENT '总时长（秒，扫描时维护）',
+  `first_item_id` int NULL DEFAULT NULL COMMENT '第一个视频ID（扫描时维护）',
   `create_time` datetime(3) NULL DEFAULT CURRENT_TIMESTAMP(3),
   `update_time` datetime(3) NULL DEFAULT CURRENT_TIMESTAMP(3) ON UPDATE CURRENT_TIMESTAMP(3),
   `thumbnail_disk_id` int NULL DEFAULT NULL COMMENT '缩略图磁盘ID',
@@ -202,6 +276,25 @@ CREATE TABLE `video_collection`  (
 -- Records of video_collection
 -- ----------------------------
 
+-- ----------------------------
+-- Table structure for video_facet
+-- ----------------------------
+DROP TABLE IF EXISTS `video_facet`;
+CREATE TABLE `video_facet`  (
+  `collection_id` int NOT NULL COMMENT '视频集合ID',
+  `quality` varchar(20) CHARACTER SET utf8mb4 COLLATE utf8mb4_unicode_ci NOT NULL DEFAULT '' COMMENT '画质标签',
+  `codec` varchar(50) CHARACTER SET utf8mb4 COLLATE utf8mb4_unicode_ci NOT NULL DEFAULT '' COMMENT '编码格式',
+  `resolution` varchar(16) CHARACTER SET utf8mb4 COLLATE utf8mb4_unicode_ci NOT NULL COMMENT '分辨率档',
+  `duration_bucket` varchar(16) CHARACTER SET utf8mb4 COLLATE utf8mb4_unicode_ci NOT NULL COMMENT '时长档',
+  `size_bucket` varchar(16) CHARACTER SET utf8mb4 COLLATE utf8mb4_unicode_ci NOT NULL COMMENT '大小档',
+  `item_count` int NOT NULL DEFAULT 0 COMMENT '视频数',
+  PRIMARY KEY (`collection_id`, `quality`, `codec`, `resolution`, `duration_bucket`, `size_bucket`) USING BTREE
+) ENGINE = InnoDB CHARACTER SET = utf8mb4 COLLATE = utf8mb4_unicode_ci ROW_FORMAT = DYNAMIC;
+
+-- ----------------------------
+-- Records of video_facet
+-- ----------------------------
+
 -- ----------------------------
 -- Table structure for video_item
 -- ----------------------------
@@ -210,9 +303,11 @@ CREATE TABLE `video_item`  (
   `video_id` int NOT NULL AUTO_INCREMENT COMMENT '视频自增ID',
   `collection_id` int NOT NULL COMMENT '所属视频集合ID',
   `relative_path` varchar(768) CHARACTER SET utf8mb4 COLLATE utf8mb4_unicode_ci NOT NULL COMMENT '相对路径（含文件名）',
+  `path_hash` binary(20) NOT NULL COMMENT '相对路径的SHA1(正斜杠规范化后)，按路径精确查找用',
   `video_name` varchar(255) CHARACTER SET utf8mb4 COLLATE utf8mb4_unicode_ci NOT NULL COMMENT '视频文件名',
   `file_size` bigint UNSIGNED NULL DEFAULT NULL COMMENT '视频文件大小(字节)',
   `video_duration` varchar(20) CHARACTER SET utf8mb4 COLLATE utf8mb4_unicode_ci NULL DEFAULT NULL COMMENT '视频时长',
+  `duration_ms` bigint UNSIGNED NULL DEFAULT NULL COMMENT '视频时长(毫秒)',
   `video_quality` varchar(20) CHARACTER SET utf8mb4 COLLATE utf8mb4_unicode_ci NULL DEFAULT NULL COMMENT '视频画质标签',
   `video_width` int NULL DEFAULT NULL COMMENT '视频宽度',
   `video_height` int NULL DEFAULT NULL COMMENT '视频高度',
@@ -220,13 +315,20 @@ CREATE TABLE `video_item`  (
   `video_fps` decimal(8, 3) NULL DEFAULT NULL COMMENT '视频帧率',
   `video_codec` varchar(50) CHARACTER SET utf8mb4 COLLATE utf8mb4_unicode_ci NULL DEFAULT NULL COMMENT '视频编码格式',
   `thumbnail_path` varchar(768) CHARACTER SET utf8mb4 COLLATE utf8mb4_unicode_ci NULL DEFAULT NULL COMMENT '缩略图相对路径',
+  `file_mtime` bigint NULL DEFAULT NULL COMMENT '文件修改时间(纳秒，增量扫描指纹)',
+  `file_inode` bigint UNSIGNED NULL DEFAULT NULL COMMENT '文件inode(增量扫描指纹)',
   `create_time` datetime(3) NULL DEFAULT CURRENT_TIMESTAMP(3) COMMENT '视频插入时间',
   `update_time` datetime(3) NULL DEFAULT CURRENT_TIMESTAMP(3) ON UPDATE CURRENT_TIMESTAMP(3),
   PRIMARY KEY (`video_id`) USING BTREE,
-  UNIQUE INDEX `uniq_file`(`collection_id`, `relative_path`(200)) USING BTREE,
+  UNIQUE INDEX `uniq_path_hash`(`path_hash`, `collection_id`) USING BTREE,
   INDEX `idx_collection`(`collection_id`) USING BTREE,
   INDEX `idx_quality`(`video_quality`) USING BTREE,
-  INDEX `idx_duration`(`video_duration`) USING BTREE,
+  INDEX `idx_duration_ms`(`duration_ms`) USING BTREE,
+  INDEX `idx_video_name`(`video_name`) USING BTREE,
+  INDEX `idx_size`(`file_size`) USING BTREE,
+  INDEX `idx_codec`(`video_codec`) USING BTREE,
+  INDEX `idx_resolution`(`video_height`, `video_width`) USING BTREE,
+  FULLTEXT INDEX `ft_video_name`(`video_name`) WITH PARSER `ngram`,
   CONSTRAINT `video_item_ibfk_1` FOREIGN KEY (`collection_id`) REFERENCES `video_collection` (`collection_id`) ON DELETE CASCADE ON UPDATE RESTRICT
 ) ENGINE = InnoDB AUTO_INCREMENT = 17 CHARACTER SET = utf8mb4 COLLATE = utf8mb4_unicode_ci ROW_FORMAT = DYNAMIC;
 
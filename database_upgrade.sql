@@ -0,0 +1,155 @@
+/*
+ 已有数据库的增量升级脚本
+
+ 全新安装直接导入 database_init.sql 即可（已包含下列全部变更）；
+ 已部署的旧库按顺序执行本文件中尚未执行过的段落。
+*/
+
+-- ----------------------------
+-- 按ID访问媒体文件：旧版 /videos/<path> 地址按文件名解析视频ID
+-- ----------------------------
+ALTER TABLE `video_item` ADD INDEX `idx_video_name`(`video_name`) USING BTREE;
+
+-- ----------------------------
+-- 增量扫描：记录文件指纹（大小 + 修改时间 + inode）
+-- 升级后第一次增量扫描会把旧记录视为“有变化”并补齐指纹，之后未变化的文件直接跳过
+-- ----------------------------
+ALTER TABLE `video_item`
+  ADD COLUMN `file_mtime` bigint NULL DEFAULT NULL COMMENT '文件修改时间(纳秒，增量扫描指纹)' AFTER `thumbnail_path`,
+  ADD COLUMN `file_inode` bigint UNSIGNED NULL DEFAULT NULL COMMENT '文件inode(增量扫描指纹)' AFTER `file_mtime`;
+ALTER TABLE `image_item`
+  ADD COLUMN `file_mtime` bigint NULL DEFAULT NULL COMMENT '文件修改时间(纳秒，增量扫描指纹)' AFTER `file_size`,
+  ADD COLUMN `file_inode` bigint UNSIGNED NULL DEFAULT NULL COMMENT '文件inode(增量扫描指纹)' AFTER `file_mtime`;
+ALTER TABLE `audio_item`
+  ADD COLUMN `file_mtime` bigint NULL DEFAULT NULL COMMENT '文件修改时间(纳秒，增量扫描指纹)' AFTER `year`,
+  ADD COLUMN `file_inode` bigint UNSIGNED NULL DEFAULT NULL COMMENT '文件inode(增量扫描指纹)' AFTER `file_mtime`;
+
+-- ----------------------------
+-- 后台扫描任务：任务状态持久化，重启后可看到被中断的任务
+-- ----------------------------
+CREATE TABLE IF NOT EXISTS `scan_job`  (
+  `job_id` varchar(32) CHARACTER SET utf8mb4 COLLATE utf8mb4_unicode_ci NOT NULL COMMENT '任务ID',
+  `media_type` varchar(16) CHARACTER SET utf8mb4 COLLATE utf8mb4_unicode_ci NOT NULL COMMENT '媒体类型 video/image/audio',
+  `status` varchar(16) CHARACTER SET utf8mb4 COLLATE utf8mb4_unicode_ci NOT NULL COMMENT 'queued/running/succeeded/failed/cancelled/interrupted',
+  `params` text CHARACTER SET utf8mb4 COLLATE utf8mb4_unicode_ci NULL COMMENT '任务参数(JSON)',
+  `progress` int NOT NULL DEFAULT 0 COMMENT '进度百分比',
+  `message` varchar(255) CHARACTER SET utf8mb4 COLLATE utf8mb4_unicode_ci NULL DEFAULT NULL COMMENT '当前状态说明',
+  `result` longtext CHARACTER SET utf8mb4 COLLATE utf8mb4_unicode_ci NULL COMMENT '扫描结果(JSON)',
+  `error` text CHARACTER SET utf8mb4 COLLATE utf8mb4_unicode_ci NULL COMMENT '失败原因',
+  `create_time` datetime(3) NOT NULL COMMENT '提交时间',
+  `start_time` datetime(3) NULL DEFAULT NULL COMMENT '开始时间',
+  `finish_time` datetime(3) NULL DEFAULT NULL COMMENT '结束时间',
+  PRIMARY KEY (`job_id`) USING BTREE,
+  INDEX `idx_type_time`(`media_type`, `create_time`) USING BTREE,
+  INDEX `idx_status`(`status`) USING BTREE
+) ENGINE = InnoDB CHARACTER SET = utf8mb4 COLLATE = utf8mb4_unicode_ci ROW_FORMAT = DYNAMIC;
+
+-- ----------------------------
+-- 列表总数：按媒体类型/分组维护的计数器（count_mode=approximate 时使用，每次扫描后重算）
+-- ----------------------------
+CREATE TABLE IF NOT EXISTS `media_counter`  (
+  `media_type` varchar(16) CHARACTER SET utf8mb4 COLLATE utf8mb4_unicode_ci NOT NULL COMMENT '媒体类型 video/image/audio',
+  `group_id` int NOT NULL COMMENT '权限分组',
+  `collection_count` int NOT NULL DEFAULT 0 COMMENT '集合数',
+  `item_count` int NOT NULL DEFAULT 0 COMMENT '条目数',
+  `update_time` datetime(3) NULL DEFAULT CURRENT_TIMESTAMP(3) ON UPDATE CURRENT_TIMESTAMP(3),
+  PRIMARY KEY (`media_type`, `group_id`) USING BTREE
+) ENGINE = InnoDB CHARACTER SET = utf8mb4 COLLATE = utf8mb4_unicode_ci ROW_FORMAT = DYNAMIC;
+
+-- ----------------------------
+-- 集合统计列：条目数/总字节/总时长/第一个条目，扫描时维护，列表页不再 JOIN 条目表聚合
+-- 升级后执行 python -m codes.collection_stats 回填已有数据
+-- ----------------------------
+ALTER TABLE `video_collection`
+  ADD COLUMN `item_count` int NOT NULL DEFAULT 0 COMMENT '视频数（扫描时维护）' AFTER `description`,
+  ADD COLUMN `total_bytes` bigint UNSIGNED NOT NULL DEFAULT 0 COMMENT '文件总字节数（扫描时维护）' AFTER `item_count`,
+  ADD COLUMN `total_duration` bigint UNSIGNED NOT NULL DEFAULT 0 COMMENT '总时长（秒，扫描时维护）' AFTER `total_bytes`,
+  ADD COLUMN `first_item_id` int NULL DEFAULT NULL COMMENT '第一个视频ID（扫描时维护）' AFTER `total_duration`;
+ALTER TABLE `image_collection`
+  ADD COLUMN `item_count` int NOT NULL DEFAULT 0 COMMENT '图片数（扫描时维护）' AFTER `cover_id`,
+  ADD COLUMN `total_bytes` bigint UNSIGNED NOT NULL DEFAULT 0 COMMENT '文件总字节数（扫描时维护）' AFTER `item_count`,
+  ADD COLUMN `first_item_id` bigint UNSIGNED NULL DEFAULT NULL COMMENT '第一张图片ID（扫描时维护）' AFTER `total_bytes`;
+ALTER TABLE `audio_collection`
+  ADD COLUMN `item_count` int NOT NULL DEFAULT 0 COMMENT '音频数（扫描时维护）' AFTER `artist`,
+  ADD COLUMN `total_bytes` bigint UNSIGNED NOT NULL DEFAULT 0 COMMENT '文件总字节数（扫描时维护）' AFTER `item_count`,
+  ADD COLUMN `total_duration` bigint UNSIGNED NOT NULL DEFAULT 0 COMMENT '总时长（秒，扫描时维护）' AFTER `total_bytes`,
+  ADD COLUMN `first_item_id` int NULL DEFAULT NULL COMMENT '第一首音频ID（扫描时维护）' AFTER `total_duration`;
+
+-- ----------------------------
+-- 名称搜索全文索引（ngram 分词，支持中文），search_mode=fulltext 时使用
+-- ngram_token_size 为 MySQL 启动参数（默认 2），修改后需重建这些索引
+-- ----------------------------
+ALTER TABLE `video_item` ADD FULLTEXT INDEX `ft_video_name`(`video_name`) WITH PARSER `ngram`;
+ALTER TABLE `image_collection` ADD FULLTEXT INDEX `ft_collection_name`(`collection_name`) WITH PARSER `ngram`;
+ALTER TABLE `audio_collection` ADD FULLTEXT INDEX `ft_collection`(`collection_name`, `artist`) WITH PARSER `ngram`;
+ALTER TABLE `audio_item` ADD FULLTEXT INDEX `ft_meta`(`title`, `artist`, `album`, `genre`) WITH PARSER `ngram`;
+
+-- ----------------------------
+-- 视频分面筛选：筛选/排序列的索引，以及按集合预聚合的分面计数（扫描后按集合增量重算）
+-- 升级后执行 python -m codes.collection_stats video 或调用 /api/collection-stats/reconcile 回填
+-- ----------------------------
+ALTER TABLE `video_item`
+  ADD INDEX `idx_size`(`file_size`) USING BTREE,
+  ADD INDEX `idx_codec`(`video_codec`) USING BTREE,
+  ADD INDEX `idx_resolution`(`video_height`, `video_width`) USING BTREE;
+CREATE TABLE IF NOT EXISTS `video_facet`  (
+  `collection_id` int NOT NULL COMMENT '视频集合ID',
+  `quality` varchar(20) CHARACTER SET utf8mb4 COLLATE utf8mb4_unicode_ci NOT NULL DEFAULT '' COMMENT '画质标签',
+  `codec` varchar(50) CHARACTER SET utf8mb4 COLLATE utf8mb4_unicode_ci NOT NULL DEFAULT '' COMMENT '编码格式',
+  `resolution` varchar(16) CHARACTER SET utf8mb4 COLLATE utf8mb4_unicode_ci NOT NULL COMMENT '分辨率档',
+  `duration_bucket` varchar(16) CHARACTER SET utf8mb4 COLLATE utf8mb4_unicode_ci NOT NULL COMMENT '时长档',
+  `size_bucket` varchar(16) CHARACTER SET utf8mb4 COLLATE utf8mb4_unicode_ci NOT NULL COMMENT '大小档',
+  `item_count` int NOT NULL DEFAULT 0 COMMENT '视频数',
+  PRIMARY KEY (`collection_id`, `quality`, `codec`, `resolution`, `duration_bucket`, `size_bucket`) USING BTREE
+) ENGINE = InnoDB CHARACTER SET = utf8mb4 COLLATE = utf8mb4_unicode_ci ROW_FORMAT = DYNAMIC;
+
+-- ----------------------------
+-- 视频时长改为数值列：duration_ms 支持按时长筛选/排序走索引，原字符串列上的索引不再使用
+-- 升级后执行 python -m codes.video_duration 回填（加 --probe 对无法换算的视频重新读取文件）
+-- ----------------------------
+ALTER TABLE `video_item`
+  ADD COLUMN `duration_ms` bigint UNSIGNED NULL DEFAULT NULL COMMENT '视频时长(毫秒)' AFTER `video_duration`,
+  ADD INDEX `idx_duration_ms`(`duration_ms`) USING BTREE,
+  DROP INDEX `idx_duration`;
+
+-- ----------------------------
+-- 路径哈希：path_hash = SHA1(正斜杠规范化后的 relative_path)，(path_hash, collection_id) 唯一索引
+-- 取代只覆盖前 200 个字符的 uniq_file 前缀索引，按路径精确查找总是一次索引定位
+-- ----------------------------
+ALTER TABLE `video_item` ADD COLUMN `path_hash` binary(20) NULL DEFAULT NULL COMMENT '相对路径的SHA1(正斜杠规范化后)，按路径精确查找用' AFTER `relative_path`;
+ALTER TABLE `image_item` ADD COLUMN `path_hash` binary(20) NULL DEFAULT NULL COMMENT '相对路径的SHA1(正斜杠规范化后)，按路径精确查找用' AFTER `relative_path`;
+ALTER TABLE `audio_item` ADD COLUMN `path_hash` binary(20) NULL DEFAULT NULL COMMENT '相对路径的SHA1(正斜杠规范化后)，按路径精确查找用' AFTER `relative_path`;
+UPDATE `video_item` SET `path_hash` = UNHEX(SHA1(REPLACE(`relative_path`, '\\', '/')));
+UPDATE `image_item` SET `path_hash` = UNHEX(SHA1(REPLACE(`relative_path`, '\\', '/')));
+UPDATE `audio_item` SET `path_hash` = UNHEX(SHA1(REPLACE(`relative_path`, '\\', '/')));
+ALTER TABLE `video_item`
+  MODIFY COLUMN `path_hash` binary(20) NOT NULL COMMENT '相对路径的SHA1(正斜杠规范化后)，按路径精确查找用',
+  ADD UNIQUE INDEX `uniq_path_hash`(`path_hash`, `collection_id`) USING BTREE,
+  DROP INDEX `uniq_file`;
+ALTER TABLE `image_item`
+  MODIFY COLUMN `path_hash` binary(20) NOT NULL COMMENT '相对路径的SHA1(正斜杠规范化后)，按路径精确查找用',
+  ADD UNIQUE INDEX `uniq_path_hash`(`path_hash`, `collection_id`) USING BTREE,
+  DROP INDEX `uniq_file`;
+ALTER TABLE `audio_item`
+  MODIFY COLUMN `path_hash` binary(20) NOT NULL COMMENT '相对路径的SHA1(正斜杠规范化后)，按路径精确查找用',
+  ADD UNIQUE INDEX `uniq_path_hash`(`path_hash`, `collection_id`) USING BTREE,
+  DROP INDEX `uniq_file`;
+
+-- ----------------------------
+-- 缩略图生成失败记录：失败后按次数指数退避，退避期内 /thumbnails 直接返回默认图不再调用 ffmpeg
+-- ----------------------------
+CREATE TABLE IF NOT EXISTS `thumbnail_failure`  (
+  `video_id` int NOT NULL COMMENT '视频ID',
+  `attempts` int NOT NULL DEFAULT 1 COMMENT '连续失败次数',
+  `last_error` varchar(1000) CHARACTER SET utf8mb4 COLLATE utf8mb4_unicode_ci NULL DEFAULT NULL COMMENT '最后一次失败原因',
+  `last_failed_at` datetime NOT NULL COMMENT '最后一次失败时间',
+  `next_retry_at` datetime NOT NULL COMMENT '退避结束时间，此前不再尝试生成',
+  PRIMARY KEY (`video_id`) USING BTREE,
+  INDEX `idx_last_failed`(`last_failed_at`) USING BTREE,
+  CONSTRAINT `thumbnail_failure_ibfk_1` FOREIGN KEY (`video_id`) REFERENCES `video_item` (`video_id`) ON DELETE CASCADE ON UPDATE RESTRICT
+) ENGINE = InnoDB CHARACTER SET = utf8mb4 COLLATE = utf8mb4_unicode_ci ROW_FORMAT = DYNAMIC;
+
+-- ----------------------------
+-- 扫描任务记录提交它的进程，启动时只把本机上次进程遗留的未结束任务标记为中断
+-- ----------------------------
+ALTER TABLE `scan_job` ADD COLUMN `owner` varchar(128) CHARACTER SET utf8mb4 COLLATE utf8mb4_unicode_ci NULL DEFAULT NULL COMMENT '提交任务的进程(主机名:进程号)，启动时只恢复本机的任务' AFTER `status`;
@@ -4,19 +4,36 @@ from flask import Flask, render_template, send_from_directory, url_for, request,
 from codes import query_database
 from functools import wraps
 import json
-import time
 import logging
 from pathlib import Path
 import threading
 from codes.video_queries_new import db
 from codes import function as fun
 from codes.video_scan_new import scan_and_process_videos_new
-from codes.video_queries_new import get_videos_paginated_new
+from codes.video_queries_new import get_videos_paginated_new, get_videos_faceted_new
 from codes.video_queries_new import get_video_categories_new
 from codes.video_queries_new import search_videos_by_name_new
+from codes.video_queries_new import get_video_file_by_id, resolve_legacy_video_id
 from codes.video_scan_new import migrate_from_old_videos
 import traceback
 from codes import connect_mysql
+from codes import env_loader
+from codes import path_cache
+from codes import job_runner
+from codes import progress_hub
+from codes import file_offload
+from codes import pagination
+from codes import count_cache
+from codes import suggest_index
+from codes import video_facets
+from codes import collection_stats
+from codes import search_index
+from codes import thumbnail_queue
+from codes import thumbnail_failure
+from codes import derivative_store
+from codes import storyboard
+from codes import hls_packager
+from codes.media_walker import ScanCancelled
 import re
 from codes.audio_processor import AudioProcessor
 
@@ -34,68 +51,60 @@ app.config.update({
 # 配置会话持久化时间（例如7天）
 app.config['PERMANENT_SESSION_LIFETIME'] = timedelta(days=7)
 
-# 全局变量用于存储进度信息 ============================================>
-# 使用线程锁保证线程安全
-progress_lock = threading.Lock()
-
-scan_progress = {
-    'percentage': 0,
-    'current_file': '',
-    'type': None
-}
-
-image_scan_progress = {
-    'percentage': 0,
-    'current_file': '',
-    'total': 0,
-    'current': 0
-}
-# 🎯 音频扫描进度变量
-audio_scan_progress = {
-    'percentage': 0,
-    'current_file': ''
-}
+# 启动任务 ============================================>
+# 不能在导入时执行：Windows 下视频元信息解析的进程池以 spawn 方式启动，每个子进程都会重新导入本模块，
+# 会把正在运行的扫描任务标记为中断，并在每个子进程里重建搜索联想索引
+_startup_lock = threading.Lock()
+_startup_done = False
+
+
+def run_startup_tasks():
+    """进程内只执行一次：上次退出时仍在排队/运行的扫描任务标记为中断，重算近似计数器，后台构建搜索联想索引"""
+    global _startup_done
+    with _startup_lock:
+        if _startup_done:
+            return
+        job_runner.runner.recover_interrupted()
+        count_cache.refresh_all()
+        suggest_index.refresh()
+        _startup_done = True
+
+
+@app.before_request
+def ensure_startup_tasks():
+    # 第一个请求前执行（包括由 WSGI 服务器加载 app 的情况），其他并发请求等它完成，
+    # 避免新提交的扫描任务被当成上次遗留的任务标记为中断
+    if not _startup_done:
+        run_startup_tasks()
+
+# 扫描进度 ============================================>
+# 进度统一发布到进度中心，旧版 SSE 接口按媒体类型订阅对应频道（scan:video / scan:image / scan:audio）
+VIDEO_PROGRESS_CHANNEL = 'scan:video'
+IMAGE_PROGRESS_CHANNEL = 'scan:image'
+AUDIO_PROGRESS_CHANNEL = 'scan:audio'
+
 
 def update_scan_progress(percentage, current_file):
-    global scan_progress
-    # 确保百分比在有效范围内且只能增加
-    percentage = max(0, min(100, percentage))
-    if percentage >= scan_progress['percentage'] or percentage == 0:
-        scan_progress['percentage'] = percentage
-        scan_progress['current_file'] = current_file
+    # 进度中心只接受重置（0）或递增的进度
+    if progress_hub.hub.update(VIDEO_PROGRESS_CHANNEL, percentage, current_file=current_file):
         print(f"🔄 视频扫描进度更新: {percentage}% - {current_file}")
-        print(f"📊 视频扫描全局进度状态: {scan_progress}")
-
 
 
 def update_image_scan_progress(percentage, current_file, current, total):
-    global image_scan_progress, progress_lock
-    # 确保百分比在有效范围内
-    percentage = max(0, min(100, percentage))
-    
-    with progress_lock:
-        # 允许重置进度（percentage == 0）或者进度递增
-        if percentage == 0 or percentage >= image_scan_progress['percentage']:
-            image_scan_progress['percentage'] = percentage
-            image_scan_progress['current_file'] = current_file
-            image_scan_progress['current'] = current
-            image_scan_progress['total'] = total
-            print(f"🔄 进度更新: {percentage}% - {current_file} ({current}/{total})")
-            print(f"📊 全局进度状态更新: {image_scan_progress}")
+    if progress_hub.hub.update(IMAGE_PROGRESS_CHANNEL, percentage, current_file=current_file,
+                               current=current, total=total):
+        print(f"🔄 进度更新: {percentage}% - {current_file} ({current}/{total})")
 
 # 🎯 音频扫描进度更新函数
 def update_audio_scan_progress(percentage, current_file):
-    global audio_scan_progress
-    # 确保百分比在有效范围内
-    percentage = max(0, min(100, percentage))
-    
-    with progress_lock:
-        # 允许重置进度（percentage == 0）或者进度递增
-        if percentage == 0 or percentage >= audio_scan_progress['percentage']:
-            audio_scan_progress['percentage'] = percentage
-            audio_scan_progress['current_file'] = current_file
-            print(f"🔄 音频扫描进度更新: {percentage}% - {current_file}")
-            print(f"📊 音频扫描全局进度状态: {audio_scan_progress}")
+    if progress_hub.hub.update(AUDIO_PROGRESS_CHANNEL, percentage, current_file=current_file):
+        print(f"🔄 音频扫描进度更新: {percentage}% - {current_file}")
+
+
+def progress_event_stream(channel, follow=False):
+    """进度 SSE 响应；关闭代理缓冲，保证事件即时送达"""
+    return Response(progress_hub.hub.stream(channel, follow=follow), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
 
 @app.route('/')
 def index():
@@ -112,97 +121,140 @@ def video_page():
     # 获取用户权限信息
     user_role = session.get('user_role', None)
     is_admin = user_role == 'admin'
-    return render_template('video.html', default_thumb=default_thumb, is_admin=is_admin)
+    return render_template('video.html', default_thumb=default_thumb, is_admin=is_admin,
+                           hls_enabled=env_loader.hls_enabled)
 
-@app.route('/videos/<path:filename>')
-def serve_video(filename):
-    """提供视频文件服务（支持VIP权限验证和新表结构）"""
+@app.route('/media/video/<int:video_id>')
+def serve_video_by_id(video_id):
+    """按视频ID提供视频文件服务（路径解析结果走缓存，未命中时一次主键查询完成解析）"""
+    cached = _resolve_video_file(video_id, fun.get_session_user_group())
+    return file_offload.send_media_file(cached.abs_path)
+
+def _resolve_video_file(video_id, user_group):
+    """
+    按视频ID解析视频文件并判断权限，不存在 abort(404)，无权限 abort(403)
+
+    返回的缓存条目 meta 中带有时长/宽高/编码，故事板和 HLS 接口命中缓存时不需要再查库
+    """
+    cached = path_cache.get_file('video', video_id)
+    
+    if cached is None:
+        video_info = get_video_file_by_id(video_id, user_group)
+        if not video_info:
+            print(f"视频不存在: video_id={video_id}")
+            abort(404)
+        full_path = Path(os.path.join(video_info['mount_path'], video_info['storage_root'], video_info['relative_path']))
+        meta = {key: video_info[key] for key in ('duration_ms', 'video_width', 'video_height', 'video_codec')}
+        cached = path_cache.put_file('video', video_id, full_path, video_info['group_id'], meta)
+        if cached is None:
+            print(f"视频文件不存在: {full_path}")
+            abort(404)
+    
+    # 缓存与用户无关，权限按缓存中的分组判断
+    if cached.group_id > user_group:
+        print(f"用户组({user_group})无权限访问视频: video_id={video_id}")
+        abort(403)
+    
+    return cached
+
+@app.route('/media/video/<int:video_id>/storyboard.vtt')
+def serve_video_storyboard_vtt(video_id):
+    """悬停预览的 WebVTT 索引；尚未生成时加入后台队列并返回 202 + Retry-After"""
+    return _send_storyboard(video_id, 1)
+
+@app.route('/media/video/<int:video_id>/storyboard.jpg')
+def serve_video_storyboard_sprite(video_id):
+    """悬停预览的雪碧图（权限与视频本身相同）"""
+    return _send_storyboard(video_id, 0)
+
+@app.route('/media/video/<int:video_id>/hls/index.m3u8')
+def serve_video_hls_playlist(video_id):
+    """
+    HLS 播放列表（权限与视频本身相同）
+
+    复制封装刚开始、列表还没写出时返回 202 + Retry-After；不支持或封装失败返回 404，前端回退为直接播放原文件
+    """
+    if not env_loader.hls_enabled:
+        abort(404)
+    cached = _resolve_video_file(video_id, fun.get_session_user_group())
+    video_info = cached.meta
+    if not hls_packager.supported(video_info['duration_ms'], video_info['video_codec']):
+        abort(404)
+
+    playlist_path, complete = hls_packager.playlist(cached.abs_path, video_info['duration_ms'],
+                                                    video_info['video_codec'])
+    if playlist_path is None:
+        if hls_packager.remux_failed(cached.abs_path, video_info['video_codec']):
+            abort(404)
+        response = jsonify({'status': 'pending', 'message': 'HLS 分片准备中'})
+        response.status_code = 202
+        response.headers['Retry-After'] = str(env_loader.hls_segment_seconds)
+        response.headers['Cache-Control'] = 'no-store'
+        return response
+
+    # 复制封装进行中时列表还会追加，始终让播放器重新请求
+    response = send_from_directory(playlist_path.parent, playlist_path.name,
+                                   mimetype='application/vnd.apple.mpegurl', max_age=0)
+    response.headers['Cache-Control'] = 'private, no-cache'
+    return response
+
+@app.route('/media/video/<int:video_id>/hls/<segment_name>')
+def serve_video_hls_segment(video_id, segment_name):
+    """HLS 分片：复制模式返回已封装的分片，转码模式首次请求时当场转码该段"""
+    if not env_loader.hls_enabled:
+        abort(404)
+    cached = _resolve_video_file(video_id, fun.get_session_user_group())
     try:
-        # 获取当前用户权限组
-        user_group = session.get('user_group', 1)
-        if isinstance(user_group, str):
-            user_group = int(user_group) if user_group.isdigit() else 1
-        elif user_group is None:
-            user_group = 1
-        
-        # 检查用户是否有权限访问该视频
-        if not query_database.check_video_access(filename, user_group):
-            print(f"用户组({user_group})无权限访问视频: {filename}")
-            abort(403)  # 返回403 Forbidden而不是404
-        
-        # 尝试从新表结构获取视频路径（参考图片模块的正确实现）
-        try:
-            with db.connect() as conn:
-                with conn.cursor() as cursor:
-                    # 检查新表是否有数据
-                    cursor.execute("SELECT COUNT(*) FROM video_item")
-                    new_table_count = cursor.fetchone()[0]
-                    
-                    if new_table_count > 0:
-                        # 参考图片模块的查询方式
-                        query_sql = """
-                            SELECT 
-                                sd.mount_path,
-                                vc.storage_root,
-                                vi.relative_path,
-                                vc.group_id
-                            FROM video_item vi
-                            JOIN video_collection vc ON vi.collection_id = vc.collection_id
-                            JOIN storage_disk sd ON vc.disk_id = sd.disk_id
-                            WHERE vi.relative_path LIKE %s
-                            LIMIT 1
-                        """
-                        
-                        # 提取和处理路径组件（参考图片模块）
-                        path_obj = Path(filename)
-                        relative_path = str(path_obj).replace('\\', '/')  # 标准化路径
-                        
-                        # 移除路径前面的斜杠
-                        if relative_path.startswith('/'):
-                            relative_path = relative_path[1:]
-                        
-                        # 尝试多种搜索模式
-                        search_patterns = [
-                            f'%{filename}%',
-                            f'%{path_obj.name}%'
-                        ]
-                        
-                        video_info = None
-                        for pattern in search_patterns:
-                            cursor.execute(query_sql, (pattern,))
-                            video_info = cursor.fetchone()
-                            if video_info:
-                                print(f"使用模式 '{pattern}' 找到视频")
-                                break
-                        
-                        if video_info:
-                            mount_path = video_info[0]        # 例如 "C:\"
-                            storage_root = video_info[1]      # 例如 "Users/Administrator/Videos/"  
-                            relative_path = video_info[2]     # 例如 "陈圆圆/video.mp4"
-                            group_id = video_info[3]
-                            
-                            # 构建完整路径（参考图片模块）
-                            full_path = os.path.join(mount_path, storage_root, relative_path)
-                            full_path = Path(full_path).resolve()
-                            
-                            print(f"视频路径拼接:")
-                            print(f"  挂载路径: '{mount_path}'")
-                            print(f"  存储根: '{storage_root}'")
-                            print(f"  相对路径: '{relative_path}'")
-                            print(f"  完整路径: {full_path}")
-                            
-                            if full_path.exists() and full_path.is_file():
-                                print(f"提供视频文件: {full_path}")
-                                return send_from_directory(str(full_path.parent), full_path.name)
-                            else:
-                                print(f"新表中的视频文件不存在: {full_path}")
-        except Exception as e:
-            print(f"视频文件服务错误: {str(e)}")
+        segment_path = hls_packager.segment(cached.abs_path, cached.meta['video_codec'], segment_name)
+    except hls_packager.SegmentBusy:
+        # 转码名额已满：不在请求线程里排队，让播放器稍后重试
+        response = jsonify({'status': 'busy', 'message': '分片转码繁忙，请稍后重试'})
+        response.status_code = 503
+        response.headers['Retry-After'] = str(env_loader.hls_segment_seconds)
+        response.headers['Cache-Control'] = 'no-store'
+        return response
+    if segment_path is None:
+        abort(404)
+    mimetype = 'video/mp2t' if segment_path.suffix == '.ts' else 'video/mp4'
+    response = send_from_directory(segment_path.parent, segment_path.name, mimetype=mimetype,
+                                   max_age=env_loader.hls_max_age)
+    response.cache_control.public = False
+    response.cache_control.private = True
+    return response
+
+def _send_storyboard(video_id, index):
+    if not env_loader.storyboard_enabled:
+        abort(404)
+    cached = _resolve_video_file(video_id, fun.get_session_user_group())
+    generated = storyboard.ready(cached.abs_path)
+    if generated is None:
+        video_info = cached.meta
+        if not storyboard.enqueue(cached.abs_path, video_info['duration_ms'],
+                                  video_info['video_width'], video_info['video_height']):
             abort(404)
-        
-    except Exception as e:
-        print(f"视频访问错误: {str(e)}")
+        response = jsonify({'status': 'pending', 'message': '故事板生成中'})
+        response.status_code = 202
+        response.headers['Retry-After'] = str(env_loader.thumbnail_retry_after)
+        response.headers['Cache-Control'] = 'no-store'
+        return response
+
+    path = generated[index]
+    # 文件名含视频大小和修改时间，内容不变；需要权限判断，只允许浏览器缓存
+    response = send_from_directory(path.parent, path.name,
+                                   mimetype='text/vtt' if index else 'image/jpeg',
+                                   max_age=env_loader.storyboard_max_age)
+    response.cache_control.public = False
+    response.cache_control.private = True
+    return response
+
+@app.route('/videos/<path:filename>')
+def serve_video(filename):
+    """旧版按路径访问视频的兼容入口：解析出视频ID后重定向到 /media/video/<video_id>"""
+    video_id = resolve_legacy_video_id(filename)
+    if not video_id:
+        print(f"旧版视频地址未找到对应视频: {filename}")
         abort(404)
+    return redirect(url_for('serve_video_by_id', video_id=video_id))
 
 @app.route('/thumbnails/<path:filename>')
 def serve_thumbnail(filename):
@@ -210,6 +262,10 @@ def serve_thumbnail(filename):
     try:
         print(f"请求缩略图: {filename}")
         
+        cached = path_cache.get_file('thumbnail', filename)
+        if cached is not None:
+            return _send_thumbnail(cached.abs_path)
+        
         # 首先尝试从新表结构查找缩略图
         try:
             with db.connect() as conn:
@@ -228,11 +284,15 @@ def serve_thumbnail(filename):
                             sd_video.mount_path as video_mount,
                             vc.storage_root,
                             vi.relative_path,
-                            vi.video_name
+                            vi.video_name,
+                            vi.duration_ms,
+                            vi.video_id,
+                            tf.next_retry_at > NOW() as backing_off
                         FROM video_item vi
                         JOIN video_collection vc ON vi.collection_id = vc.collection_id
                         JOIN storage_disk sd_video ON vc.disk_id = sd_video.disk_id
                         LEFT JOIN storage_disk sd_thumb ON vc.thumbnail_disk_id = sd_thumb.disk_id
+                        LEFT JOIN thumbnail_failure tf ON tf.video_id = vi.video_id
                         WHERE vi.thumbnail_path = %s 
                            OR (vi.thumbnail_path IS NULL AND vi.video_name = %s)
                            OR (vi.thumbnail_path IS NULL AND vi.video_name LIKE %s)
@@ -253,51 +313,78 @@ def serve_thumbnail(filename):
                     
                     video_info = cursor.fetchone()
                     if video_info:
-                        thumb_mount = video_info[0]
-                        thumbnail_root = video_info[1] 
-                        thumbnail_path = video_info[2]
-                        video_mount = video_info[3]
-                        storage_root = video_info[4]
-                        video_relative_path = video_info[5]
-                        video_name = video_info[6]
-                        
-                        # 如果有缩略图配置，使用配置的路径
-                        if thumb_mount and thumbnail_root and thumbnail_path:
-                            thumbnail_full_path = Path(thumb_mount) / thumbnail_root / thumbnail_path
-                            print(f"使用配置的缩略图路径: {thumbnail_full_path}")
-                        else:
-                            # 回退到传统方式（与视频同目录）
-                            video_full_path = Path(video_mount) / storage_root / video_relative_path
-                            thumbnail_full_path = video_full_path.parent / f"{Path(video_name).stem}.jpg"
-                            print(f"使用传统缩略图路径: {thumbnail_full_path}")
+                        duration_ms = video_info[7]
+                        video_id = video_info[8]
+                        backing_off = video_info[9]
+
+                        # 配置了缩略图目录时在其下，否则与视频同目录（回退到传统方式）
+                        video_full_path, thumbnail_full_path = thumbnail_queue.thumbnail_paths(*video_info[:7])
+                        print(f"缩略图路径: {thumbnail_full_path}")
                         
                         # 检查缩略图是否存在
                         if thumbnail_full_path.exists():
                             print(f"找到缩略图: {thumbnail_full_path}")
-                            return send_from_directory(str(thumbnail_full_path.parent), thumbnail_full_path.name)
-                        else:
-                            print(f"缩略图不存在，尝试生成: {thumbnail_full_path}")
-                            
-                            # 确保缩略图目录存在
-                            thumbnail_full_path.parent.mkdir(parents=True, exist_ok=True)
-                            
-                            # 生成缩略图
-                            video_full_path = Path(video_mount) / storage_root / video_relative_path
-                            if video_full_path.exists():
-                                if fun.generate_thumbnail(str(video_full_path), str(thumbnail_full_path)):
-                                    print(f"缩略图生成成功: {thumbnail_full_path}")
-                                    return send_from_directory(str(thumbnail_full_path.parent), thumbnail_full_path.name)
-                                else:
-                                    print(f"缩略图生成失败")
+                            path_cache.put_file('thumbnail', filename, thumbnail_full_path)
+                            return _send_thumbnail(thumbnail_full_path)
+
+                        # 最近生成失败过，退避期内直接返回默认图，不再启动 ffmpeg
+                        if backing_off:
+                            print(f"缩略图生成失败退避中，返回默认图: video_id={video_id}")
+                            return _thumbnail_placeholder()
+
+                        # 缩略图缺失：交给后台队列生成（页面可见，优先处理），本次先返回占位图
+                        if video_full_path.exists():
+                            state = thumbnail_queue.enqueue(video_full_path, thumbnail_full_path,
+                                                            thumbnail_queue.PRIORITY_VISIBLE, duration_ms, video_id)
+                            print(f"缩略图不存在，已加入生成队列({state}): {thumbnail_full_path}")
+                            return _thumbnail_placeholder(retry_after=env_loader.thumbnail_retry_after)
+                        print(f"视频文件不存在，无法生成缩略图: {video_full_path}")
                     else:
                         print(f"新表中未找到对应视频: {filename}")
         except Exception as e:
             print(f"缩略图服务错误: {str(e)}")
-            return send_from_directory(app.static_folder, app.config['DEFAULT_THUMB_PATH'])
+        return _thumbnail_placeholder()
 
     except Exception as e:
         print(f"缩略图处理异常: {str(e)}")
-        return send_from_directory(app.static_folder, app.config['DEFAULT_THUMB_PATH'])
+        return _thumbnail_placeholder()
+
+def _send_derivative(source_path, width, private=False, box=False):
+    """
+    按 Accept 发送缩放后的 WebP/JPEG，生成失败返回 None（调用方回退原图）
+
+    private=True 用于需要权限判断的资源：只允许浏览器缓存，不允许共享缓存
+    box=True 用于图片预览：宽高都限制在 width 以内（缩略图只限制宽度，与 srcset 的宽度描述一致）
+    """
+    fmt = derivative_store.negotiate_format(request.headers.get('Accept'))
+    derivative = derivative_store.get(source_path, width, fmt, box)
+    if not derivative:
+        return None
+    response = send_from_directory(derivative.parent, derivative.name,
+                                   mimetype=derivative_store.FORMATS[fmt][0],
+                                   max_age=env_loader.derivative_max_age)
+    response.vary.add('Accept')
+    if private:
+        response.cache_control.public = False
+        response.cache_control.private = True
+    return response
+
+def _send_thumbnail(thumbnail_full_path):
+    """发送缩略图：带 ?w= 时返回缩放图，否则发送原图"""
+    width = derivative_store.pick_width(request.args.get('w'))
+    if width:
+        response = _send_derivative(thumbnail_full_path, width)
+        if response is not None:
+            return response
+    return file_offload.send_media_file(thumbnail_full_path)
+
+def _thumbnail_placeholder(retry_after=None):
+    """默认占位缩略图；缩略图正在后台生成时不缓存，并通过 Retry-After 提示前端稍后重试"""
+    response = send_from_directory(app.static_folder, app.config['DEFAULT_THUMB_PATH'])
+    if retry_after:
+        response.headers['Retry-After'] = str(retry_after)
+        response.headers['Cache-Control'] = 'no-store'
+    return response
 
 @app.route('/image')
 def image_page():
@@ -501,6 +588,7 @@ def get_config():
 @app.route('/api/scan-videos', methods=['POST'])
 @fun.admin_required
 def scan_videos():
+    """提交视频扫描任务，立即返回任务ID；进度通过 SSE 或 /api/jobs/<job_id> 查询"""
     try:
         data = request.get_json()
         parent_dir = Path(data['parentDir'])
@@ -508,41 +596,50 @@ def scan_videos():
         # 获取VIP设置
         is_vip = data.get('is_vip', False)
         print(f"视频VIP设置: {is_vip}")
-
-        # 重置进度
-        update_scan_progress(0, '开始扫描...')
-
-        print(f"开始扫描视频: {parent_dir}")
-        
-        # 检查是否使用新的扫描逻辑
-        try:
-            # 从请求中获取缩略图目录（如果提供）
-            thumbnail_dir = data.get('thumbnailDir')
-            
-            # 使用新的扫描逻辑（支持跨根目录和缩略图自动映射）
-            result = scan_and_process_videos_new(
-                app,
-                parent_dir,
-                is_vip=is_vip,
-                progress_callback=update_scan_progress,
-                thumbnail_dir=thumbnail_dir
-            )
-            print(f"新扫描逻辑完成，结果：{result}")
-            
-            # 确保进度显示完成
-            update_scan_progress(100, '扫描完成')
-            
-            return jsonify({
-                'status': 'success',
-                **result
-            })
-            
-        except Exception as e:
-            print(f"视频扫描错误: {str(e)}")
-            return jsonify({
-                'status': 'error',
-                'message': str(e)
-            })
+        # 增量扫描：只处理新增/变化的文件，并删除已消失文件的记录
+        incremental = str(data.get('incremental', False)).lower() == 'true'
+        # 从请求中获取缩略图目录（如果提供）
+        thumbnail_dir = data.get('thumbnailDir')
+
+        def run_scan(progress, cancel_event):
+            # 重置进度
+            progress(0, '开始扫描...')
+            print(f"开始扫描视频: {parent_dir}")
+            try:
+                # 使用新的扫描逻辑（支持跨根目录和缩略图自动映射）
+                result = scan_and_process_videos_new(
+                    app,
+                    parent_dir,
+                    is_vip=is_vip,
+                    progress_callback=progress,
+                    thumbnail_dir=thumbnail_dir,
+                    incremental=incremental,
+                    cancel_event=cancel_event
+                )
+                print(f"新扫描逻辑完成，结果：{result}")
+                progress(100, '扫描完成')
+                return {'status': 'success', **result}
+            except ScanCancelled:
+                # 让进度流结束，任务状态由任务执行器记为已取消
+                update_scan_progress(100, '扫描已取消')
+                raise
+            except Exception as e:
+                print(f"视频扫描错误: {str(e)}")
+                update_scan_progress(100, f'扫描失败: {str(e)}')
+                return {'status': 'error', 'message': str(e)}
+
+        job = job_runner.runner.submit(
+            'video', run_scan,
+            params={'parentDir': str(parent_dir), 'is_vip': is_vip, 'incremental': incremental,
+                    'thumbnailDir': thumbnail_dir},
+            progress_callback=update_scan_progress
+        )
+        return jsonify({
+            'status': 'success',
+            'message': '扫描任务已提交',
+            'job_id': job.job_id,
+            'job': job.to_dict()
+        })
     except Exception as e:
         print(f"扫描视频异常: {str(e)}")
         return jsonify({
@@ -554,96 +651,15 @@ def scan_videos():
 
 @app.route('/api/scan-videos-progress')
 def scan_videos_progress():
-    def generate():
-        last_percentage = -1  # 初始值设为-1确保第一次一定会发送
-        timeout_counter = 0  # 添加超时计数器
-        max_timeout = 300  # 最大超时时间（60秒）
-        
-        print(f"🔌 视频扫描SSE连接开始，初始进度: {scan_progress}")
-        
-        while True:
-            current_percentage = scan_progress['percentage']
-            current_file = scan_progress['current_file']
-            
-            # 只有当进度发生实际变化时才发送更新
-            if current_percentage != last_percentage:
-                data = {
-                    'percentage': current_percentage,
-                    'current_file': current_file
-                }
-                yield f"data: {json.dumps(data)}\n\n"
-                last_percentage = current_percentage
-                timeout_counter = 0  # 重置超时计数器
-                
-                print(f"📡 视频扫描SSE发送进度: {current_percentage}% - {current_file}")
-
-                # 如果完成则结束事件流
-                if current_percentage >= 100:
-                    print("🏁 视频扫描SSE进度流结束")
-                    break
-            else:
-                timeout_counter += 1
-                # 如果长时间没有进度更新，结束连接避免资源浪费
-                if timeout_counter > max_timeout:
-                    print("⏰ 视频扫描SSE连接超时，自动关闭")
-                    break
-                    
-            time.sleep(0.2)
-    return Response(generate(), mimetype='text/event-stream')
+    """视频扫描进度（跟随最近一次视频扫描）"""
+    print("🔌 视频扫描SSE连接开始")
+    return progress_event_stream(VIDEO_PROGRESS_CHANNEL, follow=True)
 
 @app.route('/api/scan-images-progress')
 def scan_images_progress():
-    def generate():
-        last_percentage = -1  # 初始值设为-1确保第一次一定会发送
-        timeout_counter = 0  # 添加超时计数器
-        max_timeout = 300  # 最大超时时间（60秒）
-        
-        print(f"🔌 SSE连接开始，初始进度: {image_scan_progress}")
-        
-        while True:
-            # 使用线程锁安全读取进度
-            with progress_lock:
-                current_percentage = image_scan_progress['percentage']
-                current_file = image_scan_progress['current_file']
-                current = image_scan_progress['current']
-                total = image_scan_progress['total']
-            
-            # 只有当进度发生实际变化时才发送更新
-            if current_percentage != last_percentage:
-                data = {
-                    'percentage': current_percentage,
-                    'current_file': current_file,
-                    'current': current,
-                    'total': total
-                }
-                yield f"data: {json.dumps(data)}\n\n"
-                last_percentage = current_percentage
-                timeout_counter = 0  # 重置超时计数器
-                
-                print(f"📡 SSE发送进度: {current_percentage}% - {current_file}")
-
-                # 如果完成则结束事件流
-                if current_percentage >= 100:
-                    print("🏁 SSE进度流结束")
-                    break
-            else:
-                # 增加超时计数器
-                timeout_counter += 1
-                if timeout_counter >= max_timeout:
-                    # 超时退出，发送错误信息
-                    error_data = {
-                        'percentage': 0,
-                        'current_file': '连接超时',
-                        'current': 0,
-                        'total': 0,
-                        'error': True
-                    }
-                    yield f"data: {json.dumps(error_data)}\n\n"
-                    print("⏰ SSE连接超时")
-                    break
-                    
-            time.sleep(0.2)
-    return Response(generate(), mimetype='text/event-stream')
+    """图片扫描进度（跟随最近一次图片扫描）"""
+    print("🔌 图片扫描SSE连接开始")
+    return progress_event_stream(IMAGE_PROGRESS_CHANNEL, follow=True)
 
 
 
@@ -653,6 +669,15 @@ def get_videos():
         page = int(request.args.get('page', 1))
         per_page = int(request.args.get('per_page', env_loader.video_everyPageShowVideoNum))
         category = request.args.get('category', '')
+        # 游标分页（可选）：传入上次返回的 next_cursor/prev_cursor，按主键定位，深翻页不变慢
+        page_cursor = request.args.get('cursor') or None
+        if page_cursor and not pagination.is_valid_cursor(page_cursor):
+            return jsonify({'status': 'error', 'message': '无效的分页游标'}), 400
+        # 分面筛选/排序（可选）：quality、codec、resolution、duration、size、*_min/*_max、sort、order
+        try:
+            filters = video_facets.parse_filters(request.args)
+        except ValueError as e:
+            return jsonify({'status': 'error', 'message': str(e)}), 400
 
         # 获取当前用户权限组
         user_group = session.get('user_group', 1)
@@ -664,12 +689,23 @@ def get_videos():
         print(f"用户权限组: {user_group}")
 
         # 使用新表结构查询视频
-        total_count, videos = get_videos_paginated_new(
-            page=page,
-            per_page=per_page,
-            category=category,
-            user_group=user_group
-        )
+        if video_facets.has_filters(filters):
+            total_count, videos, page_info = get_videos_faceted_new(
+                filters,
+                page=page,
+                per_page=per_page,
+                category=category,
+                user_group=user_group,
+                page_cursor=page_cursor
+            )
+        else:
+            total_count, videos, page_info = get_videos_paginated_new(
+                page=page,
+                per_page=per_page,
+                category=category,
+                user_group=user_group,
+                page_cursor=page_cursor
+            )
         print(f"获取视频总数和分页数据：{total_count, videos}")
 
         # 计算总页数
@@ -683,7 +719,8 @@ def get_videos():
                     'current_page': page,
                     'per_page': per_page,
                     'total_pages': total_pages,
-                    'total_count': total_count
+                    'total_count': total_count,
+                    **page_info
                 }
             }
         })
@@ -694,6 +731,29 @@ def get_videos():
             'message': f'获取视频列表失败: {str(e)}'
         })
 
+@app.route('/api/videos/facets')
+def get_video_facets():
+    """
+    视频分面计数：画质/编码/分辨率/时长/大小各取值的视频数
+    筛选参数与 /api/videos 相同，每个分面的计数应用其余分面的筛选条件
+    """
+    try:
+        filters = video_facets.parse_filters(request.args)
+    except ValueError as e:
+        return jsonify({'status': 'error', 'message': str(e)}), 400
+
+    user_group = fun.get_session_user_group()
+
+    try:
+        data = video_facets.get_facets(filters, user_group, request.args.get('category', ''))
+        return jsonify({'status': 'success', 'data': data})
+    except Exception as e:
+        print(f"获取视频分面失败: {str(e)}")
+        return jsonify({
+            'status': 'error',
+            'message': f'获取视频分面失败: {str(e)}'
+        })
+
 @app.route('/api/video-categories')
 def get_video_categories():
     try:
@@ -725,6 +785,11 @@ def search_videos():
                 'message': '请输入搜索关键词'
             })
 
+        # 游标分页（可选）
+        page_cursor = request.args.get('cursor') or None
+        if page_cursor and not pagination.is_valid_cursor(page_cursor):
+            return jsonify({'status': 'error', 'message': '无效的分页游标'}), 400
+
         # 获取当前用户权限组
         user_group = session.get('user_group', 1)
         if isinstance(user_group, str):
@@ -733,11 +798,12 @@ def search_videos():
             user_group = 1
 
         # 使用新表结构搜索视频
-        total_count, videos = search_videos_by_name_new(
+        total_count, videos, page_info = search_videos_by_name_new(
             keyword,
             page=page,
             per_page=per_page,
-            user_group=user_group
+            user_group=user_group,
+            page_cursor=page_cursor
         )
 
         # 计算总页数
@@ -751,7 +817,8 @@ def search_videos():
                     'current_page': page,
                     'per_page': per_page,
                     'total_pages': total_pages,
-                    'total_count': total_count
+                    'total_count': total_count,
+                    **page_info
                 },
                 'keyword': keyword
             }
@@ -763,6 +830,71 @@ def search_videos():
             'message': f'搜索视频失败: {str(e)}'
         })
 
+@app.route('/api/search')
+def search_all():
+    """
+    统一搜索：视频（文件名）、图集（集合名）、音频（标题/艺术家/专辑/流派）
+    参数 q=关键词（空格分隔的多个词需全部命中），type=all|video|image|audio，page，per_page
+    每种类型各自按相关度排序分页
+    """
+    try:
+        keyword = request.args.get('q', '').strip()
+        if not keyword:
+            return jsonify({'status': 'error', 'message': '请输入搜索关键词'})
+
+        media_type = request.args.get('type', 'all')
+        if media_type == 'all':
+            media_types = list(search_index.MEDIA_TYPES)
+        elif media_type in search_index.MEDIA_TYPES:
+            media_types = [media_type]
+        else:
+            return jsonify({'status': 'error', 'message': f'不支持的搜索类型: {media_type}'}), 400
+
+        page = max(1, int(request.args.get('page', 1)))
+        per_page = min(100, max(1, int(request.args.get('per_page', 20))))
+
+        user_group = fun.get_session_user_group()
+        results = search_index.search(db, keyword, media_types, user_group, page, per_page)
+        return jsonify({
+            'status': 'success',
+            'data': {
+                'keyword': keyword,
+                'page': page,
+                'per_page': per_page,
+                'results': results
+            }
+        })
+    except Exception as e:
+        print(f"统一搜索失败: {str(e)}")
+        return jsonify({
+            'status': 'error',
+            'message': f'搜索失败: {str(e)}'
+        })
+
+@app.route('/api/suggest')
+def suggest():
+    """
+    搜索框输入联想：参数 q=已输入的前缀，type=all|video|image|audio，limit
+    结果来自内存前缀索引，只包含当前用户组可见的名称
+    """
+    prefix = request.args.get('q', '')
+    media_type = request.args.get('type', 'all')
+    if media_type == 'all':
+        media_types = None
+    elif media_type in suggest_index.MEDIA_TYPES:
+        media_types = [media_type]
+    else:
+        return jsonify({'status': 'error', 'message': f'不支持的联想类型: {media_type}'}), 400
+    try:
+        limit = max(1, min(int(request.args.get('limit', 10)), 50))
+    except ValueError:
+        limit = 10
+
+    return jsonify({
+        'status': 'success',
+        'data': suggest_index.suggest(prefix, fun.get_session_user_group(), media_types, limit)
+    })
+
 def admin_required_api(f):
     @wraps(f)
     def decorated_function(*args, **kwargs):
@@ -782,6 +914,61 @@ def admin_required_api(f):
         return f(*args, **kwargs)
     return decorated_function
 
+# 后台扫描任务接口 ============================================>
+@app.route('/api/jobs')
+@admin_required_api
+def list_jobs():
+    """最近的扫描任务列表，可按 media_type 过滤"""
+    media_type = request.args.get('media_type') or None
+    limit = min(max(request.args.get('limit', 50, type=int), 1), 500)
+    return jsonify({
+        'status': 'success',
+        'data': job_runner.runner.list(media_type, limit)
+    })
+
+@app.route('/api/jobs/<job_id>')
+@admin_required_api
+def get_job(job_id):
+    """任务状态与进度"""
+    job = job_runner.runner.get(job_id)
+    if not job:
+        return jsonify({'status': 'error', 'message': '任务不存在'}), 404
+    return jsonify({'status': 'success', 'data': job})
+
+@app.route('/api/jobs/<job_id>/result')
+@admin_required_api
+def get_job_result(job_id):
+    """任务状态及扫描结果（任务结束后 result 才有值）"""
+    job = job_runner.runner.get(job_id, with_result=True)
+    if not job:
+        return jsonify({'status': 'error', 'message': '任务不存在'}), 404
+    return jsonify({'status': 'success', 'data': job})
+
+@app.route('/api/jobs/<job_id>/progress')
+@admin_required_api
+def job_progress(job_id):
+    """单个任务的进度 SSE，任务结束后事件流随之结束"""
+    if progress_hub.hub.snapshot(job_id) is None:
+        # 不在内存中的任务（例如重启前的任务）只返回一次最终状态
+        job = job_runner.runner.get(job_id)
+        if not job:
+            return jsonify({'status': 'error', 'message': '任务不存在'}), 404
+        data = {'percentage': job['progress'], 'current_file': job['message'],
+                'status': job['status'], 'error': job['error']}
+        return Response(f"data: {json.dumps(data, ensure_ascii=False)}\n\n", mimetype='text/event-stream')
+    return progress_event_stream(job_id)
+
+@app.route('/api/jobs/<job_id>/cancel', methods=['POST'])
+@admin_required_api
+def cancel_job(job_id):
+    """取消排队中的任务，或请求运行中的任务在当前文件处理完后停止"""
+    ok, message = job_runner.runner.cancel(job_id)
+    return jsonify({
+        'status': 'success' if ok else 'error',
+        'message': message,
+        'data': job_runner.runner.get(job_id)
+    })
+
 @app.route('/clear_video_table', methods=['GET'])
 def clear_table():
     print("开始清空视频表数据库")
@@ -808,9 +995,13 @@ def force_clear_videos():
                 for table in existing_tables:
                     if table in ['video_item', 'video_collection', 'video_playlist_item', 'video_playlist']:
                         tables_to_clear.append(table)
+                # 缩略图失败记录按 video_id 关联，随视频表一起清空
+                cursor.execute("SHOW TABLES LIKE 'thumbnail_failure'")
+                if cursor.fetchone():
+                    tables_to_clear.append('thumbnail_failure')
                 
                 # 清空表（按依赖关系顺序）
-                clear_order = ['video_playlist_item', 'video_playlist', 'video_item', 'video_collection']
+                clear_order = ['thumbnail_failure', 'video_playlist_item', 'video_playlist', 'video_item', 'video_collection']
                 
                 cleared_tables = []
                 for table in clear_order:
@@ -825,6 +1016,10 @@ def force_clear_videos():
                 # 重新启用外键检查
                 cursor.execute("SET FOREIGN_KEY_CHECKS = 1")
                 conn.commit()
+                path_cache.invalidate('video', 'thumbnail')
+                count_cache.invalidate('video')
+                video_facets.refresh_all()
+                suggest_index.refresh('video')
                 
                 return jsonify({
                     'status': 'success',
@@ -890,6 +1085,156 @@ def check_migration_status():
             'message': f'检查状态失败: {str(e)}'
         }), 500
 
+@app.route('/api/db-pool-stats', methods=['GET'])
+@admin_required_api
+def db_pool_stats():
+    """数据库连接池统计（借出/等待/创建/回收），用于调整连接池大小"""
+    try:
+        return jsonify({
+            'status': 'success',
+            'data': db.pool_stats()
+        })
+    except Exception as e:
+        print(f"获取连接池统计失败: {str(e)}")
+        return jsonify({
+            'status': 'error',
+            'message': f'获取连接池统计失败: {str(e)}'
+        }), 500
+
+@app.route('/api/path-cache-stats', methods=['GET'])
+@admin_required_api
+def path_cache_stats():
+    """文件路径缓存统计（命中/未命中/淘汰），用于调整缓存容量和有效期"""
+    return jsonify({
+        'status': 'success',
+        'data': path_cache.stats()
+    })
+
+@app.route('/api/count-cache-stats', methods=['GET'])
+@admin_required_api
+def count_cache_stats():
+    """列表总数缓存统计及当前计数模式"""
+    return jsonify({
+        'status': 'success',
+        'data': count_cache.stats()
+    })
+
+@app.route('/api/collection-stats/reconcile', methods=['POST'])
+@admin_required_api
+def reconcile_collection_stats():
+    """按条目表重建集合统计列（条目数/总字节/总时长/第一个条目）"""
+    data = request.get_json(silent=True) or {}
+    media_types = data.get('media_types') or list(collection_stats.SPECS)
+    invalid = [m for m in media_types if m not in collection_stats.SPECS]
+    if invalid:
+        return jsonify({'status': 'error', 'message': f"未知的媒体类型: {', '.join(invalid)}"}), 400
+    try:
+        result = collection_stats.reconcile(media_types)
+        count_cache.invalidate(*media_types)
+        return jsonify({'status': 'success', 'data': result})
+    except Exception as e:
+        print(f"重建集合统计列失败: {str(e)}")
+        return jsonify({'status': 'error', 'message': str(e)}), 500
+
+@app.route('/api/suggest-stats', methods=['GET'])
+@admin_required_api
+def suggest_stats():
+    """搜索联想索引的条目数和最近重建时间"""
+    return jsonify({
+        'status': 'success',
+        'data': suggest_index.stats()
+    })
+
+@app.route('/api/thumbnail-queue', methods=['GET'])
+@admin_required_api
+def thumbnail_queue_stats():
+    """后台缩略图生成队列的排队数、正在生成数和累计成功/失败数"""
+    return jsonify({
+        'status': 'success',
+        'data': thumbnail_queue.stats()
+    })
+
+@app.route('/api/derivative-stats', methods=['GET'])
+@admin_required_api
+def derivative_stats():
+    """缩放图缓存的配置和命中/生成/失败计数"""
+    return jsonify({
+        'status': 'success',
+        'data': derivative_store.stats()
+    })
+
+@app.route('/api/storyboard-stats', methods=['GET'])
+@admin_required_api
+def storyboard_stats():
+    """视频故事板生成队列的状态和生成/失败计数"""
+    return jsonify({
+        'status': 'success',
+        'data': storyboard.stats()
+    })
+
+@app.route('/api/hls-stats', methods=['GET'])
+@admin_required_api
+def hls_stats():
+    """HLS 分片缓存的占用、复制封装/分片转码数量和淘汰计数"""
+    return jsonify({
+        'status': 'success',
+        'data': hls_packager.stats()
+    })
+
+@app.route('/api/thumbnail-failures', methods=['GET'])
+@admin_required_api
+def thumbnail_failures():
+    """缩略图生成失败记录（失败次数、最后错误、下次允许重试时间）"""
+    try:
+        page = max(1, int(request.args.get('page', 1)))
+        per_page = min(200, max(1, int(request.args.get('per_page', 50))))
+        total, items = thumbnail_failure.list_failures(page, per_page)
+        return jsonify({
+            'status': 'success',
+            'data': {
+                'total': total,
+                'page': page,
+                'per_page': per_page,
+                'items': items
+            }
+        })
+    except Exception as e:
+        print(f"获取缩略图失败记录失败: {str(e)}")
+        return jsonify({'status': 'error', 'message': str(e)}), 500
+
+@app.route('/api/thumbnail-failures/retry', methods=['POST'])
+@admin_required_api
+def retry_thumbnail_failures():
+    """清除失败记录并重新生成缩略图；请求体 {"video_ids": [...]}，不传 video_ids 表示全部重试"""
+    try:
+        data = request.get_json(silent=True) or {}
+        video_ids = data.get('video_ids')
+        if video_ids is not None:
+            video_ids = [int(video_id) for video_id in video_ids]
+        queued = thumbnail_failure.retry(video_ids)
+        return jsonify({
+            'status': 'success',
+            'message': f'已重新加入缩略图队列: {queued} 个',
+            'queued': queued
+        })
+    except (TypeError, ValueError):
+        return jsonify({'status': 'error', 'message': 'video_ids 必须是视频ID列表'}), 400
+    except Exception as e:
+        print(f"重试缩略图生成失败: {str(e)}")
+        return jsonify({'status': 'error', 'message': str(e)}), 500
+
+@app.route('/api/file-offload/config', methods=['GET'])
+@admin_required_api
+def file_offload_config():
+    """当前文件发送方式，以及按 storage_disk 生成的 nginx internal location 配置片段"""
+    return jsonify({
+        'status': 'success',
+        'data': {
+            **file_offload.stats(),
+            'nginx_config': file_offload.nginx_config()
+        }
+    })
+
 @app.route('/clear_image_table', methods=['GET'])
 @fun.admin_required
 def clear_image_table():
@@ -914,6 +1259,9 @@ def clear_image_table():
                 
                 # 5. 提交事务
                 conn.commit()
+                path_cache.invalidate('image')
+                count_cache.invalidate('image')
+                suggest_index.refresh('image')
                 
                 print("图片表清空成功")
                 return jsonify({"message": "图片数据表已清空"})
@@ -926,6 +1274,7 @@ def clear_image_table():
 
 @app.route('/api/scan-images', methods=['POST'])
 def scan_images():
+    """提交图片扫描任务，立即返回任务ID"""
     print("开始调用图片扫描接口")
     try:
         # 获取前端参数（JSON 格式）
@@ -940,29 +1289,40 @@ def scan_images():
             is_vip = is_vip_data.lower() == 'true'
         else:
             is_vip = bool(is_vip_data)
-        print("参数：", root_path, is_vip)
+        incremental = str(data.get('incremental', False)).lower() == 'true'
+        print("参数：", root_path, is_vip, incremental)
         
         # 参数校验
         if not root_path:
             return jsonify({'status': 'error', 'message': '缺少根路径参数'}), 400
         print("参数校验结束")
-        
-        # 🎯 重置进度
-        update_image_scan_progress(0, '开始扫描...', 0, 0)
-        print("📊 图片扫描进度已重置")
-        
-        print("开始扫描图片...")
-        
-        # 🎯 同步处理图片扫描（传递进度回调函数）
-        db = connect_mysql.Connect_mysql()
-        result = db.process_image_data_with_progress(root_path, is_vip, update_image_scan_progress)
-        print(f"到此处执行正常 开始返回结果 得到的返回值：{result}")
-        
-        # 确保进度显示完成
-        update_image_scan_progress(100, '扫描完成', 0, 0)
-        
-        # 解析结果并返回
-        if result.get('status') == 'success':
+
+        def run_scan(progress, cancel_event):
+            # 🎯 重置进度
+            progress(0, '开始扫描...', 0, 0)
+            print("开始扫描图片...")
+            try:
+                scanner = connect_mysql.Connect_mysql()
+                result = scanner.process_image_data_with_progress(root_path, is_vip, progress,
+                                                                  incremental=incremental,
+                                                                  cancel_event=cancel_event)
+            except ScanCancelled:
+                update_image_scan_progress(100, '扫描已取消', 0, 0)
+                raise
+            print(f"图片扫描结束，返回值：{result}")
+
+            # 确保进度显示完成
+            progress(100, '扫描完成', 0, 0)
+
+            if result.get('status') != 'success':
+                return {
+                    'status': 'error',
+                    'message': result.get('message', '图片扫描失败'),
+                    'images_added': 0,
+                    'categories_added': 0,
+                    'failed_count': 1
+                }
+
             # 从返回消息中提取文件数量
             message = result.get('message', '')
             images_added = 0
@@ -974,22 +1334,31 @@ def scan_images():
                         images_added = int(match.group(1))
                 except:
                     pass
-            
-            return jsonify({
+
+            return {
                 'status': 'success',
                 'message': result.get('message', '图片扫描完成'),
                 'images_added': images_added,
                 'categories_added': 1 if images_added > 0 else 0,  # 简单估算
-                'failed_count': 0
-            })
-        else:
-            return jsonify({
-                'status': 'error',
-                'message': result.get('message', '图片扫描失败'),
-                'images_added': 0,
-                'categories_added': 0,
-                'failed_count': 1
-            })
+                'failed_count': 0,
+                'incremental': result.get('incremental', False),
+                'added': result.get('added', 0),
+                'changed': result.get('changed', 0),
+                'removed': result.get('removed', 0),
+                'unchanged': result.get('unchanged', 0)
+            }
+
+        job = job_runner.runner.submit(
+            'image', run_scan,
+            params={'parentDir': root_path, 'is_vip': is_vip, 'incremental': incremental},
+            progress_callback=update_image_scan_progress
+        )
+        return jsonify({
+            'status': 'success',
+            'message': '扫描任务已提交',
+            'job_id': job.job_id,
+            'job': job.to_dict()
+        })
 
     except Exception as e:
         print(f"图片扫描异常: {str(e)}")
@@ -1014,6 +1383,10 @@ def get_image_collections():
         page = int(request.args.get('page', 1))
         per_page = int(request.args.get('per_page', env_loader.image_everyPageShowImageNum))
         search = request.args.get('search', '')
+        # 游标分页（可选）
+        page_cursor = request.args.get('cursor') or None
+        if page_cursor and not pagination.is_valid_cursor(page_cursor):
+            return jsonify({'status': 'error', 'message': '无效的分页游标'}), 400
         
         # 获取当前用户组
         user_group = session.get('user_group', 1)  # 默认为普通用户组(1)
@@ -1029,17 +1402,19 @@ def get_image_collections():
         
         # 根据搜索条件查询图片集
         if search:
-            total_count, collections = query_database.search_image_collections(
+            total_count, collections, page_info = query_database.search_image_collections(
                 search, 
                 page=page, 
                 per_page=per_page, 
-                user_group=user_group
+                user_group=user_group,
+                page_cursor=page_cursor
             )
         else:
-            total_count, collections = query_database.get_image_collections_paginated(
+            total_count, collections, page_info = query_database.get_image_collections_paginated(
                 page=page, 
                 per_page=per_page, 
-                user_group=user_group
+                user_group=user_group,
+                page_cursor=page_cursor
             )
         
         # 计算总页数
@@ -1053,7 +1428,8 @@ def get_image_collections():
                     'current_page': page,
                     'per_page': per_page,
                     'total_pages': total_pages,
-                    'total_items': total_count
+                    'total_items': total_count,
+                    **page_info
                 }
             }
         })
@@ -1123,117 +1499,57 @@ def get_image_collection(collection_id):
             'message': f'获取图片集详情失败: {str(e)}'
         }), 500
 
-@app.route('/images/<path:filename>')
-def serve_images(filename):
-    """提供图片文件服务"""
-    try:
-        cleaned_filename = filename.strip()
-        app.logger.info(f"请求图片: {cleaned_filename}")
-        
-        # 如果为空，返回默认图片
-        if not cleaned_filename:
-            app.logger.warning("请求的图片文件名为空")
+@app.route('/media/image/<int:image_id>')
+def serve_image_by_id(image_id):
+    """
+    按图片ID提供图片文件服务（路径解析结果走缓存，未命中时一次主键查询完成解析）
+
+    ?size=grid/cover/lightbox 返回缩小后的预览图（见 image_preview_sizes），
+    TIFF/HEIC 等浏览器无法直接显示的格式也能通过预览图查看
+    """
+    user_group = fun.get_session_user_group()
+    cached = path_cache.get_file('image', image_id)
+    
+    if cached is None:
+        image_info = query_database.get_image_file_by_id(image_id, user_group)
+        if not image_info:
+            app.logger.warning(f"数据库中未找到图片: image_id={image_id}")
             return send_from_directory(app.static_folder, 'images/default.jpg')
         
-        # 从主表中查找图片路径信息
-        query_sql = """
-            SELECT 
-                d.mount_path, 
-                c.storage_root, 
-                i.relative_path,
-                c.group_id
-            FROM 
-                image_item i
-            JOIN 
-                image_collection c ON i.collection_id = c.collection_id
-            JOIN 
-                storage_disk d ON c.disk_id = d.disk_id
-            WHERE 
-                i.relative_path LIKE %s
-            LIMIT 1
-        """
-        
-        # 提取和处理路径组件
-        path_obj = Path(cleaned_filename)
-        relative_path = str(path_obj).replace('\\', '/')  # 标准化路径
-        app.logger.info(f"使用相对路径搜索: {relative_path}")
-        
-        # 移除路径前面的斜杠，避免路径匹配问题
-        if relative_path.startswith('/'):
-            relative_path = relative_path[1:]
-            app.logger.info(f"移除开头斜杠后的路径: {relative_path}")
-        
-        # 尝试不同的搜索模式
-        search_patterns = [
-            f'%{cleaned_filename}%',
-            f'%{path_obj.name}%'
-        ]
-        
-        image_info = None
-        for pattern in search_patterns:
-            app.logger.info(f"使用模式 '{pattern}' 搜索图片")
-            image_info = query_database.db.fetch_one_record(query_sql, (pattern,))
-            if image_info:
-                app.logger.info(f"使用模式 '{pattern}' 找到图片")
-                break
+        relative_path = image_info['relative_path'].replace('\\', '/')
+        full_path = Path(image_info['mount_path']) / image_info['storage_root'] / relative_path
         
-        if image_info:
-            mount_path = image_info[0]
-            storage_root = image_info[1]
-            relative_path = image_info[2]
-            group_id = image_info[3]
-            
-            app.logger.info(f"找到图片信息: 挂载路径={mount_path}, 存储根路径={storage_root}, 相对路径={relative_path}")
-            
-            # 检查用户权限
-            user_group = session.get('user_group', 1)
-            if isinstance(user_group, str):
-                user_group = int(user_group) if user_group.isdigit() else 1
-            elif user_group is None:
-                user_group = 1
-                
-            # VIP用户可以访问所有图片，普通用户只能访问普通图片集(group_id=1)的图片
-            if group_id > 1 and user_group < group_id:
-                app.logger.warning(f"用户组({user_group})权限不足，无法访问图片集组({group_id})的图片")
-                return send_from_directory(app.static_folder, 'images/default.jpg')
-            # 构建完整图片路径
-            base_path = Path(mount_path) / storage_root
-            # 统一使用正斜杠
-            relative_path = relative_path.replace('\\', '/')
-            file_name = Path(relative_path).name
-            dir_path = str(base_path / Path(relative_path).parent)
-            
-            app.logger.info(f"提供图片文件: 目录={dir_path}, 文件名={file_name}")
-            
-            # 检查目录是否存在
-            if os.path.exists(dir_path):
-                # 检查文件是否存在
-                full_path = os.path.join(dir_path, file_name)
-                if os.path.isfile(full_path):
-                    try:
-                        app.logger.info(f"尝试提供文件: {full_path}")
-                        # 检查文件是否是图片
-                        if file_name.lower().endswith(('.png', '.jpg', '.jpeg', '.gif', '.bmp', '.webp', '.tiff')):
-                            return send_from_directory(dir_path, file_name)
-                        else:
-                            app.logger.warning(f"请求的文件不是图片: {file_name}")
-                            return Response('不支持的文件类型', 415)
-                    except Exception as e:
-                        app.logger.error(f"提供图片文件出错: {str(e)}")
-                        return send_from_directory(app.static_folder, 'images/default.jpg')
-                else:
-                    app.logger.warning(f"图片文件不存在: {full_path}")
-            else:
-                app.logger.warning(f"图片目录不存在: {dir_path}")
-        else:
-            app.logger.warning(f"数据库中未找到图片: {cleaned_filename}")
-            
-        # 如果找不到图片，返回默认图片
+        cached = path_cache.put_file('image', image_id, full_path, image_info['group_id'])
+        if cached is None:
+            app.logger.warning(f"图片文件不存在: {full_path}")
+            return send_from_directory(app.static_folder, 'images/default.jpg')
+    
+    # VIP用户可以访问所有图片，普通用户只能访问普通图片集(group_id=1)的图片
+    if cached.group_id > user_group:
+        app.logger.warning(f"用户组({user_group})权限不足，无法访问图片集组({cached.group_id})的图片")
         return send_from_directory(app.static_folder, 'images/default.jpg')
-            
-    except Exception as e:
-        app.logger.error(f"处理图片请求时出错: {str(e)}")
+    
+    preview_size = derivative_store.preset_width(request.args.get('size'))
+    if preview_size:
+        response = _send_derivative(cached.abs_path, preview_size, private=True, box=True)
+        if response is not None:
+            return response
+    
+    # 检查文件是否是浏览器可直接显示的图片
+    if not str(cached.abs_path).lower().endswith(('.png', '.jpg', '.jpeg', '.gif', '.bmp', '.webp', '.tiff')):
+        app.logger.warning(f"请求的文件不是图片: {cached.abs_path}")
+        return Response('不支持的文件类型', 415)
+    
+    return file_offload.send_media_file(cached.abs_path)
+
+@app.route('/images/<path:filename>')
+def serve_images(filename):
+    """旧版按路径访问图片的兼容入口：解析出图片ID后重定向到 /media/image/<image_id>"""
+    image_id = query_database.resolve_legacy_image_id(filename)
+    if not image_id:
+        app.logger.warning(f"旧版图片地址未找到对应图片: {filename}")
         return send_from_directory(app.static_folder, 'images/default.jpg')
+    return redirect(url_for('serve_image_by_id', image_id=image_id))
 
 @app.route('/api/get_collection_images/<int:collection_id>', methods=['GET'])
 def get_collection_images(collection_id):
@@ -1325,6 +1641,10 @@ def get_audio_collections():
         page = int(request.args.get('page', 1))
         per_page = int(request.args.get('per_page', 20))
         search = request.args.get('search', '')
+        # 游标分页（可选）
+        page_cursor = request.args.get('cursor') or None
+        if page_cursor and not pagination.is_valid_cursor(page_cursor):
+            return jsonify({'status': 'error', 'message': '无效的分页游标'}), 400
         
         # 获取当前用户组
         user_group = session.get('user_group', 1)  # 默认为普通用户组(1)
@@ -1337,17 +1657,19 @@ def get_audio_collections():
             
         # 根据搜索条件查询音频集
         if search:
-            total_count, collections = query_database.search_audio_collections(
+            total_count, collections, page_info = query_database.search_audio_collections(
                 search, 
                 page=page, 
                 per_page=per_page, 
-                user_group=user_group
+                user_group=user_group,
+                page_cursor=page_cursor
             )
         else:
-            total_count, collections = query_database.get_audio_collections_paginated(
+            total_count, collections, page_info = query_database.get_audio_collections_paginated(
                 page=page, 
                 per_page=per_page, 
-                user_group=user_group
+                user_group=user_group,
+                page_cursor=page_cursor
             )
         
         # 计算总页数
@@ -1361,7 +1683,8 @@ def get_audio_collections():
                     'current_page': page,
                     'per_page': per_page,
                     'total_pages': total_pages,
-                    'total_items': total_count
+                    'total_items': total_count,
+                    **page_info
                 }
             }
         })
@@ -1426,131 +1749,81 @@ def get_audio_collection(collection_id):
 
 
 
-@app.route('/audios/<path:filename>')
-def serve_audio(filename):
-    """提供音频文件服务"""
-    try:
-        print("\n=== 开始处理音频请求 ===")
-        print(f"请求的文件名: {filename}")
-        
-        # 获取当前用户组
-        user_group = session.get('user_group', 1)
-        print(f"当前用户组: {user_group}")
-        
-        # 标准化路径
-        filename = filename.replace('\\', '/').replace('//', '/')
-        print(f"标准化后的文件名: {filename}")
-        
-        # 检查用户是否有权限访问该音频
-        print("检查音频访问权限...")
-        access_result = query_database.check_audio_access(filename, user_group)
-        print(f"访问权限检查结果: {access_result}")
-        if not access_result:
-            print("访问权限检查失败，返回403")
-            abort(403)
-        
-        # 🎯 修复：音频路径重复问题
-        print("📊 查询音频文件路径信息...")
-        
-        query_sql = """
-            SELECT 
-                d.mount_path, 
-                a.relative_path
-            FROM 
-                audio_item a
-            JOIN 
-                audio_collection c ON a.collection_id = c.collection_id
-            JOIN 
-                storage_disk d ON c.disk_id = d.disk_id
-            WHERE 
-                a.relative_path LIKE %s
-            LIMIT 1
-        """
-        
-        # 直接使用前端传来的路径构建搜索条件
-        search_pattern = f"%{filename}%"
-        print(f"搜索模式: {search_pattern}")
-        
-        # 查询数据库
-        print("执行数据库查询...")
-        audio_info = query_database.db.fetch_one_record(query_sql, (search_pattern,))
-        
+@app.route('/media/audio/<int:audio_id>')
+def serve_audio_by_id(audio_id):
+    """按音频ID提供音频文件服务（路径解析结果走缓存，支持范围请求）"""
+    user_group = fun.get_session_user_group()
+    cached = path_cache.get_file('audio', audio_id)
+    
+    if cached is None:
+        audio_info = query_database.get_audio_file_by_id(audio_id, user_group)
         if not audio_info:
-            print(f"❌ 未找到音频文件: {filename}")
+            print(f"❌ 未找到音频文件: audio_id={audio_id}")
             abort(404)
-        
-        # 直接使用数据库存储的完整路径
-        mount_path = audio_info[0]
-        relative_path = audio_info[1]  # 这已经是完整的相对路径了
-        
-        print(f"🗂️ 路径信息:")
-        print(f"   挂载路径: '{mount_path}'")
-        print(f"   相对路径: '{relative_path}'")
-        
-        # 🔧 直接拼接完整路径（不需要额外的storage_root）
-        full_audio_path = os.path.join(mount_path, relative_path)
-        print(f"🎵 完整音频路径: {full_audio_path}")
-        
-        # 检查音频文件是否存在
-        if not os.path.isfile(full_audio_path):
+        # 音频的相对路径是相对于磁盘挂载点的，不需要额外的storage_root
+        full_audio_path = Path(os.path.join(audio_info['mount_path'], audio_info['relative_path']))
+        cached = path_cache.put_file('audio', audio_id, full_audio_path, audio_info['group_id'])
+        if cached is None:
             print(f"❌ 音频文件不存在: {full_audio_path}")
             abort(404)
-            
-        print("✅ 音频文件存在，准备发送...")
-        
-        # 🔧 使用Path对象分离目录和文件名（与视频模块一致）
-        audio_path_obj = Path(full_audio_path)
-        audio_directory = str(audio_path_obj.parent)
-        audio_filename = audio_path_obj.name
-        
-        print(f"📁 发送参数:")
-        print(f"   目录: {audio_directory}")
-        print(f"   文件名: {audio_filename}")
-        
-        # 返回音频文件，支持范围请求
-        return send_from_directory(
-            audio_directory,
-            audio_filename,
-            as_attachment=False,
-            conditional=True
-        )
-    except Exception as e:
-        print("\n=== 音频访问出错 ===")
-        print(f"错误类型: {type(e)}")
-        print(f"错误信息: {str(e)}")
-        print("错误堆栈:")
-        traceback.print_exc()
-        abort(500)
+    
+    if cached.group_id > user_group:
+        print(f"用户组({user_group})无权限访问音频: audio_id={audio_id}")
+        abort(403)
+    
+    return file_offload.send_media_file(cached.abs_path, as_attachment=False)
+
+@app.route('/audios/<path:filename>')
+def serve_audio(filename):
+    """旧版按路径访问音频的兼容入口：解析出音频ID后重定向到 /media/audio/<audio_id>"""
+    audio_id = query_database.resolve_legacy_audio_id(filename)
+    if not audio_id:
+        print(f"❌ 旧版音频地址未找到对应音频: {filename}")
+        abort(404)
+    return redirect(url_for('serve_audio_by_id', audio_id=audio_id))
 
 @app.route('/api/scan_audio', methods=['POST'])
 @fun.admin_required
 def scan_audio():
-    """扫描音频文件并保存到数据库"""
+    """提交音频扫描任务，立即返回任务ID"""
     try:
         data = request.get_json()
         root_path = data.get('root_path')
         is_vip = data.get('is_vip', False)
+        incremental = str(data.get('incremental', False)).lower() == 'true'
         
         if not root_path:
             return jsonify({
                 'status': 'error',
                 'message': '缺少根路径参数'
             }), 400
-        
-        # 🎯 重置音频扫描进度
-        update_audio_scan_progress(0, '开始扫描...')
-        print("📊 音频扫描进度已重置")
-            
-        # 🎯 创建音频处理器实例，传递进度回调
-        processor = AudioProcessor()
-        
-        # 🎯 处理音频文件（传递进度回调函数）
-        result = processor.process_audio_data(root_path, is_vip, update_audio_scan_progress)
-        
-        # 确保进度显示完成
-        update_audio_scan_progress(100, '扫描完成')
-        
-        return jsonify(result)
+
+        def run_scan(progress, cancel_event):
+            # 🎯 重置音频扫描进度
+            progress(0, '开始扫描...')
+            try:
+                processor = AudioProcessor()
+                result = processor.process_audio_data(root_path, is_vip, progress,
+                                                      incremental=incremental,
+                                                      cancel_event=cancel_event)
+            except ScanCancelled:
+                update_audio_scan_progress(100, '扫描已取消')
+                raise
+            # 确保进度显示完成
+            progress(100, '扫描完成')
+            return result
+
+        job = job_runner.runner.submit(
+            'audio', run_scan,
+            params={'root_path': root_path, 'is_vip': is_vip, 'incremental': incremental},
+            progress_callback=update_audio_scan_progress
+        )
+        return jsonify({
+            'status': 'success',
+            'message': '扫描任务已提交',
+            'job_id': job.job_id,
+            'job': job.to_dict()
+        })
         
     except Exception as e:
         return jsonify({
@@ -1599,46 +1872,9 @@ def process_audio():
 
 @app.route('/api/scan-audio-progress')
 def scan_audio_progress():
-    """🎯 获取音频扫描进度（使用全局进度变量，模仿视频扫描）"""
-    def generate():
-        last_percentage = -1  # 初始值设为-1确保第一次一定会发送
-        timeout_counter = 0  # 添加超时计数器
-        max_timeout = 300  # 最大超时时间（60秒）
-        
-        print(f"🔌 音频扫描SSE连接开始，初始进度: {audio_scan_progress}")
-        
-        while True:
-            # 使用线程锁安全读取进度
-            with progress_lock:
-                current_percentage = audio_scan_progress['percentage']
-                current_file = audio_scan_progress['current_file']
-            
-            # 只有当进度发生实际变化时才发送更新
-            if current_percentage != last_percentage:
-                data = {
-                    'percentage': current_percentage,
-                    'current_file': current_file
-                }
-                yield f"data: {json.dumps(data)}\n\n"
-                last_percentage = current_percentage
-                timeout_counter = 0  # 重置超时计数器
-                
-                print(f"📤 音频扫描SSE发送进度: {current_percentage}% - {current_file}")
-                
-                # 如果进度达到100%，发送后等待一小段时间再结束
-                if current_percentage >= 100:
-                    print("🏁 音频扫描进度已达100%，准备关闭SSE连接")
-                    time.sleep(0.5)  # 等待0.5秒确保前端接收到最终进度
-                    break
-            else:
-                # 如果进度没有变化，增加超时计数器
-                timeout_counter += 1
-                if timeout_counter >= max_timeout:
-                    print("⏰ 音频扫描SSE连接超时，强制关闭")
-                    break
-                    
-            time.sleep(0.2)
-    return Response(generate(), mimetype='text/event-stream')
+    """🎯 音频扫描进度（跟随最近一次音频扫描）"""
+    print("🔌 音频扫描SSE连接开始")
+    return progress_event_stream(AUDIO_PROGRESS_CHANNEL, follow=True)
 
 @app.route('/api/audio-config', methods=['GET', 'POST'])
 @fun.admin_required
@@ -1679,5 +1915,4 @@ def audio_config():
 
 
 if __name__ == '__main__':
-    from codes import env_loader
     app.run(debug=True, host=env_loader.app_host, port=env_loader.app_port)
@@ -121,6 +121,7 @@ document.addEventListener('DOMContentLoaded', function() {
             signal
         })
         .then(response => response.json())
+        .then(data => data.job_id ? waitForJob(data.job_id) : data)
         .then(data => {
             // 关闭事件流
             eventSource.close();
@@ -396,6 +397,7 @@ function image_upload() {
     // 获取输入框的值
     const imageBase = document.getElementById('imageBase').value.trim();
     const isVip = document.getElementById('image-isVip').value === 'true';
+    const incremental = document.getElementById('image-incremental').value === 'true';
 
     // 检查图片根路径是否为空
     if (!imageBase) {
@@ -459,7 +461,8 @@ function image_upload() {
     // 构建请求体（使用与视频扫描一致的参数名）
     const requestBody = {
         parentDir: imageBase,  // 使用 parentDir 而不是 root_path
-        is_vip: isVip
+        is_vip: isVip,
+        incremental: incremental
     };
 
     // 发送扫描请求（完全模仿视频扫描）
@@ -471,6 +474,7 @@ function image_upload() {
         body: JSON.stringify(requestBody)
     })
     .then(response => response.json())
+    .then(data => data.job_id ? waitForJob(data.job_id) : data)
    .then(data => {
         // 关闭事件流（完全模仿视频扫描）
         eventSource.close();
@@ -488,7 +492,8 @@ function image_upload() {
                     扫描完成！<br>
                     新增分类：${data.categories_added || 0}<br>
                     成功数：${data.images_added || 0}<br>
-                    失败数：${data.failed_count || 0}
+                    失败数：${data.failed_count || 0}<br>
+                    ${formatScanDelta(data)}
                 `;
             }
             showSuccess('图片扫描完成！');
@@ -621,6 +626,7 @@ document.addEventListener('DOMContentLoaded', function() {
 function scanAudio() {
     const rootPath = document.getElementById('audioBase').value.trim();
     const isVip = document.getElementById('audio-isVip').value === 'true';
+    const incremental = document.getElementById('audio-incremental').value === 'true';
     
     if (!rootPath) {
         showError('请输入音频根路径');
@@ -684,10 +690,12 @@ function scanAudio() {
         },
         body: JSON.stringify({
             root_path: rootPath,
-            is_vip: isVip
+            is_vip: isVip,
+            incremental: incremental
         })
     })
     .then(response => response.json())
+    .then(data => data.job_id ? waitForJob(data.job_id) : data)
     .then(data => {
         // 关闭事件流（完全模仿视频扫描）
         eventSource.close();
@@ -706,6 +714,7 @@ function scanAudio() {
                     <h4>扫描完成</h4>
                     <p>${data.message}</p>
                     <p>处理时间：${data.processing_time}</p>
+                    <p>${formatScanDelta(data)}</p>
                 </div>
             `;
             showSuccess(data.message);
@@ -872,12 +881,52 @@ function updateAudioProgress(percentage) {
     }
 }
 
+// 扫描结果中的增量统计（新增/变化/删除/未变化）
+function formatScanDelta(data) {
+    return `新文件：${data.added || 0}，有变化：${data.changed || 0}，` +
+        `已删除：${data.removed || 0}，未变化：${data.unchanged || 0}` +
+        (data.incremental ? '（增量扫描）' : '');
+}
+
+// 扫描接口只返回任务ID，轮询任务结果直到结束，再转换成原来的扫描结果格式
+function waitForJob(jobId, interval = 1000) {
+    return new Promise((resolve, reject) => {
+        const poll = () => {
+            fetch(`/api/jobs/${jobId}/result`)
+                .then(response => response.json())
+                .then(res => {
+                    if (res.status !== 'success') {
+                        resolve({ status: 'error', message: res.message || '查询扫描任务失败' });
+                        return;
+                    }
+                    const job = res.data;
+                    if (job.status === 'queued' || job.status === 'running') {
+                        setTimeout(poll, interval);
+                    } else if (job.status === 'succeeded') {
+                        resolve({ status: 'success', ...(job.result || {}), job_id: jobId });
+                    } else {
+                        const result = job.result || {};
+                        resolve({
+                            ...result,
+                            status: 'error',
+                            message: job.error || result.message || '扫描已取消/中断',
+                            job_id: jobId
+                        });
+                    }
+                })
+                .catch(reject);
+        };
+        poll();
+    });
+}
+
 // 新的视频扫描函数（支持缩略图自动映射）
 function scanVideosWithThumbnails() {
     // 获取输入值
     const videoScanDir = document.getElementById('videoScanDir').value.trim();
     const thumbnailDir = document.getElementById('thumbnailDir').value.trim();
     const isVip = document.getElementById('video-isVip').value === 'true';
+    const incremental = document.getElementById('video-incremental').value === 'true';
 
     // 输入验证
     if (!videoScanDir) {
@@ -958,10 +1007,12 @@ function scanVideosWithThumbnails() {
         body: JSON.stringify({
             parentDir: videoScanDir,
             thumbnailDir: thumbnailDir,
-            is_vip: isVip
+            is_vip: isVip,
+            incremental: incremental
         })
     })
     .then(response => response.json())
+    .then(data => data.job_id ? waitForJob(data.job_id) : data)
     .then(data => {
         // 🎯 关闭事件流
         eventSource.close();
@@ -979,6 +1030,7 @@ function scanVideosWithThumbnails() {
                     <p>添加分类：${data.categories_added || 0} 个</p>
                     <p>添加视频：${data.videos_added || 0} 个</p>
                     <p>失败数量：${data.failed_count || 0} 个</p>
+                    <p>${formatScanDelta(data)}</p>
                     ${data.disk_paths ? `<p>涉及磁盘：${data.disk_paths.join(', ')}</p>` : ''}
                 </div>
             `;
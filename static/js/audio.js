@@ -851,7 +851,7 @@ const AudioApp = {
             await new Promise(resolve => setTimeout(resolve, 50));
             
             // 设置音频源
-            const audioPath = `/audios/${track.relative_path}`;
+            const audioPath = track.url || `/audios/${track.relative_path}`;
             this.audioPlayer.src = audioPath;
             
             // 立即尝试提取音频封面（不阻塞播放）
@@ -2905,7 +2905,7 @@ const AudioApp = {
                 const firstTrack = album.tracks[0];
                 if (firstTrack.relative_path) {
                     console.log('🎵 尝试从第一首音频提取封面:', firstTrack.title);
-                    const audioPath = `/audios/${firstTrack.relative_path}`;
+                    const audioPath = firstTrack.url || `/audios/${firstTrack.relative_path}`;
                     await this.extractAudioCover(audioPath, coverElement);
                     
                     // 检查是否成功提取到封面（通过比较src是否改变）
@@ -2917,7 +2917,7 @@ const AudioApp = {
             } else if (album.first_track && album.first_track.relative_path) {
                 // 专辑列表页面，使用first_track信息
                 console.log('🎵 尝试从专辑列表第一首音频提取封面:', album.first_track.title);
-                const audioPath = `/audios/${album.first_track.relative_path}`;
+                const audioPath = album.first_track.url || `/audios/${album.first_track.relative_path}`;
                 await this.extractAudioCover(audioPath, coverElement);
                 
                 // 检查是否成功提取到封面（通过比较src是否改变）
@@ -2948,7 +2948,7 @@ const AudioApp = {
             
             // 2. 尝试从音频文件提取封面
             if (track.relative_path) {
-                const audioPath = `/audios/${track.relative_path}`;
+                const audioPath = track.url || `/audios/${track.relative_path}`;
                 console.log('🎵 尝试从音频文件提取封面:', audioPath);
                 
                 // 使用现有的音频封面提取方法
@@ -137,7 +137,7 @@ function showError(message) {
                 console.log('第一张图片路径:', allImagesData[0].full_path);
                 
                 // 测试第一张图片是否可以加载
-                testImageLoad('/images/' + allImagesData[0].full_path);
+                testImageLoad(allImagesData[0].lightbox_url || allImagesData[0].url || '/images/' + allImagesData[0].full_path);
             }
             
             // 计算总页数
@@ -293,7 +293,8 @@ function createSubsets() {
         
         // 尝试加载子集封面
         if (subsetImages[0] && subsetImages[0].full_path) {
-            const coverPath = '/images/' + subsetImages[0].full_path;
+            // 子集封面使用缩略预览图，不加载原图
+            const coverPath = subsetImages[0].preview_url || subsetImages[0].url || '/images/' + subsetImages[0].full_path;
             setTimeout(() => {
                 const testImg = new Image();
                 testImg.onload = function() {
@@ -387,7 +388,8 @@ function displayImages() {
         imgElement.alt = `图片 ${index + 1}`;
         
         // 处理图片路径
-        let fullImagePath = '/images/' + image.full_path;
+        // 浏览时加载限制尺寸的大图（原图可能是几 MB 的照片或浏览器无法显示的格式）
+        let fullImagePath = image.lightbox_url || image.url || '/images/' + image.full_path;
         
         // 检测并修复可能的路径问题
         if (fullImagePath.includes('//')) {
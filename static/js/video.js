@@ -530,6 +530,125 @@ function addSearchPageButton(container, pageNum, keyword) {
     container.appendChild(button);
 }
 
+// 从 srcset（"url 160w, url 320w, ..."）中选取不小于显示宽度的最小缩放图，都不够大时取最大的
+function pickThumbnailFromSrcset(srcset, displayWidth) {
+    const candidates = srcset.split(',')
+        .map(entry => entry.trim().split(/\s+/))
+        .filter(parts => parts.length === 2)
+        .map(([url, descriptor]) => ({ url, width: parseInt(descriptor, 10) }))
+        .sort((a, b) => a.width - b.width);
+    if (candidates.length === 0) {
+        return null;
+    }
+    const fit = candidates.find(candidate => candidate.width >= displayWidth);
+    return (fit || candidates[candidates.length - 1]).url;
+}
+
+// 已加载的故事板索引 {VTT地址: Promise<cue列表|null>}
+const storyboardCache = new Map();
+
+// 解析故事板 WebVTT：每条 cue 为 {start, end, url, x, y, w, h}，雪碧图地址相对 VTT 地址解析
+function parseStoryboardVtt(text, vttUrl) {
+    const toSeconds = value => value.split(':').reduce((total, part) => total * 60 + parseFloat(part), 0);
+    const baseUrl = new URL(vttUrl, window.location.href);
+    const cues = [];
+    const lines = text.split(/\r?\n/);
+    for (let i = 0; i < lines.length - 1; i++) {
+        const timing = lines[i].match(/^([\d:.]+)\s+-->\s+([\d:.]+)/);
+        const target = lines[i + 1].match(/^(.+)#xywh=(\d+),(\d+),(\d+),(\d+)$/);
+        if (timing && target) {
+            cues.push({
+                start: toSeconds(timing[1]),
+                end: toSeconds(timing[2]),
+                url: new URL(target[1], baseUrl).href,
+                x: +target[2], y: +target[3], w: +target[4], h: +target[5]
+            });
+        }
+    }
+    return cues;
+}
+
+// 加载故事板索引；服务端仍在生成（202 + Retry-After）时返回 null，过了提示的秒数后允许再次请求
+function loadStoryboard(vttUrl) {
+    if (!storyboardCache.has(vttUrl)) {
+        const request = fetch(vttUrl)
+            .then(response => {
+                if (response.status === 202) {
+                    const retryAfter = parseInt(response.headers.get('Retry-After'), 10) || 5;
+                    setTimeout(() => storyboardCache.delete(vttUrl), retryAfter * 1000);
+                    return null;
+                }
+                if (!response.ok) {
+                    throw new Error(`HTTP ${response.status}`);
+                }
+                return response.text().then(text => parseStoryboardVtt(text, vttUrl));
+            })
+            .catch(error => {
+                console.log(`故事板加载失败: ${vttUrl}`, error);
+                return null;
+            });
+        storyboardCache.set(vttUrl, request);
+    }
+    return storyboardCache.get(vttUrl);
+}
+
+// 缩略图悬停预览：按鼠标横向位置显示故事板雪碧图中对应时间点的画面
+function attachStoryboardPreview(thumbnailContainer, vttUrl) {
+    if (!vttUrl || window.matchMedia('(hover: none)').matches) {
+        return;
+    }
+    const preview = document.createElement('div');
+    preview.className = 'storyboard-preview';
+    const progress = document.createElement('div');
+    progress.className = 'storyboard-progress';
+    preview.appendChild(progress);
+    // 放在缩略图之后、播放按钮和时长之前，覆盖缩略图但不遮挡它们
+    thumbnailContainer.querySelector('.video-thumbnail').after(preview);
+
+    let cues = null;
+    let spriteWidth = 0;
+    let spriteHeight = 0;
+    let hovering = false;
+
+    const showAt = clientX => {
+        if (!cues || cues.length === 0) {
+            return;
+        }
+        const rect = thumbnailContainer.getBoundingClientRect();
+        const ratio = Math.min(Math.max((clientX - rect.left) / rect.width, 0), 0.9999);
+        const cue = cues[Math.floor(ratio * cues.length)];
+        // 按 cover 方式把单帧铺满容器，居中裁剪，相邻帧不会露出来
+        const scale = Math.max(rect.width / cue.w, rect.height / cue.h);
+        const offsetX = (rect.width - cue.w * scale) / 2;
+        const offsetY = (rect.height - cue.h * scale) / 2;
+        preview.style.backgroundImage = `url("${cue.url}")`;
+        preview.style.backgroundSize = `${spriteWidth * scale}px ${spriteHeight * scale}px`;
+        preview.style.backgroundPosition = `${offsetX - cue.x * scale}px ${offsetY - cue.y * scale}px`;
+        progress.style.width = `${ratio * 100}%`;
+        preview.classList.add('active');
+    };
+
+    thumbnailContainer.addEventListener('mouseenter', event => {
+        hovering = true;
+        const clientX = event.clientX;
+        loadStoryboard(vttUrl).then(result => {
+            cues = result;
+            if (cues && cues.length > 0) {
+                spriteWidth = Math.max(...cues.map(item => item.x + item.w));
+                spriteHeight = Math.max(...cues.map(item => item.y + item.h));
+            }
+            if (hovering) {
+                showAt(clientX);
+            }
+        });
+    });
+    thumbnailContainer.addEventListener('mousemove', event => showAt(event.clientX));
+    thumbnailContainer.addEventListener('mouseleave', () => {
+        hovering = false;
+        preview.classList.remove('active');
+    });
+}
+
 // 显示视频列表
 function displayVideos(videos, container) {
     container.innerHTML = '';
@@ -541,6 +660,11 @@ function displayVideos(videos, container) {
     
     // 获取默认图片路径
     const defaultImagePath = '/static/images/default.jpg';
+
+    // 估算卡片显示宽度（网格每列最小240px），乘以设备像素比后用于选择缩放图
+    const gridWidth = container.clientWidth || 960;
+    const columns = Math.max(1, Math.floor(gridWidth / 240));
+    const thumbnailDisplayWidth = Math.ceil(gridWidth / columns * (window.devicePixelRatio || 1));
     
     videos.forEach(video => {
         const videoCard = document.createElement('div');
@@ -562,14 +686,19 @@ function displayVideos(videos, container) {
         
         // 构建缩略图URL
         const timestamp = new Date().getTime();
-        let thumbnailPath;
-        if (video.thumbnail_url) {
-            // 使用后端返回的缩略图URL
-            thumbnailPath = `${video.thumbnail_url}?t=${timestamp}`;
-        } else {
-            // 兼容旧版本：前端拼接缩略图路径
-            const videoPath = video.video_path.replace(/\\/g, '/');
-            thumbnailPath = `/thumbnails/${videoPath}/${videoNameWithoutExt}.jpg?t=${timestamp}`;
+        // 按卡片显示宽度从 srcset 中选取缩放图（WebP/JPEG 由服务端按 Accept 决定，可被浏览器缓存）
+        let thumbnailPath = video.thumbnail_srcset
+            ? pickThumbnailFromSrcset(video.thumbnail_srcset, thumbnailDisplayWidth)
+            : null;
+        if (!thumbnailPath) {
+            if (video.thumbnail_url) {
+                // 使用后端返回的缩略图URL
+                thumbnailPath = `${video.thumbnail_url}?t=${timestamp}`;
+            } else {
+                // 兼容旧版本：前端拼接缩略图路径
+                const videoPath = video.video_path.replace(/\\/g, '/');
+                thumbnailPath = `/thumbnails/${videoPath}/${videoNameWithoutExt}.jpg?t=${timestamp}`;
+            }
         }
         
         // 🎯 使用后端返回的完整播放URL
@@ -610,37 +739,53 @@ function displayVideos(videos, container) {
         const thumbnailImg = videoCard.querySelector('.video-thumbnail');
         
         // 创建图片加载处理
-        const loadThumbnail = (retryCount = 0) => {
-            const img = new Image();
-            
-            img.onload = function() {
-                // 缩略图加载成功，替换默认图片
-                thumbnailImg.src = thumbnailPath;
-            };
-            
-            img.onerror = function() {
-                // 缩略图加载失败
-                console.log(`缩略图加载失败: ${thumbnailPath}`);
-                
-                // 最多重试2次
-                if (retryCount < 2) {
-                    console.log(`重试加载缩略图 (${retryCount + 1}/2): ${thumbnailPath}`);
-                    // 延迟200ms重试，避免同时请求过多
-                    setTimeout(() => loadThumbnail(retryCount + 1), 200 * (retryCount + 1));
-                } else {
-                    // 重试次数用完，保持默认图片
-                    console.log(`重试加载缩略图失败，使用默认图片: ${thumbnailPath}`);
-                    thumbnailImg.onerror = null; // 防止循环触发错误
-                }
-            };
-            
-            // 开始加载缩略图
-            img.src = thumbnailPath;
+        // 缩略图还在后台生成时，服务端返回占位图并带 Retry-After 响应头，按提示的秒数稍后重新请求
+        const maxPendingRetries = 10;
+        const loadThumbnail = (retryCount = 0, pendingCount = 0) => {
+            fetch(thumbnailPath)
+                .then(response => {
+                    if (!response.ok) {
+                        throw new Error(`HTTP ${response.status}`);
+                    }
+                    const retryAfter = parseInt(response.headers.get('Retry-After'), 10);
+                    if (retryAfter > 0) {
+                        // 缩略图正在生成，保持默认图片
+                        if (pendingCount < maxPendingRetries) {
+                            setTimeout(() => loadThumbnail(retryCount, pendingCount + 1), retryAfter * 1000);
+                        }
+                        return null;
+                    }
+                    return response.blob();
+                })
+                .then(blob => {
+                    if (blob) {
+                        // 缩略图加载成功，替换默认图片
+                        thumbnailImg.src = URL.createObjectURL(blob);
+                        thumbnailImg.onload = () => URL.revokeObjectURL(thumbnailImg.src);
+                    }
+                })
+                .catch(error => {
+                    // 缩略图加载失败
+                    console.log(`缩略图加载失败: ${thumbnailPath}`, error);
+
+                    // 最多重试2次
+                    if (retryCount < 2) {
+                        console.log(`重试加载缩略图 (${retryCount + 1}/2): ${thumbnailPath}`);
+                        // 延迟200ms重试，避免同时请求过多
+                        setTimeout(() => loadThumbnail(retryCount + 1, pendingCount), 200 * (retryCount + 1));
+                    } else {
+                        // 重试次数用完，保持默认图片
+                        console.log(`重试加载缩略图失败，使用默认图片: ${thumbnailPath}`);
+                    }
+                });
         };
         
         // 开始加载缩略图
         loadThumbnail();
         
+        // 悬停预览（故事板在第一次悬停时才请求）
+        attachStoryboardPreview(videoCard.querySelector('.thumbnail-container'), video.storyboard_url);
+        
                 // 添加点击事件
         videoCard.addEventListener('click', function() {
             const mainVideoPlayer = document.getElementById('mainVideoPlayer');
@@ -682,7 +827,8 @@ function displayVideos(videos, container) {
                     videoFullPath, 
                     videoTitle, 
                     video.video_duration || null, 
-                    video.video_quality || null
+                    video.video_quality || null,
+                    video.hls_url || null
                 );
             }
             
@@ -701,8 +847,76 @@ function displayVideos(videos, container) {
     });
 }
 
+// 播放器当前使用的 hls.js 实例（切换视频时销毁）
+const hlsInstances = new WeakMap();
+
+// 等待 HLS 播放列表就绪：服务端还在封装时返回 202 + Retry-After，按提示的秒数重试
+function waitForHlsPlaylist(hlsUrl, attempts = 20) {
+    return fetch(hlsUrl)
+        .then(response => {
+            if (response.status === 202 && attempts > 0) {
+                const retryAfter = parseInt(response.headers.get('Retry-After'), 10) || 3;
+                return new Promise(resolve => setTimeout(resolve, retryAfter * 1000))
+                    .then(() => waitForHlsPlaylist(hlsUrl, attempts - 1));
+            }
+            return response.ok;
+        })
+        .catch(() => false);
+}
+
+// 设置播放器的视频源：有 HLS 地址且浏览器支持（hls.js 或原生）时按分片播放，否则或失败时直接播放原文件
+function setVideoSource(player, videoPath, hlsUrl) {
+    const previous = hlsInstances.get(player);
+    if (previous) {
+        previous.destroy();
+        hlsInstances.delete(player);
+    }
+    const useHlsJs = hlsUrl && window.Hls && window.Hls.isSupported();
+    const useNativeHls = hlsUrl && !useHlsJs && player.canPlayType('application/vnd.apple.mpegurl');
+    const playOriginal = () => {
+        player.src = videoPath;
+        player.load();
+    };
+    if (!useHlsJs && !useNativeHls) {
+        playOriginal();
+        return;
+    }
+
+    // 等待播放列表期间又切换了视频时，丢弃这次的结果
+    const token = (player.sourceToken || 0) + 1;
+    player.sourceToken = token;
+    player.removeAttribute('src');
+    waitForHlsPlaylist(hlsUrl).then(ready => {
+        if (player.sourceToken !== token) {
+            return;
+        }
+        if (!ready) {
+            console.log(`HLS 播放列表不可用，直接播放原文件: ${videoPath}`);
+            playOriginal();
+            return;
+        }
+        if (useNativeHls) {
+            player.src = hlsUrl;
+            player.load();
+            return;
+        }
+        const hls = new Hls();
+        hls.on(Hls.Events.ERROR, (event, data) => {
+            if (data.fatal) {
+                console.log('HLS 播放失败，直接播放原文件', data);
+                hls.destroy();
+                hlsInstances.delete(player);
+                playOriginal();
+            }
+        });
+        hls.loadSource(hlsUrl);
+        hls.attachMedia(player);
+        hlsInstances.set(player, hls);
+    });
+}
+
 // 播放视频
-function playVideo(videoPath, videoName, duration, quality) {
+function playVideo(videoPath, videoName, duration, quality, hlsUrl = null) {
     const mainPlayer = document.getElementById('mainPlayer');
     const pipPlayer = document.getElementById('pipPlayer');
     const mainVideoPlayer = document.getElementById('mainVideoPlayer');
@@ -719,7 +933,7 @@ function playVideo(videoPath, videoName, duration, quality) {
     pipPlayer.classList.add('hidden');
 
     // 更新大窗播放器信息
-    mainVideoPlayer.src = videoPath;
+    setVideoSource(mainVideoPlayer, videoPath, hlsUrl);
     mainTitle.textContent = videoName;
     
     // 修改页面标题为视频名称
@@ -743,13 +957,11 @@ function playVideo(videoPath, videoName, duration, quality) {
 
     // 只在桌面端同步小窗播放器
     if (window.innerWidth > 767) {
-        pipVideoPlayer.src = videoPath;
+        setVideoSource(pipVideoPlayer, videoPath, hlsUrl);
         // 设置播放器同步
         setupPlayerSync(mainVideoPlayer, pipVideoPlayer);
     }
 
-    mainVideoPlayer.load();
-
     // 滚动到视图逻辑 - 只有在大窗隐藏时才滚动
     if (mainPlayer.classList.contains('hidden')) {
         // 大窗隐藏时，滚动到顶部显示大窗